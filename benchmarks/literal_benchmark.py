@@ -0,0 +1,66 @@
+"""
+Compare the literal matcher with the combined regex on a synthetic SDL trace.
+
+    python benchmarks/literal_benchmark.py [--mb 2] [--tokens 10 100 1000]
+
+Each token count is timed with tokens sampled from the trace the way
+color_selection stores them (``\\b``-wrapped escaped words), plus one run
+with a handful of very frequent tokens (SdlSig-I, process names) where
+per-hit overhead dominates. Both matchers must return the same spans.
+The regex side gets every token wrapped in ``(?:...)`` so TaggedMatcher
+does not hand it to the literal matcher.
+"""
+import argparse
+import os
+import re
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from highlight_engine import TaggedMatcher  # noqa: E402
+from literal_matcher import LiteralMatcher  # noqa: E402
+from restore_benchmark import build_style_patterns, timed  # noqa: E402
+from synthetic_trace import PROCESSES, sdl_text  # noqa: E402
+
+
+def frequent_style_patterns():
+    tokens = ["SdlSig-I", "SdlSig-O", "Branch"] + sorted(set(PROCESSES))
+    return dict((index, [r'\b%s\b' % re.escape(token)]) for index, token in enumerate(tokens))
+
+
+def spans(matcher, text):
+    return sorted(matcher.scan(text))
+
+
+def as_regexes(style_patterns):
+    return dict((style, ['(?:%s)' % pattern for pattern in patterns])
+                for style, patterns in style_patterns.items())
+
+
+def compare(label, text, style_patterns):
+    regex_time, regex_hits = timed(lambda: spans(TaggedMatcher(as_regexes(style_patterns)), text))
+    literal_time, literal_hits = timed(lambda: spans(LiteralMatcher(style_patterns), text))
+    status = "ok" if regex_hits == literal_hits else "MISMATCH"
+    speedup = regex_time / literal_time if literal_time > 0 else float("inf")
+    print("%-10s %8d hits  regex %7.3f s  literal %7.3f s  %6.2fx  %s" % (
+        label, len(literal_hits), regex_time, literal_time, speedup, status))
+    return status == "ok"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--mb", type=float, default=2.0)
+    parser.add_argument("--tokens", type=int, nargs="+", default=[10, 100, 1000])
+    args = parser.parse_args(argv)
+
+    text = sdl_text(args.mb)
+    print("trace: %.1f MB" % (len(text) / 1048576.0))
+    ok = True
+    for count in args.tokens:
+        ok = compare("%d tokens" % count, text, build_style_patterns(text, count)) and ok
+    ok = compare("frequent", text, frequent_style_patterns()) and ok
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
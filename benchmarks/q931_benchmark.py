@@ -0,0 +1,104 @@
+"""
+Time the Q.931 hex decode over a corpus of IsdnMsgData-shaped messages.
+
+    python benchmarks/q931_benchmark.py [--blobs 20000] [--repeat 3]
+
+"lists" mirrors the decoder before bytes/memoryview: hex parsed into a
+list of ints one pair at a time, then a walk that only picks out the
+Cause IE. "bytes" is cucm_decoders: bytes.fromhex and a memoryview walk
+that locates every IE and decodes the cause. Both must find the same
+Q.850 causes. "all IEs" adds decoding every IE through the handler
+table, as the hover popup does; it is timed against the same cause-only
+list walk, which decodes none of them, so its ratio is the price of the
+wider decode rather than a like-for-like speedup.
+"""
+import argparse
+import os
+import re
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cucm_decoders import _normalize_hex_bytes, decode_h323_q931_hex, q931_message_ies  # noqa: E402
+from restore_benchmark import timed  # noqa: E402
+from synthetic_trace import isdn_blobs  # noqa: E402
+
+
+def list_normalize(raw_text):
+    if not re.search(r'(?i)[a-f]|0x|[\s:-]', raw_text):
+        return []
+    return [int(p, 16) for p in re.findall(r'(?i)(?:0x)?([0-9a-f]{2})', raw_text)]
+
+
+def list_cause(byte_list):
+    msg_index = 2 + (byte_list[1] & 0x0F)
+    cause = None
+    i = msg_index + 1
+    while i < len(byte_list):
+        ie_id = byte_list[i]
+        if ie_id & 0x80:
+            i += 1
+            continue
+        if i + 1 >= len(byte_list):
+            break
+        ie_len = byte_list[i + 1]
+        value_end = i + 2 + ie_len
+        if value_end > len(byte_list):
+            break
+        if ie_id == 0x08 and ie_len >= 2:
+            cause = byte_list[i + 3] & 0x7F
+        i = value_end
+    return cause
+
+
+def run_lists(blobs):
+    return [list_cause(list_normalize(blob)) for blob in blobs]
+
+
+def run_bytes(blobs):
+    out = []
+    for blob in blobs:
+        cause = decode_h323_q931_hex(_normalize_hex_bytes(blob))["q850_cause"]
+        out.append(cause["code"] if cause else None)
+    return out
+
+
+def run_all_ies(blobs):
+    return [q931_message_ies(decode_h323_q931_hex(_normalize_hex_bytes(blob))) for blob in blobs]
+
+
+def best_of(repeat, fn, *args):
+    runs = [timed(fn, *args) for _ in range(repeat)]
+    return min(seconds for seconds, _ in runs), runs[0][1]
+
+
+def report(label, count, list_time, bytes_time, status):
+    print("%-10s lists %7.3f s  bytes %7.3f s  %5.2fx  %8.0f msg/s  %s" % (
+        label, list_time, bytes_time, list_time / bytes_time, count / bytes_time, status))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--blobs", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    blobs = isdn_blobs(args.blobs)
+    print("corpus: %d messages, %.1f bytes each" % (
+        len(blobs), sum(len(blob) + 1 for blob in blobs) / 3.0 / len(blobs)))
+    list_time, _ = best_of(args.repeat, lambda: [list_normalize(blob) for blob in blobs])
+    bytes_time, _ = best_of(args.repeat, lambda: [_normalize_hex_bytes(blob) for blob in blobs])
+    report("hex only", len(blobs), list_time, bytes_time, "")
+
+    list_time, list_causes = best_of(args.repeat, run_lists, blobs)
+    bytes_time, bytes_causes = best_of(args.repeat, run_bytes, blobs)
+    ok = list_causes == bytes_causes
+    report("decode", len(blobs), list_time, bytes_time, "ok" if ok else "MISMATCH")
+
+    bytes_time, _ = best_of(args.repeat, run_all_ies, blobs)
+    report("all IEs", len(blobs), list_time, bytes_time, "")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,129 @@
+"""
+Compare highlight restore strategies on a synthetic SDL trace.
+
+    python benchmarks/restore_benchmark.py [--mb 2] [--tokens 300]
+
+"per-pattern" mirrors StyleOptionsStorage.restore before the combined
+matcher: one full scan per stored token plus a set to drop duplicates.
+"combined" is highlight_engine.scan_styles, a single tagged pass. Both
+sides use Python's re so the numbers compare the number of passes, not
+Sublime's find_all against Python.
+
+Both must return the same regions, for the sampled tokens and for a set
+of tokens that are prefixes of, inside or overlapping one another, as
+literals, ``\b``-wrapped literals and regexes; a mismatch exits with 1.
+"""
+import argparse
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from highlight_engine import scan_styles  # noqa: E402
+from literal_matcher import literal_of  # noqa: E402
+from synthetic_trace import sample_tokens, sdl_text  # noqa: E402
+
+
+def per_pattern_restore(text, style_patterns):
+    hits = {}
+    for style, patterns in style_patterns.items():
+        seen = set()
+        regions = []
+        for pattern in patterns:
+            for m in re.finditer(pattern, text):
+                key_tuple = (m.start(), m.end())
+                if key_tuple not in seen:
+                    seen.add(key_tuple)
+                    regions.append(key_tuple)
+        hits[style] = regions
+    return hits
+
+
+def combined_restore(text, style_patterns):
+    hits, _ = scan_styles(lambda a, b: text[a:b], style_patterns, 0, len(text))
+    return hits
+
+
+def build_style_patterns(text, token_count, styles=10):
+    tokens = sample_tokens(text, token_count)
+    style_patterns = {}
+    for index, token in enumerate(tokens):
+        pattern = re.escape(token)
+        if pattern[0].isalnum():
+            pattern = r'\b%s\b' % pattern
+        style_patterns.setdefault(index % styles, []).append(pattern)
+    return style_patterns
+
+
+def overlapping_style_patterns(text, token_count, styles=10):
+    """
+    Sampled words plus their prefixes, inner parts and overlapping pairs,
+    spread over styles so that tokens of different styles (and some of the
+    same style) match inside and across each other's hits.
+    """
+    words = [token for token in sample_tokens(text, token_count) if len(token) >= 6]
+    tokens = []
+    for index, word in enumerate(words):
+        tokens.append(re.escape(word))
+        tokens.append(re.escape(word[:4]))
+        tokens.append(r'\b%s\b' % re.escape(word))
+        tokens.append(re.escape(word[2:-2]))
+        if index % 3 == 0:
+            tokens.append(r'%s\w*' % re.escape(word[:3]))
+    tokens.extend([r'SdlSig-[IO]', r'Sig-I\s', r'\(1,100,\d+', r'100,\d+,1\)', r'CI=\d+', r'=\d{4}'])
+    style_patterns = {}
+    for index, token in enumerate(tokens):
+        style_patterns.setdefault(index % styles, []).append(token)
+    return style_patterns
+
+
+def literal_style_patterns(style_patterns):
+    """Only the literal tokens, so the scan goes through literal_matcher alone."""
+    return dict((style, [p for p in patterns if literal_of(p) is not None])
+                for style, patterns in style_patterns.items())
+
+
+def same_hits(old_hits, new_hits):
+    return all(sorted(old_hits.get(style, ())) == sorted(new_hits.get(style, ()))
+               for style in set(old_hits) | set(new_hits))
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - start, result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--mb", type=float, default=2.0)
+    parser.add_argument("--tokens", type=int, default=300)
+    args = parser.parse_args(argv)
+
+    text = sdl_text(args.mb)
+    print("trace: %.1f MB, tokens: %d" % (len(text) / 1048576.0, args.tokens))
+    overlapping = overlapping_style_patterns(text, args.tokens)
+    few = overlapping_style_patterns(text, 20)
+    ok = True
+    for label, style_patterns in (
+            ("sampled", build_style_patterns(text, args.tokens)),
+            ("overlapping", overlapping),
+            ("overlapping literals", literal_style_patterns(overlapping)),
+            ("few overlapping literals", literal_style_patterns(few))):
+        old_time, old_hits = timed(per_pattern_restore, text, style_patterns)
+        new_time, new_hits = timed(combined_restore, text, style_patterns)
+        same = same_hits(old_hits, new_hits)
+        ok = ok and same
+        print("%s:" % label)
+        print("  per-pattern : %8.3f s  %d regions" % (old_time, sum(len(v) for v in old_hits.values())))
+        print("  combined    : %8.3f s  %d regions" % (new_time, sum(len(v) for v in new_hits.values())))
+        if new_time > 0:
+            print("  speedup     : %8.2fx" % (old_time / new_time))
+        print("  same hits   : %s" % ("yes" if same else "NO"))
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,119 @@
+"""
+Synthetic CUCM SDL trace text shared by the benchmarks.
+
+Lines follow the shape of real ``sdl001_100_*.txt`` traces closely enough
+for matching benchmarks: SdlSig-I/O headers, process names, call ids,
+hex IPs and the occasional Q.850 cause. isdn_blobs gives the hex of the
+Q.931 messages CUCM logs as IsdnMsgData, for the decoder benchmark.
+"""
+import random
+
+SIGNALS = [
+    "CcSetupReq", "CcSetupCompConf", "CcAlertingReq", "CcConnInd",
+    "CcDisconnReq", "CcRelReq", "MediaExchQueryCapability",
+    "StationOutputSetRinger", "SIPInviteInd", "SIPByeInd",
+    "CcT302ToInd", "DaAnalyzeReq", "DaAnalyzeRes", "StationInit",
+]
+
+PROCESSES = [
+    "Cdcc", "Cdcc", "LineControl", "StationD", "SIPHandler", "SIPD",
+    "MediaManager", "DigitAnalysis", "CallControl", "PolicyManager",
+]
+
+
+def sdl_lines(count, seed=1):
+    rng = random.Random(seed)
+    minute = 0
+    second = 0
+    millis = 0
+    for index in range(count):
+        millis += rng.randint(0, 40)
+        if millis >= 1000:
+            millis -= 1000
+            second += 1
+            if second >= 60:
+                second = 0
+                minute = (minute + 1) % 60
+        stamp = "14:%02d:%02d.%03d" % (minute, second, millis)
+        direction = "SdlSig-I" if rng.random() < 0.5 else "SdlSig-O"
+        signal = rng.choice(SIGNALS)
+        src = rng.choice(PROCESSES)
+        dst = rng.choice(PROCESSES)
+        ci = rng.randint(10000000, 10009999)
+        kind = rng.random()
+        if kind < 0.02:
+            tail = "Reason: Q.850;cause=%d" % rng.choice([16, 17, 31, 41, 47, 102])
+        elif kind < 0.05:
+            tail = "IpAddr=%08x Port=%d" % (rng.getrandbits(32), rng.randint(16384, 32767))
+        elif kind < 0.07:
+            tail = "IsdnMsgData: 08 02 80 %02X 45 08 02 80 90" % rng.randint(0, 255)
+        else:
+            tail = "[R:N-H:0,N:%d,L:0,V:0,Z:0,D:0] CI=%d Branch=0" % (rng.randint(0, 9), ci)
+        yield "%08d |%s |%s |%-20s |%s(1,100,%d,1) |%s(1,100,%d,1) |1,100,%d.%d^*^* |%s\n" % (
+            index, stamp, direction, signal, dst, rng.randint(1, 300),
+            src, rng.randint(1, 300), rng.randint(1, 99), rng.randint(1, 999), tail)
+
+
+def sdl_text(megabytes, seed=1):
+    target = int(megabytes * 1024 * 1024)
+    parts = []
+    size = 0
+    for line in sdl_lines(target, seed):
+        parts.append(line)
+        size += len(line)
+        if size >= target:
+            break
+    return "".join(parts)
+
+
+def sample_tokens(text, count, seed=2):
+    """Pick ``count`` distinct words from ``text`` the way color_selection would."""
+    import re
+    rng = random.Random(seed)
+    words = sorted(set(re.findall(r'[A-Za-z_][A-Za-z0-9_]{3,}|\d{6,}', text[:2 * 1024 * 1024])))
+    rng.shuffle(words)
+    picked = words[:count]
+    while len(picked) < count:
+        picked.append("Missing%dToken" % len(picked))
+    return picked
+
+
+def _ie(iei, payload):
+    return [iei, len(payload)] + list(payload)
+
+
+def _number(ie_id, digits, screened):
+    octets = [0x21] + ([0x80 | screened] if ie_id == 0x6C else [])
+    octets[-1] |= 0x80
+    return _ie(ie_id, octets + [ord(d) for d in digits])
+
+
+def isdn_message(rng):
+    """One Q.931 message as a list of octets: SETUP, ALERTING, ..., RELEASE COMPLETE."""
+    msg_type = rng.choice([0x05, 0x05, 0x02, 0x01, 0x03, 0x07, 0x45, 0x4D, 0x5A, 0x62])
+    call_ref = rng.randint(1, 0x7FFF)
+    octets = [0x08, 0x02, (call_ref >> 8) | rng.choice([0, 0x80]), call_ref & 0xFF, msg_type]
+    if msg_type == 0x05:
+        octets += [0xA1]
+        octets += _ie(0x04, [0x80, 0x90, 0xA2])
+        octets += _ie(0x18, [0xA9, 0x83, 0x80 | rng.randint(1, 23)])
+        octets += _ie(0x1E, [0x81, 0x83])
+        octets += _ie(0x28, [ord(c) for c in rng.choice(["Alice Smith", "Reception", "Conf Room 4"])])
+        octets += _number(0x6C, "%04d" % rng.randint(1000, 9999), rng.randint(0, 3))
+        octets += _number(0x70, "9%07d" % rng.randint(0, 9999999), 0)
+    elif msg_type in (0x01, 0x02, 0x03, 0x07):
+        octets += _ie(0x18, [0xA9, 0x83, 0x80 | rng.randint(1, 23)])
+        octets += _ie(0x1E, [0x82, 0x88])
+    elif msg_type == 0x62:
+        octets += _ie(0x1C, [0x91, 0xA1, 0x06, 0x02, 0x01, rng.randint(1, 127), 0x02, 0x01, 0x00])
+    else:
+        octets += _ie(0x08, [0x82, 0x80 | rng.choice([16, 16, 16, 17, 31, 34, 41, 102])])
+    if rng.random() < 0.3:
+        octets += [0x96] + _ie(0x01, [rng.randint(0, 255) for _ in range(4)])
+    return octets
+
+
+def isdn_blobs(count, seed=1):
+    """``count`` IsdnMsgData hex strings ("08 02 80 05 ...")."""
+    rng = random.Random(seed)
+    return [" ".join("%02X" % octet for octet in isdn_message(rng)) for _ in range(count)]
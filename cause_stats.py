@@ -0,0 +1,217 @@
+"""
+Count the Q.850 causes found in a trace file, or in every trace under a
+folder: per cause, per node, per file and per minute.
+
+Causes are those the hover decodes: "reason: Q.850;cause=N" text and the
+Cause IE of Q.931 PDUs and IE dumps. A cause that shows up more than once
+on a line (the text and the PDU it came from) is counted once.
+
+Used by the "Q.850 Cause Statistics" command and runnable on its own, with
+one worker process per core:
+
+    python cause_stats.py BUNDLE
+    python cause_stats.py BUNDLE --table minute --sort minute --csv
+
+The node of a file is the first folder under the bundle root, as in an
+RTMT collection (``<node>/cm/trace/ccm/sdl/...``). Nothing in here imports
+``sublime``.
+"""
+import argparse
+import csv
+import io
+import os
+import re
+import sys
+
+try:
+    from .cucm_decoders import Q850_CAUSES
+    from .decode_report import iter_decoded
+    from .highlight_report import format_table
+    from .trace_scan import TRACE_FILE_PATTERNS, iter_trace_files, node_of, run_pool
+except ImportError:
+    from cucm_decoders import Q850_CAUSES
+    from decode_report import iter_decoded
+    from highlight_report import format_table
+    from trace_scan import TRACE_FILE_PATTERNS, iter_trace_files, node_of, run_pool
+
+# Decoders whose fields() can carry a cause.
+CAUSE_DECODERS = frozenset(("q850", "h323", "isdn_line", "hex_block", "iedata"))
+NO_MINUTE = "-"
+TABLES = ("cause", "node", "file", "minute")
+SORT_KEYS = ("count", "cause", "node", "file", "minute", "first", "last")
+_MINUTE = re.compile(r'\d{2}:\d{2}(?=:\d{2})')
+
+
+def minute_of(timestamp):
+    """``timestamp`` cut to the minute, date kept: "2024/03/14 10:22"."""
+    match = _MINUTE.search(timestamp or "")
+    return timestamp[:match.end()] if match else NO_MINUTE
+
+
+def count_file(path):
+    """
+    Count the causes in ``path``. Returns ``(path, causes, minutes)`` with
+    ``causes`` as ``{cause: [count, first_ts, last_ts]}`` and ``minutes``
+    as ``{(minute, cause): count}``.
+    """
+    causes = {}
+    minutes = {}
+    last_line = None
+    seen = set()
+    for line_no, timestamp, _, fields in iter_decoded(path, CAUSE_DECODERS):
+        if line_no != last_line:
+            last_line = line_no
+            seen = set()
+        cause = fields.get("cause")
+        if cause is None or cause in seen:
+            continue
+        seen.add(cause)
+        entry = causes.get(cause)
+        if entry is None:
+            entry = causes[cause] = [0, timestamp, timestamp]
+        entry[0] += 1
+        if timestamp:
+            entry[1] = entry[1] or timestamp
+            entry[2] = timestamp
+        key = (minute_of(timestamp), cause)
+        minutes[key] = minutes.get(key, 0) + 1
+    return path, causes, minutes
+
+
+def cause_text(cause):
+    return Q850_CAUSES.get(cause, ("Unknown / Not Mapped",))[0]
+
+
+class CauseStats(object):
+    """Per-file results of count_file() merged into report tables."""
+
+    def __init__(self, root):
+        self.root = root
+        self.files = {}  # rel_path -> causes
+        self.minutes = {}  # (minute, cause) -> count
+        self.errors = []
+
+    def add(self, path, causes, minutes):
+        self.files[os.path.relpath(path, self.root)] = causes
+        for key, count in minutes.items():
+            self.minutes[key] = self.minutes.get(key, 0) + count
+
+    @property
+    def total(self):
+        return sum(entry[0] for causes in self.files.values() for entry in causes.values())
+
+    def tables(self):
+        """``{name: (columns, rows)}`` for every name in TABLES, rows unsorted."""
+        by_cause = {}
+        by_node = {}
+        file_rows = []
+        for rel_path, causes in self.files.items():
+            node = node_of(rel_path)
+            for cause, (count, first, last) in causes.items():
+                file_rows.append((rel_path, cause, count, first or "", last or ""))
+                entry = by_cause.setdefault(cause, [0, set(), set(), None, None])
+                entry[0] += count
+                entry[1].add(node)
+                entry[2].add(rel_path)
+                if first and (entry[3] is None or first < entry[3]):
+                    entry[3] = first
+                if last and (entry[4] is None or last > entry[4]):
+                    entry[4] = last
+                by_node[(node, cause)] = by_node.get((node, cause), 0) + count
+        cause_rows = [
+            (cause, cause_text(cause), count, len(nodes), len(files), first or "", last or "")
+            for cause, (count, nodes, files, first, last) in by_cause.items()]
+        return {
+            "cause": (("cause", "text", "count", "nodes", "files", "first", "last"), cause_rows),
+            "node": (("node", "cause", "count"),
+                     [(node, cause, count) for (node, cause), count in by_node.items()]),
+            "file": (("file", "cause", "count", "first", "last"), file_rows),
+            "minute": (("minute", "cause", "count"),
+                       [(minute, cause, count) for (minute, cause), count in self.minutes.items()]),
+        }
+
+
+def sort_rows(columns, rows, sort="count"):
+    """
+    ``rows`` sorted on column ``sort``, ascending with ties by count, or
+    highest count first when the table has no such column.
+    """
+    count = columns.index("count")
+    if sort in columns and sort != "count":
+        column = columns.index(sort)
+        return sorted(rows, key=lambda row: (row[column], -row[count], row))
+    return sorted(rows, key=lambda row: (-row[count], row))
+
+
+def cause_stats(root, file_patterns=TRACE_FILE_PATTERNS, workers=None, processes=True,
+                progress=None):
+    """
+    Count the causes in ``root`` (a file, or every matching file under a
+    folder). ``progress(path, error)`` is called as each file finishes.
+    """
+    if os.path.isfile(root):
+        files = [root]
+        root = os.path.dirname(root)
+    else:
+        files = list(iter_trace_files(root, file_patterns))
+    stats = CauseStats(root)
+    for job, result, error in run_pool(count_file, [(path,) for path in files], workers, processes):
+        if error is not None:
+            stats.errors.append((os.path.relpath(job[0], root), error))
+        else:
+            stats.add(*result)
+        if progress is not None:
+            progress(job[0], error)
+    return stats
+
+
+def format_report(stats, sort="count", tables=TABLES):
+    """The tables of ``stats`` as aligned text, one section per table."""
+    all_tables = stats.tables()
+    sections = []
+    for name in tables:
+        columns, rows = all_tables[name]
+        sections.append("By %s:\n\n%s" % (name, format_table(sort_rows(columns, rows, sort), columns)))
+    return "\n".join(sections)
+
+
+def format_csv(stats, sort="count", tables=TABLES):
+    """The tables of ``stats`` as CSV, each with its header row, blank-line separated."""
+    all_tables = stats.tables()
+    out = io.StringIO()
+    writer = csv.writer(out, lineterminator="\n")
+    for i, name in enumerate(tables):
+        columns, rows = all_tables[name]
+        if i:
+            out.write("\n")
+        writer.writerow(columns)
+        writer.writerows(sort_rows(columns, rows, sort))
+    return out.getvalue()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("path", help="trace file or folder (an extracted bundle)")
+    parser.add_argument("--table", action="append", choices=TABLES,
+                        help="table to print; may be repeated (default: all)")
+    parser.add_argument("--sort", choices=SORT_KEYS, default="count")
+    parser.add_argument("--csv", action="store_true", help="CSV instead of aligned tables")
+    parser.add_argument("--files", nargs="+", default=list(TRACE_FILE_PATTERNS),
+                        help="file name patterns for folders (default: %(default)s)")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.path):
+        parser.error("no such file or folder: %s" % args.path)
+    stats = cause_stats(args.path, args.files, args.workers, processes=True)
+    tables = args.table or TABLES
+    sys.stdout.write(format_csv(stats, args.sort, tables) if args.csv
+                     else format_report(stats, args.sort, tables))
+    for rel_path, error in stats.errors:
+        sys.stderr.write("error: %s: %s\n" % (rel_path, error))
+    sys.stderr.write("%d causes in %d files\n" % (stats.total, len(stats.files)))
+    return 1 if stats.errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,1595 @@
+"""
+CUCM trace decoders: Q.850 causes, hex IPs, H.323/Q.931 PDUs, Q.931 IEs and
+DTMF capability blocks, and the registry that finds them in text.
+
+Each decoder declares a trigger regex; the triggers of all registered
+decoders are compiled into one named-group alternation, so a chunk of
+lines is classified in a single pass and a decoder's own patterns only
+run on lines where its trigger fired. decode_spans turns text into
+``(begin, end, kind, pattern)`` spans, ``kind`` being the decoder's place
+in DECODERS, which is also its priority when spans overlap.
+
+Nothing in here imports ``sublime``.
+"""
+import bisect
+import re
+from html import escape
+from collections import OrderedDict
+
+DEBUG_LOG = False
+
+
+def _debug(msg):
+    if DEBUG_LOG:
+        print(msg)
+
+
+CUCM_ENUMS = {
+    "DTMFConfig": {1: "BestEffort", 2: "PreferOOB", 3: "Prefer2833", 4: "PreferBoth"},
+    "DTMFMethod": {
+        0: "NoDTMF",
+        1: "OOB",
+        2: "RFC2833",
+        3: "OOB + RFC2833",
+        4: "UnknownDTMF"
+    }
+}
+
+Q850_CAUSES = {
+    1: ("Unallocated Number", "Destination cannot be reached because the number is unassigned."),
+    2: ("No Route To Transit Network", "Call asked to route through an unrecognized intermediate network."),
+    3: ("No Route To Destination", "Called party cannot be reached via the selected network path."),
+    4: ("Send Special Information Tone", "Long-term condition; SIT tone should be returned."),
+    5: ("Misdialed Trunk Prefix", "Called number contains an erroneous trunk prefix."),
+    6: ("Channel Unacceptable", "Identified channel is not acceptable for this call."),
+    7: ("Call Delivered In Established Channel", "Call delivered using an already-established channel."),
+    8: ("Preemption", "Call was preempted (typically emergency priority)."),
+    9: ("Preemption, Circuit Reserved", "Call preempted and circuit reserved for reuse."),
+    16: ("Normal Call Clearing", "Call cleared normally because one party ended the call."),
+    17: ("User Busy", "Called party cannot accept another call (busy)."),
+    18: ("No User Responding", "No alerting/connect response within allowed time."),
+    19: ("No Answer (User Alerted)", "User was alerted but did not answer in time."),
+    20: ("Subscriber Absent", "User not reachable (logged off, out of range, or unavailable)."),
+    21: ("Call Rejected", "Called side/network rejected the call despite compatibility."),
+    22: ("Number Changed", "Dialed number is no longer assigned."),
+    23: ("Redirection To New Destination", "Call is redirected/forwarded to another destination."),
+    25: ("Exchange Routing Error", "Intermediate exchange released call (routing/hop issue)."),
+    26: ("Nonselected User Clearing", "Called number was not awarded the incoming call."),
+    27: ("Destination Out Of Order", "Destination interface/signaling path not functioning correctly."),
+    28: ("Invalid Number Format", "Called number format is invalid or incomplete."),
+    29: ("Facility Rejected", "Requested supplementary service cannot be provided."),
+    30: ("Response To STATUS ENQUIRY", "STATUS cause associated to prior STATUS ENQUIRY."),
+    31: ("Normal, Unspecified", "Normal event with no more specific normal-class cause."),
+    34: ("No Circuit/Channel Available", "No suitable circuit/channel currently available."),
+    38: ("Network Out Of Order", "Network failure expected to persist for some period."),
+    39: ("Permanent Frame Connection Out Of Service", "Permanent frame-mode connection is out of service."),
+    40: ("Permanent Frame Connection Operational", "Permanent frame-mode connection is operational."),
+    41: ("Temporary Failure", "Temporary network failure likely to clear soon."),
+    42: ("Switching Equipment Congestion", "Switching node is experiencing congestion/high traffic."),
+    43: ("Access Information Discarded", "Network could not deliver requested access information."),
+    44: ("Requested Circuit/Channel Not Available", "Requested circuit/channel cannot be provided."),
+    46: ("Precedence Call Blocked", "No preemptive circuits available or equal/higher precedence active."),
+    47: ("Resource Unavailable", "Internal resource allocation failure (e.g., memory/socket)."),
+    49: ("QoS Unavailable", "Requested quality of service cannot be provided."),
+    50: ("Facility Not Subscribed", "Caller requested a service not authorized/subscribed."),
+    53: ("Outgoing Calls Barred In CUG", "Outgoing CUG calls are barred for this member."),
+    55: ("Incoming Calls Barred In CUG", "Incoming CUG calls are barred for this member."),
+    57: ("Bearer Capability Not Authorized", "Bearer capability exists but is not authorized."),
+    58: ("Bearer Capability Not Available", "Bearer capability exists but is currently unavailable."),
+    62: ("Outgoing Access/Subclass Inconsistency", "Inconsistency in outgoing access info and subscriber class."),
+    63: ("Service/Option Not Available, Unspecified", "Service not available and no specific cause applies."),
+    65: ("Bearer Capability Not Implemented", "Requested media/bearer capability is not supported."),
+    66: ("Channel Type Not Implemented", "Requested channel type is not supported."),
+    69: ("Requested Facility Not Implemented", "Requested supplementary service is unsupported."),
+    70: ("Restricted Digital Info Bearer Only", "Only restricted bearer available for requested service."),
+    79: ("Service/Option Not Implemented, Unspecified", "Service unsupported and no specific cause applies."),
+    81: ("Invalid Call Reference", "Message received with call reference not currently in use."),
+    82: ("Identified Channel Does Not Exist", "Call attempted on a channel not configured/available."),
+    83: ("Suspended Call Exists, Identity Does Not", "Resume attempted with mismatched suspended-call identity."),
+    84: ("Call Identity In Use", "Suspended call identity already in use."),
+    85: ("No Call Suspended", "Resume requested but no suspended call matches identity."),
+    86: ("Call Cleared", "Suspended call identity points to call already cleared."),
+    87: ("User Not Member Of CUG", "Called user not member of specified closed user group."),
+    88: ("Incompatible Destination", "Destination cannot support requested call compatibility attributes."),
+    90: ("Nonexistent CUG", "Specified closed user group does not exist."),
+    91: ("Invalid Transit Network Selection", "Transit network identification format is invalid."),
+    95: ("Invalid Message", "Protocol entity received an invalid message."),
+    96: ("Mandatory IE Missing", "Message is missing required information element(s)."),
+    97: ("Message Type Nonexistent/Not Implemented", "Received unsupported or invalid message type."),
+    98: ("Message Not Compatible With Call State", "Received message not valid for current call state."),
+    99: ("IE/Parameter Nonexistent Or Not Implemented", "Message contains undefined/unsupported IE or parameter."),
+    100: ("Invalid IE Contents", "Received IE exists but contents are invalid/unsupported."),
+    101: ("Message In Invalid Call State", "Message incompatible with call processing state."),
+    102: ("Recovery On Timer Expiry", "Call setup/protocol timer expired during procedures."),
+    103: ("Parameter Not Implemented", "Message passed with undefined/unsupported parameter."),
+    110: ("Unrecognized Parameter Discarded", "Message discarded due to unrecognized parameter."),
+    111: ("Protocol Error, Unspecified", "Protocol error with no more specific cause."),
+    127: ("Interworking, Unspecified", "Internal/interworking failure; exact cause cannot be ascertained."),
+}
+
+Q850_PATTERNS = [
+    re.compile(r'(?i)\breason\s*:\s*q\.?\s*850\s*;\s*cause\s*=\s*(\d{1,3})\b'),
+]
+
+IPADDR_PATTERNS = [
+    re.compile(r'(?i)\bIpAddr\s*=\s*([0-9a-f]{1,8})\b'),
+    re.compile(r"(?i)\bip\s*'([0-9a-f]{8})'h\b"),
+]
+
+Q931_MESSAGE_TYPES = {
+    0x01: "ALERTING",
+    0x02: "CALL PROCEEDING",
+    0x03: "PROGRESS",
+    0x05: "SETUP",
+    0x07: "CONNECT",
+    0x0D: "SETUP ACKNOWLEDGE",
+    0x0F: "CONNECT ACK",
+    0x20: "USER INFORMATION",
+    0x21: "SUSPEND REJECT",
+    0x22: "RESUME REJECT",
+    0x25: "SUSPEND",
+    0x26: "RESUME",
+    0x2D: "SUSPEND ACKNOWLEDGE",
+    0x2E: "RESUME ACKNOWLEDGE",
+    0x45: "DISCONNECT",
+    0x46: "RESTART",
+    0x4D: "RELEASE",
+    0x4E: "RESTART ACKNOWLEDGE",
+    0x5A: "RELEASE COMPLETE",
+    0x60: "SEGMENT",
+    0x62: "FACILITY",
+    0x6E: "NOTIFY",
+    0x75: "STATUS ENQUIRY",
+    0x79: "CONGESTION CONTROL",
+    0x7B: "INFORMATION",
+    0x7D: "STATUS",
+}
+
+# Codeset 0 variable-length IEs (Q.931 table 4-3).
+Q931_IE_TYPES = {
+    0x00: "Segmented Message",
+    0x04: "Bearer Capability",
+    0x08: "Cause",
+    0x10: "Call Identity",
+    0x14: "Call State",
+    0x18: "Channel Identification",
+    0x1C: "Facility",
+    0x1E: "Progress Indicator",
+    0x20: "Network-Specific Facilities",
+    0x27: "Notification Indicator",
+    0x28: "Display",
+    0x29: "Date/Time",
+    0x2C: "Keypad Facility",
+    0x34: "Signal",
+    0x40: "Information Rate",
+    0x42: "End-to-End Transit Delay",
+    0x4C: "Connected Number",
+    0x4D: "Connected Subaddress",
+    0x6C: "Calling Party Number",
+    0x6D: "Calling Party Subaddress",
+    0x70: "Called Party Number",
+    0x71: "Called Party Subaddress",
+    0x74: "Redirecting Number",
+    0x76: "Redirection Number",
+    0x78: "Transit Network Selection",
+    0x79: "Restart Indicator",
+    0x7C: "Low Layer Compatibility",
+    0x7D: "High Layer Compatibility",
+    0x7E: "User-User",
+    0x7F: "Escape For Extension",
+}
+
+# Single-octet IEs, by their high nibble (0xA0 and 0xA1 by full value).
+Q931_SINGLE_OCTET_IES = {
+    0x90: "Shift",
+    0xA0: "More Data",
+    0xA1: "Sending Complete",
+    0xB0: "Congestion Level",
+    0xD0: "Repeat Indicator",
+}
+
+Q931_NUMBER_TYPES = {
+    0: "Unknown", 1: "International", 2: "National", 3: "Network Specific",
+    4: "Subscriber", 6: "Abbreviated",
+}
+
+Q931_NUMBERING_PLANS = {
+    0: "Unknown", 1: "ISDN/Telephony (E.164)", 3: "Data (X.121)", 4: "Telex (F.69)",
+    8: "National Standard", 9: "Private",
+}
+
+Q931_PRESENTATION = {0: "Allowed", 1: "Restricted", 2: "Number Not Available"}
+
+Q931_SCREENING = {
+    0: "User-provided, not screened",
+    1: "User-provided, verified and passed",
+    2: "User-provided, verified and failed",
+    3: "Network provided",
+}
+
+Q931_REDIRECTION_REASONS = {
+    0x0: "Unknown", 0x1: "Call Forwarding Busy", 0x2: "Call Forwarding No Reply",
+    0x4: "Call Deflection", 0x9: "Called DTE Out Of Order",
+    0xA: "Call Forwarding By Called DTE", 0xF: "Call Forwarding Unconditional",
+}
+
+Q931_LOCATIONS = {
+    0: "User", 1: "Private network serving local user", 2: "Public network serving local user",
+    3: "Transit network", 4: "Public network serving remote user",
+    5: "Private network serving remote user", 7: "International network",
+    10: "Network beyond interworking point",
+}
+
+Q931_PROGRESS = {
+    1: "Call is not end-to-end ISDN", 2: "Destination address is non-ISDN",
+    3: "Origination address is non-ISDN", 4: "Call has returned to the ISDN",
+    5: "Interworking has occurred", 8: "In-band information available",
+}
+
+Q931_BEARER_CAPABILITIES = {
+    0x00: "Speech", 0x08: "Unrestricted Digital", 0x09: "Restricted Digital",
+    0x10: "3.1 kHz Audio", 0x11: "7 kHz Audio", 0x18: "Video",
+}
+
+Q931_TRANSFER_RATES = {
+    0x00: "Packet mode", 0x10: "64 kbit/s", 0x11: "2 x 64 kbit/s", 0x13: "384 kbit/s",
+    0x15: "1536 kbit/s", 0x17: "1920 kbit/s", 0x18: "Multirate",
+}
+
+Q931_LAYER1_PROTOCOLS = {
+    0x01: "V.110/X.30", 0x02: "G.711 mu-law", 0x03: "G.711 A-law", 0x04: "G.721 ADPCM",
+    0x05: "H.221/H.242", 0x06: "H.223/H.245", 0x07: "Non-ITU-T", 0x08: "V.120",
+    0x09: "X.31 HDLC",
+}
+
+Q931_CALL_STATES = {
+    0: "Null", 1: "Call Initiated", 2: "Overlap Sending", 3: "Outgoing Call Proceeding",
+    4: "Call Delivered", 6: "Call Present", 7: "Call Received", 8: "Connect Request",
+    9: "Incoming Call Proceeding", 10: "Active", 11: "Disconnect Request",
+    12: "Disconnect Indication", 15: "Suspend Request", 17: "Resume Request",
+    19: "Release Request", 25: "Overlap Receiving",
+}
+
+Q931_SIGNALS = {
+    0x00: "Dial tone on", 0x01: "Ring back tone on", 0x02: "Intercept tone on",
+    0x03: "Network congestion tone on", 0x04: "Busy tone on", 0x05: "Confirm tone on",
+    0x06: "Answer tone on", 0x07: "Call waiting tone on", 0x08: "Off-hook warning tone on",
+    0x09: "Preemption tone on", 0x3F: "Tones off", 0x4F: "Alerting off",
+}
+
+Q931_NOTIFICATIONS = {0x00: "User suspended", 0x01: "User resumed", 0x02: "Bearer service change"}
+
+Q931_FACILITY_PROFILES = {
+    0x11: "ROSE", 0x12: "CMIP", 0x13: "ACSE", 0x1F: "Networking Extensions",
+}
+
+ROSE_COMPONENTS = {0xA1: "Invoke", 0xA2: "Return Result", 0xA3: "Return Error", 0xA4: "Reject"}
+
+HEX_CANDIDATE_PATTERNS = [
+    re.compile(r'(?i)(?:0x)?[0-9a-f]{2}(?:[\s:-]+(?:0x)?[0-9a-f]{2}){4,}'),
+    re.compile(r'(?i)\b(?:0x)?[0-9a-f]{12,}\b'),
+]
+
+def explain_enum(enum_type, value):
+    return CUCM_ENUMS.get(enum_type, {}).get(value, "Unknown ({})".format(value))
+
+def parse_dtmf_block(line):
+    output = {}
+
+    for start, end in dtmf_regions(line):
+        block = line[start:end]
+        label_match = re.match(r'(party\d+DTMF)', block)
+        label = label_match.group(1) if label_match else "partyXDTMF"
+
+        inner = block[block.find('(')+1 : -1].strip()
+
+        m2 = re.match(r'^\s*(\d+)\s+(\d+)\s+\(([^)]*)\)\s+(\d+)\s+(\d+)\s*$', inner)
+        if m2:
+            config, method, payload_raw, want_recv, provide_oob = m2.groups()
+        else:
+            try:
+                p_open = inner.find('(')
+                p_close = inner.find(')', p_open+1) if p_open != -1 else -1
+                if p_open == -1 or p_close == -1:
+                    raise ValueError("no payload parens")
+                before = inner[:p_open].strip().split()
+                payload_raw = inner[p_open+1:p_close]
+                after = inner[p_close+1:].strip().split()
+                if len(before) < 2 or len(after) < 2:
+                    raise ValueError("estructura inesperada")
+                config = before[0]
+                method = before[1]
+                want_recv = after[0]
+                provide_oob = after[1]
+            except Exception:
+                _debug(">>> parse_dtmf_block: no match en block: {}".format(repr(block)))
+                continue
+
+        payload = payload_raw.strip()
+        payload_value = payload.split(":", 1)[0] if payload else None
+
+        output["{} Config".format(label)] = explain_enum("DTMFConfig", int(config))
+        output["{} Method".format(label)] = CUCM_ENUMS.get("DTMFMethod", {}).get(int(method), "Unknown ({})".format(method))
+        output["{} Payload".format(label)] = payload_value if payload_value else "—"
+        output["{} Wants Reception".format(label)] = "Yes" if int(want_recv) else "No"
+        output["{} Provides OOB".format(label)] = "Yes" if int(provide_oob) else "No"
+
+        _debug(">>> parse_dtmf_block: parsed {} {} {} {} {} {}".format(label, config, method, payload_raw, want_recv, provide_oob))
+
+    return output if output else None
+
+
+def find_q850_in_line(line_text):
+    matches = []
+    seen = set()
+
+    for regex in Q850_PATTERNS:
+        for m in regex.finditer(line_text):
+            try:
+                code_text = m.group(1)
+                code = int(code_text)
+            except Exception:
+                continue
+
+            key = (m.start(1), m.end(1), code)
+            if key in seen:
+                continue
+
+            seen.add(key)
+            matches.append({
+                "start": m.start(1),
+                "end": m.end(1),
+                "code": code,
+            })
+
+    return matches
+
+
+def format_q850_popup(code):
+    title, description = Q850_CAUSES.get(
+        code,
+        ("Unknown / Not Mapped", "No description available in bundled Q.850 map."),
+    )
+
+    html = "<div style='white-space: pre-wrap; font-family: monospace;'>"
+    html += "🔹 <b>Q.850 Cause {}</b>\n".format(code)
+    html += "   📌 <b>{}</b>\n".format(title)
+    html += "   📝 {}".format(description)
+    html += "</div>"
+    return html
+
+
+def _hex_to_ipv4_pairs(hex_text):
+    normalized = (hex_text or "").strip().lower().replace("0x", "")
+    if not re.match(r'^[0-9a-f]{1,8}$', normalized):
+        return None
+
+    normalized = normalized.zfill(8)
+    octets = [int(normalized[i:i + 2], 16) for i in range(0, 8, 2)]
+    be_ip = "{}.{}.{}.{}".format(octets[0], octets[1], octets[2], octets[3])
+    le_ip = "{}.{}.{}.{}".format(octets[3], octets[2], octets[1], octets[0])
+
+    return {
+        "hex": normalized.upper(),
+        "be_ip": be_ip,
+        "le_ip": le_ip,
+    }
+
+
+def find_hex_ip_at_point(line_text, rel_point):
+    for regex in IPADDR_PATTERNS:
+        for m in regex.finditer(line_text):
+            if m.start() <= rel_point < m.end():
+                parsed = _hex_to_ipv4_pairs(m.group(1))
+                if parsed:
+                    return {
+                        "start": m.start(1),
+                        "end": m.end(1),
+                        "parsed": parsed,
+                        "is_ipaddr_field": "IpAddr" in m.group(0),
+                    }
+    return None
+
+
+def format_hex_ip_popup(found):
+    parsed = found["parsed"]
+    primary = parsed["le_ip"] if found.get("is_ipaddr_field") else parsed["be_ip"]
+    alternate = parsed["be_ip"] if found.get("is_ipaddr_field") else parsed["le_ip"]
+    primary_label = "Little-endian" if found.get("is_ipaddr_field") else "Network order"
+    alt_label = "Network order" if found.get("is_ipaddr_field") else "Little-endian"
+    network_order = parsed["be_ip"]
+
+    html = "<div style='white-space: pre-wrap; font-family: monospace;'>"
+    html += "<b>HEX to IPv4</b>\n"
+    html += "HEX: <b>{}</b>\n".format(parsed["hex"])
+    html += "OUTPUT ({}) : <span style='color: #1f7a1f;'><b>{}</b></span>\n".format(primary_label, primary)
+    html += "Network order: <span style='color: #0b4f9c;'><b>{}</b></span>\n".format(network_order)
+    if alt_label.lower() != "network order":
+        html += "{}: {}".format(alt_label, alternate)
+    html += "</div>"
+    return html
+
+
+_HEX_HINT = re.compile(r'(?i)[a-f]|0x|[\s:-]')
+_HEX_PAIR = re.compile(r'(?i)(?:0x)?([0-9a-f]{2})')
+
+
+def _normalize_hex_bytes(raw_text):
+    """The bytes spelled by ``raw_text`` ("08 02 80 90", "0x08:0x02", "08028090"), or b""."""
+    if not raw_text:
+        return b""
+
+    # Evita falsos positivos con números decimales largos.
+    if not _HEX_HINT.search(raw_text):
+        return b""
+
+    try:
+        # Pairs apart by whitespace, the usual spelling, need no regex.
+        return bytes.fromhex(raw_text)
+    except ValueError:
+        return bytes.fromhex("".join(_HEX_PAIR.findall(raw_text)))
+
+
+def find_hex_blob_at_point(line_text, rel_point):
+    for regex in HEX_CANDIDATE_PATTERNS:
+        for m in regex.finditer(line_text):
+            if m.start() <= rel_point < m.end():
+                raw = m.group(0)
+                data = _normalize_hex_bytes(raw)
+                if len(data) >= 5:
+                    return {
+                        "start": m.start(),
+                        "end": m.end(),
+                        "raw": raw,
+                        "bytes": data,
+                    }
+    return None
+
+
+def find_first_hex_blob_in_line(line_text):
+    for regex in HEX_CANDIDATE_PATTERNS:
+        for m in regex.finditer(line_text):
+            raw = m.group(0)
+            data = _normalize_hex_bytes(raw)
+            if len(data) >= 5:
+                return {
+                    "start": m.start(),
+                    "end": m.end(),
+                    "raw": raw,
+                    "bytes": data,
+                }
+    return None
+
+
+def find_iedata_hex_blob_at_point(line_text, rel_point):
+    if "IEData=" not in line_text:
+        return None
+
+    m = re.search(r'IEData\s*=\s*(.+)$', line_text)
+    if not m:
+        return None
+
+    start = m.start(1)
+    end = m.end(1)
+    # UX: para líneas IEData activamos aunque el cursor esté en cualquier parte de la línea.
+    _ = rel_point
+
+    raw = m.group(1).strip()
+    data = _normalize_hex_bytes(raw)
+    if len(data) < 2:
+        return None
+
+    return {
+        "start": start,
+        "end": end,
+        "raw": raw,
+        "bytes": data,
+    }
+
+
+# IA5 text: printable ASCII kept, the rest shown as "." or dropped.
+_IA5_SHOWN = bytes(b if 32 <= b <= 126 else 0x2E for b in range(256))
+_IA5_UNPRINTABLE = bytes(b for b in range(256) if not 32 <= b <= 126)
+
+
+def _ia5_text(value):
+    return bytes(value).translate(_IA5_SHOWN).decode("ascii")
+
+
+def _decode_q931_number_digits(value_bytes):
+    # En estos logs CUCM suele venir IA5/ASCII; conservamos bytes imprimibles.
+    return bytes(value_bytes).translate(None, _IA5_UNPRINTABLE).decode("ascii").strip()
+
+
+def _ext_end(value, start=0):
+    """Index past the octet group starting at ``start`` (ends at the first octet with bit 8 set)."""
+    i = start
+    while i < len(value) and not value[i] & 0x80:
+        i += 1
+    return i + 1
+
+
+def _decode_q931_party_number(value_bytes):
+    if not value_bytes:
+        return ""
+
+    # Q.931 Party Number IE:
+    # - octeto 3 (tipo/plan) siempre presente
+    # - octetos 3a/3b (presentation/screening, reason) opcionales mientras el ext bit = 0
+    return _decode_q931_number_digits(value_bytes[_ext_end(value_bytes):])
+
+
+def _q850_cause(code):
+    title, description = Q850_CAUSES.get(
+        code,
+        ("Unknown / Not Mapped", "No description available in bundled Q.850 map."),
+    )
+    return {"code": code, "title": title, "description": description}
+
+
+def _named(table, value):
+    name = table.get(value)
+    return name if name is not None else "Unknown ({})".format(value)
+
+
+# IE handlers: value octets (a memoryview) to a dict of any of "text",
+# "q850_cause" and "details", a list of (label, value) lines.
+
+def _ie_party_number(value):
+    details = [("Type", _named(Q931_NUMBER_TYPES, (value[0] >> 4) & 0x07)),
+               ("Plan", _named(Q931_NUMBERING_PLANS, value[0] & 0x0F))]
+    if not value[0] & 0x80 and len(value) > 1:
+        details.append(("Presentation", _named(Q931_PRESENTATION, (value[1] >> 5) & 0x03)))
+        details.append(("Screening", _named(Q931_SCREENING, value[1] & 0x03)))
+        if not value[1] & 0x80 and len(value) > 2:
+            details.append(("Reason", _named(Q931_REDIRECTION_REASONS, value[2] & 0x0F)))
+    return {"text": _decode_q931_party_number(value), "details": details}
+
+
+def _ie_cause(value):
+    # Octet 3a (recommendation) is there when octet 3 has the ext bit
+    # clear; two-octet causes with it clear are seen too, and read as if set.
+    index = 2 if not value[0] & 0x80 and len(value) > 2 else 1
+    if len(value) <= index:
+        return {}
+    return {"q850_cause": _q850_cause(value[index] & 0x7F),
+            "details": [("Location", _named(Q931_LOCATIONS, value[0] & 0x0F))]}
+
+
+def _ie_channel_id(value):
+    octet = value[0]
+    primary = bool(octet & 0x20)
+    selection = octet & 0x03
+    index = _ext_end(value, 1) if octet & 0x40 else 1  # skip the interface identifier
+    if octet & 0x04:
+        channel = "D-channel"
+    elif selection == 0:
+        channel = "No channel"
+    elif selection == 3:
+        channel = "Any channel"
+    elif not primary:
+        channel = "B{}".format(selection)
+    elif index + 1 < len(value) and not value[index] & 0x10:
+        channel = "B-channel {}".format(value[index + 1] & 0x7F)
+    else:
+        channel = "As indicated"
+    text = "{}, {}, {}".format(
+        channel, "exclusive" if octet & 0x08 else "preferred", "PRI" if primary else "BRI")
+    return {"text": text}
+
+
+def _ie_progress(value):
+    if len(value) < 2:
+        return {}
+    description = value[1] & 0x7F
+    return {"text": "{}: {}".format(description, _named(Q931_PROGRESS, description)),
+            "details": [("Location", _named(Q931_LOCATIONS, value[0] & 0x0F))]}
+
+
+def _ie_bearer_capability(value):
+    parts = [_named(Q931_BEARER_CAPABILITIES, value[0] & 0x1F)]
+    if len(value) > 1:
+        parts.append(_named(Q931_TRANSFER_RATES, value[1] & 0x1F))
+        index = _ext_end(value, 1)
+        if index < len(value) and (value[index] >> 5) & 0x03 == 1:
+            parts.append(_named(Q931_LAYER1_PROTOCOLS, value[index] & 0x1F))
+    return {"text": ", ".join(parts)}
+
+
+def _ie_call_state(value):
+    state = value[0] & 0x3F
+    return {"text": "{}: {}".format(state, _named(Q931_CALL_STATES, state))}
+
+
+def _ie_signal(value):
+    return {"text": _named(Q931_SIGNALS, value[0])}
+
+
+def _ie_notification(value):
+    return {"text": _named(Q931_NOTIFICATIONS, value[0] & 0x7F)}
+
+
+def _ie_display(value):
+    # Display IE: texto IA5.
+    return {"text": _ia5_text(value)}
+
+
+def _ie_keypad(value):
+    return {"text": _decode_q931_number_digits(value)}
+
+
+def _ie_date_time(value):
+    if len(value) < 5:
+        return {}
+    text = "{:02d}-{:02d}-{:02d} {:02d}:{:02d}".format(*value[:5])
+    if len(value) > 5:
+        text += ":{:02d}".format(value[5])
+    return {"text": text}
+
+
+def _ber_tlv(value, index):
+    """``(tag, start, end)`` of the BER element at ``index``, or None."""
+    if index + 1 >= len(value):
+        return None
+    tag = value[index]
+    length = value[index + 1]
+    start = index + 2
+    if length & 0x80:
+        octets = length & 0x7F
+        if not 0 < octets <= 2 or start + octets > len(value):
+            return None
+        length = 0
+        for b in value[start:start + octets]:
+            length = (length << 8) | b
+        start += octets
+    end = start + length
+    return (tag, start, end) if end <= len(value) else None
+
+
+def _ber_int(value, start, end):
+    number = 0
+    for b in value[start:end]:
+        number = (number << 8) | b
+    return number
+
+
+def _ie_facility(value):
+    profile = value[0] & 0x1F
+    details = [("Protocol", _named(Q931_FACILITY_PROFILES, profile))]
+    component = _ber_tlv(value, 1)
+    if component is None:
+        return {"details": details}
+    tag, start, end = component
+    text = _named(ROSE_COMPONENTS, tag)
+    invoke_id = _ber_tlv(value, start)
+    if invoke_id is not None and invoke_id[0] == 0x02:
+        details.append(("Invoke ID", _ber_int(value, invoke_id[1], invoke_id[2])))
+        # An Invoke carries its operation after the invoke (and linked) ID.
+        operation = _ber_tlv(value, invoke_id[2])
+        if operation is not None and operation[0] == 0x80:
+            operation = _ber_tlv(value, operation[2])
+        if tag == 0xA1 and operation is not None and operation[2] <= end:
+            if operation[0] == 0x02:
+                text += ", operation {}".format(_ber_int(value, operation[1], operation[2]))
+            elif operation[0] == 0x06:
+                text += ", operation OID {}".format(bytes(value[operation[1]:operation[2]]).hex())
+    return {"text": text, "details": details}
+
+
+def _ie_user_user(value):
+    protocol = value[0]
+    if protocol == 0x04:
+        return {"text": _ia5_text(value[1:])}
+    if protocol == 0x05:
+        return {"text": "H.225.0 UUIE, {} bytes".format(len(value) - 1)}
+    return {"text": "Protocol 0x{:02X}, {} bytes".format(protocol, len(value) - 1)}
+
+
+Q931_IE_HANDLERS = {
+    0x04: _ie_bearer_capability,
+    0x08: _ie_cause,
+    0x14: _ie_call_state,
+    0x18: _ie_channel_id,
+    0x1C: _ie_facility,
+    0x1E: _ie_progress,
+    0x27: _ie_notification,
+    0x28: _ie_display,
+    0x29: _ie_date_time,
+    0x2C: _ie_keypad,
+    0x34: _ie_signal,
+    0x4C: _ie_party_number,
+    0x6C: _ie_party_number,
+    0x70: _ie_party_number,
+    0x74: _ie_party_number,
+    0x76: _ie_party_number,
+    0x7E: _ie_user_user,
+}
+
+
+# (label, handler) per codeset 0 IE, one lookup in the IE walk.
+_CODESET0_IES = dict((ie_id, (label, Q931_IE_HANDLERS.get(ie_id))) for ie_id, label in Q931_IE_TYPES.items())
+_UNKNOWN_IE = ("Unknown IE", None)
+
+
+def _decode_ie(ie_id, ie_len, value, codeset=0):
+    """One variable-length IE; ``value`` is a memoryview of its contents."""
+    if codeset:
+        label = "Codeset {} IE".format(codeset)
+        handler = None
+    else:
+        label, handler = _CODESET0_IES.get(ie_id, _UNKNOWN_IE)
+    result = {"ie_id": ie_id, "ie_len": ie_len, "ie_label": label, "codeset": codeset,
+              "text": None, "q850_cause": None, "details": []}
+    if handler is not None and len(value):
+        decoded = handler(value)
+        if decoded:
+            result.update(decoded)
+    return result
+
+
+def _decode_single_octet_ie(ie_id):
+    high = ie_id & 0xF0
+    label = Q931_SINGLE_OCTET_IES.get(ie_id if high == 0xA0 else high, "Unknown IE")
+    text = None
+    if high == 0x90:
+        text = "codeset {} ({})".format(ie_id & 0x07, "non-locking" if ie_id & 0x08 else "locking")
+    elif high in (0xB0, 0xD0):
+        text = str(ie_id & 0x0F)
+    return {"ie_id": ie_id, "ie_len": 0, "ie_label": label, "codeset": None, "text": text,
+            "q850_cause": None, "details": []}
+
+
+def _as_memoryview(data):
+    return memoryview(data if isinstance(data, (bytes, bytearray)) else bytes(data))
+
+
+def decode_q931_ie_hex(data):
+    """One Q.931 IE (identifier, length, contents) from bytes or a list of ints."""
+    if not data or len(data) < 2:
+        return None
+
+    view = _as_memoryview(data)
+    ie_id = view[0]
+    ie_len = view[1]
+    value = view[2:2 + ie_len]
+    if len(value) < ie_len:
+        value = view[2:]
+
+    return _decode_ie(ie_id, ie_len, value)
+
+
+def decode_h323_q931_hex(data):
+    """
+    A Q.931 message (as tunnelled in H.225 and IsdnMsgData) from bytes or
+    a list of ints: the header and the last Q.850 cause. The IEs are only
+    located, as ``(ie_id, codeset, start, end)`` under "ies";
+    q931_message_ies decodes them. "truncated" is set when the last IE
+    runs past the end of the data.
+    """
+    if not data or len(data) < 3:
+        return None
+
+    # The walk indexes bytes, quicker than a memoryview; IE contents are
+    # handed out as memoryview slices of the same buffer.
+    if not isinstance(data, bytes):
+        data = bytes(data)
+    view = memoryview(data)
+    size = len(data)
+    protocol_discriminator = data[0]
+    call_ref_len = data[1] & 0x0F
+    msg_index = 2 + call_ref_len
+
+    if msg_index >= size:
+        return None
+
+    call_ref_dir = "Unknown"
+    call_ref_value = None
+    if call_ref_len > 0:
+        first_call_ref_octet = data[2]
+        call_ref_dir = "To originating side" if (first_call_ref_octet & 0x80) else "To destination side"
+        value = first_call_ref_octet & 0x7F
+        for b in data[3:msg_index]:
+            value = (value << 8) | b
+        call_ref_value = value
+
+    msg_type = data[msg_index]
+    ies = []
+    result = {
+        "protocol_discriminator": protocol_discriminator,
+        "protocol_label": "Q.931 Call Control" if protocol_discriminator == 0x08 else "Unknown",
+        "call_ref_len": call_ref_len,
+        "call_ref_dir": call_ref_dir,
+        "call_ref_value": call_ref_value,
+        "msg_type": msg_type,
+        "msg_label": Q931_MESSAGE_TYPES.get(msg_type, "Unknown"),
+        "q850_cause": None,
+        "data": view,
+        "ies": ies,
+        "truncated": False,
+    }
+
+    locked = codeset = 0
+    cause = None
+    append = ies.append
+    i = msg_index + 1
+    while i < size:
+        ie_id = data[i]
+
+        # Single-octet IEs (bit 8 = 1) no incluyen campo de longitud.
+        if ie_id & 0x80:
+            append((ie_id, None, i, i))
+            if ie_id & 0xF0 == 0x90:
+                # Shift: a locking one changes the codeset of every IE after
+                # it, a non-locking one of the next IE only.
+                codeset = ie_id & 0x07
+                if not ie_id & 0x08:
+                    locked = codeset
+            i += 1
+            continue
+
+        if i + 1 >= size:
+            result["truncated"] = True
+            break
+
+        ie_len = data[i + 1]
+        value_start = i + 2
+        value_end = value_start + ie_len
+        if value_end > size:
+            result["truncated"] = True
+            break
+
+        append((ie_id, codeset, value_start, value_end))
+        if ie_id == 0x08 and codeset == 0 and ie_len:
+            # As _ie_cause; only the last cause is looked up.
+            index = value_start + (2 if not data[value_start] & 0x80 and ie_len > 2 else 1)
+            if index < value_end:
+                cause = data[index] & 0x7F
+        codeset = locked
+        i = value_end
+
+    if cause is not None:
+        result["q850_cause"] = _q850_cause(cause)
+    return result
+
+
+def q931_message_ies(decoded):
+    """The IEs of a decode_h323_q931_hex result, decoded, in message order."""
+    view = decoded["data"]
+    out = []
+    for ie_id, codeset, start, end in decoded["ies"]:
+        if codeset is None:
+            out.append(_decode_single_octet_ie(ie_id))
+        else:
+            out.append(_decode_ie(ie_id, end - start, view[start:end], codeset))
+    return out
+
+
+def _ie_summary(ie):
+    """One line for an IE in the message popup: label, text, cause, details."""
+    parts = []
+    if ie["text"]:
+        parts.append(ie["text"])
+    if ie["q850_cause"]:
+        parts.append("Q.850 {} {}".format(ie["q850_cause"]["code"], ie["q850_cause"]["title"]))
+    parts.extend("{}: {}".format(label, value) for label, value in ie["details"])
+    return "{}: {}".format(ie["ie_label"], "; ".join(parts)) if parts else ie["ie_label"]
+
+
+def format_h323_popup(decoded, byte_list):
+    byte_preview = " ".join(["{:02X}".format(b) for b in byte_list[:48]])
+    if len(byte_list) > 48:
+        byte_preview += " ..."
+
+    html = "<div style='white-space: pre-wrap; font-family: monospace;'>"
+    html += "<b>H.323 / Q.931 HEX</b>\n"
+    html += "Bytes: {}\n".format(len(byte_list))
+    html += "PD: 0x{:02X} ({})\n".format(decoded["protocol_discriminator"], decoded["protocol_label"])
+    html += "CallRefLen: {}\n".format(decoded["call_ref_len"])
+
+    if decoded["call_ref_value"] is not None:
+        html += "CallRef: {} ({})\n".format(decoded["call_ref_value"], decoded["call_ref_dir"])
+
+    html += "MsgType: 0x{:02X} ({})\n".format(decoded["msg_type"], decoded["msg_label"])
+
+    ies = [ie for ie in q931_message_ies(decoded)
+           if ie["ie_label"] != "Unknown IE" and (ie["text"] or ie["details"] or ie["ie_len"] == 0)]
+    if ies:
+        html += "\nIEs:\n"
+        for ie in ies:
+            html += "  {}\n".format(escape(_ie_summary(ie), quote=False))
+
+    cause = decoded.get("q850_cause")
+    if cause:
+        html += "\nQ.850 Cause {}: {}\n".format(cause["code"], cause["title"])
+        html += "{}\n".format(cause["description"])
+
+    html += "\nHEX: {}".format(byte_preview)
+    html += "</div>"
+    return html
+
+
+def format_q931_ie_popup(decoded, byte_list, ie_name_hint=None):
+    byte_preview = " ".join(["{:02X}".format(b) for b in byte_list[:48]])
+    if len(byte_list) > 48:
+        byte_preview += " ..."
+
+    html = "<div style='white-space: pre-wrap; font-family: monospace;'>"
+    html += "<b>Q.931 IE HEX</b>\n"
+    if ie_name_hint:
+        html += "Line IE: {}\n".format(ie_name_hint)
+    html += "IEI: 0x{:02X} ({})\n".format(decoded["ie_id"], decoded["ie_label"])
+    html += "Length: {}\n".format(decoded["ie_len"])
+
+    if decoded.get("text"):
+        text_label = "Decoded text"
+        if decoded.get("ie_id") == 0x6C:
+            text_label = "Calling number"
+        elif decoded.get("ie_id") == 0x70:
+            text_label = "Called number"
+        elif decoded.get("ie_id") == 0x28:
+            text_label = "Display text"
+
+        elif decoded.get("ie_id") in Q931_IE_HANDLERS:
+            text_label = decoded["ie_label"]
+
+        html += "{}: <span style='color: #1f7a1f;'><b>{}</b></span>\n".format(
+            text_label, escape(decoded["text"], quote=False))
+
+    for label, value in decoded.get("details", ()):
+        html += "{}: {}\n".format(label, escape(str(value), quote=False))
+
+    cause = decoded.get("q850_cause")
+    if cause:
+        html += "\nQ.850 Cause {}: {}\n".format(cause["code"], cause["title"])
+        html += "{}\n".format(cause["description"])
+
+    html += "\nHEX: {}".format(byte_preview)
+    html += "</div>"
+    return html
+
+def format_popup(items):
+    # Orden deseado de sufijos y mapeo a etiquetas mostradas
+    order = [
+        ("Config", "dtmf config"),
+        ("Method", "dtmf method"),
+        ("Payload", "payload"),
+        ("Wants Reception", "wantDTMFrecepcion"),
+        ("Provides OOB", "provideOOB")
+    ]
+
+    # Agrupa por partyNDTMF
+    grouped = {}
+    for label, value in items.items():
+        key = label.split()[0]  # 'party1DTMF'
+        grouped.setdefault(key, []).append((label, value))
+
+    # ordenar keys por número de party (extraer dígito)
+    def party_key(k):
+        m = re.match(r'party(\d+)DTMF', k)
+        if m:
+            try:
+                return int(m.group(1))
+            except Exception:
+                return 9999
+        return 9999
+
+    sorted_groups = sorted(grouped.items(), key=lambda kv: party_key(kv[0]))
+
+    html = "<div style='white-space: pre; font-family: monospace;'>"
+    for group, entries in sorted_groups:
+        # crear diccionario rápido para acceder por sufijo
+        lookup = {}
+        for label, value in entries:
+            suf = " ".join(label.split()[1:]).strip()  # p.e. 'Config'
+            lookup[suf] = value
+
+        html += "\n🔹 <b>{}</b>\n".format(group)
+        for suf, display in order:
+            if suf in lookup:
+                icon = "📞" if "DTMF" in group else "🔧"
+                html += "   {} {}: {}\n".format(icon, display, lookup[suf])
+    html += "</div>"
+    return html
+
+
+DTMF_OPEN = re.compile(r'party\d+DTMF\(')
+IE_NAME_PATTERN = re.compile(r'\bIe\s*-\s*([^\-]+?)\s*--')
+
+_FAR = float("inf")
+
+
+def _balanced_end(text, idx, limit):
+    depth = 1
+    while idx < limit and depth > 0:
+        ch = text[idx]
+        if ch == '(':
+            depth += 1
+        elif ch == ')':
+            depth -= 1
+        idx += 1
+    return idx if depth == 0 else -1
+
+
+def dtmf_regions(line_text):
+    """``(start, end)`` of every balanced ``partyNDTMF(...)`` block in a line."""
+    regions = []
+    for m in DTMF_OPEN.finditer(line_text):
+        end = _balanced_end(line_text, m.end(), len(line_text))
+        if end >= 0:
+            regions.append((m.start(), end))
+        else:
+            _debug(">>> dtmf_regions: paréntesis no balanceado en posición {}".format(m.start()))
+    return regions
+
+
+# ---------------------------------------------------------------------------
+# Decoder registry
+
+class Decoder(object):
+    """
+    One kind of decodable span. Subclasses set:
+
+    ``name``     registry key and trigger group name (a Python identifier)
+    ``trigger``  regex found, case-insensitively and within one line, on
+                 every line where spans() can find anything; it only picks
+                 the lines worth a full look, so it may fire more often.
+                 It should start with text no earlier trigger can match at
+                 the same place, as the alternation reports one per place.
+    ``group``    decoders sharing a group are tried once per hover, best
+                 span first; defaults to ``name``
+    ``multiline`` for decoders of blocks of lines, which have no trigger:
+                 spans(text, starts) gets a whole chunk of lines and the
+                 starts of the lines where a decoder in ``anchors`` fired,
+                 and gives a line-wide span for every line of each block
+                 it decodes, ``pattern`` starting with the line's offset
+                 in the block
+    ``replaces`` names of decoders whose spans are dropped on the lines a
+                 multiline decoder covers
+
+    and implement spans(), cache_key() and render().
+    """
+
+    name = None
+    trigger = None
+    group = None
+    multiline = False
+    anchors = ()
+    replaces = ()
+
+    def spans(self, line_text):
+        """``(start, end, pattern)`` of each span in one line, no line break."""
+        raise NotImplementedError
+
+    def cache_key(self, line_text, start, end, sub):
+        """
+        Hashable key holding everything the popup of one span depends on,
+        first item naming the renderer, or None when the span has nothing
+        to show.
+        """
+        raise NotImplementedError
+
+    def render(self, key):
+        """``(html, max_width, status)`` for a cache_key(), or None."""
+        raise NotImplementedError
+
+    def fields(self, key):
+        """
+        Decoded values of a cache_key() as a flat dict for tables, with
+        ``cause`` holding a Q.850 cause code when there is one; None
+        leaves the span out of batch reports.
+        """
+        return None
+
+
+def _cause_fields(cause):
+    if not cause:
+        return {}
+    return {"cause": cause["code"], "cause_text": cause["title"]}
+
+
+def _line_end(line_text):
+    # Line-wide spans reach one past the last character, where the
+    # per-line detectors used to fire as well.
+    return len(line_text) + 1
+
+
+class Q850Decoder(Decoder):
+    name = "q850"
+    trigger = r'reason[^\S\n]*:'
+
+    def spans(self, line_text):
+        return [(m["start"], m["end"], 0) for m in find_q850_in_line(line_text)]
+
+    def cache_key(self, line_text, start, end, sub):
+        return ("q850", int(line_text[start:end]))
+
+    def render(self, key):
+        return format_q850_popup(key[1]), 700, "CUCM Q.850: información mostrada"
+
+    def fields(self, key):
+        title = Q850_CAUSES.get(key[1], ("Unknown / Not Mapped",))[0]
+        return {"cause": key[1], "cause_text": title}
+
+
+class HexIpDecoder(Decoder):
+    name = "hex_ip"
+    trigger = r"ipaddr[^\S\n]*=|ip[^\S\n]*'"
+
+    def spans(self, line_text):
+        out = []
+        for sub, regex in enumerate(IPADDR_PATTERNS):
+            for m in regex.finditer(line_text):
+                if _hex_to_ipv4_pairs(m.group(1)):
+                    out.append((m.start(), m.end(), sub))
+        return out
+
+    def cache_key(self, line_text, start, end, sub):
+        m = IPADDR_PATTERNS[sub].match(line_text, start)
+        return ("hex_ip", m.group(1).lower(), "IpAddr" in m.group(0)) if m else None
+
+    def render(self, key):
+        parsed = _hex_to_ipv4_pairs(key[1])
+        if not parsed:
+            return None
+        found = {"parsed": parsed, "is_ipaddr_field": key[2]}
+        return format_hex_ip_popup(found), 600, "CUCM HEX IP: información mostrada"
+
+    def fields(self, key):
+        parsed = _hex_to_ipv4_pairs(key[1])
+        if not parsed:
+            return None
+        ip = parsed["le_ip"] if key[2] else parsed["be_ip"]
+        return {"hex": parsed["hex"], "ip": ip, "network_order": parsed["be_ip"]}
+
+
+# Message IEs reported by H323Decoder.fields, by field name.
+IE_FIELD_NAMES = {
+    0x04: "bearer",
+    0x18: "channel",
+    0x1C: "facility",
+    0x1E: "progress",
+    0x28: "display",
+    0x4C: "connected",
+    0x6C: "calling",
+    0x70: "called",
+    0x74: "redirecting",
+}
+
+
+class H323Decoder(Decoder):
+    name = "h323"
+    group = "h323"
+    # Looser, one-line forms of HEX_CANDIDATE_PATTERNS. A leading optional
+    # group or \b costs the combined pass more than the extra lines do.
+    trigger = r'[0-9a-f]{2}(?:[^\S\n]|[:-])+(?:0x)?[0-9a-f]{2}(?:(?:[^\S\n]|[:-])+(?:0x)?[0-9a-f]{2}){3}|[0-9a-f]{12}'
+
+    def spans(self, line_text):
+        out = []
+        for sub, regex in enumerate(HEX_CANDIDATE_PATTERNS):
+            for m in regex.finditer(line_text):
+                if len(_normalize_hex_bytes(m.group(0))) >= 5:
+                    out.append((m.start(), m.end(), sub))
+        return out
+
+    def cache_key(self, line_text, start, end, sub):
+        return ("h323", _normalize_hex_bytes(line_text[start:end]))
+
+    def render(self, key):
+        decoded = decode_h323_q931_hex(key[1])
+        if decoded and decoded["protocol_discriminator"] == 0x08:
+            return format_h323_popup(decoded, key[1]), 760, "CUCM H.323 HEX: información mostrada"
+        return None
+
+    def fields(self, key):
+        decoded = decode_h323_q931_hex(key[1])
+        if not decoded or decoded["protocol_discriminator"] != 0x08:
+            return None
+        out = {
+            "message": decoded["msg_label"],
+            "msg_type": "0x{:02X}".format(decoded["msg_type"]),
+            "call_ref": decoded["call_ref_value"],
+        }
+        view = decoded["data"]
+        for ie_id, codeset, start, end in decoded["ies"]:
+            name = IE_FIELD_NAMES.get(ie_id) if codeset == 0 else None
+            if name:
+                text = _decode_ie(ie_id, end - start, view[start:end])["text"]
+                if text:
+                    out[name] = text
+        out.update(_cause_fields(decoded.get("q850_cause")))
+        return out
+
+
+class IsdnLineDecoder(H323Decoder):
+    """The first hex blob of an IsdnMsgData line, wherever the point is on it."""
+
+    name = "isdn_line"
+    trigger = r'IsdnMsgData'
+
+    def spans(self, line_text):
+        if "IsdnMsgData" in line_text and find_first_hex_blob_in_line(line_text):
+            return [(0, _line_end(line_text), 0)]
+        return []
+
+    def cache_key(self, line_text, start, end, sub):
+        blob = find_first_hex_blob_in_line(line_text)
+        return ("h323", blob["bytes"]) if blob else None
+
+
+# A line holding nothing but hex bytes, after an optional offset
+# ("0010:", "0x0010"), as in the wrapped part of a PDU dump.
+HEX_DUMP_LINE = re.compile(
+    r'(?i)[^\S\n]*(?:(?:0x)?[0-9a-f]{4,8}:?[^\S\n]+)?'
+    r'((?:0x)?[0-9a-f]{2}(?:[^\S\n]+(?:0x)?[0-9a-f]{2})*)[^\S\n]*$')
+# Hex bytes ending the line a dump wraps from ("IsdnMsgData: 08 02 ...").
+HEX_LINE_TAIL = re.compile(r'(?i)(?:^|[\s:=])((?:0x)?[0-9a-f]{2}(?:[\s:-]+(?:0x)?[0-9a-f]{2})*)[^\S\n]*$')
+MAX_HEX_BLOCK_LINES = 64
+
+
+def _is_q931(data):
+    """Whether ``data`` is one whole Q.931 message, its last IE ending with it."""
+    decoded = decode_h323_q931_hex(data)
+    return bool(decoded) and decoded["protocol_discriminator"] == 0x08 and not decoded["truncated"]
+
+
+def _text_line(text, start):
+    end = text.find("\n", start)
+    return text[start:] if end < 0 else text[start:end]
+
+
+def hex_block_at(text, start):
+    """
+    The Q.931 message wrapped over several lines of ``text`` that takes in
+    the line starting at ``start``, as ``(begin, end, data)``, or None.
+
+    A block is a run of hex dump lines, with the line before it when that
+    line ends in hex bytes; ``end`` is the end of its last line (before
+    the line break) and ``data`` the reassembled bytes.
+    """
+    first = start
+    if not HEX_DUMP_LINE.match(_text_line(text, start)):
+        # The line a dump wraps from: the dump starts on the next line.
+        first = text.find("\n", start) + 1
+        if not first or not HEX_DUMP_LINE.match(_text_line(text, first)):
+            return None
+    lines = 0
+    while first > 0 and lines < MAX_HEX_BLOCK_LINES:
+        above = text.rfind("\n", 0, first - 1) + 1
+        if not HEX_DUMP_LINE.match(text[above:first - 1]):
+            break
+        first = above
+        lines += 1
+    dump = []
+    line_start = first
+    end = first - 1
+    while line_start and len(dump) <= MAX_HEX_BLOCK_LINES:
+        m = HEX_DUMP_LINE.match(_text_line(text, line_start))
+        if not m:
+            break
+        dump.append(_normalize_hex_bytes(m.group(1)))
+        end = line_start + m.end()
+        line_start = text.find("\n", line_start) + 1
+    if len(dump) > MAX_HEX_BLOCK_LINES:
+        return None
+    data = b"".join(dump)
+
+    if first > 0:
+        head_begin = text.rfind("\n", 0, first - 1) + 1
+        tail = HEX_LINE_TAIL.search(text[head_begin:first - 1])
+        if tail:
+            head = _normalize_hex_bytes(tail.group(1))
+            # A whole message on the line before a dump that is a whole
+            # message itself is two messages, not one wrapped.
+            if _is_q931(head + data) and not (_is_q931(head) and _is_q931(data)):
+                return head_begin, end, head + data
+    if len(dump) > 1 and _is_q931(data):
+        return first, end, data
+    return None
+
+
+class HexBlockDecoder(H323Decoder):
+    """
+    A Q.931 message whose hex dump wraps over several lines, decoded whole
+    from any of them. Blocks are looked for around the lines where the
+    one-line hex decoders fired, reassembled once, and carry their bytes
+    in their spans.
+    """
+
+    name = "hex_block"
+    group = None
+    trigger = None
+    multiline = True
+    anchors = ("h323", "isdn_line")
+    replaces = ("h323", "isdn_line")
+
+    def spans(self, text, starts):
+        out = []
+        done = -1
+        for start in starts:
+            if start <= done:
+                continue
+            block = hex_block_at(text, start)
+            if block is None:
+                continue
+            begin, end, data = block
+            line_begin = begin
+            while line_begin <= end:
+                line_end = text.find("\n", line_begin, end)
+                if line_end < 0:
+                    line_end = end
+                out.append((line_begin, line_end + 1, (line_begin - begin, data)))
+                line_begin = line_end + 1
+            done = end
+        return out
+
+    def cache_key(self, line_text, start, end, sub):
+        return ("h323", sub[1])
+
+
+class IeDataDecoder(Decoder):
+    name = "iedata"
+    trigger = r'IEData='
+
+    def spans(self, line_text):
+        if find_iedata_hex_blob_at_point(line_text, 0):
+            return [(0, _line_end(line_text), 0)]
+        return []
+
+    def cache_key(self, line_text, start, end, sub):
+        ie_blob = find_iedata_hex_blob_at_point(line_text, 0)
+        if not ie_blob:
+            return None
+        ie_name_match = IE_NAME_PATTERN.search(line_text)
+        ie_name = ie_name_match.group(1).strip() if ie_name_match else None
+        return ("iedata", ie_blob["bytes"], ie_name)
+
+    def render(self, key):
+        ie_decoded = decode_q931_ie_hex(key[1])
+        if not ie_decoded:
+            return None
+        return format_q931_ie_popup(ie_decoded, key[1], key[2]), 760, "CUCM Q.931 IE: información mostrada"
+
+    def fields(self, key):
+        ie_decoded = decode_q931_ie_hex(key[1])
+        if not ie_decoded:
+            return None
+        out = {"ie": ie_decoded["ie_label"], "iei": "0x{:02X}".format(ie_decoded["ie_id"])}
+        if key[2]:
+            out["ie_name"] = key[2]
+        if ie_decoded.get("text"):
+            out["text"] = ie_decoded["text"]
+        out.update(_cause_fields(ie_decoded.get("q850_cause")))
+        return out
+
+
+class DtmfDecoder(Decoder):
+    name = "dtmf"
+    trigger = r'party\d+DTMF\('
+
+    def spans(self, line_text):
+        return [(start, end, 0) for start, end in dtmf_regions(line_text)]
+
+    def cache_key(self, line_text, start, end, sub):
+        # The popup covers every DTMF block of the line.
+        return ("dtmf", tuple(line_text[a:b] for a, b in dtmf_regions(line_text)))
+
+    def render(self, key):
+        explanation_dict = parse_dtmf_block(" ".join(key[1])) or {}
+        if explanation_dict:
+            return format_popup(explanation_dict), 600, "CUCM DTMF: información mostrada"
+        return None
+
+    def fields(self, key):
+        return parse_dtmf_block(" ".join(key[1]))
+
+
+DECODERS = []
+_decoder_kinds = {}
+_triggers = None
+_subset_triggers = {}
+
+
+def register_decoder(decoder):
+    """Add ``decoder`` after those registered so far; earlier ones win overlaps."""
+    global _triggers
+    if decoder.name in _decoder_kinds:
+        raise ValueError("decoder already registered: {}".format(decoder.name))
+    triggers = _compile_triggers(DECODERS + [decoder])
+    _decoder_kinds[decoder.name] = len(DECODERS)
+    DECODERS.append(decoder)
+    _triggers = triggers
+    _subset_triggers.clear()
+    return decoder
+
+
+def _compile_triggers(decoders):
+    return re.compile(
+        "|".join("(?P<{}>{})".format(d.name, d.trigger) for d in decoders if d.trigger),
+        re.IGNORECASE)
+
+
+def _triggers_for(names):
+    """The trigger pattern of the decoders in ``names`` and their anchors (None: all)."""
+    if names is None:
+        return _triggers
+    names = frozenset(names)
+    triggers = _subset_triggers.get(names)
+    if triggers is None:
+        wanted = set(names)
+        for d in DECODERS:
+            if d.name in names:
+                wanted.update(d.anchors)
+        triggers = _subset_triggers[names] = _compile_triggers(
+            [d for d in DECODERS if d.name in wanted])
+    return triggers
+
+
+for _decoder in (Q850Decoder(), HexIpDecoder(), HexBlockDecoder(), H323Decoder(),
+                 IsdnLineDecoder(), IeDataDecoder(), DtmfDecoder()):
+    register_decoder(_decoder)
+
+
+def _decoder_spans(line_text, base, names):
+    spans = []
+    for kind, decoder in enumerate(DECODERS):
+        if decoder.name in names and not decoder.multiline:
+            for start, end, sub in decoder.spans(line_text):
+                spans.append((base + start, base + end, kind, sub))
+    return spans
+
+
+def line_decode_spans(line_text, base=0):
+    """Decodable spans of one line (no line break), offset by ``base``."""
+    names = set(m.lastgroup for m in _triggers.finditer(line_text))
+    spans = _decoder_spans(line_text, base, names) if names else []
+    spans.sort()
+    return spans
+
+
+def decode_spans(text, offset=0, names=None):
+    """
+    Decodable spans of ``text``, which holds whole lines, as sorted
+    ``(begin, end, kind, pattern)`` tuples offset by ``offset``; only those
+    of the decoders named in ``names``, when given.
+    """
+    if names is not None:
+        names = frozenset(names)
+    fired = OrderedDict()
+    for m in _triggers_for(names).finditer(text):
+        start = text.rfind("\n", 0, m.start()) + 1
+        line_names = fired.get(start)
+        if line_names is None:
+            line_names = fired[start] = set()
+        line_names.add(m.lastgroup)
+    spans = []
+    replaced = {}  # line start -> names of decoders dropped there
+    for kind, decoder in enumerate(DECODERS):
+        if decoder.multiline and (names is None or decoder.name in names):
+            anchors = decoder.anchors
+            starts = [start for start, line_names in fired.items()
+                      if not line_names.isdisjoint(anchors)]
+            for start, end, sub in decoder.spans(text, starts) if starts else ():
+                spans.append((offset + start, offset + end, kind, sub))
+                replaced.setdefault(start, set()).update(decoder.replaces)
+    for start, line_names in fired.items():
+        if names is not None:
+            line_names &= names
+        if start in replaced:
+            line_names -= replaced[start]
+        end = text.find("\n", start)
+        line_text = text[start:] if end < 0 else text[start:end]
+        spans.extend(_decoder_spans(line_text, offset + start, line_names))
+    spans.sort()
+    return spans
+
+
+def span_popup(line_text, line_begin, span, cache=None):
+    """``(html, max_width, status)`` for one span, or None when it does not decode."""
+    begin, end, kind, sub = span
+    decoder = DECODERS[kind]
+    key = decoder.cache_key(line_text, begin - line_begin, end - line_begin, sub)
+    if key is None:
+        return None
+    if cache is None:
+        return decoder.render(key)
+    return cache.get(key, decoder.render)
+
+
+def hover_popup(spans, line_text, line_begin, cache=None):
+    """The popup of the best span in ``spans`` (as from DecodeIndex.at) that decodes."""
+    tried = set()
+    for span in spans:
+        decoder = DECODERS[span[2]]
+        group = decoder.group or decoder.name
+        if group in tried:
+            continue
+        tried.add(group)
+        popup = span_popup(line_text, line_begin, span, cache)
+        if popup:
+            return popup
+    return None
+
+
+class DecodeIndex(object):
+    """Decodable spans of one buffer, sorted by begin; see decode_spans."""
+
+    def __init__(self, spans=()):
+        self.spans = sorted(spans)
+
+    def __len__(self):
+        return len(self.spans)
+
+    def at(self, point, line_begin):
+        """Spans of the line starting at ``line_begin`` that hold ``point``, best first."""
+        spans = self.spans
+        i = bisect.bisect_right(spans, (point, _FAR))
+        found = []
+        while i > 0:
+            i -= 1
+            span = spans[i]
+            if span[0] < line_begin:
+                break
+            if point < span[1]:
+                found.append(span)
+        found.sort(key=lambda span: (span[2], span[3], span[0]))
+        return found
+
+    def edit(self, begin, old_end, new_end, line_begin, line_end, spans):
+        """
+        Apply ``[begin, old_end)`` having become ``[begin, new_end)``, with
+        ``spans`` as the rescan of the lines ``[line_begin, line_end)`` that
+        now hold the change.
+        """
+        delta = new_end - old_end
+        old = self.spans
+        # Spans before the edited lines stay; those from there up to the end
+        # of the change are rescanned or gone; the rest move by ``delta``.
+        head = bisect.bisect_left(old, (line_begin,))
+        tail = max(head, bisect.bisect_left(old, (old_end,)))
+        moved = [(a + delta, b + delta, kind, sub) for a, b, kind, sub in old[tail:]]
+        moved = [span for span in moved if span[0] >= line_end]
+        # One assignment, so a hover on the UI thread never sees half an edit.
+        self.spans = old[:head] + sorted(spans) + moved
+
+
+class DecodeCache(object):
+    """
+    Rendered hover popups, least recently used first out, keyed by what the
+    popup depends on: the cause code, the normalized hex bytes, the DTMF
+    block text. A popup that did not decode is cached as None. Hits and
+    misses are counted per kind.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.stats = {}
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, render):
+        """The popup for ``key``, calling ``render(key)`` on a miss."""
+        counts = self.stats.setdefault(key[0], [0, 0])
+        try:
+            popup = self._entries.pop(key)
+            counts[0] += 1
+        except KeyError:
+            popup = render(key)
+            counts[1] += 1
+        self._entries[key] = popup
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return popup
+
+    def clear(self):
+        self._entries.clear()
+        self.stats.clear()
+
+    def summary(self):
+        hits = sum(counts[0] for counts in self.stats.values())
+        misses = sum(counts[1] for counts in self.stats.values())
+        parts = ["{} {}/{}".format(kind, counts[0], counts[1])
+                 for kind, counts in sorted(self.stats.items())]
+        return "{} entries, {} hits, {} misses ({})".format(
+            len(self), hits, misses, ", ".join(parts) or "no lookups")
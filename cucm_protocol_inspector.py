@@ -1,606 +1,360 @@
+import os
 import re
+import threading
+import time
+import traceback
 import sublime
 import sublime_plugin
 
-DEBUG_LOG = False
-
-
-def _debug(msg):
-    if DEBUG_LOG:
-        print(msg)
-
+from .cucm_decoders import (
+    HEX_DUMP_LINE,
+    MAX_HEX_BLOCK_LINES,
+    DecodeCache,
+    DecodeIndex,
+    _debug,
+    decode_spans,
+    hover_popup,
+)
+from .cause_stats import SORT_KEYS, cause_stats, format_report
+from .decode_report import decode_report
+from .sdl_index import SDL_SIGNAL, build as build_sdl_index, format_histogram, load_or_index
+from .sdp_media import build_media_table, format_report as format_media_report
+from .sip_index import SipIndexCache, build_sip_index, format_ladder
+from .time_index import build as build_time_index, parse_time, seek as seek_time
+from .trace_merge import merge_traces, trace_sets
+from .trace_scan import line_timestamp
+from .highlight_engine import iter_chunks
 
 _debug(">>> cucm_dtmf_hover module loaded (py3.3 compatible, ordered by party, no title)")
 
-CUCM_ENUMS = {
-    "DTMFConfig": {1: "BestEffort", 2: "PreferOOB", 3: "Prefer2833", 4: "PreferBoth"},
-    "DTMFMethod": {
-        0: "NoDTMF",
-        1: "OOB",
-        2: "RFC2833",
-        3: "OOB + RFC2833",
-        4: "UnknownDTMF"
-    }
-}
-
-Q850_CAUSES = {
-    1: ("Unallocated Number", "Destination cannot be reached because the number is unassigned."),
-    2: ("No Route To Transit Network", "Call asked to route through an unrecognized intermediate network."),
-    3: ("No Route To Destination", "Called party cannot be reached via the selected network path."),
-    4: ("Send Special Information Tone", "Long-term condition; SIT tone should be returned."),
-    5: ("Misdialed Trunk Prefix", "Called number contains an erroneous trunk prefix."),
-    6: ("Channel Unacceptable", "Identified channel is not acceptable for this call."),
-    7: ("Call Delivered In Established Channel", "Call delivered using an already-established channel."),
-    8: ("Preemption", "Call was preempted (typically emergency priority)."),
-    9: ("Preemption, Circuit Reserved", "Call preempted and circuit reserved for reuse."),
-    16: ("Normal Call Clearing", "Call cleared normally because one party ended the call."),
-    17: ("User Busy", "Called party cannot accept another call (busy)."),
-    18: ("No User Responding", "No alerting/connect response within allowed time."),
-    19: ("No Answer (User Alerted)", "User was alerted but did not answer in time."),
-    20: ("Subscriber Absent", "User not reachable (logged off, out of range, or unavailable)."),
-    21: ("Call Rejected", "Called side/network rejected the call despite compatibility."),
-    22: ("Number Changed", "Dialed number is no longer assigned."),
-    23: ("Redirection To New Destination", "Call is redirected/forwarded to another destination."),
-    25: ("Exchange Routing Error", "Intermediate exchange released call (routing/hop issue)."),
-    26: ("Nonselected User Clearing", "Called number was not awarded the incoming call."),
-    27: ("Destination Out Of Order", "Destination interface/signaling path not functioning correctly."),
-    28: ("Invalid Number Format", "Called number format is invalid or incomplete."),
-    29: ("Facility Rejected", "Requested supplementary service cannot be provided."),
-    30: ("Response To STATUS ENQUIRY", "STATUS cause associated to prior STATUS ENQUIRY."),
-    31: ("Normal, Unspecified", "Normal event with no more specific normal-class cause."),
-    34: ("No Circuit/Channel Available", "No suitable circuit/channel currently available."),
-    38: ("Network Out Of Order", "Network failure expected to persist for some period."),
-    39: ("Permanent Frame Connection Out Of Service", "Permanent frame-mode connection is out of service."),
-    40: ("Permanent Frame Connection Operational", "Permanent frame-mode connection is operational."),
-    41: ("Temporary Failure", "Temporary network failure likely to clear soon."),
-    42: ("Switching Equipment Congestion", "Switching node is experiencing congestion/high traffic."),
-    43: ("Access Information Discarded", "Network could not deliver requested access information."),
-    44: ("Requested Circuit/Channel Not Available", "Requested circuit/channel cannot be provided."),
-    46: ("Precedence Call Blocked", "No preemptive circuits available or equal/higher precedence active."),
-    47: ("Resource Unavailable", "Internal resource allocation failure (e.g., memory/socket)."),
-    49: ("QoS Unavailable", "Requested quality of service cannot be provided."),
-    50: ("Facility Not Subscribed", "Caller requested a service not authorized/subscribed."),
-    53: ("Outgoing Calls Barred In CUG", "Outgoing CUG calls are barred for this member."),
-    55: ("Incoming Calls Barred In CUG", "Incoming CUG calls are barred for this member."),
-    57: ("Bearer Capability Not Authorized", "Bearer capability exists but is not authorized."),
-    58: ("Bearer Capability Not Available", "Bearer capability exists but is currently unavailable."),
-    62: ("Outgoing Access/Subclass Inconsistency", "Inconsistency in outgoing access info and subscriber class."),
-    63: ("Service/Option Not Available, Unspecified", "Service not available and no specific cause applies."),
-    65: ("Bearer Capability Not Implemented", "Requested media/bearer capability is not supported."),
-    66: ("Channel Type Not Implemented", "Requested channel type is not supported."),
-    69: ("Requested Facility Not Implemented", "Requested supplementary service is unsupported."),
-    70: ("Restricted Digital Info Bearer Only", "Only restricted bearer available for requested service."),
-    79: ("Service/Option Not Implemented, Unspecified", "Service unsupported and no specific cause applies."),
-    81: ("Invalid Call Reference", "Message received with call reference not currently in use."),
-    82: ("Identified Channel Does Not Exist", "Call attempted on a channel not configured/available."),
-    83: ("Suspended Call Exists, Identity Does Not", "Resume attempted with mismatched suspended-call identity."),
-    84: ("Call Identity In Use", "Suspended call identity already in use."),
-    85: ("No Call Suspended", "Resume requested but no suspended call matches identity."),
-    86: ("Call Cleared", "Suspended call identity points to call already cleared."),
-    87: ("User Not Member Of CUG", "Called user not member of specified closed user group."),
-    88: ("Incompatible Destination", "Destination cannot support requested call compatibility attributes."),
-    90: ("Nonexistent CUG", "Specified closed user group does not exist."),
-    91: ("Invalid Transit Network Selection", "Transit network identification format is invalid."),
-    95: ("Invalid Message", "Protocol entity received an invalid message."),
-    96: ("Mandatory IE Missing", "Message is missing required information element(s)."),
-    97: ("Message Type Nonexistent/Not Implemented", "Received unsupported or invalid message type."),
-    98: ("Message Not Compatible With Call State", "Received message not valid for current call state."),
-    99: ("IE/Parameter Nonexistent Or Not Implemented", "Message contains undefined/unsupported IE or parameter."),
-    100: ("Invalid IE Contents", "Received IE exists but contents are invalid/unsupported."),
-    101: ("Message In Invalid Call State", "Message incompatible with call processing state."),
-    102: ("Recovery On Timer Expiry", "Call setup/protocol timer expired during procedures."),
-    103: ("Parameter Not Implemented", "Message passed with undefined/unsupported parameter."),
-    110: ("Unrecognized Parameter Discarded", "Message discarded due to unrecognized parameter."),
-    111: ("Protocol Error, Unspecified", "Protocol error with no more specific cause."),
-    127: ("Interworking, Unspecified", "Internal/interworking failure; exact cause cannot be ascertained."),
-}
-
-Q850_PATTERNS = [
-    re.compile(r'(?i)\breason\s*:\s*q\.?\s*850\s*;\s*cause\s*=\s*(\d{1,3})\b'),
-]
-
-IPADDR_PATTERNS = [
-    re.compile(r'(?i)\bIpAddr\s*=\s*([0-9a-f]{1,8})\b'),
-    re.compile(r"(?i)\bip\s*'([0-9a-f]{8})'h\b"),
-]
-
-Q931_MESSAGE_TYPES = {
-    0x01: "ALERTING",
-    0x02: "CALL PROCEEDING",
-    0x03: "PROGRESS",
-    0x05: "SETUP",
-    0x07: "CONNECT",
-    0x0F: "CONNECT ACK",
-    0x45: "DISCONNECT",
-    0x4D: "RELEASE",
-    0x5A: "RELEASE COMPLETE",
-    0x62: "FACILITY",
-    0x75: "STATUS",
-    0x79: "STATUS ENQUIRY",
-    0x7B: "INFORMATION",
-    0x7D: "NOTIFY",
-}
-
-Q931_IE_TYPES = {
-    0x04: "Bearer Capability",
-    0x08: "Cause",
-    0x18: "Channel Identification",
-    0x1E: "Progress Indicator",
-    0x28: "Display",
-    0x34: "Signal",
-    0x4C: "Connected Number",
-    0x6C: "Calling Party Number",
-    0x70: "Called Party Number",
-    0x7D: "High Layer Compatibility",
-    0x7E: "User-User",
-}
-
-HEX_CANDIDATE_PATTERNS = [
-    re.compile(r'(?i)(?:0x)?[0-9a-f]{2}(?:[\s:-]+(?:0x)?[0-9a-f]{2}){4,}'),
-    re.compile(r'(?i)\b(?:0x)?[0-9a-f]{12,}\b'),
-]
-
-def explain_enum(enum_type, value):
-    return CUCM_ENUMS.get(enum_type, {}).get(value, "Unknown ({})".format(value))
-
-def parse_dtmf_block(line):
-    output = {}
-
-    for m in re.finditer(r'party\d+DTMF\(', line):
-        start = m.start()
-        idx = m.end()
-        depth = 1
-        while idx < len(line) and depth > 0:
-            ch = line[idx]
-            if ch == '(':
-                depth += 1
-            elif ch == ')':
-                depth -= 1
-            idx += 1
-        if depth != 0:
-            _debug(">>> parse_dtmf_block: paréntesis no balanceado en posición {}".format(start))
-            continue
-        block = line[m.start():idx]
-        label_match = re.match(r'(party\d+DTMF)', block)
-        label = label_match.group(1) if label_match else "partyXDTMF"
-
-        inner = block[block.find('(')+1 : -1].strip()
-
-        m2 = re.match(r'^\s*(\d+)\s+(\d+)\s+\(([^)]*)\)\s+(\d+)\s+(\d+)\s*$', inner)
-        if m2:
-            config, method, payload_raw, want_recv, provide_oob = m2.groups()
-        else:
-            try:
-                p_open = inner.find('(')
-                p_close = inner.find(')', p_open+1) if p_open != -1 else -1
-                if p_open == -1 or p_close == -1:
-                    raise ValueError("no payload parens")
-                before = inner[:p_open].strip().split()
-                payload_raw = inner[p_open+1:p_close]
-                after = inner[p_close+1:].strip().split()
-                if len(before) < 2 or len(after) < 2:
-                    raise ValueError("estructura inesperada")
-                config = before[0]
-                method = before[1]
-                want_recv = after[0]
-                provide_oob = after[1]
-            except Exception:
-                _debug(">>> parse_dtmf_block: no match en block: {}".format(repr(block)))
-                continue
-
-        payload = payload_raw.strip()
-        payload_value = payload.split(":", 1)[0] if payload else None
-
-        output["{} Config".format(label)] = explain_enum("DTMFConfig", int(config))
-        output["{} Method".format(label)] = CUCM_ENUMS.get("DTMFMethod", {}).get(int(method), "Unknown ({})".format(method))
-        output["{} Payload".format(label)] = payload_value if payload_value else "—"
-        output["{} Wants Reception".format(label)] = "Yes" if int(want_recv) else "No"
-        output["{} Provides OOB".format(label)] = "Yes" if int(provide_oob) else "No"
-
-        _debug(">>> parse_dtmf_block: parsed {} {} {} {} {} {}".format(label, config, method, payload_raw, want_recv, provide_oob))
-
-    return output if output else None
-
-
-def find_q850_in_line(line_text):
-    matches = []
-    seen = set()
-
-    for regex in Q850_PATTERNS:
-        for m in regex.finditer(line_text):
-            try:
-                code_text = m.group(1)
-                code = int(code_text)
-            except Exception:
-                continue
-
-            key = (m.start(1), m.end(1), code)
-            if key in seen:
-                continue
-
-            seen.add(key)
-            matches.append({
-                "start": m.start(1),
-                "end": m.end(1),
-                "code": code,
-            })
-
-    return matches
-
-
-def format_q850_popup(code):
-    title, description = Q850_CAUSES.get(
-        code,
-        ("Unknown / Not Mapped", "No description available in bundled Q.850 map."),
-    )
-
-    html = "<div style='white-space: pre-wrap; font-family: monospace;'>"
-    html += "🔹 <b>Q.850 Cause {}</b>\n".format(code)
-    html += "   📌 <b>{}</b>\n".format(title)
-    html += "   📝 {}".format(description)
-    html += "</div>"
-    return html
-
-
-def _hex_to_ipv4_pairs(hex_text):
-    normalized = (hex_text or "").strip().lower().replace("0x", "")
-    if not re.match(r'^[0-9a-f]{1,8}$', normalized):
-        return None
-
-    normalized = normalized.zfill(8)
-    octets = [int(normalized[i:i + 2], 16) for i in range(0, 8, 2)]
-    be_ip = "{}.{}.{}.{}".format(octets[0], octets[1], octets[2], octets[3])
-    le_ip = "{}.{}.{}.{}".format(octets[3], octets[2], octets[1], octets[0])
-
-    return {
-        "hex": normalized.upper(),
-        "be_ip": be_ip,
-        "le_ip": le_ip,
-    }
-
-
-def find_hex_ip_at_point(line_text, rel_point):
-    for regex in IPADDR_PATTERNS:
-        for m in regex.finditer(line_text):
-            if m.start() <= rel_point < m.end():
-                parsed = _hex_to_ipv4_pairs(m.group(1))
-                if parsed:
-                    return {
-                        "start": m.start(1),
-                        "end": m.end(1),
-                        "parsed": parsed,
-                        "is_ipaddr_field": "IpAddr" in m.group(0),
-                    }
+# Hover decodes come from a per-buffer DecodeIndex of every decodable span
+# (see cucm_decoders), built once on a background thread and kept in step
+# with edits, so a hover is a bisect plus the decode of one span.
+
+DECODE_INDEX_CHUNK_CHARS = 1024 * 1024
+# Edits inserting more than this are re-indexed in the background instead
+# of on the UI thread.
+DECODE_INDEX_SYNC_CHARS = 64 * 1024
+DECODE_CACHE_MAX_ENTRIES = 4096
+CAUSE_STATS_PANEL = "cucm_cause_stats"
+# Files this big get their time index built as they load.
+TIME_INDEX_PREBUILD_CHARS = 16 * 1024 * 1024
+SDL_HISTOGRAM_PANEL = "cucm_sdl_histogram"
+SDL_HISTOGRAM_TOP = 50
+# A file with a signal line this near its start has its SDL index built as it loads.
+SDL_SNIFF_CHARS = 64 * 1024
+
+_decode_indexes = {}  # buffer_id -> {"index", "change_count", "building"}
+_decode_cache = DecodeCache(DECODE_CACHE_MAX_ENTRIES)
+_cause_stats = {}  # window id -> (path, CauseStats, seconds)
+_sip_cache = SipIndexCache()
+_sip_indexes = {}  # window id -> SipIndex
+_media_tables = {}  # window id -> MediaTable
+_time_indexes = {}  # buffer_id -> {"index", "change_count", "waiting"}
+_sdl_indexes = {}  # buffer_id -> {"index", "change_count", "waiting"}
+SIP_CALL_ID_LINE = re.compile(r'^\s*(?:Call-ID|i)\s*:\s*(\S+)', re.IGNORECASE)
+SDL_CI = re.compile(r'\bCI=(\d+)')
+
+
+def _view_decode_index(view):
+    """The buffer's index when it is up to date, else None (and start a build)."""
+    entry = _decode_indexes.get(view.buffer_id())
+    if entry is not None and entry["index"] is not None and entry["change_count"] == view.change_count():
+        return entry["index"]
+    _build_decode_index(view)
     return None
 
 
-def format_hex_ip_popup(found):
-    parsed = found["parsed"]
-    primary = parsed["le_ip"] if found.get("is_ipaddr_field") else parsed["be_ip"]
-    alternate = parsed["be_ip"] if found.get("is_ipaddr_field") else parsed["le_ip"]
-    primary_label = "Little-endian" if found.get("is_ipaddr_field") else "Network order"
-    alt_label = "Network order" if found.get("is_ipaddr_field") else "Little-endian"
-    network_order = parsed["be_ip"]
-
-    html = "<div style='white-space: pre-wrap; font-family: monospace;'>"
-    html += "<b>HEX to IPv4</b>\n"
-    html += "HEX: <b>{}</b>\n".format(parsed["hex"])
-    html += "OUTPUT ({}) : <span style='color: #1f7a1f;'><b>{}</b></span>\n".format(primary_label, primary)
-    html += "Network order: <span style='color: #0b4f9c;'><b>{}</b></span>\n".format(network_order)
-    if alt_label.lower() != "network order":
-        html += "{}: {}".format(alt_label, alternate)
-    html += "</div>"
-    return html
-
-
-def _normalize_hex_bytes(raw_text):
-    if not raw_text:
-        return []
-
-    # Evita falsos positivos con números decimales largos.
-    if not re.search(r'(?i)[a-f]|0x|[\s:-]', raw_text):
-        return []
-
-    parts = re.findall(r'(?i)(?:0x)?([0-9a-f]{2})', raw_text)
-    output = []
-    for p in parts:
+def _build_decode_index(view):
+    entry = _decode_indexes.setdefault(
+        view.buffer_id(), {"index": None, "change_count": None, "building": False})
+    if entry["building"]:
+        return
+    entry["building"] = True
+    change_count = view.change_count()
+
+    def read(a, b):
+        return view.substr(sublime.Region(a, b))
+
+    def install(spans):
+        entry["building"] = False
+        if not view.is_valid() or _decode_indexes.get(view.buffer_id()) is not entry:
+            return
+        if view.change_count() != change_count:
+            _build_decode_index(view)
+            return
+        entry["index"] = DecodeIndex(spans)
+        entry["change_count"] = change_count
+
+    def run():
+        spans = []
         try:
-            output.append(int(p, 16))
-        except Exception:
-            return []
-    return output
-
-
-def find_hex_blob_at_point(line_text, rel_point):
-    for regex in HEX_CANDIDATE_PATTERNS:
-        for m in regex.finditer(line_text):
-            if m.start() <= rel_point < m.end():
-                raw = m.group(0)
-                data = _normalize_hex_bytes(raw)
-                if len(data) >= 5:
-                    return {
-                        "start": m.start(),
-                        "end": m.end(),
-                        "raw": raw,
-                        "bytes": data,
-                    }
-    return None
-
-
-def find_first_hex_blob_in_line(line_text):
-    for regex in HEX_CANDIDATE_PATTERNS:
-        for m in regex.finditer(line_text):
-            raw = m.group(0)
-            data = _normalize_hex_bytes(raw)
-            if len(data) >= 5:
-                return {
-                    "start": m.start(),
-                    "end": m.end(),
-                    "raw": raw,
-                    "bytes": data,
-                }
-    return None
-
-
-def find_iedata_hex_blob_at_point(line_text, rel_point):
-    if "IEData=" not in line_text:
-        return None
-
-    m = re.search(r'IEData\s*=\s*(.+)$', line_text)
-    if not m:
-        return None
-
-    start = m.start(1)
-    end = m.end(1)
-    # UX: para líneas IEData activamos aunque el cursor esté en cualquier parte de la línea.
-    _ = rel_point
-
-    raw = m.group(1).strip()
-    data = _normalize_hex_bytes(raw)
-    if len(data) < 2:
-        return None
-
-    return {
-        "start": start,
-        "end": end,
-        "raw": raw,
-        "bytes": data,
-    }
-
-
-def _decode_q931_number_digits(value_bytes):
-    # En estos logs CUCM suele venir IA5/ASCII; conservamos bytes imprimibles.
-    out = []
-    for b in value_bytes:
-        if 32 <= b <= 126:
-            out.append(chr(b))
-    return "".join(out).strip()
-
-
-def _decode_q931_party_number(value_bytes):
-    if not value_bytes:
-        return ""
-
-    # Q.931 Party Number IE:
-    # - octeto 3 (tipo/plan) siempre presente
-    # - octeto 3a (presentation/screening) opcional cuando ext bit del octeto 3 = 0
-    start = 1
-    if len(value_bytes) >= 2 and (value_bytes[0] & 0x80) == 0:
-        start = 2
-
-    return _decode_q931_number_digits(value_bytes[start:])
-
-
-def decode_q931_ie_hex(byte_list):
-    if not byte_list or len(byte_list) < 2:
-        return None
-
-    ie_id = byte_list[0]
-    ie_len = byte_list[1]
-    value = byte_list[2:2 + ie_len]
-    if len(value) < ie_len:
-        value = byte_list[2:]
-
-    result = {
-        "ie_id": ie_id,
-        "ie_len": ie_len,
-        "ie_label": Q931_IE_TYPES.get(ie_id, "Unknown IE"),
-        "text": None,
-        "q850_cause": None,
-    }
-
-    if ie_id == 0x28 and value:
-        # Display IE: texto IA5.
-        result["text"] = "".join([chr(b) if 32 <= b <= 126 else "." for b in value])
-    elif ie_id in (0x6C, 0x70) and len(value) >= 1:
-        result["text"] = _decode_q931_party_number(value)
-    elif ie_id == 0x08 and len(value) >= 2:
-        cause_code = value[1] & 0x7F
-        cause_title, cause_desc = Q850_CAUSES.get(
-            cause_code,
-            ("Unknown / Not Mapped", "No description available in bundled Q.850 map."),
-        )
-        result["q850_cause"] = {
-            "code": cause_code,
-            "title": cause_title,
-            "description": cause_desc,
-        }
-
-    return result
-
-
-def decode_h323_q931_hex(byte_list):
-    if not byte_list or len(byte_list) < 3:
-        return None
-
-    protocol_discriminator = byte_list[0]
-    call_ref_len = byte_list[1] & 0x0F
-    msg_index = 2 + call_ref_len
-
-    if msg_index >= len(byte_list):
-        return None
-
-    call_ref_dir = "Unknown"
-    call_ref_value = None
-    if call_ref_len > 0:
-        first_call_ref_octet = byte_list[2]
-        call_ref_dir = "To originating side" if (first_call_ref_octet & 0x80) else "To destination side"
-        value = first_call_ref_octet & 0x7F
-        idx = 3
-        while idx < (2 + call_ref_len) and idx < len(byte_list):
-            value = (value << 8) | byte_list[idx]
-            idx += 1
-        call_ref_value = value
-
-    msg_type = byte_list[msg_index]
-    result = {
-        "protocol_discriminator": protocol_discriminator,
-        "protocol_label": "Q.931 Call Control" if protocol_discriminator == 0x08 else "Unknown",
-        "call_ref_len": call_ref_len,
-        "call_ref_dir": call_ref_dir,
-        "call_ref_value": call_ref_value,
-        "msg_type": msg_type,
-        "msg_label": Q931_MESSAGE_TYPES.get(msg_type, "Unknown"),
-        "q850_cause": None,
-    }
-
-    i = msg_index + 1
-    while i < len(byte_list):
-        ie_id = byte_list[i]
-
-        # Single-octet IEs (bit 8 = 1) no incluyen campo de longitud.
-        if ie_id & 0x80:
-            i += 1
-            continue
-
-        if i + 1 >= len(byte_list):
+            for offset, text in iter_chunks(read, 0, view.size(), DECODE_INDEX_CHUNK_CHARS):
+                if view.change_count() != change_count:
+                    break
+                spans.extend(decode_spans(text, offset))
+        except Exception as e:
+            _debug(">>> decode index build failed: {}".format(e))
+        sublime.set_timeout(lambda: install(spans), 0)
+
+    thread = threading.Thread(target=run)
+    thread.daemon = True
+    thread.start()
+
+
+def _hex_block_lines(view, region):
+    """
+    The full lines of ``region`` widened over the hex dump lines around it,
+    and the line a dump wraps from, so a wrapped PDU is scanned whole.
+    """
+    begin = view.line(region.begin()).begin()
+    end = view.line(region.end()).end()
+    for _ in range(MAX_HEX_BLOCK_LINES):
+        if begin == 0:
             break
-
-        ie_len = byte_list[i + 1]
-        value_start = i + 2
-        value_end = value_start + ie_len
-        if value_end > len(byte_list):
+        above = view.line(begin - 1)
+        begin = above.begin()
+        if not HEX_DUMP_LINE.match(view.substr(above)):
             break
-
-        # Cause IE (Q.931 IEI 0x08) contiene causa Q.850 en el segundo octeto.
-        if ie_id == 0x08 and ie_len >= 2:
-            cause_code = byte_list[value_start + 1] & 0x7F
-            cause_title, cause_desc = Q850_CAUSES.get(
-                cause_code,
-                ("Unknown / Not Mapped", "No description available in bundled Q.850 map."),
-            )
-            result["q850_cause"] = {
-                "code": cause_code,
-                "title": cause_title,
-                "description": cause_desc,
-            }
-
-        i = value_end
-
-    return result
-
-
-def format_h323_popup(decoded, byte_list):
-    byte_preview = " ".join(["{:02X}".format(b) for b in byte_list[:48]])
-    if len(byte_list) > 48:
-        byte_preview += " ..."
-
-    html = "<div style='white-space: pre-wrap; font-family: monospace;'>"
-    html += "<b>H.323 / Q.931 HEX</b>\n"
-    html += "Bytes: {}\n".format(len(byte_list))
-    html += "PD: 0x{:02X} ({})\n".format(decoded["protocol_discriminator"], decoded["protocol_label"])
-    html += "CallRefLen: {}\n".format(decoded["call_ref_len"])
-
-    if decoded["call_ref_value"] is not None:
-        html += "CallRef: {} ({})\n".format(decoded["call_ref_value"], decoded["call_ref_dir"])
-
-    html += "MsgType: 0x{:02X} ({})\n".format(decoded["msg_type"], decoded["msg_label"])
-
-    cause = decoded.get("q850_cause")
-    if cause:
-        html += "\nQ.850 Cause {}: {}\n".format(cause["code"], cause["title"])
-        html += "{}\n".format(cause["description"])
-
-    html += "\nHEX: {}".format(byte_preview)
-    html += "</div>"
-    return html
-
-
-def format_q931_ie_popup(decoded, byte_list, ie_name_hint=None):
-    byte_preview = " ".join(["{:02X}".format(b) for b in byte_list[:48]])
-    if len(byte_list) > 48:
-        byte_preview += " ..."
-
-    html = "<div style='white-space: pre-wrap; font-family: monospace;'>"
-    html += "<b>Q.931 IE HEX</b>\n"
-    if ie_name_hint:
-        html += "Line IE: {}\n".format(ie_name_hint)
-    html += "IEI: 0x{:02X} ({})\n".format(decoded["ie_id"], decoded["ie_label"])
-    html += "Length: {}\n".format(decoded["ie_len"])
-
-    if decoded.get("text"):
-        text_label = "Decoded text"
-        if decoded.get("ie_id") == 0x6C:
-            text_label = "Calling number"
-        elif decoded.get("ie_id") == 0x70:
-            text_label = "Called number"
-        elif decoded.get("ie_id") == 0x28:
-            text_label = "Display text"
-
-        html += "{}: <span style='color: #1f7a1f;'><b>{}</b></span>\n".format(text_label, decoded["text"])
-
-    cause = decoded.get("q850_cause")
-    if cause:
-        html += "\nQ.850 Cause {}: {}\n".format(cause["code"], cause["title"])
-        html += "{}\n".format(cause["description"])
-
-    html += "\nHEX: {}".format(byte_preview)
-    html += "</div>"
-    return html
-
-def format_popup(items):
-    # Orden deseado de sufijos y mapeo a etiquetas mostradas
-    order = [
-        ("Config", "dtmf config"),
-        ("Method", "dtmf method"),
-        ("Payload", "payload"),
-        ("Wants Reception", "wantDTMFrecepcion"),
-        ("Provides OOB", "provideOOB")
+    for _ in range(MAX_HEX_BLOCK_LINES):
+        if end >= view.size():
+            break
+        below = view.line(end + 1)
+        if not HEX_DUMP_LINE.match(view.substr(below)):
+            break
+        end = below.end()
+    return view.full_line(sublime.Region(begin, end))
+
+
+def _update_decode_index(view, begin, old_end, new_end):
+    """Keep the buffer's index in step with one edit; drop it if that is not cheap."""
+    entry = _decode_indexes.get(view.buffer_id())
+    if entry is None or entry["index"] is None or entry["building"]:
+        return
+    if new_end - begin > DECODE_INDEX_SYNC_CHARS:
+        entry["index"] = None
+        return
+    lines = _hex_block_lines(view, sublime.Region(begin, new_end))
+    text = view.substr(lines)
+    if text.endswith("\n"):
+        text = text[:-1]
+    spans = decode_spans(text, lines.begin())
+    entry["index"].edit(begin, old_end, new_end, lines.begin(), lines.end(), spans)
+    entry["change_count"] = view.change_count()
+
+
+def _with_buffer_index(indexes, build, view, callback):
+    """
+    Call ``callback(index)`` with the buffer's index in ``indexes``: now
+    when it is up to date, else once ``build(view, read, cancelled)`` has
+    run in the background. A build returning None was cancelled by an edit
+    and is started again.
+    """
+    entry = indexes.setdefault(
+        view.buffer_id(), {"index": None, "change_count": None, "waiting": []})
+    if entry["index"] is not None and entry["change_count"] == view.change_count():
+        callback(entry["index"])
+        return
+    entry["waiting"].append(callback)
+    if len(entry["waiting"]) > 1:
+        return
+    change_count = view.change_count()
+
+    def read(a, b):
+        return view.substr(sublime.Region(a, b))
+
+    def install(index):
+        waiting = entry["waiting"]
+        entry["waiting"] = []
+        if not view.is_valid() or indexes.get(view.buffer_id()) is not entry:
+            return
+        if index is None:
+            # Edited while building: start again.
+            for callback in waiting:
+                _with_buffer_index(indexes, build, view, callback)
+            return
+        entry["index"] = index
+        entry["change_count"] = change_count
+        for callback in waiting:
+            callback(index)
+
+    def run():
+        index = None
+        try:
+            index = build(view, read, lambda: view.change_count() != change_count)
+        except Exception as e:
+            _debug(">>> buffer index build failed: {}".format(e))
+        sublime.set_timeout(lambda: install(index), 0)
+
+    thread = threading.Thread(target=run)
+    thread.daemon = True
+    thread.start()
+
+
+def _with_time_index(view, callback):
+    """Call ``callback(index)`` with the buffer's time index; see _with_buffer_index."""
+    _with_buffer_index(
+        _time_indexes,
+        lambda view, read, cancelled: build_time_index(read, view.size(), cancelled=cancelled),
+        view, callback)
+
+
+def _go_to_time(view, index, time_text, key):
+    point = seek_time(index, lambda a, b: view.substr(sublime.Region(a, b)), key[0], key[1])
+    if point is None:
+        sublime.status_message("Go to Time: no line at or after {}".format(time_text))
+        return
+    view.sel().clear()
+    view.sel().add(sublime.Region(point))
+    view.show_at_center(point)
+    found = line_timestamp(view.substr(view.line(point)), 0)
+    sublime.status_message("Go to Time: {} at line {}".format(found, view.rowcol(point)[0] + 1))
+
+
+class CucmGoToTimeCommand(sublime_plugin.TextCommand):
+    """
+    Jump to the first line at or after a time of day ("14:03:22",
+    "2024/03/14 14:03:22.500", "Mar 14 14:03:22") through the buffer's
+    sparse time index (see time_index), built in the background on first
+    use or as a large file loads. Without ``at`` the time is asked for.
+    """
+
+    def run(self, edit, at=None):
+        view = self.view
+        if at is None:
+            caret = view.sel()[0].b if len(view.sel()) else 0
+            default = line_timestamp(view.substr(view.line(caret)), 0) or ""
+            view.window().show_input_panel(
+                "Go to time:", default,
+                lambda text: text.strip() and view.run_command("cucm_go_to_time", {"at": text}),
+                None, None)
+            return
+        key = parse_time(at)
+        if key is None:
+            sublime.status_message("Go to Time: not a time: {}".format(at))
+            return
+        _with_time_index(view, lambda index: _go_to_time(view, index, at.strip(), key))
+
+
+def _build_sdl_index(view, read, cancelled):
+    """
+    The saved file is indexed from disk through the index cache, so it is
+    only scanned once; an unsaved or edited buffer is indexed as it is.
+    """
+    path = view.file_name()
+    if path and not view.is_dirty() and os.path.isfile(path):
+        started = time.time()
+        index, cached = load_or_index(path, os.path.join(sublime.cache_path(), "CiscoCollab", "SdlIndex"))
+        _debug(">>> SDL index of {}: {} signals, {}, {:.2f} s".format(
+            path, len(index), "cached" if cached else "scanned", time.time() - started))
+        return index
+    return build_sdl_index(read, view.size(), cancelled=cancelled)
+
+
+def _with_sdl_index(view, callback):
+    """Call ``callback(index)`` with the buffer's SDL signal index; see _with_buffer_index."""
+    _with_buffer_index(_sdl_indexes, _build_sdl_index, view, callback)
+
+
+def _is_sdl_trace(view):
+    return SDL_SIGNAL.search(view.substr(sublime.Region(0, min(view.size(), SDL_SNIFF_CHARS)))) is not None
+
+
+def _show_sdl_histogram(view, index):
+    window = view.window()
+    if window is None:
+        return
+    if not len(index):
+        sublime.status_message("CUCM SDL: no SdlSig lines in {}".format(view.file_name() or view.name()))
+        return
+    lines = [
+        "SDL signals in {}".format(view.file_name() or view.name() or "untitled"),
+        "{} signal lines, {} signals, {} process instances; top {} of each".format(
+            len(index), len(index.signals), len(index.processes), SDL_HISTOGRAM_TOP),
+        "",
+        format_histogram(index, SDL_HISTOGRAM_TOP),
     ]
+    panel = window.create_output_panel(SDL_HISTOGRAM_PANEL)
+    panel.run_command("append", {"characters": "\n".join(lines)})
+    window.run_command("show_panel", {"panel": "output.{}".format(SDL_HISTOGRAM_PANEL)})
+
+
+def _show_sdl_signals(view, index, ci, signal):
+    window = view.window()
+    if window is None:
+        return
+    rows = index.rows_for_ci(ci) if ci is not None else index.rows_for_signal(signal)
+    what = "CI {}".format(ci) if ci is not None else signal
+    if not rows:
+        sublime.status_message("CUCM SDL: no signals for {}".format(what))
+        return
+    origin = [sublime.Region(r.a, r.b) for r in view.sel()]
+
+    def go(i, keep):
+        point = view.text_point(index.line[rows[i]] - 1, 0)
+        view.sel().clear()
+        view.sel().add(sublime.Region(point))
+        view.show_at_center(point)
+        if keep:
+            sublime.status_message("CUCM SDL: {} of {} signals for {}".format(i + 1, len(rows), what))
+
+    def done(i):
+        if i >= 0:
+            go(i, True)
+            return
+        view.sel().clear()
+        for region in origin:
+            view.sel().add(region)
+        if origin:
+            view.show_at_center(origin[0])
+
+    window.show_quick_panel(
+        ["{}: {}".format(index.line[row], index.row_text(row)) for row in rows],
+        done, 0, 0, lambda i: i >= 0 and go(i, False))
+
+
+class CucmSdlHistogramCommand(sublime_plugin.TextCommand):
+    """
+    Count the SdlSig lines of the file per signal, per destination
+    process and per process and signal, and show the counts as bars in a
+    panel. Uses the file's SDL index (see sdl_index), built in the
+    background and kept on disk, so a trace is scanned once.
+    """
+
+    def run(self, edit):
+        view = self.view
+        sublime.status_message("CUCM SDL: indexing signals...")
+        _with_sdl_index(view, lambda index: _show_sdl_histogram(view, index))
+
+
+class CucmSdlSignalsCommand(sublime_plugin.TextCommand):
+    """
+    List the SDL signals of one CI (or connection id), or of one signal
+    name, from the file's SDL index and jump to the one picked. Without
+    arguments, the selection or the CI= of the caret line is used, else
+    asked for.
+    """
+
+    def run(self, edit, ci=None, signal=None):
+        view = self.view
+        if ci is None and signal is None:
+            text = view.substr(view.sel()[0]).strip() if len(view.sel()) else ""
+            if not text and len(view.sel()):
+                match = SDL_CI.search(view.substr(view.line(view.sel()[0].b)))
+                text = match.group(1) if match else ""
+            if not text:
+                view.window().show_input_panel(
+                    "CI, connection id or signal name:", "",
+                    lambda text: text.strip() and self._run_for(text.strip()), None, None)
+                return
+            self._run_for(text)
+            return
+        _with_sdl_index(view, lambda index: _show_sdl_signals(view, index, ci, signal))
+
+    def _run_for(self, text):
+        args = {"ci": int(text)} if text.isdigit() else {"signal": text}
+        self.view.run_command("cucm_sdl_signals", args)
 
-    # Agrupa por partyNDTMF
-    grouped = {}
-    for label, value in items.items():
-        key = label.split()[0]  # 'party1DTMF'
-        grouped.setdefault(key, []).append((label, value))
-
-    # ordenar keys por número de party (extraer dígito)
-    def party_key(k):
-        m = re.match(r'party(\d+)DTMF', k)
-        if m:
-            try:
-                return int(m.group(1))
-            except Exception:
-                return 9999
-        return 9999
-
-    sorted_groups = sorted(grouped.items(), key=lambda kv: party_key(kv[0]))
-
-    html = "<div style='white-space: pre; font-family: monospace;'>"
-    for group, entries in sorted_groups:
-        # crear diccionario rápido para acceder por sufijo
-        lookup = {}
-        for label, value in entries:
-            suf = " ".join(label.split()[1:]).strip()  # p.e. 'Config'
-            lookup[suf] = value
-
-        html += "\n🔹 <b>{}</b>\n".format(group)
-        for suf, display in order:
-            if suf in lookup:
-                icon = "📞" if "DTMF" in group else "🔧"
-                html += "   {} {}: {}\n".format(icon, display, lookup[suf])
-    html += "</div>"
-    return html
 
 class CucmEnumHoverListener(sublime_plugin.EventListener):
     def on_hover(self, view, point, hover_zone):
@@ -611,101 +365,464 @@ class CucmEnumHoverListener(sublime_plugin.EventListener):
                 return
 
             line_region = view.line(point)
-            line_text = view.substr(line_region)
-            rel_point = point - line_region.begin()
-
-            q850_matches = find_q850_in_line(line_text)
-            for match in q850_matches:
-                if match["start"] <= rel_point < match["end"]:
-                    html = format_q850_popup(match["code"])
-                    view.show_popup(
-                        html,
-                        flags=sublime.HIDE_ON_MOUSE_MOVE_AWAY,
-                        location=point,
-                        max_width=700,
-                    )
-                    sublime.status_message("CUCM Q.850: información mostrada")
+            line_begin = line_region.begin()
+            index = _view_decode_index(view)
+            if index is not None:
+                spans = index.at(point, line_begin)
+                if not spans:
                     return
-
-            ip_hit = find_hex_ip_at_point(line_text, rel_point)
-            if ip_hit:
-                html = format_hex_ip_popup(ip_hit)
+                line_text = view.substr(line_region)
+            else:
+                # Index still building: scan just this line, with any hex
+                # dump it is part of.
+                line_text = view.substr(line_region)
+                lines = _hex_block_lines(view, line_region)
+                text = view.substr(lines)
+                if text.endswith("\n"):
+                    text = text[:-1]
+                spans = DecodeIndex(decode_spans(text, lines.begin())).at(point, line_begin)
+
+            popup = hover_popup(spans, line_text, line_begin, _decode_cache)
+            if popup:
+                html, max_width, status = popup
                 view.show_popup(
                     html,
                     flags=sublime.HIDE_ON_MOUSE_MOVE_AWAY,
                     location=point,
-                    max_width=600,
+                    max_width=max_width,
                 )
-                sublime.status_message("CUCM HEX IP: información mostrada")
-                return
+                sublime.status_message(status)
+        except Exception as e:
+            _debug(">>> on_hover exception: {}".format(e))
+            sublime.status_message("CUCM DTMF: excepción (ver consola)")
 
-            hex_blob = find_hex_blob_at_point(line_text, rel_point)
-            if (not hex_blob) and ("IsdnMsgData" in line_text):
-                hex_blob = find_first_hex_blob_in_line(line_text)
-            if hex_blob:
-                decoded = decode_h323_q931_hex(hex_blob["bytes"])
-                if decoded and decoded["protocol_discriminator"] == 0x08:
-                    html = format_h323_popup(decoded, hex_blob["bytes"])
-                    view.show_popup(
-                        html,
-                        flags=sublime.HIDE_ON_MOUSE_MOVE_AWAY,
-                        location=point,
-                        max_width=760,
-                    )
-                    sublime.status_message("CUCM H.323 HEX: información mostrada")
-                    return
+    def on_load(self, view):
+        if view.settings().get("is_widget"):
+            return
+        if view.size() >= TIME_INDEX_PREBUILD_CHARS:
+            _with_time_index(view, lambda index: None)
+        if _is_sdl_trace(view):
+            _with_sdl_index(view, lambda index: None)
+
+    def on_close(self, view):
+        _decode_indexes.pop(view.buffer_id(), None)
+        _time_indexes.pop(view.buffer_id(), None)
+        _sdl_indexes.pop(view.buffer_id(), None)
+
+
+class CucmDecodeCacheStatsCommand(sublime_plugin.WindowCommand):
+    """Show hover decode cache hits/misses (per kind as hits/misses); clear=True empties it."""
+
+    def run(self, clear=False):
+        summary = _decode_cache.summary()
+        print("CUCM decode cache: " + summary)
+        sublime.status_message("CUCM decode cache: " + summary)
+        if clear:
+            _decode_cache.clear()
+
+
+class CucmDecodeAllCommand(sublime_plugin.WindowCommand):
+    """
+    Decode every Q.850, H.323/Q.931, IE, hex IP and DTMF item in a trace
+    file or folder into a CSV (or JSON) table next to it, then open it.
+    Runs on threads; decode_report.py does the same from a shell with
+    worker processes.
+    """
+
+    def run(self, path=None, json=False, failures=False):
+        if path is None:
+            view = self.window.active_view()
+            default = (view.file_name() if view else None) or (self.window.folders() or [""])[0]
+            self.window.show_input_panel(
+                "Trace file or folder to decode:", default,
+                lambda text: text.strip() and self.window.run_command(
+                    "cucm_decode_all", {"path": text.strip(), "json": json, "failures": failures}),
+                None, None)
+            return
+        if not os.path.exists(path):
+            sublime.status_message("CUCM Decode All: no such file or folder: {}".format(path))
+            return
+        suffix = ".json" if json else ".csv"
+        if os.path.isdir(path):
+            output = os.path.join(path, "cucm_decoded" + suffix)
+        else:
+            output = path + ".decoded" + suffix
+        thread = threading.Thread(target=self._run, args=(path, output, json, failures))
+        thread.daemon = True
+        thread.start()
 
-            ie_blob = find_iedata_hex_blob_at_point(line_text, rel_point)
-            if ie_blob:
-                ie_name_match = re.search(r'\bIe\s*-\s*([^\-]+?)\s*--', line_text)
-                ie_name = ie_name_match.group(1).strip() if ie_name_match else None
-                ie_decoded = decode_q931_ie_hex(ie_blob["bytes"])
-                if ie_decoded:
-                    html = format_q931_ie_popup(ie_decoded, ie_blob["bytes"], ie_name)
-                    view.show_popup(
-                        html,
-                        flags=sublime.HIDE_ON_MOUSE_MOVE_AWAY,
-                        location=point,
-                        max_width=760,
-                    )
-                    sublime.status_message("CUCM Q.931 IE: información mostrada")
-                    return
+    def _run(self, path, output, as_json, failures):
+        started = time.time()
+        done = [0]
 
-            # localizar regiones DTMF balanceadas dentro de la línea
-            dtmf_regions = []
-            for m in re.finditer(r'party\d+DTMF\(', line_text):
-                rel_start = m.start()
-                idx = m.end()
-                depth = 1
-                while idx < len(line_text) and depth > 0:
-                    ch = line_text[idx]
-                    if ch == '(':
-                        depth += 1
-                    elif ch == ')':
-                        depth -= 1
-                    idx += 1
-                if depth == 0:
-                    dtmf_regions.append((rel_start, idx))
-
-            inside = False
-            for s, e in dtmf_regions:
-                if s <= rel_point < e:
-                    inside = True
-                    break
+        def progress(name, rows, error):
+            done[0] += 1
+            sublime.status_message("CUCM Decode All: {} files done, {}".format(
+                done[0], os.path.basename(name)))
+
+        try:
+            with open(output, "w", encoding="utf-8", newline="") as out:
+                files, rows, errors = decode_report(
+                    path, out, as_json, failures, processes=False, progress=progress)
+        except Exception:
+            traceback.print_exc()
+            sublime.set_timeout(
+                lambda: sublime.status_message("CUCM Decode All: failed; see the console."), 0)
+            return
+        for rel_path, error in errors:
+            print("CUCM Decode All: {}: {}".format(rel_path, error))
+        message = "CUCM Decode All: {} rows from {} files in {:.1f} s{}".format(
+            rows, files, time.time() - started,
+            ", {} failed (see console)".format(len(errors)) if errors else "")
+
+        def show():
+            self.window.open_file(output)
+            sublime.status_message(message)
+        sublime.set_timeout(show, 0)
+
+
+def _show_cause_stats(window, sort):
+    path, stats, seconds = _cause_stats[window.id()]
+    lines = [
+        "Q.850 causes in {}".format(path),
+        "{} causes in {} files, {:.1f} s; sorted by {} (\"Sort Cause Statistics\" to change)".format(
+            stats.total, len(stats.files), seconds, sort),
+        "",
+        format_report(stats, sort),
+    ]
+    lines.extend("error: {}: {}".format(rel_path, error) for rel_path, error in stats.errors)
+    panel = window.create_output_panel(CAUSE_STATS_PANEL)
+    panel.run_command("append", {"characters": "\n".join(lines) + "\n"})
+    window.run_command("show_panel", {"panel": "output.{}".format(CAUSE_STATS_PANEL)})
+
+
+class CucmCauseStatsCommand(sublime_plugin.WindowCommand):
+    """
+    Count the Q.850 causes in a trace file or folder per cause, node, file
+    and minute, and show the tables in a panel. Threads, as for Decode All;
+    cause_stats.py does the same from a shell with worker processes.
+    """
+
+    def run(self, path=None, sort="count"):
+        if path is None:
+            view = self.window.active_view()
+            default = (self.window.folders() or [""])[0] or (view.file_name() if view else None) or ""
+            self.window.show_input_panel(
+                "Trace file or folder for cause statistics:", default,
+                lambda text: text.strip() and self.window.run_command(
+                    "cucm_cause_stats", {"path": text.strip(), "sort": sort}),
+                None, None)
+            return
+        if not os.path.exists(path):
+            sublime.status_message("CUCM Cause Statistics: no such file or folder: {}".format(path))
+            return
+        thread = threading.Thread(target=self._run, args=(path, sort))
+        thread.daemon = True
+        thread.start()
+
+    def _run(self, path, sort):
+        started = time.time()
+        done = [0]
+
+        def progress(name, error):
+            done[0] += 1
+            sublime.status_message("CUCM Cause Statistics: {} files done, {}".format(
+                done[0], os.path.basename(name)))
+
+        try:
+            stats = cause_stats(path, processes=False, progress=progress)
+        except Exception:
+            traceback.print_exc()
+            sublime.set_timeout(
+                lambda: sublime.status_message("CUCM Cause Statistics: failed; see the console."), 0)
+            return
+
+        def show():
+            _cause_stats[self.window.id()] = (path, stats, time.time() - started)
+            _show_cause_stats(self.window, sort)
+        sublime.set_timeout(show, 0)
+
+
+class CucmCauseStatsSortCommand(sublime_plugin.WindowCommand):
+    """Re-sort the last cause statistics of this window without scanning again."""
+
+    def run(self, sort=None):
+        if sort is None:
+            self.window.show_quick_panel(
+                ["Sort by {}".format(key) for key in SORT_KEYS],
+                lambda index: index >= 0 and self.window.run_command(
+                    "cucm_cause_stats_sort", {"sort": SORT_KEYS[index]}))
+            return
+        _show_cause_stats(self.window, sort)
 
-            if not inside:
+    def is_enabled(self, sort=None):
+        return self.window.id() in _cause_stats
+
+
+def _call_id_at_caret(view):
+    """The selected text, or the Call-ID of the header line under the caret."""
+    if view is None or not len(view.sel()):
+        return None
+    region = view.sel()[0]
+    if not region.empty():
+        return view.substr(region).strip() or None
+    match = SIP_CALL_ID_LINE.match(view.substr(view.line(region.b)))
+    return match.group(1) if match else None
+
+
+def _show_sip_ladder(window, index, call_id):
+    view = window.new_file()
+    view.set_name("SIP {}".format(call_id))
+    view.set_scratch(True)
+    # Double-click a row to open the message in its trace.
+    view.settings().set("result_file_regex", r"@ (.+):(\d+)$")
+    view.settings().set("result_base_dir", index.root)
+    view.run_command("append", {"characters": format_ladder(index, call_id)})
+    view.set_read_only(True)
+
+
+class CucmSipLadderCommand(sublime_plugin.WindowCommand):
+    """
+    Index the SIP messages of a trace file or folder by Call-ID and open
+    the ladder of one call in a new view: the Call-ID under the caret, or
+    one picked from the calls found. The index of the window is kept, so
+    later ladders open without reading the traces again; rebuild=True (or
+    a new path) indexes again, reading only files that changed.
+    sip_index.py does the same from a shell with worker processes.
+    """
+
+    def run(self, path=None, call_id=None, rebuild=False):
+        if call_id is None:
+            call_id = _call_id_at_caret(self.window.active_view())
+        index = _sip_indexes.get(self.window.id())
+        if path is None and index is not None and not rebuild:
+            self._pick(index, call_id)
+            return
+        if path is None:
+            view = self.window.active_view()
+            default = (index.root if index is not None else None) or (self.window.folders() or [""])[0] \
+                or (view.file_name() if view else None) or ""
+            self.window.show_input_panel(
+                "Trace file or folder to index SIP messages of:", default,
+                lambda text: text.strip() and self.window.run_command(
+                    "cucm_sip_ladder", {"path": text.strip(), "call_id": call_id}),
+                None, None)
+            return
+        if not os.path.exists(path):
+            sublime.status_message("CUCM SIP Ladder: no such file or folder: {}".format(path))
+            return
+        thread = threading.Thread(target=self._run, args=(path, call_id))
+        thread.daemon = True
+        thread.start()
+
+    def _run(self, path, call_id):
+        started = time.time()
+        done = [0]
+
+        def progress(name, error):
+            done[0] += 1
+            sublime.status_message("CUCM SIP Ladder: {} files indexed, {}".format(
+                done[0], os.path.basename(name)))
+
+        try:
+            index = build_sip_index(path, processes=False, cache=_sip_cache, progress=progress)
+        except Exception:
+            traceback.print_exc()
+            sublime.set_timeout(
+                lambda: sublime.status_message("CUCM SIP Ladder: indexing failed; see the console."), 0)
+            return
+        for rel_path, error in index.errors:
+            print("CUCM SIP Ladder: {}: {}".format(rel_path, error))
+        message = "CUCM SIP Ladder: {} messages, {} calls in {} files, {:.1f} s".format(
+            index.total, len(index.calls), len(index.files), time.time() - started)
+
+        def show():
+            _sip_indexes[self.window.id()] = index
+            sublime.status_message(message)
+            self._pick(index, call_id)
+        sublime.set_timeout(show, 0)
+
+    def _pick(self, index, call_id):
+        if call_id in index.calls:
+            _show_sip_ladder(self.window, index, call_id)
+            return
+        rows = index.call_rows()
+        if not rows:
+            sublime.status_message("CUCM SIP Ladder: no SIP messages in {}".format(index.root))
+            return
+        self.window.show_quick_panel(
+            [[row[0], "{} messages, {} - {}: {}".format(row[1], row[3], row[4], row[5])] for row in rows],
+            lambda i: i >= 0 and _show_sip_ladder(self.window, index, rows[i][0]))
+
+
+def _show_media_table(window, table, call_ids):
+    view = window.new_file()
+    view.set_name("SDP {}".format(call_ids[0] if len(call_ids) == 1 else "media"))
+    view.set_scratch(True)
+    # Double-click a row to open the SDP in its trace.
+    view.settings().set("result_file_regex", r"@ (.+):(\d+)$")
+    view.settings().set("result_base_dir", table.root)
+    view.run_command("append", {"characters": format_media_report(table, call_ids)})
+    view.set_read_only(True)
+
+
+class CucmSdpMediaCommand(sublime_plugin.WindowCommand):
+    """
+    Extract the SDP offers and answers of every call in a trace file or
+    folder, with codecs, ptime, direction and media addresses and the hex
+    IPs of SDL signals, and open the media table of one call (the Call-ID
+    under the caret, or one picked) or of all of them in a new view. The
+    table of the window is kept; rebuild=True (or a new path) scans again.
+    sdp_media.py does the same from a shell with worker processes.
+    """
+
+    def run(self, path=None, call_id=None, rebuild=False):
+        if call_id is None:
+            call_id = _call_id_at_caret(self.window.active_view())
+        table = _media_tables.get(self.window.id())
+        if path is None and table is not None and not rebuild:
+            self._pick(table, call_id)
+            return
+        if path is None:
+            view = self.window.active_view()
+            default = (table.root if table is not None else None) or (self.window.folders() or [""])[0] \
+                or (view.file_name() if view else None) or ""
+            self.window.show_input_panel(
+                "Trace file or folder to extract SDP media of:", default,
+                lambda text: text.strip() and self.window.run_command(
+                    "cucm_sdp_media", {"path": text.strip(), "call_id": call_id}),
+                None, None)
+            return
+        if not os.path.exists(path):
+            sublime.status_message("CUCM SDP Media: no such file or folder: {}".format(path))
+            return
+        thread = threading.Thread(target=self._run, args=(path, call_id))
+        thread.daemon = True
+        thread.start()
+
+    def _run(self, path, call_id):
+        started = time.time()
+        done = [0]
+
+        def progress(name, error):
+            done[0] += 1
+            sublime.status_message("CUCM SDP Media: {} files scanned, {}".format(
+                done[0], os.path.basename(name)))
+
+        try:
+            table = build_media_table(path, processes=False, progress=progress)
+        except Exception:
+            traceback.print_exc()
+            sublime.set_timeout(
+                lambda: sublime.status_message("CUCM SDP Media: scan failed; see the console."), 0)
+            return
+        for rel_path, error in table.errors:
+            print("CUCM SDP Media: {}: {}".format(rel_path, error))
+        message = "CUCM SDP Media: {} SDP bodies, {} calls in {} files, {:.1f} s".format(
+            table.total, len(table.calls), len(table.files), time.time() - started)
+
+        def show():
+            _media_tables[self.window.id()] = table
+            sublime.status_message(message)
+            self._pick(table, call_id)
+        sublime.set_timeout(show, 0)
+
+    def _pick(self, table, call_id):
+        if call_id in table.calls:
+            _show_media_table(self.window, table, [call_id])
+            return
+        rows = table.call_rows()
+        if not rows:
+            sublime.status_message("CUCM SDP Media: no SDP or hex IPs in {}".format(table.root))
+            return
+        items = [["All calls", "{} calls".format(len(rows))]]
+        items.extend([row[0], "{} SDP, {} hex IPs, {} - {}: {}".format(row[1], row[2], row[4], row[5], row[6])]
+                     for row in rows)
+        self.window.show_quick_panel(
+            items,
+            lambda i: i >= 0 and _show_media_table(
+                self.window, table, [row[0] for row in rows] if i == 0 else [rows[i - 1][0]]))
+
+
+class CucmMergeTracesCommand(sublime_plugin.WindowCommand):
+    """
+    Merge the rotated traces of every node under a folder into one file in
+    time order, each line prefixed with its node and file, and open it.
+    The rotation set to merge (or all) is picked from those found; see
+    trace_merge. The file is written next to the folder, not in it.
+    """
+
+    def run(self, path=None, sets=None):
+        if path is None:
+            default = (self.window.folders() or [""])[0]
+            self.window.show_input_panel(
+                "Folder of traces to merge:", default,
+                lambda text: text.strip() and self.window.run_command(
+                    "cucm_merge_traces", {"path": text.strip(), "sets": sets}),
+                None, None)
+            return
+        if not os.path.isdir(path):
+            sublime.status_message("CUCM Merge Traces: no such folder: {}".format(path))
+            return
+        if sets is None:
+            found = trace_sets(path)
+            if not found:
+                sublime.status_message("CUCM Merge Traces: no traces in {}".format(path))
                 return
+            names = list(found)
+            items = [["All sets", "{} sets".format(len(names))]]
+            items.extend([name, "{} nodes, {} files".format(
+                len(nodes), sum(len(paths) for paths in nodes.values()))]
+                for name, nodes in found.items())
+            self.window.show_quick_panel(
+                items,
+                lambda i: i >= 0 and self.window.run_command(
+                    "cucm_merge_traces", {"path": path, "sets": names if i == 0 else [names[i - 1]]}))
+            return
+        root = os.path.normpath(path)
+        suffix = "_merged_{}.txt".format(sets[0]) if len(sets) == 1 else "_merged.txt"
+        thread = threading.Thread(target=self._run, args=(root, root + suffix, sets))
+        thread.daemon = True
+        thread.start()
+
+    def _run(self, root, output, sets):
+        started = time.time()
+
+        def progress(lines):
+            sublime.status_message("CUCM Merge Traces: {} lines".format(lines))
 
-            explanation_dict = parse_dtmf_block(line_text) or {}
-            if explanation_dict:
-                html = format_popup(explanation_dict)
-                view.show_popup(
-                    html,
-                    flags=sublime.HIDE_ON_MOUSE_MOVE_AWAY,
-                    location=point,
-                    max_width=600
-                )
-                sublime.status_message("CUCM DTMF: información mostrada")
-        except Exception as e:
-            _debug(">>> on_hover exception: {}".format(e))
-            sublime.status_message("CUCM DTMF: excepción (ver consola)")
+        try:
+            with open(output, "w", encoding="utf-8", newline="") as out:
+                files, lines = merge_traces(root, out, sets, progress=progress)
+        except Exception:
+            traceback.print_exc()
+            sublime.set_timeout(
+                lambda: sublime.status_message("CUCM Merge Traces: failed; see the console."), 0)
+            return
+        message = "CUCM Merge Traces: {} lines from {} files in {:.1f} s".format(
+            lines, files, time.time() - started)
+
+        def show():
+            self.window.open_file(output)
+            sublime.status_message(message)
+        sublime.set_timeout(show, 0)
+
+
+if hasattr(sublime_plugin, "TextChangeListener"):
+    class CucmDecodeIndexChangeListener(sublime_plugin.TextChangeListener):
+        @classmethod
+        def is_applicable(cls, buffer):
+            return True
+
+        def on_text_changed(self, changes):
+            view = self.buffer.primary_view()
+            if view is None:
+                return
+            if len(changes) != 1:
+                entry = _decode_indexes.get(self.buffer.id())
+                if entry is not None:
+                    entry["index"] = None
+                return
+            change = changes[0]
+            begin = change.a.pt
+            _update_decode_index(view, begin, change.b.pt, begin + len(change.str))
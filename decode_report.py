@@ -0,0 +1,200 @@
+"""
+Run the CUCM decoders over every line of a trace file, or of every trace
+under a folder, and write one row per decoded item: file, line, timestamp,
+decoder, Q.850 cause and the decoded fields.
+
+Used by the "Decode All" command and runnable on its own, with one worker
+process per core:
+
+    python decode_report.py BUNDLE -o calls.csv
+    python decode_report.py sdl001_100_000123.txt --json --failures -o failures.json
+
+Files are read in chunks and each worker spools its rows to a temporary
+file that is copied into the output as soon as the files before it are
+done, so memory does not grow with the size of the traces. Nothing in
+here imports ``sublime``.
+"""
+import argparse
+import csv
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+try:
+    from .cucm_decoders import DECODERS, DecodeCache, decode_spans
+    from .trace_scan import TRACE_FILE_PATTERNS, iter_file_chunks, iter_trace_files, line_timestamp, open_trace, run_pool
+except ImportError:
+    from cucm_decoders import DECODERS, DecodeCache, decode_spans
+    from trace_scan import TRACE_FILE_PATTERNS, iter_file_chunks, iter_trace_files, line_timestamp, open_trace, run_pool
+
+COLUMNS = ("file", "line", "timestamp", "decoder", "cause", "fields")
+# Causes that are a normal end of call, left out by --failures.
+NORMAL_CAUSES = (16,)
+FIELDS_CACHE_MAX_ENTRIES = 4096
+
+
+def iter_decoded(path, names=None):
+    """
+    Yield ``(line_no, timestamp, decoder, fields)`` for every item decoded
+    in ``path``, or only by the decoders named in ``names``.
+
+    An item decoded twice on one line (an IsdnMsgData line's blob found as
+    both the line and the blob) is yielded once, and one spanning several
+    lines (a wrapped hex dump) on its first line. Hex blobs that are not
+    Q.931 PDUs are left out.
+    """
+    cache = DecodeCache(FIELDS_CACHE_MAX_ENTRIES)
+    line_no = 1
+    with open_trace(path) as handle:
+        for _, text in iter_file_chunks(handle):
+            pos = 0
+            seen = set()
+            for begin, end, kind, sub in decode_spans(text, names=names):
+                count = text.count("\n", pos, begin)
+                if count:
+                    line_no += count
+                    seen = set()
+                pos = begin
+                line_begin = text.rfind("\n", 0, begin) + 1
+                line_end = text.find("\n", begin)
+                line_text = text[line_begin:] if line_end < 0 else text[line_begin:line_end]
+                decoder = DECODERS[kind]
+                if decoder.multiline and sub[0]:
+                    continue
+                key = decoder.cache_key(line_text, begin - line_begin, end - line_begin, sub)
+                if key is None or key in seen:
+                    continue
+                seen.add(key)
+                fields = cache.get(key, decoder.fields)
+                if fields:
+                    yield line_no, line_timestamp(text, begin), decoder, fields
+            line_no += text.count("\n", pos)
+
+
+def decode_file(path, spool_path, failures_only=False):
+    """
+    Decode every line of ``path`` and write the rows, one JSON list per
+    line, to ``spool_path``. Returns ``(path, spool_path, rows)``.
+    """
+    rows = 0
+    with open(spool_path, "w", encoding="utf-8") as spool:
+        for line_no, timestamp, decoder, fields in iter_decoded(path):
+            cause = fields.get("cause")
+            if failures_only and (cause is None or cause in NORMAL_CAUSES):
+                continue
+            row = [line_no, timestamp or "", decoder.group or decoder.name,
+                   "" if cause is None else cause, fields]
+            spool.write(json.dumps(row) + "\n")
+            rows += 1
+    return path, spool_path, rows
+
+
+def _fields_text(fields):
+    return "; ".join("{}={}".format(name, value) for name, value in sorted(fields.items()))
+
+
+class RowWriter(object):
+    """Rows as CSV, or as one JSON array streamed an object at a time."""
+
+    def __init__(self, out, as_json=False):
+        self.out = out
+        self.as_json = as_json
+        self.rows = 0
+        if as_json:
+            out.write("[")
+        else:
+            self._csv = csv.writer(out, lineterminator="\n")
+            self._csv.writerow(COLUMNS)
+
+    def write(self, file_label, row):
+        line_no, timestamp, decoder, cause, fields = row
+        if self.as_json:
+            item = dict(zip(COLUMNS, (file_label, line_no, timestamp, decoder,
+                                      None if cause == "" else cause, fields)))
+            self.out.write(("\n" if not self.rows else ",\n") + json.dumps(item, sort_keys=True))
+        else:
+            self._csv.writerow((file_label, line_no, timestamp, decoder, cause, _fields_text(fields)))
+        self.rows += 1
+
+    def close(self):
+        if self.as_json:
+            self.out.write("\n]\n")
+
+
+def decode_report(path, out, as_json=False, failures_only=False,
+                  file_patterns=TRACE_FILE_PATTERNS, workers=None, processes=True,
+                  progress=None):
+    """
+    Decode ``path`` (a file, or every matching file under a folder) into
+    ``out``, files in path order. ``progress(file, rows, error)`` is called
+    as each file finishes. Returns ``(files, rows, errors)``.
+    """
+    if os.path.isfile(path):
+        root = os.path.dirname(path)
+        files = [path]
+    else:
+        root = path
+        files = list(iter_trace_files(path, file_patterns))
+
+    writer = RowWriter(out, as_json)
+    errors = []
+    spool_dir = tempfile.mkdtemp(prefix="cucm_decode_")
+    try:
+        jobs = [(name, os.path.join(spool_dir, "%d.jsonl" % i), failures_only)
+                for i, name in enumerate(files)]
+        order = dict((job[0], i) for i, job in enumerate(jobs))
+        finished = {}
+        next_index = 0
+        for job, result, error in run_pool(decode_file, jobs, workers, processes):
+            finished[order[job[0]]] = error
+            if error is not None:
+                errors.append((os.path.relpath(job[0], root), error))
+            if progress is not None:
+                progress(job[0], result[2] if result else 0, error)
+            # Copy spooled rows out in file order as soon as they are next.
+            while next_index in finished:
+                name, spool_path, _ = jobs[next_index]
+                if finished.pop(next_index) is None:
+                    label = os.path.relpath(name, root)
+                    with open(spool_path, encoding="utf-8") as spool:
+                        for line in spool:
+                            writer.write(label, json.loads(line))
+                    os.remove(spool_path)
+                next_index += 1
+    finally:
+        writer.close()
+        shutil.rmtree(spool_dir, ignore_errors=True)
+    return len(files), writer.rows, errors
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("path", help="trace file or folder (an extracted bundle)")
+    parser.add_argument("-o", "--output", help="output file (default: stdout)")
+    parser.add_argument("--json", action="store_true", help="JSON array instead of CSV")
+    parser.add_argument("--failures", action="store_true",
+                        help="only rows with a Q.850 cause other than normal clearing")
+    parser.add_argument("--files", nargs="+", default=list(TRACE_FILE_PATTERNS),
+                        help="file name patterns for folders (default: %(default)s)")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.path):
+        parser.error("no such file or folder: %s" % args.path)
+    out = open(args.output, "w", encoding="utf-8", newline="") if args.output else sys.stdout
+    try:
+        files, rows, errors = decode_report(
+            args.path, out, args.json, args.failures, args.files, args.workers, processes=True)
+    finally:
+        if args.output:
+            out.close()
+    for rel_path, error in errors:
+        sys.stderr.write("error: %s: %s\n" % (rel_path, error))
+    sys.stderr.write("%d rows from %d files\n" % (rows, files))
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
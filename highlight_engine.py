@@ -0,0 +1,373 @@
+"""
+Sublime-independent matching core for the highlighter.
+
+Stored highlight tokens are matched in a single pass over a buffer (or a
+file on disk) for all styles instead of once per token: literal tokens
+through literal_matcher, the rest through one alternation of lookaheads.
+Hits are those of a find_all per token. Nothing in here imports
+``sublime``; callers pass a ``read`` callable returning text for a
+``(begin, end)`` character range.
+"""
+import bisect
+import hashlib
+import heapq
+import json
+import os
+import re
+from array import array
+from collections import OrderedDict
+
+try:
+    from .literal_matcher import LiteralMatcher, all_literal, literal_of
+except ImportError:
+    from literal_matcher import LiteralMatcher, all_literal, literal_of
+
+# Characters read per scan step. Chunks are cut back to the last newline so
+# a token never straddles two chunks.
+CHUNK_SIZE = 4 * 1024 * 1024
+
+# Non-literal tokens per alternation tried at an offset where one matches.
+PATTERN_BLOCK = 32
+
+# Bytes hashed from each end of a file for its content fingerprint.
+FINGERPRINT_BYTES = 64 * 1024
+
+
+class TaggedMatcher(object):
+    """
+    Every stored token matched in one pass, with the hits a ``find_all``
+    per token gives: each token leftmost first and never overlapping its
+    own earlier matches, but independent of the other tokens, so one that
+    is a prefix of, inside or overlapping another keeps its hits.
+
+    Literal tokens go through literal_matcher. The rest are found through
+    one compiled alternation of lookaheads, ``(?=(?:a)|(?:b)|...)``, which
+    stops at every offset where any of them matches without consuming
+    text; only there is each token matched on its own, to get its span.
+    The alternation has no groups of its own: sre saves every group mark
+    on each branch attempt, which makes a few hundred named alternatives
+    orders of magnitude slower than the same alternation without groups.
+
+    Patterns Python's ``re`` cannot compile (syntax only Sublime understands)
+    are kept in ``rejected`` so the caller can fall back to its per-pattern
+    search for just those.
+    """
+
+    def __init__(self, style_patterns):
+        self.rejected = []
+        self.regex = None
+        self._literal = None
+        self._patterns = []
+        self._blocks = []
+
+        owners = OrderedDict()
+        for style in sorted(style_patterns):
+            for pattern in style_patterns[style]:
+                if not pattern:
+                    continue
+                styles = owners.setdefault(pattern, [])
+                if style not in styles:
+                    styles.append(style)
+
+        literals = {}
+        alternatives = []
+        for pattern, styles in owners.items():
+            if literal_of(pattern) is not None:
+                for style in styles:
+                    literals.setdefault(style, []).append(pattern)
+                continue
+            try:
+                compiled = re.compile(pattern)
+            except (re.error, OverflowError):
+                self.rejected.extend((style, pattern) for style in styles)
+                continue
+            self._patterns.append((compiled, tuple(styles)))
+            alternatives.append('(?:%s)' % pattern)
+
+        if literals:
+            self._literal = LiteralMatcher(literals)
+        if alternatives:
+            try:
+                self.regex = re.compile('(?=%s)' % '|'.join(alternatives))
+                # Where a token matches, blocks of tokens are tried together
+                # first, so only the tokens of blocks that match are tried
+                # one by one.
+                self._blocks = [
+                    (re.compile('|'.join(alternatives[i:i + PATTERN_BLOCK])),
+                     range(i, min(i + PATTERN_BLOCK, len(alternatives))))
+                    for i in range(0, len(alternatives), PATTERN_BLOCK)]
+            except (re.error, OverflowError, AssertionError):
+                # Inline flags or group names clashing between tokens; keep
+                # the engine usable by handing those to the fallback.
+                self.rejected.extend(
+                    (style, compiled.pattern) for compiled, styles in self._patterns for style in styles)
+                self.regex = None
+                self._patterns = []
+
+    def __bool__(self):
+        return self.regex is not None or self._literal is not None
+
+    __nonzero__ = __bool__
+
+    def _pattern_hits(self, text):
+        # (begin, style, end) in order of begin for the non-literal tokens.
+        patterns = self._patterns
+        ends = [0] * len(patterns)  # per token: where its last match ended
+        blocks = self._blocks
+        for m in self.regex.finditer(text):
+            begin = m.start()
+            for block, indices in blocks:
+                if len(blocks) > 1 and block.match(text, begin) is None:
+                    continue
+                for i in indices:
+                    if begin < ends[i]:
+                        continue
+                    compiled, styles = patterns[i]
+                    found = compiled.match(text, begin)
+                    if found is None or found.end() == begin:
+                        continue
+                    ends[i] = end = found.end()
+                    for style in styles:
+                        yield begin, style, end
+
+    def scan(self, text, offset=0):
+        """Yield ``(style, begin, end)`` for every match in ``text``, in order of ``begin``."""
+        sources = []
+        if self._literal is not None:
+            sources.append((begin, style, end) for style, begin, end in self._literal.scan(text))
+        if self.regex is not None:
+            sources.append(self._pattern_hits(text))
+        last = None
+        seen = set()
+        for begin, style, end in heapq.merge(*sources):
+            if begin != last:
+                last = begin
+                seen.clear()
+            if (style, end) not in seen:
+                seen.add((style, end))
+                yield style, offset + begin, offset + end
+
+
+def build_matcher(style_patterns):
+    """LiteralMatcher when every token is a literal, else TaggedMatcher."""
+    if all_literal(style_patterns):
+        return LiteralMatcher(style_patterns)
+    return TaggedMatcher(style_patterns)
+
+
+def iter_chunks(read, begin, end, chunk_size=CHUNK_SIZE):
+    """
+    Yield ``(offset, text)`` pieces of ``[begin, end)`` no longer than
+    ``chunk_size``, each ending on a line boundary where possible.
+    """
+    pos = begin
+    while pos < end:
+        stop = min(end, pos + chunk_size)
+        text = read(pos, stop)
+        if not text:
+            return
+        if stop < end:
+            cut = text.rfind('\n')
+            if cut >= 0:
+                text = text[:cut + 1]
+        yield pos, text
+        pos += len(text)
+
+
+def scan_styles(read, style_patterns, begin, end, chunk_size=CHUNK_SIZE):
+    """
+    Single pass over ``[begin, end)`` for all styles.
+
+    Returns ``(hits, rejected)`` where ``hits`` maps style index to a list of
+    ``(begin, end)`` tuples in buffer order.
+    """
+    matcher = build_matcher(style_patterns)
+    hits = dict((style, []) for style in style_patterns)
+    if matcher:
+        for offset, text in iter_chunks(read, begin, end, chunk_size):
+            for style, a, b in matcher.scan(text, offset):
+                hits[style].append((a, b))
+    return hits, matcher.rejected
+
+
+def token_signature(style_patterns):
+    """Stable hash of a ``{style: [pattern, ...]}`` token set."""
+    items = sorted(
+        (int(style), pattern)
+        for style, patterns in style_patterns.items()
+        for pattern in set(patterns)
+    )
+    return hashlib.sha1(json.dumps(items).encode('utf-8')).hexdigest()
+
+
+def file_identity(path):
+    """
+    ``(path, size, mtime, fingerprint)`` for a file on disk, or None.
+
+    The fingerprint hashes the first and last FINGERPRINT_BYTES so a file
+    rewritten within the mtime resolution still gets a new identity.
+    """
+    try:
+        real = os.path.normcase(os.path.realpath(path))
+        stat = os.stat(real)
+        digest = hashlib.sha1()
+        with open(real, 'rb') as handle:
+            digest.update(handle.read(FINGERPRINT_BYTES))
+            if stat.st_size > FINGERPRINT_BYTES:
+                handle.seek(max(FINGERPRINT_BYTES, stat.st_size - FINGERPRINT_BYTES))
+                digest.update(handle.read(FINGERPRINT_BYTES))
+    except (IOError, OSError):
+        return None
+    return (real, stat.st_size, stat.st_mtime, digest.hexdigest())
+
+
+class MatchCache(object):
+    """
+    Match offsets per style for files whose identity and token set are
+    unchanged since they were last scanned.
+
+    One entry per path; a new identity or token signature replaces it.
+    Offsets are packed into ``array('q')`` pairs. Least recently used
+    entries are evicted once either ``max_files`` or ``max_regions`` (total
+    cached matches) is exceeded.
+    """
+
+    def __init__(self, max_files, max_regions):
+        self.max_files = max_files
+        self.max_regions = max_regions
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._regions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, identity, signature):
+        """Return ``{style: [(begin, end), ...]}`` or None."""
+        entry = self._entries.get(identity[0]) if identity else None
+        if entry is None or entry[0] != identity or entry[1] != signature:
+            self.misses += 1
+            return None
+        self._entries.pop(identity[0])
+        self._entries[identity[0]] = entry
+        self.hits += 1
+        out = {}
+        for style, packed in entry[2].items():
+            out[style] = list(zip(packed[0::2], packed[1::2]))
+        return out
+
+    def put(self, identity, signature, hits):
+        if not identity:
+            return
+        self.discard(identity[0])
+        packed = {}
+        count = 0
+        for style, spans in hits.items():
+            flat = array('q')
+            for begin, end in spans:
+                flat.append(begin)
+                flat.append(end)
+            packed[style] = flat
+            count += len(spans)
+        if count > self.max_regions:
+            return
+        self._entries[identity[0]] = (identity, signature, packed, count)
+        self._regions += count
+        while self._entries and (len(self._entries) > self.max_files or self._regions > self.max_regions):
+            _, evicted = self._entries.popitem(last=False)
+            self._regions -= evicted[3]
+
+    def discard(self, path):
+        entry = self._entries.pop(path, None)
+        if entry is not None:
+            self._regions -= entry[3]
+
+    def clear(self):
+        self._entries.clear()
+        self._regions = 0
+
+
+class OffsetIndex(object):
+    """
+    Sorted, de-duplicated ``(begin, end)`` spans with binary-search lookups
+    for next/previous/nth navigation and before/after counts.
+    """
+
+    def __init__(self, spans=()):
+        self.begins = array('q')
+        self.ends = array('q')
+        self.longest = 0  # no span is longer, so edit() need not look further back
+        for begin, end in sorted(set(spans)):
+            self.begins.append(begin)
+            self.ends.append(end)
+            self.longest = max(self.longest, end - begin)
+
+    def __len__(self):
+        return len(self.begins)
+
+    def extend(self, spans):
+        """
+        Add ``spans``. When none of the spans already held starts among
+        them, as for the hits of a chunk not scanned before, they go in as
+        one block; otherwise both are merged.
+        """
+        spans = sorted(set(spans))
+        if not spans:
+            return
+        first = bisect.bisect_left(self.begins, spans[0][0])
+        if first == bisect.bisect_right(self.begins, spans[-1][0]):
+            self.begins[first:first] = array('q', [begin for begin, _ in spans])
+            self.ends[first:first] = array('q', [end for _, end in spans])
+            self.longest = max(self.longest, max(end - begin for begin, end in spans))
+            return
+        merged = OffsetIndex(list(zip(self.begins, self.ends)) + spans)
+        self.begins, self.ends, self.longest = merged.begins, merged.ends, merged.longest
+
+    def edit(self, begin, old_end, new_end):
+        """
+        Follow the text ``[begin, old_end)`` becoming ``[begin, new_end)``
+        the way Sublime moves regions: spans after it shift, a span holding
+        all of it grows or shrinks with it, and spans it cuts into go.
+        Only the spans from the edit on are rewritten.
+        """
+        delta = new_end - old_end
+        begins, ends = self.begins, self.ends
+        tail = bisect.bisect_left(begins, old_end)
+        head = bisect.bisect_left(begins, begin - self.longest)
+        kept_begins = array('q')
+        kept_ends = array('q')
+        for i in range(head, tail):
+            a, b = begins[i], ends[i]
+            if b > begin:
+                if not (a <= begin and old_end <= b) or b + delta <= a:
+                    continue
+                b += delta
+                self.longest = max(self.longest, b - a)
+            kept_begins.append(a)
+            kept_ends.append(b)
+        self.begins = begins[:head] + kept_begins + array('q', [a + delta for a in begins[tail:]])
+        self.ends = ends[:head] + kept_ends + array('q', [b + delta for b in ends[tail:]])
+
+    def span(self, index):
+        return self.begins[index], self.ends[index]
+
+    def next_after(self, pos):
+        """Index of the first span starting after ``pos``, or None."""
+        index = bisect.bisect_right(self.begins, pos)
+        return index if index < len(self.begins) else None
+
+    def prev_before(self, pos):
+        """Index of the last span starting before ``pos``, or None."""
+        index = bisect.bisect_left(self.begins, pos) - 1
+        return index if index >= 0 else None
+
+    def between(self, begin, end):
+        """``(i, j)`` such that spans ``i..j-1`` start within ``[begin, end]``."""
+        return (bisect.bisect_left(self.begins, begin),
+                bisect.bisect_right(self.begins, end))
+
+    def counts(self, pos):
+        """``(before, after)``: spans starting before and after ``pos``."""
+        return (bisect.bisect_left(self.begins, pos),
+                len(self.begins) - bisect.bisect_right(self.begins, pos))
@@ -0,0 +1,147 @@
+"""
+Wall-time and counter accounting for the highlighter.
+
+A Profiler keeps, per operation name, the number of calls and their total
+and longest wall time, both overall and per view, plus counters such as
+regions added or bytes written. Counters bumped while an operation is
+running on the same thread are also charged to that call, so the recent
+calls list shows what each restore or save actually did.
+
+The highlighter only holds a Profiler while profiling is on; with it off
+every hook is a single ``is None`` test. Nothing in here imports
+``sublime``.
+"""
+import json
+import threading
+import time
+from collections import deque
+
+RECENT_CALLS = 200
+
+
+class Profiler(object):
+
+    def __init__(self, recent=RECENT_CALLS):
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._ops = {}
+        self._counters = {}
+        self._views = {}
+        self._recent = deque(maxlen=recent)
+
+    def _stack(self):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def begin(self, name, view=None):
+        """Start timing ``name``; pass the result to end()."""
+        call = {"op": name, "view": view, "start": time.time(), "counts": {}}
+        self._stack().append(call)
+        call["clock"] = time.perf_counter()
+        return call
+
+    def end(self, call):
+        elapsed = time.perf_counter() - call.pop("clock")
+        stack = self._stack()
+        if stack and stack[-1] is call:
+            stack.pop()
+        elif call in stack:
+            stack.remove(call)
+        call["ms"] = round(elapsed * 1000.0, 3)
+        with self._lock:
+            _add_time(self._ops, call["op"], elapsed)
+            if call["view"] is not None:
+                view = self._views.setdefault(call["view"], {"ops": {}, "counters": {}})
+                _add_time(view["ops"], call["op"], elapsed)
+            self._recent.append(call)
+
+    def count(self, name, amount=1, view=None):
+        """Add ``amount`` to counter ``name``, and to the calls in progress."""
+        for call in self._stack():
+            call["counts"][name] = call["counts"].get(name, 0) + amount
+            if view is None:
+                view = call["view"]
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+            if view is not None:
+                counters = self._views.setdefault(view, {"ops": {}, "counters": {}})["counters"]
+                counters[name] = counters.get(name, 0) + amount
+
+    def summary(self):
+        """Everything recorded so far as plain, JSON-serializable data."""
+        with self._lock:
+            return {
+                "started": self.started,
+                "seconds": round(time.time() - self.started, 3),
+                "ops": _ops_summary(self._ops),
+                "counters": dict(self._counters),
+                "views": dict(
+                    (view, {"ops": _ops_summary(data["ops"]), "counters": dict(data["counters"])})
+                    for view, data in self._views.items()),
+                "recent": [dict(call) for call in self._recent],
+            }
+
+
+def _add_time(ops, name, elapsed):
+    entry = ops.get(name)
+    if entry is None:
+        entry = ops[name] = [0, 0.0, 0.0]
+    entry[0] += 1
+    entry[1] += elapsed
+    if elapsed > entry[2]:
+        entry[2] = elapsed
+
+
+def _ops_summary(ops):
+    return dict(
+        (name, {"calls": calls, "total_ms": round(total * 1000.0, 3),
+                "max_ms": round(longest * 1000.0, 3)})
+        for name, (calls, total, longest) in ops.items())
+
+
+def _op_lines(ops, indent=""):
+    lines = []
+    for name in sorted(ops, key=lambda n: -ops[n]["total_ms"]):
+        op = ops[name]
+        lines.append("%s%-24s %6d calls %10.1f ms total %9.1f ms max" % (
+            indent, name, op["calls"], op["total_ms"], op["max_ms"]))
+    return lines
+
+
+def _counter_lines(counters, indent=""):
+    return ["%s%-24s %12d" % (indent, name, counters[name]) for name in sorted(counters)]
+
+
+def format_summary(summary, views=20, recent=20):
+    """Text report of a summary(): totals, the slowest views, the latest calls."""
+    lines = ["Highlighter profile, %.1f s" % summary["seconds"], "", "Operations:"]
+    lines.extend(_op_lines(summary["ops"], "  ") or ["  (none)"])
+    lines.extend(["", "Counters:"])
+    lines.extend(_counter_lines(summary["counters"], "  ") or ["  (none)"])
+
+    by_time = sorted(
+        summary["views"].items(),
+        key=lambda item: -sum(op["total_ms"] for op in item[1]["ops"].values()))
+    if by_time:
+        lines.extend(["", "Views (slowest %d):" % min(views, len(by_time))])
+        for view, data in by_time[:views]:
+            lines.append("  %s" % view)
+            lines.extend(_op_lines(data["ops"], "    "))
+            lines.extend(_counter_lines(data["counters"], "    "))
+
+    calls = summary["recent"][-recent:]
+    if calls:
+        lines.extend(["", "Latest calls:"])
+        for call in reversed(calls):
+            counts = ", ".join("%s=%d" % item for item in sorted(call["counts"].items()))
+            lines.append("  %-24s %9.1f ms  %s%s" % (
+                call["op"], call["ms"], call["view"] or "-", "  " + counts if counts else ""))
+    return "\n".join(lines) + "\n"
+
+
+def write_summary(summary, path):
+    with open(path, "w") as handle:
+        json.dump(summary, handle, indent=1, sort_keys=True)
@@ -0,0 +1,141 @@
+"""
+Run a set of highlight tokens over a folder of traces and report, per file
+and style, the number of hits and the timestamps of the first and last.
+
+Used by the "Highlight Profile Report" command and runnable on its own
+against the highlight database, with one worker process per core:
+
+    python highlight_report.py BUNDLE --db StyleOptionsRegions.sqlite3 --profile NAME
+    python highlight_report.py BUNDLE --token 'CcRelReq' --token 'cause=41' --csv
+
+Nothing in here imports ``sublime``.
+"""
+import argparse
+import csv
+import io
+import os
+import re
+import sys
+
+try:
+    from .highlight_store import HighlightStore
+    from .trace_scan import TRACE_FILE_PATTERNS, iter_trace_files, run_pool, summarize_file
+except ImportError:
+    from highlight_store import HighlightStore
+    from trace_scan import TRACE_FILE_PATTERNS, iter_trace_files, run_pool, summarize_file
+
+STYLE_KEY = re.compile(r'(\d+)$')
+COLUMNS = ("file", "style", "hits", "first", "last")
+
+
+def profile_style_patterns(profile):
+    """``{style_key: [pattern]}`` as stored to ``{style index: [pattern]}``."""
+    out = {}
+    for style_key, patterns in profile.items():
+        match = STYLE_KEY.search(style_key)
+        if match and patterns:
+            out.setdefault(int(match.group(1)), []).extend(patterns)
+    return out
+
+
+def profile_report(root, style_patterns, file_patterns=TRACE_FILE_PATTERNS,
+                   workers=None, processes=True):
+    """
+    Summarize every trace file under ``root``. Yields
+    ``(path, summary, rejected, error)`` as files finish; see
+    trace_scan.summarize_file for ``summary``.
+    """
+    jobs = [(path, style_patterns) for path in iter_trace_files(root, file_patterns)]
+    for job, result, error in run_pool(summarize_file, jobs, workers, processes):
+        if error is not None:
+            yield job[0], None, [], error
+        else:
+            yield result[0], result[1], result[2], None
+
+
+def report_rows(root, results):
+    """
+    Table rows ``(file, style, hits, first, last)`` for styles with hits,
+    in path then style order, plus ``(errors, rejected, scanned)``.
+    """
+    rows = []
+    errors = []
+    rejected = set()
+    scanned = 0
+    for path, summary, skipped, error in results:
+        rel_path = os.path.relpath(path, root)
+        if error is not None:
+            errors.append((rel_path, error))
+            continue
+        scanned += 1
+        rejected.update(skipped)
+        for style in sorted(summary):
+            hits, first, last = summary[style]
+            if hits:
+                rows.append((rel_path, style + 1, hits, first or "", last or ""))
+    rows.sort()
+    return rows, (errors, sorted(rejected), scanned)
+
+
+def format_table(rows, columns=COLUMNS):
+    widths = [len(name) for name in columns]
+    for row in rows:
+        widths = [max(width, len(str(value))) for width, value in zip(widths, row)]
+    template = "  ".join("%%-%ds" % width for width in widths)
+    lines = [template % tuple(columns), template % tuple("-" * width for width in widths)]
+    lines.extend(template % row for row in rows)
+    return "\n".join(line.rstrip() for line in lines) + "\n"
+
+
+def format_csv(rows):
+    out = io.StringIO()
+    writer = csv.writer(out, lineterminator="\n")
+    writer.writerow(COLUMNS)
+    writer.writerows(rows)
+    return out.getvalue()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("root", help="folder to scan (an extracted bundle)")
+    parser.add_argument("--db", help="highlight database (User/StyleOptionsRegions.sqlite3)")
+    parser.add_argument("--profile", help="profile name saved in --db")
+    parser.add_argument("--token", action="append", default=[],
+                        help="regex to count as style 1; may be repeated")
+    parser.add_argument("--files", nargs="+", default=list(TRACE_FILE_PATTERNS),
+                        help="file name patterns (default: %(default)s)")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--csv", action="store_true", help="CSV instead of an aligned table")
+    args = parser.parse_args(argv)
+
+    style_patterns = {}
+    if args.profile:
+        if not args.db:
+            parser.error("--profile needs --db")
+        if not os.path.isfile(args.db):
+            parser.error("no such database: %s" % args.db)
+        store = HighlightStore(args.db)
+        try:
+            style_patterns = profile_style_patterns(store.load_profile(args.profile))
+        finally:
+            store.close()
+        if not style_patterns:
+            parser.error("no profile named %r in %s" % (args.profile, args.db))
+    if args.token:
+        style_patterns.setdefault(0, []).extend(args.token)
+    if not style_patterns:
+        parser.error("give --profile or --token")
+
+    results = profile_report(args.root, style_patterns, args.files, args.workers, processes=True)
+    rows, (errors, rejected, scanned) = report_rows(args.root, results)
+    sys.stdout.write(format_csv(rows) if args.csv else format_table(rows))
+    for rel_path, error in errors:
+        sys.stderr.write("error: %s: %s\n" % (rel_path, error))
+    for style, pattern in rejected:
+        sys.stderr.write("skipped (not a Python regex): style %d: %s\n" % (style + 1, pattern))
+    sys.stderr.write("%d files scanned\n" % scanned)
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,536 @@
+"""
+SQLite storage for saved highlight tokens.
+
+One row per (scope key, style key, pattern), so adding or touching a token
+is a single indexed upsert instead of a rewrite of the whole JSON settings
+file. Scope keys are the same strings StyleOptionsStorage has always used
+("folder::<root>", bare folders and the legacy per-file paths).
+
+Nothing in here imports ``sublime``.
+"""
+import os
+import threading
+import time
+
+try:
+    import sqlite3
+except ImportError:  # embedded Python builds without the sqlite3 module
+    sqlite3 = None
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tokens (
+    scope_key TEXT NOT NULL,
+    style_key TEXT NOT NULL,
+    pattern   TEXT NOT NULL,
+    ts        REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (scope_key, style_key, pattern)
+);
+CREATE INDEX IF NOT EXISTS tokens_by_age ON tokens (scope_key, style_key, ts);
+CREATE TABLE IF NOT EXISTS meta (
+    name  TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS profiles (
+    name      TEXT NOT NULL,
+    style_key TEXT NOT NULL,
+    pattern   TEXT NOT NULL,
+    PRIMARY KEY (name, style_key, pattern)
+);
+"""
+
+# Per-scope token and byte counts kept current by triggers, so the budget
+# check is a SUM over scopes rather than a scan of every token. A scope row
+# is created on its first token (a write counts as an access) and dropped
+# with its last one. Trigger bodies avoid OR IGNORE: the outer statement's
+# conflict policy (INSERT OR REPLACE) would override it.
+ACCOUNTING_SCHEMA = """
+CREATE TABLE IF NOT EXISTS scopes (
+    scope_key   TEXT PRIMARY KEY,
+    last_access REAL NOT NULL DEFAULT 0,
+    tokens      INTEGER NOT NULL DEFAULT 0,
+    bytes       INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS scopes_by_access ON scopes (last_access);
+
+CREATE TRIGGER IF NOT EXISTS tokens_counted_insert AFTER INSERT ON tokens BEGIN
+    INSERT INTO scopes (scope_key, last_access)
+        SELECT NEW.scope_key, (julianday('now') - 2440587.5) * 86400.0
+        WHERE NOT EXISTS (SELECT 1 FROM scopes WHERE scope_key = NEW.scope_key);
+    UPDATE scopes SET tokens = tokens + 1,
+                      bytes = bytes + length(NEW.style_key) + length(NEW.pattern)
+        WHERE scope_key = NEW.scope_key;
+END;
+
+CREATE TRIGGER IF NOT EXISTS tokens_counted_delete AFTER DELETE ON tokens BEGIN
+    UPDATE scopes SET tokens = tokens - 1,
+                      bytes = bytes - length(OLD.style_key) - length(OLD.pattern)
+        WHERE scope_key = OLD.scope_key;
+END;
+
+CREATE TRIGGER IF NOT EXISTS tokens_counted_move AFTER UPDATE OF scope_key ON tokens BEGIN
+    UPDATE scopes SET tokens = tokens - 1,
+                      bytes = bytes - length(OLD.style_key) - length(OLD.pattern)
+        WHERE scope_key = OLD.scope_key;
+    INSERT INTO scopes (scope_key, last_access)
+        SELECT NEW.scope_key, (julianday('now') - 2440587.5) * 86400.0
+        WHERE NOT EXISTS (SELECT 1 FROM scopes WHERE scope_key = NEW.scope_key);
+    UPDATE scopes SET tokens = tokens + 1,
+                      bytes = bytes + length(NEW.style_key) + length(NEW.pattern)
+        WHERE scope_key = NEW.scope_key;
+END;
+
+CREATE TRIGGER IF NOT EXISTS scopes_drop_empty AFTER UPDATE OF tokens ON scopes
+WHEN NEW.tokens <= 0 BEGIN
+    DELETE FROM scopes WHERE scope_key = NEW.scope_key;
+END;
+"""
+
+MIGRATED_FLAG = "migrated_settings_store"
+ACCOUNTING_FLAG = "scope_accounting"
+
+
+def available():
+    return sqlite3 is not None
+
+
+def _chunks(values, size=500):
+    # Stay well below SQLITE_MAX_VARIABLE_NUMBER on old builds.
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+class HighlightStore(object):
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.RLock()
+        folder = os.path.dirname(path)
+        if folder and not os.path.isdir(folder):
+            os.makedirs(folder)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            # INSERT OR REPLACE must fire the delete trigger for the row it
+            # replaces, or the counts drift.
+            self._conn.execute("PRAGMA recursive_triggers=ON")
+            self._conn.executescript(SCHEMA)
+            self._conn.executescript(ACCOUNTING_SCHEMA)
+            self._conn.commit()
+            self._backfill_accounting()
+
+    def _backfill_accounting(self):
+        # Stores created before the scopes table existed.
+        with self._lock, self._conn:
+            if self._conn.execute(
+                    "SELECT 1 FROM meta WHERE name = ?", (ACCOUNTING_FLAG,)).fetchone():
+                return
+            self._conn.execute("DELETE FROM scopes")
+            self._conn.execute(
+                "INSERT INTO scopes (scope_key, last_access, tokens, bytes) "
+                "SELECT scope_key, MAX(ts), COUNT(*), SUM(length(style_key) + length(pattern)) "
+                "FROM tokens GROUP BY scope_key"
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)",
+                (ACCOUNTING_FLAG, "1")
+            )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # Reads
+
+    def scope_keys(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT DISTINCT scope_key FROM tokens").fetchall()
+        return [row[0] for row in rows]
+
+    def load(self, scope_keys):
+        """Return ``{scope_key: {style_key: [{"p", "ts"}, ...]}}`` oldest first."""
+        out = {}
+        with self._lock:
+            for keys in _chunks(scope_keys):
+                rows = self._conn.execute(
+                    "SELECT scope_key, style_key, pattern, ts FROM tokens "
+                    "WHERE scope_key IN (%s) ORDER BY ts" % ",".join("?" * len(keys)),
+                    keys
+                ).fetchall()
+                for scope_key, style_key, pattern, ts in rows:
+                    out.setdefault(scope_key, {}).setdefault(style_key, []).append(
+                        {"p": pattern, "ts": ts})
+        return out
+
+    def token_count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM tokens").fetchone()[0]
+
+    def usage(self):
+        """``(tokens, bytes)`` across all scopes, from the running counts."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COALESCE(SUM(tokens), 0), COALESCE(SUM(bytes), 0) FROM scopes").fetchone()
+        return row[0], row[1]
+
+    # Writes
+
+    def _trim_style(self, scope_key, style_key, limit):
+        self._conn.execute(
+            "DELETE FROM tokens WHERE scope_key = ? AND style_key = ? AND pattern NOT IN ("
+            "SELECT pattern FROM tokens WHERE scope_key = ? AND style_key = ? "
+            "ORDER BY ts DESC LIMIT ?)",
+            (scope_key, style_key, scope_key, style_key, limit)
+        )
+
+    def _adopt(self, scope_key, other_keys):
+        # Styles stored under an alternative key of the same scope move to
+        # the canonical key unless it already has that style, mirroring the
+        # "first key wins" merge of the settings store.
+        for other in other_keys:
+            if other == scope_key:
+                continue
+            self._conn.execute(
+                "UPDATE OR IGNORE tokens SET scope_key = ? WHERE scope_key = ? AND style_key NOT IN ("
+                "SELECT style_key FROM tokens WHERE scope_key = ?)",
+                (scope_key, other, scope_key)
+            )
+            self._conn.execute("DELETE FROM tokens WHERE scope_key = ?", (other,))
+
+    def add_tokens(self, scope_key, style_key, patterns, ts, limit, other_keys=()):
+        with self._lock, self._conn:
+            self._adopt(scope_key, other_keys)
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO tokens (scope_key, style_key, pattern, ts) VALUES (?, ?, ?, ?)",
+                [(scope_key, style_key, pattern, ts) for pattern in patterns]
+            )
+            self._trim_style(scope_key, style_key, limit)
+
+    def replace_scope(self, scope_key, data, drop_keys=()):
+        """``data`` is ``{style_key: [{"p", "ts"}, ...]}``; empty clears it."""
+        with self._lock, self._conn:
+            for keys in _chunks(set(drop_keys) | set([scope_key])):
+                self._conn.execute(
+                    "DELETE FROM tokens WHERE scope_key IN (%s)" % ",".join("?" * len(keys)),
+                    keys
+                )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO tokens (scope_key, style_key, pattern, ts) VALUES (?, ?, ?, ?)",
+                [
+                    (scope_key, style_key, token["p"], token.get("ts", 0))
+                    for style_key, tokens in data.items()
+                    for token in tokens
+                ]
+            )
+
+    def write_scopes(self, scopes):
+        """Replace several scopes in one transaction; ``{}`` deletes a scope."""
+        with self._lock, self._conn:
+            for scope_key, data in scopes.items():
+                self._conn.execute("DELETE FROM tokens WHERE scope_key = ?", (scope_key,))
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO tokens (scope_key, style_key, pattern, ts) VALUES (?, ?, ?, ?)",
+                    [
+                        (scope_key, style_key, token["p"], token.get("ts", 0))
+                        for style_key, tokens in data.items()
+                        for token in tokens
+                    ]
+                )
+
+    def delete_style(self, scope_key, style_key, other_keys=()):
+        with self._lock, self._conn:
+            self._adopt(scope_key, other_keys)
+            self._conn.execute(
+                "DELETE FROM tokens WHERE scope_key = ? AND style_key = ?",
+                (scope_key, style_key)
+            )
+
+    def touch(self, scope_keys, ts):
+        with self._lock, self._conn:
+            for keys in _chunks(scope_keys):
+                self._conn.execute(
+                    "UPDATE scopes SET last_access = ? WHERE scope_key IN (%s)" % ",".join("?" * len(keys)),
+                    [ts] + keys
+                )
+
+    def evict_lru(self, max_tokens, max_bytes, protect=()):
+        """
+        Drop whole scopes, least recently accessed first, until both budgets
+        hold. Scopes in ``protect`` are kept. Returns the evicted keys.
+        """
+        evicted = []
+        protect = set(protect)
+        with self._lock, self._conn:
+            tokens, size = self._conn.execute(
+                "SELECT COALESCE(SUM(tokens), 0), COALESCE(SUM(bytes), 0) FROM scopes").fetchone()
+            if tokens <= max_tokens and size <= max_bytes:
+                return evicted
+            rows = self._conn.execute(
+                "SELECT scope_key, tokens, bytes FROM scopes ORDER BY last_access").fetchall()
+            for scope_key, scope_tokens, scope_bytes in rows:
+                if tokens <= max_tokens and size <= max_bytes:
+                    break
+                if scope_key in protect:
+                    continue
+                self._conn.execute("DELETE FROM tokens WHERE scope_key = ?", (scope_key,))
+                tokens -= scope_tokens
+                size -= scope_bytes
+                evicted.append(scope_key)
+        return evicted
+
+    def purge_all(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM tokens")
+            self._conn.execute("DELETE FROM scopes")
+
+    # Named profiles: {style_key: [pattern, ...]} kept apart from scopes, so
+    # eviction never touches them.
+
+    def profile_names(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT DISTINCT name FROM profiles ORDER BY name").fetchall()
+        return [row[0] for row in rows]
+
+    def load_profile(self, name):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT style_key, pattern FROM profiles WHERE name = ? ORDER BY style_key, pattern",
+                (name,)).fetchall()
+        out = {}
+        for style_key, pattern in rows:
+            out.setdefault(style_key, []).append(pattern)
+        return out
+
+    def save_profile(self, name, data):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM profiles WHERE name = ?", (name,))
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO profiles (name, style_key, pattern) VALUES (?, ?, ?)",
+                [(name, style_key, pattern)
+                 for style_key, patterns in data.items() for pattern in patterns]
+            )
+
+    def delete_profile(self, name):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM profiles WHERE name = ?", (name,))
+
+    # Migration from StyleOptionsRegions.sublime-settings
+
+    def is_migrated(self):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM meta WHERE name = ?", (MIGRATED_FLAG,)).fetchone()
+        return row is not None
+
+    def migrate(self, scope_items):
+        """
+        Import ``(scope_key, {style_key: [{"p", "ts"}, ...]})`` pairs once.
+
+        Keys are copied verbatim, legacy per-file keys included, so lookups
+        that resolved them from the settings file keep finding them here.
+        """
+        with self._lock, self._conn:
+            for scope_key, styles in scope_items:
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO tokens (scope_key, style_key, pattern, ts) VALUES (?, ?, ?, ?)",
+                    [
+                        (scope_key, style_key, token["p"], token.get("ts", 0))
+                        for style_key, tokens in styles.items()
+                        for token in tokens
+                    ]
+                )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)",
+                (MIGRATED_FLAG, "1")
+            )
+
+
+class BufferedHighlightStore(object):
+    """
+    Write-behind front for HighlightStore with the same interface.
+
+    Changed scopes are held in memory and written in one transaction when
+    the debounce timer fires, at most ``delay_ms`` after the first change
+    since the last flush, so a crash loses no more than that window. Reads
+    see pending changes. ``schedule(fn, delay_ms)`` defaults to a
+    threading.Timer; the plugin passes sublime.set_timeout_async.
+
+    Eviction is deferred to the flush as well, so evict_lru returns
+    nothing; ``on_evict(scope_keys)`` is called from the flush with the
+    scopes it dropped, if any.
+    """
+
+    def __init__(self, store, delay_ms=2000, schedule=None, on_evict=None):
+        self.store = store
+        self.path = store.path
+        self.delay_ms = delay_ms
+        self._schedule = schedule or _timer_schedule
+        self._on_evict = on_evict
+        self._lock = threading.RLock()
+        self._pending = {}
+        self._touched = {}
+        self._budget = None
+        self._timer_armed = False
+
+    # Reads
+
+    def scope_keys(self):
+        with self._lock:
+            keys = set(self.store.scope_keys())
+            for scope_key, data in self._pending.items():
+                if data:
+                    keys.add(scope_key)
+                else:
+                    keys.discard(scope_key)
+            return sorted(keys)
+
+    def load(self, scope_keys):
+        with self._lock:
+            stored = [k for k in scope_keys if k not in self._pending]
+            out = self.store.load(stored) if stored else {}
+            for scope_key in scope_keys:
+                data = self._pending.get(scope_key)
+                if data:
+                    out[scope_key] = _token_lists(data)
+            return out
+
+    def token_count(self):
+        self.flush()
+        return self.store.token_count()
+
+    def usage(self):
+        self.flush()
+        return self.store.usage()
+
+    # Writes
+
+    def _scope(self, scope_key):
+        # The flush rewrites the scope row, so keep the time of the change
+        # itself for LRU ordering rather than the time of the flush.
+        self._touched[scope_key] = time.time()
+        data = self._pending.get(scope_key)
+        if data is None:
+            loaded = self.store.load([scope_key]).get(scope_key, {})
+            data = dict(
+                (style_key, dict((t["p"], t.get("ts", 0)) for t in tokens))
+                for style_key, tokens in loaded.items()
+            )
+            self._pending[scope_key] = data
+        return data
+
+    def _adopt(self, scope_key, other_keys):
+        target = self._scope(scope_key)
+        for other in other_keys:
+            if other == scope_key:
+                continue
+            for style_key, tokens in self._scope(other).items():
+                target.setdefault(style_key, tokens)
+            self._pending[other] = {}
+
+    def _changed(self):
+        if not self._timer_armed:
+            self._timer_armed = True
+            self._schedule(self.flush, self.delay_ms)
+
+    def add_tokens(self, scope_key, style_key, patterns, ts, limit, other_keys=()):
+        with self._lock:
+            self._adopt(scope_key, other_keys)
+            tokens = self._scope(scope_key).setdefault(style_key, {})
+            for pattern in patterns:
+                tokens[pattern] = ts
+            if len(tokens) > limit:
+                newest = sorted(tokens.items(), key=lambda item: item[1])[-limit:]
+                tokens.clear()
+                tokens.update(newest)
+            self._changed()
+
+    def replace_scope(self, scope_key, data, drop_keys=()):
+        with self._lock:
+            for other in drop_keys:
+                self._pending[other] = {}
+            self._pending[scope_key] = dict(
+                (style_key, dict((t["p"], t.get("ts", 0)) for t in tokens))
+                for style_key, tokens in data.items() if tokens
+            )
+            self._changed()
+
+    def delete_style(self, scope_key, style_key, other_keys=()):
+        with self._lock:
+            self._adopt(scope_key, other_keys)
+            self._scope(scope_key).pop(style_key, None)
+            self._changed()
+
+    def touch(self, scope_keys, ts):
+        with self._lock:
+            for scope_key in scope_keys:
+                self._touched[scope_key] = ts
+            self._changed()
+
+    def evict_lru(self, max_tokens, max_bytes, protect=()):
+        # Runs after the pending writes land; the budget only needs to hold
+        # on disk. What it drops goes to on_evict.
+        with self._lock:
+            self._budget = (max_tokens, max_bytes, tuple(protect))
+            self._changed()
+        return []
+
+    def purge_all(self):
+        with self._lock:
+            self._pending = {}
+            self._touched = {}
+            self.store.purge_all()
+
+    def flush(self):
+        evicted = []
+        with self._lock:
+            self._timer_armed = False
+            if self._pending:
+                self.store.write_scopes(dict(
+                    (scope_key, _token_lists(data)) for scope_key, data in self._pending.items()
+                ))
+                self._pending = {}
+            if self._touched:
+                for ts in set(self._touched.values()):
+                    self.store.touch([k for k, v in self._touched.items() if v == ts], ts)
+                self._touched = {}
+            if self._budget is not None:
+                max_tokens, max_bytes, protect = self._budget
+                self._budget = None
+                evicted = self.store.evict_lru(max_tokens, max_bytes, protect)
+        if evicted and self._on_evict is not None:
+            self._on_evict(evicted)
+
+    def close(self):
+        self.flush()
+        self.store.close()
+
+    def profile_names(self):
+        return self.store.profile_names()
+
+    def load_profile(self, name):
+        return self.store.load_profile(name)
+
+    def save_profile(self, name, data):
+        self.store.save_profile(name, data)
+
+    def delete_profile(self, name):
+        self.store.delete_profile(name)
+
+    def is_migrated(self):
+        return self.store.is_migrated()
+
+    def migrate(self, scope_items):
+        self.store.migrate(scope_items)
+
+
+def _token_lists(data):
+    return dict(
+        (style_key, [{"p": p, "ts": ts} for p, ts in sorted(tokens.items(), key=lambda item: item[1])])
+        for style_key, tokens in data.items() if tokens
+    )
+
+
+def _timer_schedule(fn, delay_ms):
+    timer = threading.Timer(delay_ms / 1000.0, fn)
+    timer.daemon = True
+    timer.start()
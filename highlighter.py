@@ -1,18 +1,69 @@
 import sublime
 import sublime_plugin
+import functools
+import json
 import re
 import os
 import time
+import threading
+import traceback
+
+from .highlight_engine import (
+    MatchCache,
+    OffsetIndex,
+    build_matcher,
+    file_identity,
+    iter_chunks,
+    scan_styles,
+    token_signature,
+)
+from .highlight_store import BufferedHighlightStore, HighlightStore, available as sqlite_store_available
+from .highlight_profiler import Profiler, format_summary, write_summary
+from .highlight_report import format_table, profile_report, profile_style_patterns, report_rows
+from .trace_scan import TRACE_FILE_PATTERNS, iter_trace_files, run_pool, scan_file
 
 REGION_NAME = 'StyleOptionsListener%d'
 MAX_STYLES = 10
 REGION_STORE = 'StyleOptionsRegions.sublime-settings'
+REGION_DB = 'StyleOptionsRegions.sqlite3'
 SETTINGS_INDEX_KEY = '__style_options_keys__'
+SETTINGS_ACCESS_KEY = '__style_options_access__'
+SETTINGS_PROFILES_KEY = '__style_options_profiles__'
+SETTINGS_FILE = 'CiscoCollab.sublime-settings'
 
 # Limits
 MAX_REGIONS_PER_STYLE = 500
 MAX_TOKENS_PER_STYLE = 500
 MAX_STORAGE_SIZE = 20 * 1024 * 1024  # 20 MB
+MAX_STORED_TOKENS = 200000
+
+# Background restore
+ASYNC_MIN_CHARS = 2 * 1024 * 1024
+ASYNC_CHUNK_CHARS = 1024 * 1024
+ASYNC_PUBLISH_EVERY = 8  # chunks between intermediate add_regions calls
+
+# Incremental (tail) restore
+TAIL_FINGERPRINT_CHARS = 256
+TAIL_DEBOUNCE_MS = 300
+
+# Match offsets kept for unmodified files, keyed by file identity
+MATCH_CACHE_MAX_FILES = 128
+MATCH_CACHE_MAX_REGIONS = 2000000
+
+# Write-behind delay for highlight persistence
+WRITE_DELAY_MS = 2000
+
+# Windowed rendering: styles with more hits than the per-style region limit
+# only get regions around the visible area, refreshed as the view scrolls.
+WINDOW_POLL_MS = 150
+WINDOW_MIN_MARGIN_CHARS = 4096
+
+# Propagating a highlight to every trace file of a folder scope
+PROPAGATE_PANEL = 'style_options_propagate'
+PROPAGATE_MAX_FILES = 1000
+
+TIMING_PANEL = 'style_options_timing'
+TIMING_FILE = 'StyleOptionsTiming.json'
 
 DOUBLE_CLICK_WINDOW_SEC = 0.45
 DOUBLE_CLICK_PIXEL_TOLERANCE = 8
@@ -51,6 +102,36 @@ STYLE_FLAGS = {
     9: sublime.DRAW_NO_OUTLINE,
 }
 
+_restore_jobs = {}
+_scan_marks = {}
+_match_cache = MatchCache(MATCH_CACHE_MAX_FILES, MATCH_CACHE_MAX_REGIONS)
+_store = None
+_region_store_save = {"pending": False}
+# Settings backend: (tokens, bytes) per scope key and their sums, measured
+# over the whole store once and kept current on every write and eviction
+# instead of re-reading the store each time.
+_settings_scope_usage = {}
+_settings_usage_totals = {"tokens": 0, "bytes": 0, "measured": False}
+# SQLite backend: (tokens, bytes) at the last measure plus everything written
+# since, an upper bound on usage; None until measured and after an eviction.
+_store_usage = {"tokens": None, "bytes": 0}
+# Sorted offsets for next/previous navigation, per view and style (-1 for
+# all styles), stamped with (region generation, change count).
+_nav_indexes = {}
+_region_generation = {}
+# view_id -> {style_ind: {"key", "index", "mark", "window"}} for styles whose
+# full hit set is kept off-view; see _add_style_regions.
+_windowed_styles = {}
+_window_poll = {"armed": False}
+# A highlight_profiler.Profiler while profiling is on, else None; every hook
+# checks for None first so profiling off costs one test.
+_profiler = None
+
+
+def _settings():
+    return sublime.load_settings(SETTINGS_FILE)
+
+
 # Persistent region storage
 
 
@@ -97,7 +178,8 @@ def _settings_items(settings_obj):
         try:
             data = to_dict_fn()
             if isinstance(data, dict):
-                return [(k, v) for k, v in data.items() if k != SETTINGS_INDEX_KEY]
+                return [(k, v) for k, v in data.items()
+                        if k not in (SETTINGS_INDEX_KEY, SETTINGS_ACCESS_KEY, SETTINGS_PROFILES_KEY)]
         except Exception:
             pass
 
@@ -107,6 +189,215 @@ def _settings_items(settings_obj):
     return items
 
 
+def _get_settings_access(settings_obj):
+    access = settings_obj.get(SETTINGS_ACCESS_KEY, {})
+    return dict(access) if isinstance(access, dict) else {}
+
+
+def _measure_settings_scope(value):
+    tokens = 0
+    for payload in value.values():
+        tokens += len(_extract_tokens_from_payload(payload))
+    return tokens, len(json.dumps(value))
+
+
+def _set_settings_scope_usage(key, value):
+    """Account scope ``key`` as now holding ``value``, None when it was erased."""
+    totals = _settings_usage_totals
+    old = _settings_scope_usage.pop(key, None)
+    if old is not None:
+        totals["tokens"] -= old[0]
+        totals["bytes"] -= old[1]
+    if totals["measured"] and isinstance(value, dict):
+        usage = _settings_scope_usage[key] = _measure_settings_scope(value)
+        totals["tokens"] += usage[0]
+        totals["bytes"] += usage[1]
+
+
+def _settings_usage(settings_obj):
+    """``(tokens, bytes)`` of every scope of the settings store, measured on first use."""
+    totals = _settings_usage_totals
+    if not totals["measured"]:
+        _settings_scope_usage.clear()
+        totals.update(tokens=0, bytes=0, measured=True)
+        for key, value in _settings_items(settings_obj):
+            _set_settings_scope_usage(key, value)
+    return totals["tokens"], totals["bytes"]
+
+
+def _reset_settings_usage():
+    _settings_scope_usage.clear()
+    _settings_usage_totals.update(tokens=0, bytes=0, measured=False)
+
+
+def _storage_budget():
+    settings = _settings()
+    max_tokens = settings.get("highlighter_storage_max_tokens", MAX_STORED_TOKENS)
+    max_bytes = settings.get("highlighter_storage_max_bytes", MAX_STORAGE_SIZE)
+    if not isinstance(max_tokens, int) or max_tokens <= 0:
+        max_tokens = MAX_STORED_TOKENS
+    if not isinstance(max_bytes, int) or max_bytes <= 0:
+        max_bytes = MAX_STORAGE_SIZE
+    return max_tokens, max_bytes
+
+
+def _normalize_token_entries(token_entries):
+    normalized = []
+    for entry in token_entries:
+        if isinstance(entry, dict) and entry.get("p"):
+            normalized.append({"p": entry["p"], "ts": entry.get("ts", 0)})
+        elif isinstance(entry, str):
+            normalized.append({"p": entry, "ts": 0})
+    return normalized
+
+
+def _extract_tokens_from_payload(payload):
+    if not isinstance(payload, dict):
+        return []
+    tokens = _normalize_token_entries(payload.get("tokens", []))
+    if tokens:
+        return tokens
+    # Backward compatibility with older structures
+    patterns = payload.get("__patterns__", {})
+    if isinstance(patterns, dict):
+        legacy_tokens = []
+        for values in patterns.values():
+            for item in values if isinstance(values, list) else []:
+                if isinstance(item, dict) and item.get("pattern"):
+                    pattern = item["pattern"]
+                    if item.get("literal"):
+                        pattern = re.escape(pattern)
+                    legacy_tokens.append(
+                        {"p": pattern, "ts": item.get("ts", 0)})
+        if legacy_tokens:
+            return legacy_tokens
+    return []
+
+
+def _settings_store_scopes(settings_obj):
+    # Scope payloads of the JSON store as token lists. Bare region-offset
+    # lists from the oldest format carry no token text and are left out.
+    for key, value in _settings_items(settings_obj):
+        if not isinstance(value, dict):
+            continue
+        styles = {}
+        for style_key, payload in value.items():
+            tokens = _extract_tokens_from_payload(payload)
+            if tokens:
+                styles[style_key] = tokens
+        if styles:
+            yield key, styles
+
+
+def _view_label(view):
+    if view is None:
+        return None
+    return view.file_name() or view.name() or "view %d" % view.id()
+
+
+def _profiled(name):
+    """Time a StyleOptionsStorage method under ``name`` while profiling is on."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def timed(self, *args, **kwargs):
+            profiler = _profiler
+            if profiler is None:
+                return fn(self, *args, **kwargs)
+            call = profiler.begin(name, _view_label(self.view))
+            try:
+                return fn(self, *args, **kwargs)
+            finally:
+                profiler.end(call)
+        return timed
+    return decorate
+
+
+def _set_profiling(enabled):
+    global _profiler
+    if enabled and _profiler is None:
+        _profiler = Profiler()
+    elif not enabled:
+        _profiler = None
+
+
+def plugin_loaded():
+    _set_profiling(bool(_settings().get("highlighter_timing", False)))
+
+
+def _highlight_store():
+    """The SQLite token store, migrated from REGION_STORE on first use, or None."""
+    global _store
+    if not sqlite_store_available() or _settings().get("highlighter_storage", "sqlite") != "sqlite":
+        return None
+    if _store is not None:
+        return _store
+    path = os.path.join(sublime.packages_path(), 'User', REGION_DB)
+    try:
+        store = HighlightStore(path)
+        if not store.is_migrated():
+            store.migrate(_settings_store_scopes(sublime.load_settings(REGION_STORE)))
+    except Exception:
+        traceback.print_exc()
+        return None
+    delay_ms = _write_delay_ms()
+    if delay_ms > 0:
+        store = BufferedHighlightStore(
+            store, delay_ms, sublime.set_timeout_async,
+            lambda evicted: sublime.set_timeout(lambda: _report_evicted(evicted), 0))
+    _store = store
+    return _store
+
+
+def _report_evicted(evicted):
+    sublime.status_message(
+        "Style Options: Dropped highlights for %d least recently used scope(s)." % len(evicted))
+
+
+def _write_delay_ms():
+    delay_ms = _settings().get("highlighter_write_delay_ms", WRITE_DELAY_MS)
+    return delay_ms if isinstance(delay_ms, int) and delay_ms > 0 else 0
+
+
+def _save_region_store_later():
+    # Settings backend: the in-memory settings object is already current,
+    # only the disk write is deferred.
+    delay_ms = _write_delay_ms()
+    if not delay_ms:
+        sublime.save_settings(REGION_STORE)
+        return
+    if _region_store_save["pending"]:
+        return
+    _region_store_save["pending"] = True
+    sublime.set_timeout(_flush_region_store, delay_ms)
+
+
+def _flush_region_store():
+    if _region_store_save["pending"]:
+        _region_store_save["pending"] = False
+        sublime.save_settings(REGION_STORE)
+
+
+def _flush_highlight_writes():
+    _flush_region_store()
+    flush_fn = getattr(_store, 'flush', None)
+    if callable(flush_fn):
+        try:
+            flush_fn()
+        except Exception:
+            traceback.print_exc()
+
+
+def plugin_unloaded():
+    global _store
+    _flush_highlight_writes()
+    if _store is not None:
+        try:
+            _store.close()
+        except Exception:
+            traceback.print_exc()
+        _store = None
+
+
 def _restore_storage(storage):
     restore_fn = getattr(storage, 'restore', None)
     if callable(restore_fn):
@@ -121,32 +412,113 @@ def _restore_storage(storage):
         return False
 
     data = merged_scope_fn(include_legacy=True)
-    restored = False
-    for key, payload in data.items():
+    return _apply_scope_data(view, data, extract_tokens_fn, legacy_regions_fn)
+
+
+def _restore_view(storage):
+    if _use_async_restore(storage.view):
+        return storage.restore_async(_settings().get("highlighter_async_chunk_chars", ASYNC_CHUNK_CHARS))
+    return _restore_storage(storage)
+
+
+def _style_index_from_key(key):
+    try:
+        return int(re.search(r'\d+', key).group())
+    except Exception:
+        return None
+
+
+def _find_style_regions(view, style_patterns, begin=0, end=None):
+    # One pass over the buffer for every stored token; only patterns the
+    # engine cannot embed go through view.find_all individually.
+    if end is None:
+        end = view.size()
+    hits, rejected = scan_styles(
+        lambda a, b: view.substr(sublime.Region(a, b)),
+        style_patterns, begin, end)
+
+    regions = {}
+    for style, spans in hits.items():
+        regions[style] = [sublime.Region(a, b) for a, b in spans]
+
+    fallback_styles = set()
+    for style, pattern in rejected:
+        if _profiler is not None:
+            _profiler.count("find_all", view=_view_label(view))
         try:
-            style_ind = int(re.search(r'\d+', key).group())
+            if begin > 0 or end < view.size():
+                found = _find_in_range(view, pattern, begin, end)
+            else:
+                found = view.find_all(pattern)
         except Exception:
             continue
+        regions.setdefault(style, []).extend(found)
+        fallback_styles.add(style)
+
+    for style in fallback_styles:
+        regions[style] = _unique_regions(regions[style])
+    return regions
+
+
+def _find_in_range(view, pattern, begin, end):
+    # view.find from ``begin`` rather than find_all, so a tail scan does
+    # not match the pattern against the whole buffer.
+    found = []
+    pos = begin
+    while pos <= end:
+        region = view.find(pattern, pos)
+        if region is None or region.begin() < 0 or region.begin() >= end:
+            break
+        if region.end() <= end:
+            found.append(region)
+        pos = max(region.end(), region.begin() + 1)
+    return found
+
+
+def _unique_regions(regions):
+    seen = set()
+    unique = []
+    for region in sorted(regions, key=lambda r: (r.begin(), r.end())):
+        key_tuple = (region.a, region.b)
+        if key_tuple not in seen:
+            seen.add(key_tuple)
+            unique.append(region)
+    return unique
+
 
+def _collect_scope_styles(data, extract_tokens_fn):
+    style_keys = []
+    style_patterns = {}
+    for key, payload in data.items():
+        style_ind = _style_index_from_key(key)
+        if style_ind is None:
+            continue
         token_entries = extract_tokens_fn(payload)
         patterns = [entry['p'] for entry in token_entries if isinstance(entry, dict) and entry.get('p')]
-        regions = []
-
+        style_keys.append((key, style_ind, payload, bool(patterns)))
         if patterns:
-            seen = set()
-            for pattern in patterns:
-                try:
-                    found = view.find_all(pattern)
-                except Exception:
-                    continue
-                for region in found:
-                    key_tuple = (region.a, region.b)
-                    if key_tuple not in seen:
-                        seen.add(key_tuple)
-                        regions.append(region)
-        elif isinstance(payload, list) and callable(legacy_regions_fn):
-            regions = legacy_regions_fn(payload)
-
+            style_patterns.setdefault(style_ind, []).extend(patterns)
+    return style_keys, style_patterns
+
+
+def _add_style_regions(view, key, style_ind, regions):
+    limit = _windowed_region_limit()
+    windowed = _windowed_styles.get(view.id())
+    if limit and len(regions) > limit:
+        entry = {
+            "key": key,
+            "index": OffsetIndex((r.begin(), r.end()) for r in regions),
+            "mark": _buffer_mark(view),
+            "window": None,
+        }
+        _windowed_styles.setdefault(view.id(), {})[style_ind] = entry
+        _install_window(view, style_ind, entry)
+        _schedule_window_refresh()
+    else:
+        if windowed:
+            windowed.pop(style_ind, None)
+        if _profiler is not None:
+            _profiler.count("regions_added", len(regions), _view_label(view))
         view.add_regions(
             key,
             regions,
@@ -154,21 +526,394 @@ def _restore_storage(storage):
             '',
             STYLE_FLAGS.get(style_ind, sublime.DRAW_NO_OUTLINE)
         )
+    _regions_changed(view)
+
+
+def _style_regions(view, key, style_ind):
+    """Every hit of a style, including those a windowed style keeps off-view."""
+    entry = _windowed_styles.get(view.id(), {}).get(style_ind)
+    if entry is None:
+        return view.get_regions(key)
+    index = entry["index"]
+    return [sublime.Region(a, b) for a, b in zip(index.begins, index.ends)]
+
+
+def _windowed_region_limit():
+    settings = _settings()
+    if not settings.get("highlighter_windowed_rendering", False):
+        return 0
+    limit = settings.get("highlighter_max_regions_per_style", MAX_REGIONS_PER_STYLE)
+    return limit if isinstance(limit, int) and limit > 0 else MAX_REGIONS_PER_STYLE
+
+
+def _install_window(view, style_ind, entry):
+    # Regions for the visible area plus a screen's worth either side, at
+    # most the per-style limit, centred on the top of the visible area.
+    index = entry["index"]
+    visible = view.visible_region()
+    margin = max(visible.size(), WINDOW_MIN_MARGIN_CHARS)
+    begin = max(0, visible.begin() - margin)
+    end = visible.end() + margin
+    first, last = index.between(begin, end)
+    limit = _windowed_region_limit() or MAX_REGIONS_PER_STYLE
+    if last - first > limit:
+        top = index.between(visible.begin(), visible.begin())[0]
+        first = max(first, min(top - limit // 4, last - limit))
+        if first + limit < last:
+            end = index.begins[first + limit - 1]
+            last = first + limit
+        begin = index.begins[first]
+    # More hits on screen than the limit cannot all be shown; count the
+    # window as covering the screen so it is not reinstalled on every poll.
+    entry["window"] = (min(begin, visible.begin()), max(end, visible.end()))
+    if _profiler is not None:
+        _profiler.count("regions_added", last - first, _view_label(view))
+    view.add_regions(
+        entry["key"],
+        [sublime.Region(index.begins[i], index.ends[i]) for i in range(first, last)],
+        get_style(style_ind),
+        '',
+        STYLE_FLAGS.get(style_ind, sublime.DRAW_NO_OUTLINE)
+    )
+
+
+def _drop_windowed_styles(view_id, style_ind=None):
+    if style_ind is None:
+        _windowed_styles.pop(view_id, None)
+        return
+    styles = _windowed_styles.get(view_id)
+    if styles:
+        styles.pop(style_ind, None)
+
+
+def _refresh_view_window(view):
+    styles = _windowed_styles.get(view.id())
+    if not styles:
+        return
+    stale = [entry for entry in styles.values()
+             if entry["mark"]["change_count"] != view.change_count() and
+             not _appended_since_mark(view, entry["mark"])]
+    if stale:
+        # Edited in a way _edit_windowed_styles did not follow; rescan
+        # rather than install regions at the wrong places.
+        _rescan_windowed_styles(view)
+        return
+    visible = view.visible_region()
+    for style_ind, entry in list(styles.items()):
+        begin, end = entry["window"]
+        if visible.begin() < begin or visible.end() > end:
+            _install_window(view, style_ind, entry)
+
+
+def _rescan_windowed_styles(view):
+    _drop_windowed_styles(view.id())
+    _scan_marks.pop(view.id(), None)
+    if view.file_name():
+        _restore_view(StyleOptionsStorage(view))
+
+
+def _edit_windowed_styles(view, begin, old_end, new_end):
+    """
+    Move the kept hits of the view's windowed styles for ``[begin,
+    old_end)`` having become ``[begin, new_end)``, as Sublime moves the
+    installed regions; hits the edit cuts into are dropped, the rest of
+    the buffer is not rescanned.
+    """
+    styles = _windowed_styles.get(view.id())
+    if not styles:
+        return
+    delta = new_end - old_end
+    for entry in styles.values():
+        entry["index"].edit(begin, old_end, new_end)
+        window = entry["window"]
+        if window is not None:
+            entry["window"] = tuple(edge + delta if edge >= old_end else min(edge, begin)
+                                    for edge in window)
+        entry["mark"] = _buffer_mark(view)
+    _regions_changed(view)
+
+
+def _schedule_window_refresh():
+    if _windowed_styles and not _window_poll["armed"]:
+        _window_poll["armed"] = True
+        sublime.set_timeout(_refresh_windows, WINDOW_POLL_MS)
+
+
+def _refresh_windows():
+    # There is no scroll event; poll the windowed views that are on screen.
+    _window_poll["armed"] = False
+    on_screen = False
+    for window in sublime.windows():
+        for group in range(window.num_groups()):
+            view = window.active_view_in_group(group)
+            if view is not None and view.id() in _windowed_styles:
+                on_screen = True
+                try:
+                    _refresh_view_window(view)
+                except Exception:
+                    traceback.print_exc()
+    # Stops while no windowed view is on screen; on_activated restarts it.
+    if on_screen:
+        _schedule_window_refresh()
+
+
+def _regions_changed(view):
+    view_id = view.id()
+    _region_generation[view_id] = _region_generation.get(view_id, 0) + 1
+
+
+def _view_file_identity(view):
+    # Only an unmodified buffer is known to match the file on disk.
+    if not view.file_name() or view.is_dirty():
+        return None
+    return file_identity(view.file_name())
+
+
+def _cached_style_regions(identity, style_patterns):
+    if not identity:
+        return None
+    cached = _match_cache.get(identity, token_signature(style_patterns))
+    if cached is None:
+        return None
+    return dict(
+        (style, [sublime.Region(a, b) for a, b in spans])
+        for style, spans in cached.items()
+    )
+
+
+def _cache_style_regions(identity, style_patterns, found):
+    if not identity:
+        return
+    _match_cache.put(
+        identity,
+        token_signature(style_patterns),
+        dict((style, [(r.begin(), r.end()) for r in regions]) for style, regions in found.items())
+    )
+
+
+def _apply_scope_data(view, data, extract_tokens_fn, legacy_regions_fn=None):
+    style_keys, style_patterns = _collect_scope_styles(data, extract_tokens_fn)
+    found = {}
+    if style_patterns:
+        identity = _view_file_identity(view)
+        found = _cached_style_regions(identity, style_patterns)
+        if found is None:
+            found = _find_style_regions(view, style_patterns)
+            _cache_style_regions(identity, style_patterns, found)
+    _record_scan_mark(view, style_patterns)
+
+    restored = False
+    for key, style_ind, payload, has_patterns in style_keys:
+        regions = []
+        if has_patterns:
+            regions = found.get(style_ind, [])
+        elif isinstance(payload, list) and callable(legacy_regions_fn):
+            regions = legacy_regions_fn(payload)
+
+        _add_style_regions(view, key, style_ind, regions)
         if regions:
             restored = True
 
     return restored
 
 
+def _buffer_mark(view):
+    # The buffer's size and change count, and the text just before its end
+    # so a later append can be told from an edit.
+    size = view.size()
+    return {
+        "offset": size,
+        "change_count": view.change_count(),
+        "tail": view.substr(sublime.Region(max(0, size - TAIL_FINGERPRINT_CHARS), size)),
+    }
+
+
+def _record_scan_mark(view, style_patterns):
+    # Where the last scan of this view stopped, and for which token set.
+    mark = _buffer_mark(view)
+    mark["signature"] = token_signature(style_patterns)
+    _scan_marks[view.id()] = mark
+
+
+def _appended_since_mark(view, mark):
+    offset = mark["offset"]
+    if view.size() < offset:
+        return False
+    tail = mark["tail"]
+    return view.substr(sublime.Region(offset - len(tail), offset)) == tail
+
+
+class _AsyncRestore(object):
+    """
+    Restore one view's highlights off the UI thread.
+
+    The buffer is read in line-aligned chunks, visible area first, for as
+    long as ``change_count`` is the one seen when the job started; an edit
+    or closing the view abandons the job. Regions reach the view in batches
+    through sublime.set_timeout so add_regions always runs on the UI thread;
+    each batch carries only the regions found since the one before, and a
+    windowed style's OffsetIndex is extended with them, not rebuilt.
+    """
+
+    def __init__(self, view, style_keys, style_patterns, chunk_size, identity=None):
+        self.view = view
+        self.identity = identity
+        self.view_id = view.id()
+        self.change_count = view.change_count()
+        self.style_keys = [(key, style_ind) for key, style_ind, _, has_patterns in style_keys if has_patterns]
+        self.style_patterns = style_patterns
+        self.chunk_size = chunk_size
+        self.cancelled = False
+        self.done = False
+        self.found = dict((style, []) for style in style_patterns)  # since the last batch
+        self.shown = dict((style, []) for style in style_patterns)  # UI thread: every batch so far
+        self.windowed = {}  # UI thread: style -> the _windowed_styles entry this job made
+        self.applied = False
+
+        size = view.size()
+        visible = view.full_line(view.visible_region())
+        visible_begin = min(visible.begin(), size)
+        visible_end = min(visible.end(), size)
+        ranges = [(visible_begin, visible_end), (visible_end, size), (0, visible_begin)]
+        self.ranges = [(a, b) for a, b in ranges if a < b]
+
+    def is_stale(self):
+        return (
+            self.cancelled or
+            not self.view.is_valid() or
+            self.view.change_count() != self.change_count
+        )
+
+    def cancel(self):
+        self.cancelled = True
+
+    def start(self):
+        thread = threading.Thread(target=self._run)
+        thread.daemon = True
+        thread.start()
+
+    def _read(self, a, b):
+        return self.view.substr(sublime.Region(a, b))
+
+    def _run(self):
+        profiler = _profiler
+        call = profiler.begin("restore_job", _view_label(self.view)) if profiler is not None else None
+        try:
+            matcher = build_matcher(self.style_patterns)
+            pending = 0
+            for index, (begin, end) in enumerate(self.ranges):
+                for offset, text in iter_chunks(self._read, begin, end, self.chunk_size):
+                    if self.is_stale():
+                        return
+                    for style, a, b in matcher.scan(text, offset):
+                        self.found[style].append(sublime.Region(a, b))
+                    pending += 1
+                    if pending >= ASYNC_PUBLISH_EVERY:
+                        self._publish()
+                        pending = 0
+                if index == 0 and pending:
+                    # Visible area goes out as soon as it has been scanned.
+                    self._publish()
+                    pending = 0
+
+            for style, pattern in matcher.rejected:
+                if self.is_stale():
+                    return
+                if profiler is not None:
+                    profiler.count("find_all")
+                try:
+                    found = self.view.find_all(pattern)
+                except Exception:
+                    continue
+                self.found[style].extend(found)
+
+            self._publish(final=True)
+        except Exception:
+            traceback.print_exc()
+        finally:
+            if call is not None:
+                profiler.end(call)
+
+    def _publish(self, final=False):
+        batch = self.found
+        self.found = dict((style, []) for style in self.style_patterns)
+        sublime.set_timeout(lambda: self._apply(batch, final), 0)
+
+    def _apply(self, batch, final):
+        if self.is_stale():
+            return
+        for style, new in batch.items():
+            self.shown[style].extend(new)
+        for key, style_ind in self.style_keys:
+            new = batch.get(style_ind, [])
+            shown = self.shown[style_ind]
+            entry = _windowed_styles.get(self.view_id, {}).get(style_ind)
+            if entry is not None and entry is self.windowed.get(style_ind):
+                if new:
+                    entry["index"].extend((r.begin(), r.end()) for r in new)
+                    window = entry["window"]
+                    if final or any(window[0] <= r.begin() <= window[1] for r in new):
+                        _install_window(self.view, style_ind, entry)
+                    _regions_changed(self.view)
+            elif new or final or not self.applied:
+                # Below the windowing limit the view needs the whole list;
+                # the final install is the only one that de-duplicates it.
+                _add_style_regions(self.view, key, style_ind, _unique_regions(shown) if final else shown)
+                entry = _windowed_styles.get(self.view_id, {}).get(style_ind)
+                if entry is not None:
+                    self.windowed[style_ind] = entry
+        self.applied = True
+        if final:
+            _cache_style_regions(
+                self.identity,
+                self.style_patterns,
+                dict((style, _unique_regions(regions)) for style, regions in self.shown.items())
+            )
+            _record_scan_mark(self.view, self.style_patterns)
+            self.done = True
+            if _restore_jobs.get(self.view_id) is self:
+                del _restore_jobs[self.view_id]
+
+
+def _start_restore_job(view, style_keys, style_patterns, chunk_size, identity=None):
+    current = _restore_jobs.get(view.id())
+    if current is not None:
+        if (not current.is_stale() and not current.done and
+                current.style_patterns == style_patterns):
+            return current
+        current.cancel()
+    job = _AsyncRestore(view, style_keys, style_patterns, chunk_size, identity)
+    _restore_jobs[view.id()] = job
+    job.start()
+    return job
+
+
+def _cancel_restore_job(view_id):
+    job = _restore_jobs.pop(view_id, None)
+    if job is not None:
+        job.cancel()
+
+
+def _use_async_restore(view):
+    settings = _settings()
+    if not settings.get("highlighter_async_restore", True):
+        return False
+    min_chars = settings.get("highlighter_async_min_chars", ASYNC_MIN_CHARS)
+    return view.size() >= min_chars
+
+
 class StyleOptionsStorage:
-    def __init__(self, view):
+    def __init__(self, view, file_name=None):
+        # file_name stands in for the view's own file to resolve the scope
+        # of another file in the same window (see propagation).
         self.view = view
-        file_name = view.file_name()
+        file_name = file_name or view.file_name()
         self.folder_norm = self._normalized_folder(file_name) if file_name else None
         self.scope_root = self._scope_root(file_name) if file_name else None
         self.key = self._scope_key(file_name) if file_name else str(view.id())
         self.scope_keys = self._scope_keys(file_name) if file_name else [str(view.id())]
         self.settings = sublime.load_settings(REGION_STORE)
+        self.store = _highlight_store()
 
     def _normalized_folder(self, file_name):
         folder = os.path.dirname(file_name)
@@ -218,13 +963,16 @@ class StyleOptionsStorage:
             return False
         return normalized == self.scope_root or normalized.startswith(self.scope_root + os.sep)
 
+    def _stored_scope_keys(self):
+        if self.store is not None:
+            return self.store.scope_keys()
+        return [key for key, value in _settings_items(self.settings) if isinstance(value, dict)]
+
     def _legacy_file_keys_in_scope(self):
         if not self.scope_root:
             return []
         legacy_keys = []
-        for key, value in _settings_items(self.settings):
-            if not isinstance(value, dict):
-                continue
+        for key in self._stored_scope_keys():
             candidate = key
             if key.startswith("folder::"):
                 candidate = key[len("folder::"):]
@@ -242,8 +990,14 @@ class StyleOptionsStorage:
         keys = list(self.scope_keys)
         if include_legacy:
             keys += self._legacy_file_keys_in_scope()
+        stored = self.store.load(keys) if self.store is not None else None
         for key in keys:
-            payload = self.settings.get(key, {})
+            if stored is not None:
+                payload = dict(
+                    (style_key, {"tokens": tokens})
+                    for style_key, tokens in stored.get(key, {}).items())
+            else:
+                payload = self.settings.get(key, {})
             if isinstance(payload, dict):
                 for style_key, value in payload.items():
                     if style_key not in merged:
@@ -251,55 +1005,49 @@ class StyleOptionsStorage:
         return merged
 
     def _save_scope_data(self, data, purge_legacy=False):
+        if self.store is not None:
+            drop_keys = [k for k in self.scope_keys if k != self.key]
+            if purge_legacy:
+                drop_keys += self._legacy_file_keys_in_scope()
+            tokens = dict((style_key, self._extract_tokens_from_payload(payload))
+                          for style_key, payload in data.items())
+            if _profiler is not None:
+                _profiler.count("store_bytes", sum(
+                    len(style_key) + len(entry["p"])
+                    for style_key, entries in tokens.items() for entry in entries))
+            self.store.replace_scope(self.key, tokens, drop_keys)
+            return
+
+        access = _get_settings_access(self.settings)
+        _set_settings_scope_usage(self.key, data or None)
         if data:
+            if _profiler is not None:
+                _profiler.count("store_bytes", len(json.dumps(data)))
             self.settings.set(self.key, data)
             _add_settings_index_key(self.settings, self.key)
+            access[self.key] = time.time()
         else:
             self.settings.erase(self.key)
             _remove_settings_index_key(self.settings, self.key)
+            access.pop(self.key, None)
 
-        for old_key in self.scope_keys:
-            if old_key != self.key:
-                self.settings.erase(old_key)
-                _remove_settings_index_key(self.settings, old_key)
-
+        old_keys = [k for k in self.scope_keys if k != self.key]
         if purge_legacy:
-            for old_key in self._legacy_file_keys_in_scope():
-                self.settings.erase(old_key)
-                _remove_settings_index_key(self.settings, old_key)
+            old_keys += self._legacy_file_keys_in_scope()
+        for old_key in old_keys:
+            self.settings.erase(old_key)
+            _remove_settings_index_key(self.settings, old_key)
+            _set_settings_scope_usage(old_key, None)
+            access.pop(old_key, None)
 
-        sublime.save_settings(REGION_STORE)
+        self.settings.set(SETTINGS_ACCESS_KEY, access)
+        _save_region_store_later()
 
     def _normalize_token_entries(self, token_entries):
-        normalized = []
-        for entry in token_entries:
-            if isinstance(entry, dict) and entry.get("p"):
-                normalized.append({"p": entry["p"], "ts": entry.get("ts", 0)})
-            elif isinstance(entry, str):
-                normalized.append({"p": entry, "ts": 0})
-        return normalized
+        return _normalize_token_entries(token_entries)
 
     def _extract_tokens_from_payload(self, payload):
-        if not isinstance(payload, dict):
-            return []
-        tokens = self._normalize_token_entries(payload.get("tokens", []))
-        if tokens:
-            return tokens
-        # Backward compatibility with older structures
-        patterns = payload.get("__patterns__", {})
-        if isinstance(patterns, dict):
-            legacy_tokens = []
-            for values in patterns.values():
-                for item in values if isinstance(values, list) else []:
-                    if isinstance(item, dict) and item.get("pattern"):
-                        pattern = item["pattern"]
-                        if item.get("literal"):
-                            pattern = re.escape(pattern)
-                        legacy_tokens.append(
-                            {"p": pattern, "ts": item.get("ts", 0)})
-            if legacy_tokens:
-                return legacy_tokens
-        return []
+        return _extract_tokens_from_payload(payload)
 
     def _regions_from_legacy_list(self, payload):
         regions = []
@@ -331,15 +1079,28 @@ class StyleOptionsStorage:
                 tokens.add(re.escape(literal))
         return tokens
 
+    @_profiled("add_tokens")
     def add_tokens(self, style_ind, patterns):
         style_key = REGION_NAME % style_ind
-        key_data = self._merged_scope_data(include_legacy=False)
-        payload = key_data.get(style_key, {})
-        existing = self._extract_tokens_from_payload(payload)
-        merged_tokens = self._merge_tokens(existing, patterns)
-        key_data[style_key] = {"tokens": merged_tokens}
-        self._save_scope_data(key_data, purge_legacy=False)
-
+        written = None
+        if self.store is not None:
+            patterns = list(patterns)
+            written = (len(patterns), sum(len(style_key) + len(p) for p in patterns))
+            if _profiler is not None:
+                _profiler.count("store_bytes", written[1])
+            self.store.add_tokens(
+                self.key, style_key, patterns, time.time(),
+                MAX_TOKENS_PER_STYLE, self.scope_keys)
+        else:
+            key_data = self._merged_scope_data(include_legacy=False)
+            payload = key_data.get(style_key, {})
+            existing = self._extract_tokens_from_payload(payload)
+            merged_tokens = self._merge_tokens(existing, patterns)
+            key_data[style_key] = {"tokens": merged_tokens}
+            self._save_scope_data(key_data, purge_legacy=False)
+        self._purge_oldest_entries(written)
+
+    @_profiled("save")
     def save(self):
         existing_data = self._merged_scope_data(include_legacy=False)
         data = {}
@@ -354,88 +1115,242 @@ class StyleOptionsStorage:
                 data[style_key] = {"tokens": merged_tokens}
 
         self._save_scope_data(data, purge_legacy=False)
+        self._purge_oldest_entries((
+            sum(len(payload["tokens"]) for payload in data.values()),
+            sum(len(style_key) + len(token["p"])
+                for style_key, payload in data.items() for token in payload["tokens"])))
 
-        # Global storage cap check
-        store_path = os.path.join(
-            sublime.packages_path(), 'User', REGION_STORE)
-        if os.path.exists(store_path) and os.path.getsize(store_path) > MAX_STORAGE_SIZE:
-            self._purge_oldest_entries()
-
-    def _purge_oldest_entries(self):
-        all_data = dict(_settings_items(self.settings))
-        all_tokens = []
-        for file_key, styles in all_data.items():
-            for style_key, regions in styles.items():
-                if not isinstance(regions, dict):
-                    continue
-                for token in self._extract_tokens_from_payload(regions):
-                    all_tokens.append((file_key, style_key, token))
-        # Sort globally by timestamp
-        all_tokens.sort(key=lambda x: x[2].get("ts", 0))
-        # Keep only newest half
-        keep = all_tokens[len(all_tokens)//2:]
-        new_data = {}
-        for file_key, style_key, token in keep:
-            new_data.setdefault(file_key, {}).setdefault(
-                style_key, {}).setdefault("tokens", []).append(token)
-        # Replace settings
-        for k in list(all_data.keys()):
-            self.settings.erase(k)
-        for k, v in new_data.items():
-            self.settings.set(k, v)
-        _set_settings_index(self.settings, list(new_data.keys()))
-        sublime.save_settings(REGION_STORE)
-        sublime.status_message("Style Options: Storage pruned to reduce size.")
+    def touch(self):
+        """Record that this scope was just used, for LRU eviction."""
+        now = time.time()
+        if self.store is not None:
+            self.store.touch(self.scope_keys, now)
+            return
+        access = _get_settings_access(self.settings)
+        touched = False
+        for key in self.scope_keys:
+            if isinstance(self.settings.get(key), dict):
+                access[key] = now
+                touched = True
+        if touched:
+            self.settings.set(SETTINGS_ACCESS_KEY, access)
+            _save_region_store_later()
+
+    @_profiled("_purge_oldest_entries")
+    def _purge_oldest_entries(self, written=None):
+        """
+        Drop least recently used scopes until storage is within the
+        configured token and byte budget. The current scope is kept.
+
+        ``written`` is the ``(tokens, bytes)`` just stored; the SQLite
+        store is only asked to evict once the running total crosses the
+        budget. Written tokens that replace stored ones count again, so
+        the total can only run high, and it is measured afresh after an
+        eviction. With the buffered store evicted scopes are reported
+        when the write lands; see _report_evicted.
+        """
+        max_tokens, max_bytes = _storage_budget()
+        if self.store is not None:
+            if _store_usage["tokens"] is None:
+                _store_usage["tokens"], _store_usage["bytes"] = self.store.usage()
+            elif written is not None:
+                _store_usage["tokens"] += written[0]
+                _store_usage["bytes"] += written[1]
+            if _store_usage["tokens"] <= max_tokens and _store_usage["bytes"] <= max_bytes:
+                return
+            _store_usage["tokens"] = None
+            evicted = self.store.evict_lru(max_tokens, max_bytes, [self.key])
+        else:
+            evicted = self._evict_settings_scopes(max_tokens, max_bytes)
+        if evicted:
+            _report_evicted(evicted)
 
+    def _evict_settings_scopes(self, max_tokens, max_bytes):
+        tokens, size = _settings_usage(self.settings)
+        if tokens <= max_tokens and size <= max_bytes:
+            return []
+        access = _get_settings_access(self.settings)
+        evicted = []
+        for key in sorted(_settings_scope_usage, key=lambda k: access.get(k, 0)):
+            if tokens <= max_tokens and size <= max_bytes:
+                break
+            if key == self.key:
+                continue
+            self.settings.erase(key)
+            _remove_settings_index_key(self.settings, key)
+            access.pop(key, None)
+            _set_settings_scope_usage(key, None)
+            tokens, size = _settings_usage(self.settings)
+            evicted.append(key)
+        self.settings.set(SETTINGS_ACCESS_KEY, access)
+        _save_region_store_later()
+        return evicted
+
+    @_profiled("restore")
     def restore(self):
         data = self._merged_scope_data(include_legacy=True)
+        return _apply_scope_data(
+            self.view,
+            data,
+            self._extract_tokens_from_payload,
+            self._regions_from_legacy_list
+        )
+
+    @_profiled("restore_async")
+    def restore_async(self, chunk_size=ASYNC_CHUNK_CHARS):
+        data = self._merged_scope_data(include_legacy=True)
+        style_keys, style_patterns = _collect_scope_styles(
+            data, self._extract_tokens_from_payload)
+
+        # Legacy region lists need no scan; apply them right away.
         restored = False
-        for key, payload in data.items():
-            try:
-                style_ind = int(re.search(r'\d+', key).group())
-            except Exception:
+        for key, style_ind, payload, has_patterns in style_keys:
+            if has_patterns:
                 continue
-            token_entries = self._extract_tokens_from_payload(payload)
-            patterns = [entry["p"]
-                        for entry in token_entries if entry.get("p")]
-            regions = []
-            if patterns:
-                seen = set()
-                for pattern in patterns:
-                    try:
-                        found = self.view.find_all(pattern)
-                    except Exception:
-                        continue
-                    for region in found:
-                        key_tuple = (region.a, region.b)
-                        if key_tuple not in seen:
-                            seen.add(key_tuple)
-                            regions.append(region)
-            elif isinstance(payload, list):
-                regions = self._regions_from_legacy_list(payload)
-            self.view.add_regions(
-                key,
-                regions,
-                get_style(style_ind),
-                '',
-                STYLE_FLAGS.get(style_ind, sublime.DRAW_NO_OUTLINE)
-            )
+            regions = self._regions_from_legacy_list(payload) if isinstance(payload, list) else []
+            _add_style_regions(self.view, key, style_ind, regions)
             if regions:
                 restored = True
+
+        if style_patterns:
+            identity = _view_file_identity(self.view)
+            cached = _cached_style_regions(identity, style_patterns)
+            if cached is None:
+                _start_restore_job(self.view, style_keys, style_patterns, chunk_size, identity)
+                return True
+            for key, style_ind, _, has_patterns in style_keys:
+                if has_patterns:
+                    _add_style_regions(self.view, key, style_ind, cached.get(style_ind, []))
+            _record_scan_mark(self.view, style_patterns)
+            return True
         return restored
 
+    def is_current(self):
+        """True when this view's regions already reflect the stored tokens."""
+        mark = _scan_marks.get(self.view.id())
+        if mark is None:
+            return False
+        if mark["change_count"] != self.view.change_count() or mark["offset"] != self.view.size():
+            return False
+        data = self._merged_scope_data(include_legacy=True)
+        _, style_patterns = _collect_scope_styles(data, self._extract_tokens_from_payload)
+        return mark["signature"] == token_signature(style_patterns)
+
+    @_profiled("restore_tail")
+    def restore_tail(self):
+        """
+        Match the stored tokens against text appended since the last scan and
+        merge the hits into the existing style regions. Returns None when the
+        buffer was edited rather than appended to, or the token set changed;
+        the caller then needs a full restore.
+        """
+        mark = _scan_marks.get(self.view.id())
+        if mark is None or not _appended_since_mark(self.view, mark):
+            return None
+
+        data = self._merged_scope_data(include_legacy=True)
+        style_keys, style_patterns = _collect_scope_styles(
+            data, self._extract_tokens_from_payload)
+        if not style_patterns or mark["signature"] != token_signature(style_patterns):
+            return None
+
+        size = self.view.size()
+        if size == mark["offset"]:
+            return False
+
+        # Rescan from the start of the line the last scan ended in, so a
+        # token completed by the appended text is still found.
+        begin = self.view.line(mark["offset"]).begin()
+        found = _find_style_regions(self.view, style_patterns, begin, size)
+        merged = {}
+        for key, style_ind, _, has_patterns in style_keys:
+            if not has_patterns:
+                continue
+            kept = [r for r in _style_regions(self.view, key, style_ind) if r.begin() < begin]
+            merged[style_ind] = kept + found.get(style_ind, [])
+            _add_style_regions(self.view, key, style_ind, merged[style_ind])
+
+        _cache_style_regions(_view_file_identity(self.view), style_patterns, merged)
+        _record_scan_mark(self.view, style_patterns)
+        return True
+
+    def _refresh_scan_mark(self):
+        # The token set changed and the regions already reflect it for the
+        # whole buffer; keep the mark usable for the next tail restore.
+        mark = _scan_marks.get(self.view.id())
+        if mark is None or mark["offset"] != self.view.size():
+            return
+        data = self._merged_scope_data(include_legacy=True)
+        _, style_patterns = _collect_scope_styles(data, self._extract_tokens_from_payload)
+        mark["signature"] = token_signature(style_patterns)
+
     def clear(self):
         for style in range(MAX_STYLES):
             self.view.erase_regions(REGION_NAME % style)
+        _drop_windowed_styles(self.view.id())
+        _regions_changed(self.view)
         self._save_scope_data({}, purge_legacy=True)
 
     def clear_style(self, style_ind):
         style_key = REGION_NAME % rollover(style_ind)
         self.view.erase_regions(style_key)
+        _drop_windowed_styles(self.view.id(), rollover(style_ind))
+        _regions_changed(self.view)
+        if self.store is not None:
+            self.store.delete_style(self.key, style_key, self.scope_keys)
+            self._refresh_scan_mark()
+            return
         key_data = self._merged_scope_data(include_legacy=False)
         if style_key in key_data:
             del key_data[style_key]
         self._save_scope_data(key_data, purge_legacy=False)
+        self._refresh_scan_mark()
+
+    # Profiles: named {style_key: [pattern, ...]} token sets, kept apart
+    # from folder scopes so they survive eviction and purges.
+
+    def _settings_profiles(self):
+        profiles = self.settings.get(SETTINGS_PROFILES_KEY, {})
+        return dict(profiles) if isinstance(profiles, dict) else {}
+
+    def profile_names(self):
+        if self.store is not None:
+            return self.store.profile_names()
+        return sorted(self._settings_profiles())
+
+    def save_profile(self, name):
+        """Save this scope's current tokens as ``name``; returns the token count."""
+        data = self._merged_scope_data(include_legacy=True)
+        profile = {}
+        for style_key, payload in data.items():
+            patterns = [t["p"] for t in self._extract_tokens_from_payload(payload)]
+            if patterns:
+                profile[style_key] = patterns
+        if self.store is not None:
+            self.store.save_profile(name, profile)
+        else:
+            profiles = self._settings_profiles()
+            profiles[name] = profile
+            self.settings.set(SETTINGS_PROFILES_KEY, profiles)
+            _save_region_store_later()
+        return sum(len(patterns) for patterns in profile.values())
+
+    def load_profile(self, name):
+        """``{style index: [pattern, ...]}`` for a saved profile."""
+        if self.store is not None:
+            profile = self.store.load_profile(name)
+        else:
+            profile = self._settings_profiles().get(name, {})
+        return profile_style_patterns(profile)
+
+    def delete_profile(self, name):
+        if self.store is not None:
+            self.store.delete_profile(name)
+            return
+        profiles = self._settings_profiles()
+        if profiles.pop(name, None) is not None:
+            self.settings.set(SETTINGS_PROFILES_KEY, profiles)
+            _save_region_store_later()
 
 
 # Core logic
@@ -451,10 +1366,39 @@ def get_current_regions(view, style_index):
     if style_index < 0:
         currentRegions = []
         for style in range(MAX_STYLES):
-            currentRegions += view.get_regions(REGION_NAME % style)
+            currentRegions += _style_regions(view, REGION_NAME % style, style)
         return sorted(currentRegions, key=lambda region: region.begin())
     else:
-        return view.get_regions(REGION_NAME % rollover(style_index))
+        style = rollover(style_index)
+        return _style_regions(view, REGION_NAME % style, style)
+
+
+def _navigation_index(view, style_index):
+    """
+    OffsetIndex over one style, or every style for -1. Rebuilt only after
+    regions were added or erased, or the buffer changed (which moves them).
+    """
+    _refresh_view_window(view)
+    key = -1 if style_index < 0 else rollover(style_index)
+    if key >= 0:
+        entry = _windowed_styles.get(view.id(), {}).get(key)
+        if entry is not None:
+            return entry["index"]
+    stamp = (_region_generation.get(view.id(), 0), view.change_count())
+    indexes = _nav_indexes.setdefault(view.id(), {})
+    cached = indexes.get(key)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+    index = OffsetIndex((r.begin(), r.end()) for r in get_current_regions(view, style_index))
+    indexes[key] = (stamp, index)
+    return index
+
+
+def _move_to_index_entry(view, index, position):
+    begin, end = index.span(position)
+    move_selection(view, sublime.Region(begin, end))
+    sublime.status_message(
+        "Style Options: Highlight %d of %d" % (position + 1, len(index)))
 
 
 # --------------------
@@ -531,8 +1475,9 @@ def move_selection(view, region):
     view.show(region)
 
 
-def color_selection(view, style_ind):
-    current_regions = view.get_regions(REGION_NAME % style_ind)
+def _selection_tokens(view):
+    # Escaped selections; an empty selection stands for the whole word
+    # under the caret, matched on word boundaries.
     tokens = set()
     for region in view.sel():
         whole_word_only = region.empty()
@@ -545,21 +1490,189 @@ def color_selection(view, style_ind):
         if whole_word_only and escaped and escaped[0].isalnum():
             escaped = r'\b%s\b' % escaped
         tokens.add(escaped)
+    return tokens
 
+
+def color_selection(view, style_ind):
+    current_regions = _style_regions(view, REGION_NAME % style_ind, style_ind)
+    tokens = _selection_tokens(view)
     if tokens:
-        if len(tokens) == 1 and not whole_word_only:
-            current_regions.extend(view.find_all(literal, sublime.LITERAL))
-        else:
-            current_regions.extend(view.find_all('|'.join(tokens)))
-        view.add_regions(
-            REGION_NAME % style_ind,
-            current_regions,
-            get_style(style_ind),
-            '',
-            STYLE_FLAGS.get(style_ind, sublime.DRAW_NO_OUTLINE)
-        )
+        # Same single pass as restore; literal tokens skip the regex engine.
+        found = _find_style_regions(view, {style_ind: sorted(tokens)})
+        current_regions.extend(found.get(style_ind, []))
+        _add_style_regions(view, REGION_NAME % style_ind, style_ind, current_regions)
         storage = StyleOptionsStorage(view)
         storage.add_tokens(style_ind, tokens)
+        storage._refresh_scan_mark()
+
+
+# --------------------
+# propagation
+# --------------------
+def _scope_style_patterns(view, path):
+    storage = StyleOptionsStorage(view, path)
+    data = storage._merged_scope_data(include_legacy=True)
+    return _collect_scope_styles(data, _extract_tokens_from_payload)[1]
+
+
+def _prime_match_cache(identity, style_patterns, hits):
+    _match_cache.put(identity, token_signature(style_patterns), hits)
+
+
+class _PropagateJob(object):
+    """
+    Match a scope's stored tokens against every trace file under its root
+    on a worker pool, report hits of one style per file to an output panel,
+    and prime the match cache so those files restore without a scan.
+
+    The plugin host cannot start worker processes, so the pool is threads:
+    reading overlaps, matching still shares the interpreter.
+    """
+
+    def __init__(self, view, scope_root, style_ind):
+        self.view = view
+        self.window = view.window()
+        self.scope_root = scope_root
+        self.style_ind = style_ind
+        self.panel = self.window.create_output_panel(PROPAGATE_PANEL)
+        self.panel.set_read_only(False)
+
+    def log(self, msg):
+        sublime.set_timeout(
+            lambda: self.panel.run_command("append", {"characters": msg + "\n"}), 0)
+
+    def start(self):
+        # Settings and scope storage are read here and in _start_scan, on
+        # the UI thread; the worker threads only get plain data.
+        settings = _settings()
+        self.file_patterns = settings.get("highlighter_propagate_file_patterns", list(TRACE_FILE_PATTERNS))
+        self.workers = settings.get("highlighter_propagate_workers", 0) or None
+        self.started = time.time()
+        self.window.run_command("show_panel", {"panel": "output.%s" % PROPAGATE_PANEL})
+        self.log("Highlight %d across %s" % (self.style_ind + 1, self.scope_root))
+        thread = threading.Thread(target=self._list_files)
+        thread.daemon = True
+        thread.start()
+
+    def _list_files(self):
+        try:
+            paths = []
+            for path in iter_trace_files(self.scope_root, self.file_patterns):
+                if len(paths) >= PROPAGATE_MAX_FILES:
+                    self.log("Stopped at %d files." % PROPAGATE_MAX_FILES)
+                    break
+                paths.append(path)
+            sublime.set_timeout(lambda: self._start_scan(paths), 0)
+        except Exception:
+            traceback.print_exc()
+            self.log("Propagation failed; see the console.")
+
+    def _start_scan(self, paths):
+        by_folder = {}
+        jobs = []
+        for path in paths:
+            folder = os.path.dirname(path)
+            # Scope keys only depend on the folder.
+            if folder not in by_folder:
+                by_folder[folder] = _scope_style_patterns(self.view, path)
+            if by_folder[folder]:
+                jobs.append((path, by_folder[folder]))
+        thread = threading.Thread(target=self._run, args=(jobs,))
+        thread.daemon = True
+        thread.start()
+
+    def _run(self, jobs):
+        try:
+            total = 0
+            files_hit = 0
+            for job, result, error in run_pool(scan_file, jobs, self.workers, processes=False):
+                rel_path = os.path.relpath(job[0], self.scope_root)
+                if error is not None:
+                    self.log("   error  %s: %s" % (rel_path, error))
+                    continue
+                _, identity, hits, rejected = result
+                count = len(hits.get(self.style_ind, []))
+                total += count
+                if count:
+                    files_hit += 1
+                self.log("%8d  %s" % (count, rel_path))
+                # Tokens only Sublime's regex understands were not matched,
+                # so those results must not stand in for a full restore.
+                if identity is not None and not rejected:
+                    sublime.set_timeout(
+                        lambda i=identity, p=job[1], h=hits: _prime_match_cache(i, p, h), 0)
+            self.log("%d hits in %d of %d files, %.1f s" % (
+                total, files_hit, len(jobs), time.time() - self.started))
+            sublime.set_timeout(self._restore_open_views, 0)
+        except Exception:
+            traceback.print_exc()
+            self.log("Propagation failed; see the console.")
+
+    def _restore_open_views(self):
+        prefix = self.scope_root + os.sep
+        for view in self.window.views():
+            file_name = view.file_name()
+            if view.id() == self.view.id() or not file_name:
+                continue
+            real = os.path.normcase(os.path.realpath(file_name))
+            if real.startswith(prefix):
+                _restore_view(StyleOptionsStorage(view))
+
+
+# --------------------
+# profile report
+# --------------------
+class _ProfileReportJob(object):
+    """
+    Run a profile over every trace file under a folder and write a
+    file/style/hits/first/last table to a new scratch view. Threads, for
+    the same reason as _PropagateJob; highlight_report.py runs the same
+    report from a shell with worker processes.
+    """
+
+    def __init__(self, window, name, style_patterns, root):
+        self.window = window
+        self.name = name
+        self.style_patterns = style_patterns
+        self.root = root
+
+    def start(self):
+        sublime.status_message("Style Options: Running profile %s..." % self.name)
+        settings = _settings()
+        thread = threading.Thread(target=self._run, args=(
+            settings.get("highlighter_propagate_file_patterns", list(TRACE_FILE_PATTERNS)),
+            settings.get("highlighter_propagate_workers", 0) or None))
+        thread.daemon = True
+        thread.start()
+
+    def _run(self, file_patterns, workers):
+        try:
+            started = time.time()
+            results = profile_report(self.root, self.style_patterns, file_patterns, workers, processes=False)
+            rows, (errors, rejected, scanned) = report_rows(self.root, results)
+            lines = [
+                "Profile %s over %s" % (self.name, self.root),
+                "%d files scanned, %d with hits, %.1f s" % (
+                    scanned, len(set(row[0] for row in rows)), time.time() - started),
+                "",
+                format_table(rows),
+            ]
+            lines.extend("error: %s: %s" % (rel_path, error) for rel_path, error in errors)
+            lines.extend("skipped (not a Python regex): Highlight %d: %s" % (style + 1, pattern)
+                         for style, pattern in rejected)
+            report = "\n".join(lines) + "\n"
+            sublime.set_timeout(lambda: self._show(report), 0)
+        except Exception:
+            traceback.print_exc()
+            sublime.set_timeout(
+                lambda: sublime.status_message("Style Options: Profile report failed; see the console."), 0)
+
+    def _show(self, report):
+        view = self.window.new_file()
+        view.set_name("Profile %s" % self.name)
+        view.set_scratch(True)
+        view.run_command("append", {"characters": report})
+        view.set_read_only(True)
 
 
 # Commands
@@ -595,31 +1708,162 @@ class StyleOptionsToggleBookmarkAtEventCommand(sublime_plugin.TextCommand):
 class StyleOptionsGoCommand(sublime_plugin.TextCommand):
     def run(self, edit, style_index=-1):
         view = self.view
-        current_regions = get_current_regions(view, style_index)
-        if current_regions:
+        index = _navigation_index(view, style_index)
+        if len(index):
             selections = view.sel()
-            if selections:
-                pos = selections[0].end()
-                for region in current_regions:
-                    if region.begin() > pos:
-                        move_selection(view, region)
-                        return
-            move_selection(view, current_regions[0])
+            position = index.next_after(selections[0].end()) if selections else None
+            _move_to_index_entry(view, index, 0 if position is None else position)
 
 
 class StyleOptionsGoBackCommand(sublime_plugin.TextCommand):
     def run(self, edit, style_index=-1):
         view = self.view
-        current_regions = get_current_regions(view, style_index)
-        if current_regions:
+        index = _navigation_index(view, style_index)
+        if len(index):
             selections = view.sel()
-            if selections:
-                pos = selections[0].end()
-                for region in reversed(current_regions):
-                    if region.begin() < pos:
-                        move_selection(view, region)
-                        return
-            move_selection(view, current_regions[-1])
+            position = index.prev_before(selections[0].end()) if selections else None
+            _move_to_index_entry(view, index, len(index) - 1 if position is None else position)
+
+
+class StyleOptionsGoNthCommand(sublime_plugin.TextCommand):
+    """Jump to the nth highlight (1-based, negative counts from the end)"""
+
+    def run(self, edit, n=None, style_index=-1):
+        view = self.view
+        index = _navigation_index(view, style_index)
+        if not len(index):
+            sublime.status_message("Style Options: No highlights in this view.")
+            return
+        if n is None:
+            window = view.window()
+            if window is not None:
+                window.show_input_panel(
+                    "Go to highlight (1-%d, negative from end):" % len(index), "",
+                    lambda text: self._on_done(text, style_index), None, None)
+            return
+        position = n - 1 if n > 0 else len(index) + n
+        if n == 0 or not 0 <= position < len(index):
+            sublime.status_message(
+                "Style Options: There are only %d highlights." % len(index))
+            return
+        _move_to_index_entry(view, index, position)
+
+    def _on_done(self, text, style_index):
+        try:
+            n = int(text.strip())
+        except ValueError:
+            sublime.status_message("Style Options: Not a number: %s" % text)
+            return
+        self.view.run_command("style_options_go_nth", {"n": n, "style_index": style_index})
+
+
+class StyleOptionsCountCommand(sublime_plugin.TextCommand):
+    """Show how many highlights lie before and after the cursor"""
+
+    def run(self, edit, style_index=-1):
+        view = self.view
+        index = _navigation_index(view, style_index)
+        selections = view.sel()
+        pos = selections[0].begin() if selections else 0
+        before, after = index.counts(pos)
+        sublime.status_message(
+            "Style Options: %d highlights, %d before and %d after the cursor." % (len(index), before, after))
+
+
+class StyleOptionsPropagateCommand(sublime_plugin.TextCommand):
+    """Highlight the selection here and in every trace file of the folder scope"""
+
+    def run(self, edit, style_index=None):
+        view = self.view
+        window = view.window()
+        if window is None:
+            return
+        if style_index is None:
+            window.show_quick_panel(
+                ["Highlight %d" % (style + 1) for style in range(MAX_STYLES)],
+                lambda index: index >= 0 and view.run_command(
+                    "style_options_propagate", {"style_index": index}))
+            return
+        if not view.file_name():
+            sublime.status_message("Style Options: Save the file to highlight its folder.")
+            return
+        style_ind = rollover(style_index)
+        if not _selection_tokens(view):
+            return
+        color_selection(view, style_ind)
+        _PropagateJob(view, StyleOptionsStorage(view).scope_root, style_ind).start()
+
+
+class StyleOptionsSaveProfileCommand(sublime_plugin.TextCommand):
+    """Save the tokens highlighted in this folder scope as a named profile"""
+
+    def run(self, edit, name=None):
+        if name is None:
+            window = self.view.window()
+            if window is not None:
+                window.show_input_panel(
+                    "Profile name:", "",
+                    lambda text: text.strip() and self.view.run_command(
+                        "style_options_save_profile", {"name": text.strip()}),
+                    None, None)
+            return
+        count = StyleOptionsStorage(self.view).save_profile(name)
+        sublime.status_message("Style Options: Saved %d tokens as profile %s." % (count, name))
+
+
+class StyleOptionsDeleteProfileCommand(sublime_plugin.TextCommand):
+    def run(self, edit, name=None):
+        storage = StyleOptionsStorage(self.view)
+        if name is None:
+            names = storage.profile_names()
+            window = self.view.window()
+            if names and window is not None:
+                window.show_quick_panel(
+                    names,
+                    lambda index: index >= 0 and self.view.run_command(
+                        "style_options_delete_profile", {"name": names[index]}))
+            elif not names:
+                sublime.status_message("Style Options: No saved profiles.")
+            return
+        storage.delete_profile(name)
+        sublime.status_message("Style Options: Deleted profile %s." % name)
+
+
+class StyleOptionsProfileReportCommand(sublime_plugin.TextCommand):
+    """Count a profile's tokens in every trace file under a folder"""
+
+    def run(self, edit, name=None, folder=None):
+        view = self.view
+        window = view.window()
+        if window is None:
+            return
+        storage = StyleOptionsStorage(view)
+        if name is None:
+            names = storage.profile_names()
+            if not names:
+                sublime.status_message("Style Options: No saved profiles.")
+                return
+            window.show_quick_panel(
+                names,
+                lambda index: index >= 0 and view.run_command(
+                    "style_options_profile_report", {"name": names[index], "folder": folder}))
+            return
+        if folder is None:
+            default = storage.scope_root or (window.folders() or [""])[0]
+            window.show_input_panel(
+                "Folder to scan:", default,
+                lambda text: text.strip() and view.run_command(
+                    "style_options_profile_report", {"name": name, "folder": text.strip()}),
+                None, None)
+            return
+        if not os.path.isdir(folder):
+            sublime.status_message("Style Options: Not a folder: %s" % folder)
+            return
+        style_patterns = storage.load_profile(name)
+        if not style_patterns:
+            sublime.status_message("Style Options: Profile %s is empty." % name)
+            return
+        _ProfileReportJob(window, name, style_patterns, folder).start()
 
 
 class StyleOptionsClearCommand(sublime_plugin.TextCommand):
@@ -640,6 +1884,53 @@ class StyleOptionsSaveCommand(sublime_plugin.TextCommand):
         sublime.status_message("Style Options: Highlights saved.")
 
 
+class StyleOptionsRestoreTailCommand(sublime_plugin.TextCommand):
+    """Pick up highlights in lines appended since the last restore"""
+
+    def run(self, edit):
+        storage = StyleOptionsStorage(self.view)
+        restored = storage.restore_tail()
+        if restored is None:
+            _restore_view(storage)
+            sublime.status_message("Style Options: Highlights restored.")
+        else:
+            sublime.status_message("Style Options: New lines highlighted.")
+
+
+class StyleOptionsToggleTimingCommand(sublime_plugin.WindowCommand):
+    """Turn timing of restore/save/eviction on or off; turning it on starts afresh."""
+
+    def run(self, enable=None):
+        if enable is None:
+            enable = _profiler is None
+        _set_profiling(enable)
+        sublime.status_message("Style Options: Timing %s." % ("on" if enable else "off"))
+
+    def is_checked(self, enable=None):
+        return _profiler is not None
+
+
+class StyleOptionsDumpTimingCommand(sublime_plugin.WindowCommand):
+    """Show the timing summary in a panel and write it to User/StyleOptionsTiming.json."""
+
+    def run(self, reset=False):
+        global _profiler
+        if _profiler is None:
+            sublime.status_message("Style Options: Timing is off; run \"Toggle Highlight Timing\" first.")
+            return
+        summary = _profiler.summary()
+        path = os.path.join(sublime.packages_path(), 'User', TIMING_FILE)
+        try:
+            write_summary(summary, path)
+        except (IOError, OSError, TypeError, ValueError) as error:
+            path = "not written: %s" % error
+        panel = self.window.create_output_panel(TIMING_PANEL)
+        panel.run_command("append", {"characters": format_summary(summary) + "\nJSON: %s\n" % path})
+        self.window.run_command("show_panel", {"panel": "output.%s" % TIMING_PANEL})
+        if reset:
+            _profiler = Profiler()
+
+
 class StyleOptionsPurgeCommand(sublime_plugin.WindowCommand):
     """Manual purge command to reset storage file"""
 
@@ -648,7 +1939,14 @@ class StyleOptionsPurgeCommand(sublime_plugin.WindowCommand):
         for k, _ in _settings_items(settings):
             settings.erase(k)
         settings.erase(SETTINGS_INDEX_KEY)
+        settings.erase(SETTINGS_ACCESS_KEY)
         sublime.save_settings(REGION_STORE)
+        _reset_settings_usage()
+        _store_usage["tokens"] = None
+        store = _highlight_store()
+        if store is not None:
+            store.purge_all()
+        _match_cache.clear()
         sublime.status_message("Style Options: All stored highlights purged.")
 
 
@@ -681,8 +1979,14 @@ class StyleOptionsListener(sublime_plugin.EventListener):
                 )
             return
         storage = StyleOptionsStorage(view)
-        restored = _restore_storage(storage)
-        if not restored and retries > 0:
+        if storage.is_current():
+            return
+        restored = _restore_view(storage)
+        if restored:
+            # Only a restore counts as a use for LRU eviction: touching on
+            # every activation would write the store on each tab switch.
+            storage.touch()
+        elif retries > 0:
             sublime.set_timeout(
                 lambda: self._restore_when_ready(view, retries - 1, delay_ms),
                 delay_ms
@@ -694,6 +1998,71 @@ class StyleOptionsListener(sublime_plugin.EventListener):
                 lambda: self._restore_when_ready(view), 50)
 
     def on_activated(self, view):
+        if view.id() in _windowed_styles:
+            _schedule_window_refresh()
         if view.file_name():
             sublime.set_timeout(
                 lambda: self._restore_when_ready(view), 80)
+
+    def on_close(self, view):
+        _cancel_restore_job(view.id())
+        _scan_marks.pop(view.id(), None)
+        _nav_indexes.pop(view.id(), None)
+        _region_generation.pop(view.id(), None)
+        _drop_windowed_styles(view.id())
+        _flush_highlight_writes()
+
+    def on_exit(self):
+        _flush_highlight_writes()
+
+    def on_modified_async(self, view):
+        self._schedule_tail_restore(view)
+
+    def on_reload_async(self, view):
+        self._schedule_tail_restore(view)
+
+    def _schedule_tail_restore(self, view):
+        mark = _scan_marks.get(view.id())
+        if mark is None or not view.file_name() or view.size() <= mark["offset"]:
+            return
+        if not _settings().get("highlighter_incremental_tail", True):
+            return
+        change_count = view.change_count()
+        sublime.set_timeout(
+            lambda: self._restore_tail_when_idle(view, change_count),
+            TAIL_DEBOUNCE_MS
+        )
+
+    def _restore_tail_when_idle(self, view, change_count):
+        if not view.is_valid() or view.change_count() != change_count:
+            return
+        mark = _scan_marks.get(view.id())
+        if mark is None:
+            return
+        if not _appended_since_mark(view, mark):
+            # Edited rather than appended to; regions already moved with
+            # the text, so just stop tracking until the next full restore.
+            _scan_marks.pop(view.id(), None)
+            return
+        if StyleOptionsStorage(view).restore_tail() is None:
+            self._restore_when_ready(view, retries=0)
+
+
+if hasattr(sublime_plugin, "TextChangeListener"):
+    class StyleOptionsWindowedChangeListener(sublime_plugin.TextChangeListener):
+        """Keeps windowed styles in step with edits; see _edit_windowed_styles."""
+
+        @classmethod
+        def is_applicable(cls, buffer):
+            return True
+
+        def on_text_changed(self, changes):
+            for view in self.buffer.views():
+                if view.id() not in _windowed_styles:
+                    continue
+                if len(changes) != 1:
+                    _rescan_windowed_styles(view)
+                    continue
+                change = changes[0]
+                begin = change.a.pt
+                _edit_windowed_styles(view, begin, change.b.pt, begin + len(change.str))
@@ -0,0 +1,169 @@
+"""
+Literal multi-token matching for the highlighter.
+
+Tokens stored by color_selection are ``re.escape``'d literals, usually
+wrapped in ``\b``. When every token of a scan is such a literal they are
+matched as strings instead of through one big regex alternation, which sre
+tries branch by branch at every position of the text.
+
+Two strategies, both C-speed for the inner loop:
+
+* up to FIND_LITERALS_MAX literals, ``str.find`` per literal;
+* above that, every word run of the text is looked up in a dictionary of
+  literals keyed by their leading word, so the cost stops growing with the
+  number of tokens. Literals that cannot be anchored on a word start
+  (unbounded, or starting with punctuation) still go through ``str.find``.
+
+A character-level automaton such as Aho-Corasick would need a Python-level
+step per character, which is slower here than either of the above.
+
+Results are the ones a ``find_all`` per token gives, as restore did
+before the combined pass: each token matches leftmost first and never
+overlaps its own earlier matches, but is matched independently of the
+other tokens, so a token that is a prefix of, inside or overlapping
+another keeps its hits. A span matched by several tokens of one style is
+reported once. Nothing in here imports ``sublime``.
+"""
+import re
+from collections import OrderedDict
+
+# Above this many distinct literals, anchor on word runs instead of one
+# str.find pass per literal.
+FIND_LITERALS_MAX = 128
+
+_WORD_BOUNDARY = r'\b'
+_ESCAPED_LITERAL = re.compile(r'^(?:\\[^A-Za-z0-9]|[^\\.^$*+?{}\[\]|()])+$')
+_UNESCAPE = re.compile(r'\\(.)', re.S)
+_WORD_RUN = re.compile(r'\w+')
+
+
+def _is_word_char(text, index):
+    if index < 0 or index >= len(text):
+        return False
+    ch = text[index]
+    return ch.isalnum() or ch == '_'
+
+
+def _is_boundary(text, index):
+    return _is_word_char(text, index - 1) != _is_word_char(text, index)
+
+
+def literal_of(pattern):
+    """
+    Return ``(text, bounded)`` when ``pattern`` is an escaped literal, as
+    produced by color_selection (optionally wrapped in ``\b``), else None.
+    """
+    core = pattern
+    bounded = False
+    if core.startswith(_WORD_BOUNDARY) and core.endswith(_WORD_BOUNDARY) and len(core) > 4:
+        core = core[2:-2]
+        bounded = True
+    if not _ESCAPED_LITERAL.match(core):
+        return None
+    return _UNESCAPE.sub(r'\1', core), bounded
+
+
+def all_literal(style_patterns):
+    """True when every non-empty pattern in ``{style: [pattern]}`` is a literal."""
+    found = False
+    for patterns in style_patterns.values():
+        for pattern in patterns:
+            if not pattern:
+                continue
+            if literal_of(pattern) is None:
+                return False
+            found = True
+    return found
+
+
+class LiteralMatcher(object):
+    """
+    Drop-in for highlight_engine.TaggedMatcher when every token is a
+    literal; raises ValueError otherwise. ``rejected`` is always empty.
+    """
+
+    def __init__(self, style_patterns):
+        self.rejected = []
+        self._ordered = []  # (text, bounded, styles) per distinct pattern
+
+        owners = OrderedDict()
+        for style in sorted(style_patterns):
+            for pattern in style_patterns[style]:
+                if not pattern:
+                    continue
+                styles = owners.setdefault(pattern, [])
+                if style not in styles:
+                    styles.append(style)
+
+        for pattern, styles in owners.items():
+            literal = literal_of(pattern)
+            if literal is None:
+                raise ValueError("not a literal token: %r" % pattern)
+            text, bounded = literal
+            self._ordered.append((text, bounded, tuple(styles)))
+
+        self._anchors = None
+        self._unanchored = list(enumerate(self._ordered))
+        if len(self._ordered) > FIND_LITERALS_MAX:
+            self._anchors = {}
+            self._unanchored = []
+            for rank, entry in enumerate(self._ordered):
+                text, bounded, _ = entry
+                lead = _WORD_RUN.match(text)
+                if bounded and lead is not None:
+                    self._anchors.setdefault(lead.group(), []).append((rank, text))
+                else:
+                    self._unanchored.append((rank, entry))
+
+    def __bool__(self):
+        return bool(self._ordered)
+
+    __nonzero__ = __bool__
+
+    def _candidates(self, text):
+        # (begin, rank, end) for every place a literal matches, overlaps
+        # included; scan() keeps the ones a find_all per literal would.
+        found = []
+        append = found.append
+        for rank, (literal, bounded, _) in self._unanchored:
+            size = len(literal)
+            index = text.find(literal)
+            while index >= 0:
+                if not bounded or (_is_boundary(text, index) and _is_boundary(text, index + size)):
+                    append((index, rank, index + size))
+                    index = text.find(literal, index + size)
+                else:
+                    index = text.find(literal, index + 1)
+
+        if self._anchors:
+            anchors = self._anchors
+            startswith = text.startswith
+            for run in _WORD_RUN.finditer(text):
+                entries = anchors.get(run.group())
+                if entries is None:
+                    continue
+                index = run.start()
+                for rank, literal in entries:
+                    end = index + len(literal)
+                    if startswith(literal, index) and _is_boundary(text, end):
+                        append((index, rank, end))
+        found.sort()
+        return found
+
+    def scan(self, text, offset=0):
+        """Yield ``(style, begin, end)`` for every match in ``text``, in order of ``begin``."""
+        ordered = self._ordered
+        ends = [0] * len(ordered)  # per literal: where its last match ended
+        last = None
+        seen = set()
+        for begin, rank, end in self._candidates(text):
+            if begin < ends[rank]:
+                continue
+            ends[rank] = end
+            if begin != last:
+                last = begin
+                seen.clear()
+            for style in ordered[rank][2]:
+                if (style, end) not in seen:
+                    seen.add((style, end))
+                    yield style, offset + begin, offset + end
@@ -0,0 +1,287 @@
+"""
+Columnar index of the SdlSig lines of a CUCM SDL trace, saved to a cache
+file per trace and checked against the file's identity, so a trace is
+only scanned once.
+
+For every signal line the index holds the offset and line number, the
+time of day, direction (I, O, or none where the trace has no
+SdlSig-I/SdlSig-O), signal, destination and source process (as
+"Name(1,100,224,1)") and the CI= and connection ids of the line, each in
+its own ``array`` column; names are kept once in string tables. Filtering
+on a CI or a signal and counting per signal or process run over those
+columns, not over the text.
+
+Used by the "SDL Signal Histogram" and "SDL Signals for CI" commands and
+runnable on its own:
+
+    python sdl_index.py sdl001_100_000123.txt
+    python sdl_index.py sdl001_100_000123.txt --ci 10008376
+
+Nothing in here imports ``sublime``; callers pass a ``read`` callable
+returning text for a ``(begin, end)`` character range, or a path.
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+from array import array
+from collections import Counter
+
+try:
+    from .highlight_engine import file_identity, iter_chunks
+    from .trace_scan import TIMESTAMP, TIMESTAMP_SEARCH_CHARS, iter_file_chunks, open_trace, timestamp_key
+except ImportError:
+    from highlight_engine import file_identity, iter_chunks
+    from trace_scan import TIMESTAMP, TIMESTAMP_SEARCH_CHARS, iter_file_chunks, open_trace, timestamp_key
+
+# "00000123 |14:00:00.024 |SdlSig-O |CcSetupReq |Cdcc(1,100,224,1) |SIPD(1,100,105,1) |...",
+# or as CUCM writes it now, without a direction and with the state the
+# destination is in, "|SdlSig |CcSetupReq |restart0 |Cdcc(1,100,224,1) |...":
+# direction (if any), signal, destination and source process, rest of the
+# line. A column after the signal that is not "Name(1,100,224,1)" is the state.
+SDL_SIGNAL = re.compile(
+    r'\|[^\S\n]*SdlSig(?:-([IO]))?[^\S\n]*\|[^\S\n]*([^|\s]+)[^\S\n]*\|'
+    r'(?:(?![^\S\n]*[^|\s(]+\(\d+,\d+,\d+,\d+\)[^\S\n]*\|)[^|\n]*\|)?'
+    r'[^\S\n]*([^|\n]*?)[^\S\n]*\|[^\S\n]*([^|\n]*?)[^\S\n]*\|([^\n]*)')
+CI = re.compile(r'\bCI=(\d+)')
+CONNECTION = re.compile(r'\bConn(?:ection)?Id=(\d+)', re.IGNORECASE)
+PROCESS_NAME = re.compile(r'[^(\s]+')
+NO_ID = -1
+DIRECTIONS = {"I": 0, "O": 1}
+COLUMNS = (("offset", "q"), ("line", "q"), ("micros", "q"), ("direction", "b"),
+           ("signal", "l"), ("destination", "l"), ("source", "l"), ("ci", "q"), ("connection", "q"))
+CACHE_VERSION = 2
+CACHE_SUFFIX = ".sdlidx"
+CACHE_MAX_FILES = 64
+HISTOGRAM_WIDTH = 40
+
+
+class SdlIndex(object):
+    """The signal lines of one trace as COLUMNS arrays and the string tables they point into."""
+
+    def __init__(self):
+        for name, typecode in COLUMNS:
+            setattr(self, name, array(typecode))
+        self.signals = []
+        self.processes = []
+        self._ids = {}
+        self._by_ci = None
+
+    def __len__(self):
+        return len(self.offset)
+
+    def _intern(self, table, value):
+        key = (id(table), value)
+        number = self._ids.get(key)
+        if number is None:
+            number = self._ids[key] = len(table)
+            table.append(value)
+        return number
+
+    def add_text(self, text, offset=0, line=1):
+        """Index the signal lines of ``text`` (whole lines), ``line`` being its first line's number."""
+        pos = 0
+        last = -1
+        for m in SDL_SIGNAL.finditer(text):
+            start = text.rfind("\n", 0, m.start()) + 1
+            if start == last:
+                continue
+            line += text.count("\n", pos, start)
+            pos = last = start
+            stamp = TIMESTAMP.search(text, start, min(m.start(), start + TIMESTAMP_SEARCH_CHARS))
+            tail = m.group(5)
+            ci = CI.search(tail)
+            connection = CONNECTION.search(tail)
+            self.offset.append(offset + start)
+            self.line.append(line)
+            self.micros.append(timestamp_key(stamp)[1] if stamp else NO_ID)
+            self.direction.append(DIRECTIONS.get(m.group(1), NO_ID))
+            self.signal.append(self._intern(self.signals, m.group(2)))
+            self.destination.append(self._intern(self.processes, m.group(3)))
+            self.source.append(self._intern(self.processes, m.group(4)))
+            self.ci.append(int(ci.group(1)) if ci else NO_ID)
+            self.connection.append(int(connection.group(1)) if connection else NO_ID)
+        self._by_ci = None
+        return line + text.count("\n", pos)
+
+    def rows_for_ci(self, ci):
+        """Rows with ``ci`` as their CI or connection id, in file order."""
+        if self._by_ci is None:
+            by_ci = {}
+            for column in (self.ci, self.connection):
+                for row, value in enumerate(column):
+                    if value != NO_ID:
+                        by_ci.setdefault(value, set()).add(row)
+            self._by_ci = by_ci
+        return sorted(self._by_ci.get(ci, ()))
+
+    def rows_for_signal(self, name):
+        if name not in self.signals:
+            return []
+        number = self.signals.index(name)
+        return [row for row, value in enumerate(self.signal) if value == number]
+
+    def row_text(self, row):
+        """One row as "14:00:00.024 O CcSetupReq  SIPD(...) -> Cdcc(...)  CI=..."."""
+        micros = self.micros[row]
+        stamp = "--:--:--.---" if micros == NO_ID else "%02d:%02d:%02d.%03d" % (
+            micros // 3600000000, micros // 60000000 % 60, micros // 1000000 % 60, micros // 1000 % 1000)
+        ids = " ".join("{}={}".format(label, value) for label, value in (
+            ("CI", self.ci[row]), ("ConnId", self.connection[row])) if value != NO_ID)
+        return "{} {} {}  {} -> {}  {}".format(
+            stamp, "-IO"[self.direction[row] + 1], self.signals[self.signal[row]],
+            self.processes[self.source[row]], self.processes[self.destination[row]], ids).rstrip()
+
+    def histogram(self):
+        """
+        ``{"signal": [(name, count)], "process": [...], "process/signal": [...]}``,
+        most first; a signal counts for the process it is sent to, instances
+        of a process together.
+        """
+        names = [PROCESS_NAME.match(p).group() if PROCESS_NAME.match(p) else p for p in self.processes]
+        signals = Counter(self.signal)
+        processes = Counter()
+        for number, count in Counter(self.destination).items():
+            processes[names[number]] += count
+        pairs = Counter()
+        for (destination, signal), count in Counter(zip(self.destination, self.signal)).items():
+            pairs["{} / {}".format(names[destination], self.signals[signal])] += count
+        return {
+            "signal": [(self.signals[number], count) for number, count in signals.most_common()],
+            "process": processes.most_common(),
+            "process/signal": pairs.most_common(),
+        }
+
+
+def build(read, size, chunk_size=None, cancelled=None):
+    """
+    SdlIndex of a text of ``size`` characters read through ``read``.
+    ``cancelled()`` is checked at each chunk; when true, None is returned.
+    """
+    index = SdlIndex()
+    line = 1
+    chunks = iter_chunks(read, 0, size) if chunk_size is None else iter_chunks(read, 0, size, chunk_size)
+    for offset, text in chunks:
+        if cancelled is not None and cancelled():
+            return None
+        line = index.add_text(text, offset, line)
+    return index
+
+
+def index_file(path):
+    """SdlIndex of a trace on disk."""
+    index = SdlIndex()
+    line = 1
+    with open_trace(path) as handle:
+        for offset, text in iter_file_chunks(handle):
+            line = index.add_text(text, offset, line)
+    return index
+
+
+def cache_file(cache_dir, path):
+    real = os.path.normcase(os.path.realpath(path))
+    return os.path.join(cache_dir, hashlib.sha1(real.encode("utf-8")).hexdigest() + CACHE_SUFFIX)
+
+
+def save(index, identity, cache_dir, max_files=CACHE_MAX_FILES):
+    """Write ``index`` for the file of ``identity``; the oldest cache files past ``max_files`` go."""
+    if not identity:
+        return
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+    header = {"version": CACHE_VERSION, "identity": list(identity), "rows": len(index),
+              "signals": index.signals, "processes": index.processes}
+    target = cache_file(cache_dir, identity[0])
+    temp = target + ".tmp"
+    with open(temp, "wb") as handle:
+        handle.write(json.dumps(header).encode("utf-8") + b"\n")
+        for name, _ in COLUMNS:
+            getattr(index, name).tofile(handle)
+    os.replace(temp, target)
+    cached = sorted((os.path.getmtime(os.path.join(cache_dir, name)), name)
+                    for name in os.listdir(cache_dir) if name.endswith(CACHE_SUFFIX))
+    for _, name in cached[:max(0, len(cached) - max_files)]:
+        os.remove(os.path.join(cache_dir, name))
+
+
+def load(path, cache_dir, identity=None):
+    """The cached SdlIndex of ``path`` when it matches the file as it is now, else None."""
+    identity = identity or file_identity(path)
+    target = cache_file(cache_dir, path)
+    if not identity or not os.path.isfile(target):
+        return None
+    try:
+        with open(target, "rb") as handle:
+            header = json.loads(handle.readline().decode("utf-8"))
+            if header.get("version") != CACHE_VERSION or tuple(header["identity"]) != tuple(identity):
+                return None
+            index = SdlIndex()
+            index.signals = header["signals"]
+            index.processes = header["processes"]
+            for name, _ in COLUMNS:
+                getattr(index, name).fromfile(handle, header["rows"])
+    except (IOError, OSError, EOFError, ValueError, KeyError):
+        return None
+    return index
+
+
+def load_or_index(path, cache_dir):
+    """The index of ``path`` from the cache, else scanned and cached. Returns ``(index, cached)``."""
+    identity = file_identity(path)
+    index = load(path, cache_dir, identity)
+    if index is not None:
+        return index, True
+    index = index_file(path)
+    if identity is not None and file_identity(path) == identity:
+        try:
+            save(index, identity, cache_dir)
+        except (IOError, OSError):
+            pass
+    return index, False
+
+
+def format_histogram(index, top=None):
+    """The histogram of ``index`` as text bars, one section per count."""
+    sections = []
+    for title, counts in sorted(index.histogram().items()):
+        counts = counts[:top] if top else counts
+        if not counts:
+            continue
+        width = max(len(name) for name, _ in counts)
+        peak = counts[0][1]
+        lines = ["By {} ({} signal lines):".format(title, len(index)), ""]
+        lines.extend("{}  {:>8}  {}".format(name.ljust(width), count,
+                                            "#" * max(1, count * HISTOGRAM_WIDTH // peak))
+                     for name, count in counts)
+        sections.append("\n".join(lines))
+    return "\n\n".join(sections) + "\n"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("path", help="SDL trace file")
+    parser.add_argument("--ci", type=int, help="list the signals of this CI or connection id")
+    parser.add_argument("--signal", help="list the lines of this signal")
+    parser.add_argument("--top", type=int, default=30, help="rows per histogram (default: %(default)s)")
+    parser.add_argument("--cache", help="cache folder (default: no cache)")
+    args = parser.parse_args(argv)
+
+    if not os.path.isfile(args.path):
+        parser.error("no such file: %s" % args.path)
+    if args.cache:
+        index, _ = load_or_index(args.path, args.cache)
+    else:
+        index = index_file(args.path)
+    if args.ci is not None or args.signal:
+        rows = index.rows_for_ci(args.ci) if args.ci is not None else index.rows_for_signal(args.signal)
+        for row in rows:
+            sys.stdout.write("%d: %s\n" % (index.line[row], index.row_text(row)))
+    else:
+        sys.stdout.write(format_histogram(index, args.top))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
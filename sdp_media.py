@@ -0,0 +1,433 @@
+"""
+Per-call media table of CUCM SDI and CUBE traces: the SDP offers and
+answers of every call, with codecs, ptime, direction attribute and media
+address and port, plus the media addresses CUCM logs as hex IPs in SDL
+signals, across every trace of a bundle.
+
+An SDP body is the run of "x=..." lines starting at a "v=0" line; it
+belongs to the SIP message logged just above it, whose Call-ID, start
+line and direction are read as in sip_index. Within one file the SDPs of
+a call are paired in order: one with no offer outstanding is the offer,
+the next one the answer (an INVITE with SDP or a late offer in a 200 OK
+and the ACK). A repeat of the last SDP of a call (same o= line, message
+and direction) is a retransmission and is left out.
+
+Hex IPs are those the hover decodes ("IpAddr=0a01a8c0", little-endian,
+and "ip '0A01A8C0'h", in network order), with a port on the same line;
+they are listed under the CI= of their line, or "-" when it has none.
+
+Used by the "SDP Media Table" command and runnable on its own, with one
+worker process per core:
+
+    python sdp_media.py BUNDLE --list
+    python sdp_media.py BUNDLE --call-id 9f1c2a00-1c41-4b2d@10.10.1.20
+
+Nothing in here imports ``sublime``.
+"""
+import argparse
+import bisect
+import os
+import re
+import sys
+
+try:
+    from .cucm_decoders import IPADDR_PATTERNS, _hex_to_ipv4_pairs
+    from .highlight_report import format_table
+    from .sdl_index import CI, SDL_SIGNAL
+    from .sip_index import (
+        CALL_ID, CSEQ, DIRECTION, DIRECTION_LOOKBACK_CHARS, LINE, MAX_HEADER_CHARS, OFFSET, PEER,
+        SIP_START, START_LINE, TIME_KEY, TIMESTAMP, _direction, _message, message_label)
+    from .trace_scan import (
+        NO_NODE, TRACE_FILE_PATTERNS, iter_file_chunks, iter_trace_files, line_timestamp_match, node_of,
+        open_trace, run_pool, sort_keys, timestamp_key)
+except ImportError:
+    from cucm_decoders import IPADDR_PATTERNS, _hex_to_ipv4_pairs
+    from highlight_report import format_table
+    from sdl_index import CI, SDL_SIGNAL
+    from sip_index import (
+        CALL_ID, CSEQ, DIRECTION, DIRECTION_LOOKBACK_CHARS, LINE, MAX_HEADER_CHARS, OFFSET, PEER,
+        SIP_START, START_LINE, TIME_KEY, TIMESTAMP, _direction, _message, message_label)
+    from trace_scan import (
+        NO_NODE, TRACE_FILE_PATTERNS, iter_file_chunks, iter_trace_files, line_timestamp_match, node_of,
+        open_trace, run_pool, sort_keys, timestamp_key)
+
+# An SDP record is a sip_index message tuple, with the offset and line of
+# its "v=0" line, followed by these two.
+ORIGIN, MEDIA = 11, 12
+# Fields of each MEDIA entry, in tuple order.
+MEDIA_FIELDS = ("kind", "port", "proto", "codecs", "ptime", "mode", "address")
+# Fields of a hex IP record, in tuple order.
+HEX_FIELDS = ("offset", "line", "timestamp", "ci", "signal", "address", "port", "time_key")
+HEX_TIME_KEY = 7
+TABLE_COLUMNS = ("time", "node", "message", "sdp", "peer", "media", "address", "codecs", "ptime",
+                 "mode", "note", "at")
+CALL_COLUMNS = ("call", "sdp", "hex", "files", "first", "last", "addresses")
+NO_CALL = "-"
+
+SDP_START = re.compile(r'^[^\S\n]*v=0[^\S\n]*$', re.MULTILINE)
+SDP_LINE = re.compile(r'[^\S\n]*([a-z])=([^\n]*?)[^\S\n]*(?:\n|\Z)')
+# An SDP longer than this is cut; a "v=0" this near the end of a chunk is
+# left for the next one.
+MAX_SDP_CHARS = 8192
+# Where IPADDR_PATTERNS can match; much quicker to find than they are.
+HEX_IP_HINT = re.compile(r"[Ii][Pp](?:[Aa][Dd][Dd][Rr])?[^\S\n]*[=']")
+HEX_PORT = re.compile(r'\b(?:Port|PortNumber|RtpPort|MediaPort)\s*=\s*(\d+)', re.IGNORECASE)
+MODES = frozenset(("sendrecv", "sendonly", "recvonly", "inactive"))
+# Static RTP payload types (RFC 3551), for m= lines with no rtpmap.
+STATIC_PAYLOADS = {0: "PCMU", 3: "GSM", 4: "G723", 8: "PCMA", 9: "G722", 13: "CN", 15: "G728",
+                   18: "G729", 26: "JPEG", 31: "H261", 34: "H263"}
+# Requests that carry the answer to an outstanding offer, not a new one.
+ANSWER_REQUESTS = frozenset(("ACK", "PRACK"))
+# Not codecs: left out when codecs of an offer and its answer are compared.
+NOT_CODECS = frozenset(("telephone-event", "CN", "red", "ulpfec", "rtx"))
+
+
+def parse_sdp(text, start, end):
+    """``(origin, media, sdp_end)`` of the SDP whose "v=0" line starts at ``start``."""
+    origin = ""
+    session = {"address": "", "mode": None}
+    media = []
+    current = None
+    pos = start
+    while pos < end:
+        m = SDP_LINE.match(text, pos, end)
+        if m is None:
+            break
+        pos = m.end()
+        kind, value = m.group(1), m.group(2)
+        target = current if current is not None else session
+        if kind == "o":
+            origin = value
+        elif kind == "c":
+            target["address"] = value.split()[-1] if value.split() else ""
+        elif kind == "m":
+            parts = value.split()
+            current = {"kind": parts[0] if parts else "?", "port": parts[1] if len(parts) > 1 else "",
+                       "proto": parts[2] if len(parts) > 2 else "", "formats": parts[3:],
+                       "rtpmap": {}, "ptime": "", "mode": None, "address": ""}
+            media.append(current)
+        elif kind == "a":
+            name, _, rest = value.partition(":")
+            if name in MODES:
+                target["mode"] = name
+            elif current is not None and name == "rtpmap":
+                payload, _, encoding = rest.partition(" ")
+                current["rtpmap"][payload] = encoding.split("/")[0]
+            elif current is not None and name == "ptime":
+                current["ptime"] = rest.strip()
+    entries = []
+    for item in media:
+        codecs = []
+        for payload in item["formats"]:
+            name = item["rtpmap"].get(payload)
+            if name is None:
+                name = STATIC_PAYLOADS.get(int(payload), payload) if payload.isdigit() else payload
+            codecs.append(name)
+        port = item["port"].split("/")[0]
+        entries.append((item["kind"], int(port) if port.isdigit() else -1, item["proto"], tuple(codecs),
+                        item["ptime"], item["mode"] or session["mode"] or "sendrecv",
+                        item["address"] or session["address"]))
+    return origin, tuple(entries), pos
+
+
+def _hex_ips(text, begin, end):
+    """Hex IP records of the lines in ``[begin, end)``, offsets and lines relative to ``text``."""
+    found = []
+    for hint in HEX_IP_HINT.finditer(text, begin, end):
+        for regex in IPADDR_PATTERNS:
+            m = regex.match(text, hint.start(), end)
+            if m is not None:
+                break
+        else:
+            continue
+        parsed = _hex_to_ipv4_pairs(m.group(1))
+        if not parsed:
+            continue
+        line_start = text.rfind("\n", 0, m.start()) + 1
+        line_end = text.find("\n", m.end())
+        if line_end < 0:
+            line_end = len(text)
+        line_text = text[line_start:line_end]
+        port = HEX_PORT.search(line_text, m.end() - line_start)
+        if port is None:
+            continue
+        ci = CI.search(line_text)
+        signal = SDL_SIGNAL.search(line_text)
+        address = parsed["le_ip"] if "IpAddr" in m.group(0) else parsed["be_ip"]
+        stamp = line_timestamp_match(text, line_start)
+        found.append((m.start(), line_start, stamp.group() if stamp else None,
+                      "CI={}".format(ci.group(1)) if ci else NO_CALL,
+                      signal.group(2) if signal else "", address, int(port.group(1)),
+                      timestamp_key(stamp) if stamp else None))
+    return found
+
+
+def _scan(text, final, skip=0):
+    """
+    ``(sdps, hexes, consumed)`` for the SDP bodies and hex IPs in ``text``
+    at or after ``skip``, offsets relative to it and lines counted from 0.
+    ``consumed`` is where an SDP that may go on past ``text`` starts, or
+    ``len(text)``; unless ``final``, it is left for the next chunk.
+    """
+    consumed = len(text)
+    starts = [m.start() for m in SIP_START.finditer(text)]
+    sdps = []
+    for m in SDP_START.finditer(text, skip):
+        if not final and m.start() > len(text) - MAX_SDP_CHARS:
+            consumed = m.start()
+            break
+        i = bisect.bisect_left(starts, m.start())
+        if not i or m.start() - starts[i - 1] > MAX_HEADER_CHARS:
+            continue
+        start = starts[i - 1]
+        start_line, call_id, cseq, from_tag, to_tag, via = _message(text, start, m.start())
+        if not call_id:
+            continue
+        direction, peer = _direction(text, start, starts[i - 2] if i > 1 else 0)
+        if peer is None and direction is not None:
+            if (direction == "in") != start_line.startswith("SIP/"):
+                peer = via
+        origin, media, _ = parse_sdp(text, m.start(), min(len(text), m.start() + MAX_SDP_CHARS))
+        stamp = line_timestamp_match(text, start)
+        sdps.append((m.start(), None, stamp.group() if stamp else None, direction, peer, start_line,
+                     call_id, cseq, from_tag, to_tag, timestamp_key(stamp) if stamp else None,
+                     origin, media))
+    hexes = _hex_ips(text, skip, consumed)
+    # Line numbers, in one pass over the offsets of both.
+    line = 0
+    pos = 0
+    numbered = {}
+    for offset in sorted(set([r[OFFSET] for r in sdps] + [r[1] for r in hexes])):
+        line += text.count("\n", pos, offset)
+        pos = offset
+        numbered[offset] = line
+    sdps = [(r[OFFSET], numbered[r[OFFSET]]) + r[2:] for r in sdps]
+    hexes = [(r[0], numbered[r[1]]) + r[2:] for r in hexes]
+    return sdps, hexes, consumed
+
+
+def scan_file(path):
+    """
+    The SDP records and hex IP records of ``path``, in file order, lines
+    counted from 1. Returns ``(path, sdps, hexes)``.
+    """
+    sdps = []
+    hexes = []
+    carry = ""
+    skip = 0
+    carry_offset = 0
+    carry_line = 1  # line number of the start of ``carry``
+
+    def shift(records):
+        return [(carry_offset + r[0], carry_line + r[1]) + r[2:] for r in records]
+
+    with open_trace(path) as handle:
+        for _, text in iter_file_chunks(handle):
+            text = carry + text
+            found, found_hex, consumed = _scan(text, False, skip)
+            sdps.extend(shift(found))
+            hexes.extend(shift(found_hex))
+            # Carry an SDP cut by the chunk end, with the message above it
+            # and the lines before that giving its direction.
+            keep = text.rfind("\n", 0, max(0, consumed - MAX_HEADER_CHARS - DIRECTION_LOOKBACK_CHARS)) + 1
+            skip = consumed - keep
+            carry_offset += keep
+            carry_line += text.count("\n", 0, keep)
+            carry = text[keep:]
+    if carry[skip:]:
+        found, found_hex, _ = _scan(carry, True, skip)
+        sdps.extend(shift(found))
+        hexes.extend(shift(found_hex))
+    return path, sdps, hexes
+
+
+def _by_time(found, time_key):
+    """``[(rel_path, record), ...]`` by the parsed timestamp at ``time_key``, then file and offset."""
+    keys = sort_keys([record[time_key] for _, record in found])
+    order = sorted(range(len(found)), key=lambda i: (keys[i], found[i][0], found[i][1][0]))
+    return [found[i] for i in order]
+
+
+def _codecs(media):
+    return set(codec for entry in media for codec in entry[3] if codec not in NOT_CODECS)
+
+
+class MediaTable(object):
+    """The SDP and hex IP records of the traces under ``root``, by call."""
+
+    def __init__(self, root):
+        self.root = root
+        self.sdps = {}  # call_id -> [(rel_path, record), ...]
+        self.hexes = {}  # "CI=n" or NO_CALL -> [(rel_path, record), ...]
+        self.files = set()
+        self.errors = []
+
+    def add(self, path, sdps, hexes):
+        rel_path = os.path.relpath(path, self.root)
+        self.files.add(rel_path)
+        for record in sdps:
+            self.sdps.setdefault(record[CALL_ID], []).append((rel_path, record))
+        for record in hexes:
+            self.hexes.setdefault(record[3], []).append((rel_path, record))
+
+    @property
+    def calls(self):
+        return set(self.sdps) | set(self.hexes)
+
+    @property
+    def total(self):
+        return sum(len(found) for found in self.sdps.values())
+
+    def offers(self, call_id):
+        """
+        ``[(rel_path, record, role, note), ...]`` for the SDPs of a call in
+        time order: role "offer N" or "answer N", retransmissions left out.
+        """
+        found = _by_time(self.sdps.get(call_id, []), TIME_KEY)
+        pending = {}  # rel_path -> (pair, offer record)
+        pairs = {}
+        last = {}
+        rows = []
+        for rel_path, record in found:
+            seen = (record[ORIGIN], record[START_LINE], record[CSEQ], record[DIRECTION], record[MEDIA])
+            if last.get(rel_path) == seen:
+                continue
+            last[rel_path] = seen
+            offer = pending.get(rel_path)
+            request = not record[START_LINE].startswith("SIP/")
+            if offer is not None and request and record[CSEQ] != offer[1][CSEQ] \
+                    and message_label(record) not in ANSWER_REQUESTS:
+                offer = None  # a new offer in a new transaction
+            note = ""
+            if offer is None:
+                pairs[rel_path] = pairs.get(rel_path, 0) + 1
+                pending[rel_path] = (pairs[rel_path], record)
+                role = "offer {}".format(pairs[rel_path])
+            else:
+                pending.pop(rel_path)
+                role = "answer {}".format(offer[0])
+                offered = _codecs(offer[1][MEDIA])
+                if offered and not offered & _codecs(record[MEDIA]):
+                    note = "no common codec"
+            rows.append((rel_path, record, role, note))
+        return rows
+
+    def table_rows(self, call_id):
+        """TABLE_COLUMNS rows of one call: a row per m= line of its SDPs, then its hex IPs."""
+        rows = []
+        for rel_path, record, role, note in self.offers(call_id):
+            node = _node(rel_path)
+            peer = "{} {}".format(record[DIRECTION] or "?", record[PEER] or "").strip()
+            for kind, port, proto, codecs, ptime, mode, address in record[MEDIA] or (("-",) * 7,):
+                notes = [note] if note else []
+                if port == 0:
+                    notes.append("rejected")
+                elif address in ("0.0.0.0", "::") or mode == "inactive":
+                    notes.append("hold")
+                rows.append((record[TIMESTAMP] or "", node, message_label(record), role, peer,
+                             "{} {}".format(kind, proto).strip(),
+                             "{}:{}".format(address, port) if port != "-" else "-",
+                             " ".join(codecs), ptime, mode, ", ".join(notes),
+                             "@ {}:{}".format(rel_path, record[LINE])))
+        for rel_path, (_, line, timestamp, _, signal, address, port, _) in _by_time(
+                self.hexes.get(call_id, []), HEX_TIME_KEY):
+            rows.append((timestamp or "", _node(rel_path), signal or "-", "sdl", "", "hex IP",
+                         "{}:{}".format(address, port), "", "", "", "",
+                         "@ {}:{}".format(rel_path, line)))
+        return rows
+
+    def call_rows(self):
+        """One CALL_COLUMNS row per call, earliest first; calls without a CI last."""
+        rows = []
+        firsts = []
+        for call_id in self.calls:
+            sdps = self.sdps.get(call_id, [])
+            hexes = self.hexes.get(call_id, [])
+            stamps = [(r[TIME_KEY], r[TIMESTAMP]) for _, r in sdps if r[TIMESTAMP]]
+            stamps.extend((r[HEX_TIME_KEY], r[2]) for _, r in hexes if r[2])
+            keys = sort_keys([key for key, _ in stamps])
+            order = sorted(range(len(stamps)), key=lambda i: keys[i])
+            times = [stamps[i][1] for i in order]
+            firsts.append(stamps[order[0]][0] if order else None)
+            addresses = set("{}:{}".format(entry[6], entry[1]) for _, r in sdps for entry in r[MEDIA])
+            addresses.update("{}:{}".format(r[5], r[6]) for _, r in hexes)
+            rows.append((call_id, len(sdps), len(hexes),
+                         len(set(rel_path for rel_path, _ in sdps + hexes)),
+                         times[0] if times else "", times[-1] if times else "",
+                         " ".join(sorted(addresses))))
+        keys = sort_keys(firsts)
+        order = sorted(range(len(rows)), key=lambda i: (rows[i][0] == NO_CALL, keys[i], rows[i][0]))
+        return [rows[i] for i in order]
+
+
+def _node(rel_path):
+    node = node_of(rel_path)
+    return "local" if node == NO_NODE else node
+
+
+def build_media_table(root, file_patterns=TRACE_FILE_PATTERNS, workers=None, processes=True,
+                      progress=None):
+    """
+    Scan ``root`` (a file, or every matching file under a folder) on the
+    pool. ``progress(path, error)`` is called as each file finishes.
+    """
+    if os.path.isfile(root):
+        files = [root]
+        root = os.path.dirname(root)
+    else:
+        files = list(iter_trace_files(root, file_patterns))
+    table = MediaTable(root)
+    for job, result, error in run_pool(scan_file, [(path,) for path in files], workers, processes):
+        if error is not None:
+            table.errors.append((os.path.relpath(job[0], root), error))
+        else:
+            table.add(*result)
+        if progress is not None:
+            progress(job[0], error)
+    return table
+
+
+def format_call(table, call_id):
+    """The media table of one call, with a heading."""
+    rows = table.table_rows(call_id)
+    if not rows:
+        return "No SDP or hex IPs for {}\n".format(call_id)
+    heading = "Call-ID: {}".format(call_id) if not call_id.startswith("CI=") and call_id != NO_CALL \
+        else "SDL {}".format(call_id if call_id != NO_CALL else "(no CI)")
+    return "{}\n\n{}".format(heading, format_table(rows, TABLE_COLUMNS))
+
+
+def format_report(table, call_ids=None):
+    """The media tables of ``call_ids``, or of every call, earliest first."""
+    if call_ids is None:
+        call_ids = [row[0] for row in table.call_rows()]
+    return "\n".join(format_call(table, call_id) for call_id in call_ids)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("path", help="trace file or folder (an extracted bundle)")
+    parser.add_argument("--call-id", action="append", dest="call_ids",
+                        help="print the table of this Call-ID or CI=n; may be repeated (default: all)")
+    parser.add_argument("--list", action="store_true", help="list the calls instead")
+    parser.add_argument("--files", nargs="+", default=list(TRACE_FILE_PATTERNS),
+                        help="file name patterns for folders (default: %(default)s)")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.path):
+        parser.error("no such file or folder: %s" % args.path)
+    table = build_media_table(args.path, args.files, args.workers, processes=True)
+    if args.list:
+        sys.stdout.write(format_table(table.call_rows(), CALL_COLUMNS))
+    else:
+        sys.stdout.write(format_report(table, args.call_ids))
+    for rel_path, error in table.errors:
+        sys.stderr.write("error: %s: %s\n" % (rel_path, error))
+    sys.stderr.write("%d SDP bodies, %d calls in %d files\n" % (
+        table.total, len(table.calls), len(table.files)))
+    return 1 if table.errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,407 @@
+"""
+Index the SIP messages of CUCM SDI and CUBE traces by Call-ID, across
+every trace of a bundle, and draw the ladder of one call.
+
+A message is its start line (request or status line) and the headers
+after it; for each one the index keeps the file
+offset and line, timestamp, direction and peer, Call-ID, CSeq, the
+From/To tags and the parsed timestamp (trace_scan.timestamp_key), which
+orders the messages of CUCM and CUBE traces together although their
+timestamps are written differently. Bodies are not kept.
+
+Used by the "SIP Ladder" command and runnable on its own, with one worker
+process per core:
+
+    python sip_index.py BUNDLE
+    python sip_index.py BUNDLE --call-id 9f1c2a00-1c41-4b2d@10.10.1.20
+
+Files are indexed once: SipIndexCache keeps the messages of every file
+by its identity, so building the index of a bundle again only reads the
+files that changed, and a Call-ID lookup is a dict lookup and a sort.
+Nothing in here imports ``sublime``.
+"""
+import argparse
+import os
+import re
+import sys
+from collections import OrderedDict
+
+try:
+    from .highlight_engine import file_identity
+    from .highlight_report import format_table
+    from .trace_scan import (
+        NO_NODE, TRACE_FILE_PATTERNS, iter_file_chunks, iter_trace_files, line_timestamp_match, node_of,
+        open_trace, run_pool, sort_keys, timestamp_key)
+except ImportError:
+    from highlight_engine import file_identity
+    from highlight_report import format_table
+    from trace_scan import (
+        NO_NODE, TRACE_FILE_PATTERNS, iter_file_chunks, iter_trace_files, line_timestamp_match, node_of,
+        open_trace, run_pool, sort_keys, timestamp_key)
+
+# Fields of an indexed message, in tuple order.
+MESSAGE_FIELDS = ("offset", "line", "timestamp", "direction", "peer", "start_line",
+                  "call_id", "cseq", "from_tag", "to_tag", "time_key")
+OFFSET, LINE, TIMESTAMP, DIRECTION, PEER, START_LINE, CALL_ID, CSEQ, FROM_TAG, TO_TAG, TIME_KEY = range(11)
+CALL_COLUMNS = ("call_id", "messages", "files", "first", "last", "start")
+
+# Request line or status line, alone on its line.
+SIP_START = re.compile(
+    r'^[^\S\n]*(?:[A-Z][A-Z-]+ (?:sips?|tel|urn):\S+ SIP/2\.0|SIP/2\.0 \d{3}(?: [^\n]*?)?)[^\S\n]*$',
+    re.MULTILINE)
+HEADER = re.compile(
+    r'^[^\S\n]*(call-id|i|cseq|from|f|to|t|via|v)[^\S\n]*:[^\S\n]*([^\n]*?)[^\S\n]*$',
+    re.MULTILINE | re.IGNORECASE)
+HEADER_NAMES = {"i": "call-id", "f": "from", "t": "to", "v": "via"}
+TAG = re.compile(r';\s*tag=([^;,>\s]+)', re.IGNORECASE)
+VIA_SENT_BY = re.compile(r'SIP/2\.0/\w+\s+([^;,\s]+)', re.IGNORECASE)
+# The line break before the first line that is neither a header nor a
+# folded header line: the blank line before the body, or the next line
+# of the trace when the message was logged without one.
+HEADERS_END = re.compile(r'\n(?![^\S\n]*[\w.!%*+`\'~-]+[^\S\n]*:|[ \t]+\S|\Z)')
+# What CUCM and CUBE log on the lines before a message:
+# "Incoming SIP TCP message from 10.10.1.20 on port 5060 index 12 with 1234 bytes:",
+# "Outgoing SIP TCP message to 10.10.1.20 on port 5060 index 12", "Received:", "Sent:".
+DIRECTION_LINE = re.compile(
+    r'\b(Incoming|Outgoing) SIP (?:\w+ )?message (?:from|to) ([0-9A-Za-z.:\[\]_-]+)(?: on port (\d+))?'
+    r'|^[^\S\n]*(Received|Sent):[^\S\n]*$',
+    re.MULTILINE)
+DIRECTIONS = {"Incoming": "in", "Received": "in", "Outgoing": "out", "Sent": "out"}
+DIRECTION_LOOKBACK_CHARS = 512
+# Headers are looked for this far past the start line; past it, or the
+# next start line, a message ends regardless.
+MAX_HEADER_CHARS = 8192
+SIP_INDEX_CACHE_MAX_FILES = 512
+LADDER_COLUMN = 28
+
+
+def _direction(text, line_start, after=0):
+    """
+    ``(direction, peer)`` from the lines logged just before a message, and
+    after ``after`` (the end of the message before it).
+    """
+    before = text[max(after, line_start - DIRECTION_LOOKBACK_CHARS):line_start]
+    found = None
+    for found in DIRECTION_LINE.finditer(before):
+        pass
+    if found is None:
+        return None, None
+    if found.group(4):
+        return DIRECTIONS[found.group(4)], None
+    peer = found.group(2)
+    if found.group(3):
+        peer = "{}:{}".format(peer, found.group(3))
+    return DIRECTIONS[found.group(1)], peer
+
+
+def _message(text, start, end):
+    """``(start_line, call_id, cseq, from_tag, to_tag, via)`` of the message at ``start``."""
+    line_end = text.find("\n", start, end)
+    if line_end < 0:
+        line_end = end
+    headers = {}
+    for m in HEADER.finditer(text, line_end, end):
+        name = m.group(1).lower()
+        name = HEADER_NAMES.get(name, name)
+        if name not in headers:
+            headers[name] = m.group(2)
+    from_tag = TAG.search(headers.get("from", ""))
+    to_tag = TAG.search(headers.get("to", ""))
+    via = VIA_SENT_BY.search(headers.get("via", ""))
+    return (text[start:line_end].strip(), headers.get("call-id"), headers.get("cseq"),
+            from_tag.group(1) if from_tag else None, to_tag.group(1) if to_tag else None,
+            via.group(1) if via else None)
+
+
+def _scan(text, final, skip=0):
+    """
+    ``(messages, consumed)`` for the messages in ``text`` that start at or
+    after ``skip``, with the offsets and lines relative to it. ``consumed``
+    is where a message whose headers may go on past ``text`` starts, or
+    ``len(text)``; unless ``final``, that message is left for the next
+    chunk.
+    """
+    messages = []
+    starts = [m.start() for m in SIP_START.finditer(text, skip)]
+    line = 0
+    pos = 0
+    end = 0
+    for i, start in enumerate(starts):
+        after = end
+        limit = starts[i + 1] if i + 1 < len(starts) else len(text)
+        limit = min(limit, start + MAX_HEADER_CHARS)
+        line_end = text.find("\n", start, limit)
+        headers_end = HEADERS_END.search(text, line_end, limit) if line_end >= 0 else None
+        if headers_end:
+            end = headers_end.start()
+        elif limit < len(text) or final:
+            end = limit
+        else:
+            return messages, start
+        line += text.count("\n", pos, start)
+        pos = start
+        start_line, call_id, cseq, from_tag, to_tag, via = _message(text, start, end)
+        if not call_id:
+            continue
+        direction, peer = _direction(text, start, after)
+        if peer is None and direction is not None:
+            # The top Via is the sender of a request, the receiver of a response.
+            if (direction == "in") != start_line.startswith("SIP/"):
+                peer = via
+        stamp = line_timestamp_match(text, start)
+        messages.append((start, line, stamp.group() if stamp else None, direction, peer, start_line,
+                         call_id, cseq, from_tag, to_tag, timestamp_key(stamp) if stamp else None))
+    return messages, len(text)
+
+
+def index_file(path):
+    """
+    Every SIP message of ``path`` as MESSAGE_FIELDS tuples, in file order,
+    lines counted from 1. Returns ``(path, identity, messages)``, identity
+    as for trace_scan.scan_file.
+    """
+    identity = file_identity(path)
+    messages = []
+    carry = ""
+    skip = 0
+    carry_offset = 0
+    carry_line = 1  # line number of the start of ``carry``
+    with open_trace(path) as handle:
+        for _, text in iter_file_chunks(handle):
+            text = carry + text
+            found, consumed = _scan(text, False, skip)
+            messages.extend((carry_offset + m[0], carry_line + m[1]) + m[2:] for m in found)
+            # Carry a message cut by the chunk end, with the lines before
+            # it that give its direction.
+            keep = text.rfind("\n", 0, max(0, consumed - DIRECTION_LOOKBACK_CHARS)) + 1
+            skip = consumed - keep
+            carry_offset += keep
+            carry_line += text.count("\n", 0, keep)
+            carry = text[keep:]
+    if carry[skip:]:
+        found, _ = _scan(carry, True, skip)
+        messages.extend((carry_offset + m[0], carry_line + m[1]) + m[2:] for m in found)
+    if identity is not None and file_identity(path) != identity:
+        identity = None
+    return path, identity, messages
+
+
+class SipIndexCache(object):
+    """
+    The messages of each file indexed, kept while its identity (see
+    highlight_engine.file_identity) is unchanged; least recently used
+    files out first past ``max_files``.
+    """
+
+    def __init__(self, max_files=SIP_INDEX_CACHE_MAX_FILES):
+        self.max_files = max_files
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, identity):
+        entry = self._entries.get(identity[0]) if identity else None
+        if entry is None or entry[0] != identity:
+            return None
+        self._entries.pop(identity[0])
+        self._entries[identity[0]] = entry
+        return entry[1]
+
+    def put(self, identity, messages):
+        if not identity:
+            return
+        self._entries.pop(identity[0], None)
+        self._entries[identity[0]] = (identity, messages)
+        while len(self._entries) > self.max_files:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+
+class SipIndex(object):
+    """The messages of the traces under ``root``, by file and by Call-ID."""
+
+    def __init__(self, root):
+        self.root = root
+        self.files = {}  # rel_path -> messages
+        self.calls = {}  # call_id -> [(rel_path, message index), ...]
+        self.errors = []
+
+    def add(self, path, messages):
+        rel_path = os.path.relpath(path, self.root)
+        self.files[rel_path] = messages
+        for i, message in enumerate(messages):
+            self.calls.setdefault(message[CALL_ID], []).append((rel_path, i))
+
+    @property
+    def total(self):
+        return sum(len(messages) for messages in self.files.values())
+
+    def messages(self, call_id):
+        """``[(rel_path, message), ...]`` of one call, in time order."""
+        found = [(rel_path, self.files[rel_path][i]) for rel_path, i in self.calls.get(call_id, ())]
+        keys = sort_keys([message[TIME_KEY] for _, message in found])
+        order = sorted(range(len(found)), key=lambda i: (keys[i], found[i][0], found[i][1][OFFSET]))
+        return [found[i] for i in order]
+
+    def call_rows(self):
+        """One CALL_COLUMNS row per call, earliest first."""
+        rows = []
+        firsts = []
+        for call_id, refs in self.calls.items():
+            found = self.messages(call_id)
+            timed = [message for _, message in found if message[TIMESTAMP]]
+            rows.append((call_id, len(refs), len(set(rel_path for rel_path, _ in refs)),
+                         timed[0][TIMESTAMP] if timed else "", timed[-1][TIMESTAMP] if timed else "",
+                         found[0][1][START_LINE]))
+            firsts.append(timed[0][TIME_KEY] if timed else None)
+        keys = sort_keys(firsts)
+        order = sorted(range(len(rows)), key=lambda i: (keys[i], rows[i][0]))
+        return [rows[i] for i in order]
+
+
+def build_sip_index(root, file_patterns=TRACE_FILE_PATTERNS, workers=None, processes=True,
+                    cache=None, progress=None):
+    """
+    Index ``root`` (a file, or every matching file under a folder). Files
+    in ``cache`` with an unchanged identity are not read again; the rest
+    are indexed on the pool and put in it. ``progress(path, error)`` is
+    called as each file finishes.
+    """
+    if os.path.isfile(root):
+        files = [root]
+        root = os.path.dirname(root)
+    else:
+        files = list(iter_trace_files(root, file_patterns))
+    index = SipIndex(root)
+    jobs = []
+    for path in files:
+        messages = cache.get(file_identity(path)) if cache is not None else None
+        if messages is None:
+            jobs.append((path,))
+        else:
+            index.add(path, messages)
+    for job, result, error in run_pool(index_file, jobs, workers, processes):
+        if error is not None:
+            index.errors.append((os.path.relpath(job[0], root), error))
+        else:
+            path, identity, messages = result
+            index.add(path, messages)
+            if cache is not None:
+                cache.put(identity, messages)
+        if progress is not None:
+            progress(job[0], error)
+    return index
+
+
+def message_label(message):
+    """Method, or status and the method it answers: "INVITE", "200 OK (INVITE)"."""
+    start_line = message[START_LINE]
+    if not start_line.startswith("SIP/"):
+        return start_line.split(" ", 1)[0]
+    status = start_line.split(" ", 1)[1]
+    method = (message[CSEQ] or "").split()[-1:]
+    return "{} ({})".format(status, method[0]) if method else status
+
+
+def _local_node(rel_path):
+    node = node_of(rel_path)
+    return "local" if node == NO_NODE else node
+
+
+def format_ladder(index, call_id):
+    """
+    The messages of ``call_id`` as a text ladder, one column per node or
+    peer, each row ending in ``@ file:line`` of the message.
+    """
+    found = index.messages(call_id)
+    if not found:
+        return "No SIP messages with Call-ID {}\n".format(call_id)
+    endpoints = []
+    rows = []
+    for rel_path, message in found:
+        local = _local_node(rel_path)
+        peer = message[PEER] or "?"
+        if message[DIRECTION] == "out":
+            ends = (local, peer)
+        else:
+            ends = (peer, local)
+        for name in ends:
+            if name not in endpoints:
+                endpoints.append(name)
+        rows.append((rel_path, message, ends))
+
+    time_width = max(len(m[TIMESTAMP] or "") for _, m, _ in rows) + 2
+    width = time_width + LADDER_COLUMN * (len(endpoints) - 1) + 1
+    columns = [time_width + LADDER_COLUMN * i for i in range(len(endpoints))]
+
+    def blank():
+        cells = [" "] * width
+        for x in columns:
+            cells[x] = "|"
+        return cells
+
+    header = [" "] * (width + LADDER_COLUMN)
+    for name, x in zip(endpoints, columns):
+        name = name[:LADDER_COLUMN - 2]
+        left = max(0, x - len(name) // 2)
+        header[left:left + len(name)] = name
+    tags = sorted(set(tag for _, m, _ in rows for tag in (m[FROM_TAG], m[TO_TAG]) if tag))
+    files = sorted(set(rel_path for rel_path, _, _ in rows))
+    lines = [
+        "Call-ID: {}".format(call_id),
+        "{} messages in {} files, {} - {}; tags: {}".format(
+            len(rows), len(files), rows[0][1][TIMESTAMP] or "?", rows[-1][1][TIMESTAMP] or "?",
+            ", ".join(tags) or "-"),
+        "",
+        "".join(header).rstrip(),
+        "".join(blank()).rstrip(),
+    ]
+    for rel_path, message, (source, target) in rows:
+        cells = blank()
+        a, b = columns[endpoints.index(source)], columns[endpoints.index(target)]
+        lo, hi = min(a, b), max(a, b)
+        label = message_label(message)
+        if hi > lo:
+            cells[lo + 1:hi] = "-" * (hi - lo - 1)
+            if b > a:
+                cells[hi - 1] = ">"
+            else:
+                cells[lo + 1] = "<"
+            label = " {} ".format(label[:hi - lo - 6])
+            left = lo + (hi - lo - len(label)) // 2 + 1
+            cells[left:left + len(label)] = label
+        row = (message[TIMESTAMP] or "").ljust(time_width) + "".join(cells)[time_width:]
+        if hi == lo:
+            row = "{} ? {}".format(row, label)
+        lines.append("{}   @ {}:{}".format(row, rel_path, message[LINE]))
+    return "\n".join(lines) + "\n"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("path", help="trace file or folder (an extracted bundle)")
+    parser.add_argument("--call-id", help="print the ladder of this call instead of the list of calls")
+    parser.add_argument("--files", nargs="+", default=list(TRACE_FILE_PATTERNS),
+                        help="file name patterns for folders (default: %(default)s)")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.path):
+        parser.error("no such file or folder: %s" % args.path)
+    index = build_sip_index(args.path, args.files, args.workers, processes=True)
+    if args.call_id:
+        sys.stdout.write(format_ladder(index, args.call_id))
+    else:
+        sys.stdout.write(format_table(index.call_rows(), CALL_COLUMNS))
+    for rel_path, error in index.errors:
+        sys.stderr.write("error: %s: %s\n" % (rel_path, error))
+    sys.stderr.write("%d SIP messages, %d calls in %d files\n" % (
+        index.total, len(index.calls), len(index.files)))
+    return 1 if index.errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
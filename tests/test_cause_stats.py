@@ -0,0 +1,74 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cause_stats import cause_stats, count_file, format_csv, minute_of, sort_rows  # noqa: E402
+
+TRACE = (
+    "00000001 |2024/03/14 10:22:01.000 |AppInfo |Reason: Q.850;cause=16\n"
+    # The text and the PDU it came from on one line: counted once.
+    "00000002 |2024/03/14 10:22:02.000 |AppInfo |Reason: Q.850;cause=41 "
+    "IsdnMsgData: 08 02 80 05 5A 08 02 80 A9\n"
+    "00000003 |2024/03/14 10:23:59.000 |AppInfo |IsdnMsgData: 08 02 80 05\n"
+    " 5A 08 02 80 A9\n"
+    "00000005 |2024/03/14 10:24:00.000 |AppInfo |Reason: Q.850;cause=41 and again cause=41\n"
+)
+
+
+class CountFileTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        for name in ("cucm1/sdl001.txt", "cucm1/sdl002.txt", "cucm2/sdl001.txt"):
+            path = os.path.join(self.root, name)
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            with open(path, "w") as handle:
+                handle.write(TRACE)
+
+    def test_causes_once_per_line(self):
+        _, causes, minutes = count_file(os.path.join(self.root, "cucm1", "sdl001.txt"))
+        self.assertEqual(causes, {
+            16: [1, "2024/03/14 10:22:01.000", "2024/03/14 10:22:01.000"],
+            41: [3, "2024/03/14 10:22:02.000", "2024/03/14 10:24:00.000"],
+        })
+        self.assertEqual(minutes, {("2024/03/14 10:22", 16): 1, ("2024/03/14 10:22", 41): 1,
+                                   ("2024/03/14 10:23", 41): 1, ("2024/03/14 10:24", 41): 1})
+
+    def test_tables_per_node_and_file(self):
+        stats = cause_stats(self.root, processes=False)
+        self.assertEqual(stats.total, 12)
+        self.assertEqual(stats.errors, [])
+        tables = stats.tables()
+        columns, rows = tables["cause"]
+        self.assertEqual(sort_rows(columns, rows)[0], (
+            41, "Temporary Failure", 9, 2, 3, "2024/03/14 10:22:02.000", "2024/03/14 10:24:00.000"))
+        columns, rows = tables["node"]
+        self.assertEqual(sort_rows(columns, rows, "node"),
+                         [("cucm1", 41, 6), ("cucm1", 16, 2), ("cucm2", 41, 3), ("cucm2", 16, 1)])
+        columns, rows = tables["minute"]
+        self.assertEqual(sort_rows(columns, rows, "minute")[0], ("2024/03/14 10:22", 16, 3))
+
+    def test_csv(self):
+        text = format_csv(cause_stats(os.path.join(self.root, "cucm2", "sdl001.txt"), processes=False),
+                          tables=("cause", "node"))
+        # A single file has no node folder under its own folder.
+        self.assertEqual(text.split("\n\n")[1], "node,cause,count\n-,41,3\n-,16,1\n")
+
+
+class MinuteOfTest(unittest.TestCase):
+
+    def test_minutes(self):
+        self.assertEqual(minute_of("2024/03/14 10:22:31.451"), "2024/03/14 10:22")
+        self.assertEqual(minute_of("10:22:31.451"), "10:22")
+        self.assertEqual(minute_of(None), "-")
+        self.assertEqual(minute_of(""), "-")
+
+
+if __name__ == "__main__":
+    unittest.main()
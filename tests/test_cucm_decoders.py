@@ -0,0 +1,287 @@
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cucm_decoders import (  # noqa: E402
+    DECODERS, HEX_DUMP_LINE, MAX_HEX_BLOCK_LINES, Q931_MESSAGE_TYPES, DecodeCache, DecodeIndex,
+    Q850Decoder, _normalize_hex_bytes, decode_h323_q931_hex, decode_q931_ie_hex, decode_spans,
+    hex_block_at, hover_popup, q931_message_ies, register_decoder)
+
+SETUP = ("08 02 80 05 05 04 03 80 90 A2 18 03 A9 83 81 "
+         "6C 06 00 81 31 30 30 30 70 05 80 32 30 30 30 08 02 80 90")
+
+
+def decode(text):
+    return decode_h323_q931_hex(_normalize_hex_bytes(text))
+
+
+class NormalizeHexTest(unittest.TestCase):
+
+    def test_spellings(self):
+        expected = b"\x08\x02\x80\x05"
+        for text in ("08 02 80 05", "0x08:0x02:0x80:0x05", "08-02-80-05", "08\t02 80 05"):
+            self.assertEqual(_normalize_hex_bytes(text), expected, text)
+
+    def test_decimal_digits_are_not_hex(self):
+        self.assertEqual(_normalize_hex_bytes("08028005"), b"")
+        self.assertEqual(_normalize_hex_bytes("0802800a"), b"\x08\x02\x80\x0a")
+        self.assertEqual(_normalize_hex_bytes(""), b"")
+
+
+class Q931MessageTest(unittest.TestCase):
+
+    def test_header_and_cause(self):
+        decoded = decode(SETUP)
+        self.assertEqual(decoded["msg_label"], "SETUP")
+        self.assertEqual(decoded["call_ref_value"], 5)
+        self.assertEqual(decoded["call_ref_dir"], "To originating side")
+        self.assertEqual(decoded["q850_cause"]["code"], 16)
+        self.assertFalse(decoded["truncated"])
+
+    def test_ies(self):
+        ies = dict((ie["ie_label"], ie) for ie in q931_message_ies(decode(SETUP)))
+        self.assertEqual(ies["Bearer Capability"]["text"], "Speech, 64 kbit/s, G.711 mu-law")
+        self.assertEqual(ies["Channel Identification"]["text"], "B-channel 1, exclusive, PRI")
+        self.assertEqual(ies["Calling Party Number"]["text"], "1000")
+        self.assertIn(("Presentation", "Allowed"), ies["Calling Party Number"]["details"])
+        self.assertEqual(ies["Called Party Number"]["text"], "2000")
+        self.assertEqual(ies["Cause"]["details"], [("Location", "User")])
+
+    def test_cause_with_recommendation_octet(self):
+        # Octet 3 with the ext bit clear: octet 3a comes before the cause.
+        decoded = decode("08 02 80 05 5A 08 03 00 80 9F")
+        self.assertEqual(decoded["msg_label"], "RELEASE COMPLETE")
+        self.assertEqual(decoded["q850_cause"]["code"], 31)
+
+    def test_two_octet_cause_with_ext_bit_clear(self):
+        self.assertEqual(decode("08 02 80 05 5A 08 02 00 9F")["q850_cause"]["code"], 31)
+
+    def test_last_cause_wins(self):
+        self.assertEqual(decode("08 02 80 05 45 08 02 80 90 08 02 80 91")["q850_cause"]["code"], 17)
+
+    def test_shifted_ies_are_not_codeset_0(self):
+        # Non-locking shift to codeset 6: only the next IE is in it.
+        ies = q931_message_ies(decode("08 02 80 05 45 9E 08 02 80 90 08 02 80 91"))
+        self.assertEqual([(ie["ie_label"], ie["codeset"]) for ie in ies],
+                         [("Shift", None), ("Codeset 6 IE", 6), ("Cause", 0)])
+        self.assertEqual(decode("08 02 80 05 45 9E 08 02 80 90")["q850_cause"], None)
+
+    def test_truncated_ie(self):
+        decoded = decode("08 02 80 05 45 08 05 80 90")
+        self.assertTrue(decoded["truncated"])
+        self.assertEqual(decoded["ies"], [])
+
+    def test_message_type_codes(self):
+        self.assertEqual(Q931_MESSAGE_TYPES[0x7D], "STATUS")
+        self.assertEqual(Q931_MESSAGE_TYPES[0x75], "STATUS ENQUIRY")
+        self.assertEqual(Q931_MESSAGE_TYPES[0x6E], "NOTIFY")
+
+    def test_list_of_ints_is_accepted(self):
+        self.assertEqual(decode_h323_q931_hex(list(_normalize_hex_bytes(SETUP)))["q850_cause"]["code"], 16)
+
+    def test_too_short(self):
+        self.assertIsNone(decode("08 02"))
+
+
+class Q931IeTest(unittest.TestCase):
+
+    def test_display(self):
+        decoded = decode_q931_ie_hex(_normalize_hex_bytes("28 05 41 6C 69 63 65"))
+        self.assertEqual((decoded["ie_label"], decoded["text"]), ("Display", "Alice"))
+
+    def test_short_value_is_cut_to_the_data(self):
+        decoded = decode_q931_ie_hex(_normalize_hex_bytes("70 09 80 32 30"))
+        self.assertEqual(decoded["text"], "20")
+
+
+TRACE_LINES = [
+    "00000001 |14:00:00.001 |AppInfo |Reason: Q.850;cause=16\n",
+    "00000002 |14:00:00.002 |AppInfo |IpAddr=0a0a0a0a Port=5060 ip '0a0b0c0d'h\n",
+    "00000003 |14:00:00.003 |AppInfo |IsdnMsgData: 08 02 80 05 05 04 03 80 90 A2 18 03 A9 83 81\n",
+    "00000004 |14:00:00.004 |AppInfo |IsdnMsgData: 08 02 80 05 05 04 03\n"
+    " 80 90 A2 18 03 A9 83 81\n"
+    " 6C 06 00 81 31 30 30 30 70 05 80 32 30 30 30 08 02 80 90\n",
+    "00000005 |14:00:00.005 |AppInfo |party1DTMF(1,2,3)\n",
+    "00000006 |14:00:00.006 |AppInfo |nothing to decode\n",
+]
+
+
+def _line(text, pos):
+    end = text.find("\n", pos)
+    return text.rfind("\n", 0, pos) + 1, len(text) if end < 0 else end
+
+
+def edited_lines(text, begin, end):
+    # What the inspector rescans after an edit: the full lines of it,
+    # widened over the hex dump lines around them.
+    begin = _line(text, begin)[0]
+    end = _line(text, end)[1]
+    for _ in range(MAX_HEX_BLOCK_LINES):
+        if begin == 0:
+            break
+        above = _line(text, begin - 1)
+        begin = above[0]
+        if not HEX_DUMP_LINE.match(text[above[0]:above[1]]):
+            break
+    for _ in range(MAX_HEX_BLOCK_LINES):
+        if end >= len(text):
+            break
+        below = _line(text, end + 1)
+        if not HEX_DUMP_LINE.match(text[below[0]:below[1]]):
+            break
+        end = below[1]
+    return begin, min(len(text), end + 1)
+
+
+class DecodeIndexTest(unittest.TestCase):
+
+    def edit(self, index, text, begin, old_end, inserted):
+        text = text[:begin] + inserted + text[old_end:]
+        new_end = begin + len(inserted)
+        line_begin, line_end = edited_lines(text, begin, new_end)
+        chunk = text[line_begin:line_end]
+        if chunk.endswith("\n"):
+            chunk = chunk[:-1]
+        index.edit(begin, old_end, new_end, line_begin, line_end, decode_spans(chunk, line_begin))
+        return text
+
+    def test_edits_match_a_full_rescan(self):
+        rng = random.Random(9)
+        for _ in range(40):
+            text = "".join(rng.choice(TRACE_LINES) for _ in range(12))
+            index = DecodeIndex(decode_spans(text))
+            for _ in range(15):
+                begin = rng.randint(0, len(text))
+                kind = rng.random()
+                if kind < 0.3:
+                    begin = _line(text, begin)[0]
+                    old_end, inserted = begin, rng.choice(TRACE_LINES)
+                elif kind < 0.5:
+                    begin = _line(text, begin)[0]
+                    old_end, inserted = min(len(text), _line(text, begin)[1] + 1), ""
+                else:
+                    old_end = min(len(text), begin + rng.randint(0, 6))
+                    inserted = "".join(rng.choice("08 Aa9\n:") for _ in range(rng.randint(0, 4)))
+                text = self.edit(index, text, begin, old_end, inserted)
+                self.assertEqual(index.spans, decode_spans(text))
+
+    def test_at_gives_the_spans_of_the_line_under_the_point(self):
+        text = "".join(TRACE_LINES)
+        index = DecodeIndex(decode_spans(text))
+        begin = text.index("00000003")
+        self.assertEqual([span[:2] for span in index.at(begin + 60, begin)],
+                         [(begin + 46, begin + 90), (begin, begin + 91)])
+        self.assertEqual(index.at(begin + 20, begin), [(begin, begin + 91, 4, 0)])
+        self.assertEqual(index.at(text.index("nothing"), _line(text, text.index("nothing"))[0]), [])
+
+
+class DecodeCacheTest(unittest.TestCase):
+
+    def test_renders_once_per_key(self):
+        rendered = []
+        cache = DecodeCache(max_entries=10)
+
+        def render(key):
+            rendered.append(key)
+            return None if key[1] == "bad" else ("<b>%s</b>" % key[1], 600, "status")
+
+        self.assertEqual(cache.get(("q850", 16), render)[0], "<b>16</b>")
+        self.assertEqual(cache.get(("q850", 16), render)[0], "<b>16</b>")
+        self.assertIsNone(cache.get(("hex_ip", "bad"), render))
+        self.assertIsNone(cache.get(("hex_ip", "bad"), render))
+        self.assertEqual(rendered, [("q850", 16), ("hex_ip", "bad")])
+        self.assertEqual(cache.stats, {"q850": [1, 1], "hex_ip": [1, 1]})
+        self.assertEqual(cache.summary(), "2 entries, 2 hits, 2 misses (hex_ip 1/1, q850 1/1)")
+
+    def test_least_recently_used_go_first(self):
+        cache = DecodeCache(max_entries=2)
+        render = lambda key: key  # noqa: E731
+        cache.get(("q850", 1), render)
+        cache.get(("q850", 2), render)
+        cache.get(("q850", 1), render)
+        cache.get(("q850", 3), render)
+        self.assertEqual(list(cache._entries), [("q850", 1), ("q850", 3)])
+
+    def test_hover_popup_goes_through_the_cache(self):
+        line = TRACE_LINES[0].rstrip("\n")
+        cache = DecodeCache(max_entries=10)
+        spans = decode_spans(line)
+        popup = hover_popup(spans, line, 0, cache)
+        self.assertIn("16", popup[0])
+        self.assertEqual(hover_popup(spans, line, 0, cache), popup)
+        self.assertEqual(cache.stats, {"q850": [1, 1]})
+
+
+class DecoderRegistryTest(unittest.TestCase):
+
+    def kinds(self, text, names=None):
+        return [DECODERS[span[2]].name for span in decode_spans(text, names=names)]
+
+    def test_one_pass_finds_every_decoder(self):
+        self.assertEqual(self.kinds("".join(TRACE_LINES)), [
+            "q850", "hex_ip", "hex_ip", "isdn_line", "h323",
+            "hex_block", "hex_block", "hex_block", "dtmf"])
+
+    def test_names_limit_the_decoders(self):
+        text = "".join(TRACE_LINES)
+        self.assertEqual(self.kinds(text, ["q850", "dtmf"]), ["q850", "dtmf"])
+        # A wrapped dump is found from the decoders it is anchored on.
+        self.assertEqual(self.kinds(text, ["hex_block"]), ["hex_block"] * 3)
+
+    def test_offsets(self):
+        line = TRACE_LINES[0]
+        self.assertEqual(decode_spans(line, 1000)[0][:2], (1053, 1055))
+        self.assertEqual(line[53:55], "16")
+
+    def test_names_are_unique(self):
+        self.assertRaises(ValueError, register_decoder, Q850Decoder())
+
+
+class HexBlockTest(unittest.TestCase):
+
+    WRAPPED = TRACE_LINES[3]
+    WHOLE = _normalize_hex_bytes(SETUP)
+
+    def test_dump_wrapped_from_a_trace_line(self):
+        text = self.WRAPPED + "next line\n"
+        end = len(self.WRAPPED) - 1
+        self.assertEqual(hex_block_at(text, 0), (0, end, self.WHOLE))
+        # From any line of the block.
+        second = self.WRAPPED.index("\n") + 1
+        self.assertEqual(hex_block_at(text, second), (0, end, self.WHOLE))
+        self.assertIsNone(hex_block_at(text, len(self.WRAPPED)))
+
+    def test_dump_with_offsets(self):
+        text = ("Q931 PDU:\n"
+                "0000: 08 02 80 05 05 04 03 80 90 A2 18 03 A9 83 81 6C\n"
+                "0010: 06 00 81 31 30 30 30 70 05 80 32 30 30 30 08 02\n"
+                "0020: 80 90\n")
+        begin, end, data = hex_block_at(text, text.index("0010"))
+        self.assertEqual((text[begin:begin + 4], end, data), ("0000", len(text) - 1, self.WHOLE))
+
+    def test_whole_messages_on_consecutive_lines_stay_apart(self):
+        text = "IsdnMsgData: 08 02 80 05 5A 08 02 80 90\n08 02 80 06 5A 08 02 80 90\n"
+        self.assertIsNone(hex_block_at(text, 0))
+
+    def test_bytes_that_are_not_one_message(self):
+        text = "IsdnMsgData: 08 02 80 05 05 04 03\n 80 90 A2 18\n"
+        self.assertIsNone(hex_block_at(text, 0))
+        self.assertIsNone(hex_block_at("01 02 03 04\n05 06 07 08\n", 0))
+
+    def test_every_line_of_the_block_decodes_the_whole_message(self):
+        spans = decode_spans(self.WRAPPED)
+        self.assertEqual([DECODERS[span[2]].name for span in spans], ["hex_block"] * 3)
+        popups = set()
+        for span in spans:
+            line_begin = span[0]
+            line_text = self.WRAPPED[line_begin:span[1] - 1]
+            popups.add(hover_popup([span], line_text, line_begin)[0])
+        self.assertEqual(len(popups), 1)
+        self.assertIn("2000", popups.pop())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+import csv
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from decode_report import decode_report, iter_decoded  # noqa: E402
+
+TRACE = (
+    "00000001 |14:00:00.001 |AppInfo |Reason: Q.850;cause=16\n"
+    "00000002 |14:00:00.002 |AppInfo |IpAddr=0a0a0a0a Port=5060\n"
+    "00000003 |14:00:00.003 |AppInfo |IsdnMsgData: 08 02 80 05 05 04 03 80 90 A2 18 03 A9 83 81\n"
+    "00000004 |14:00:00.004 |AppInfo |IsdnMsgData: 08 02 80 05 05 04 03\n"
+    " 80 90 A2 18 03 A9 83 81\n"
+    " 6C 06 00 81 31 30 30 30 70 05 80 32 30 30 30 08 02 80 90\n"
+    "00000005 |14:00:00.005 |AppInfo |not a PDU: 01 02 03 04 05 06\n"
+    "00000006 |14:00:00.006 |AppInfo |Reason: Q.850;cause=41\n"
+)
+
+
+class DecodeReportTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        for name, text in (("node2/sdl002.txt", TRACE), ("node1/sdl001.txt", TRACE * 2),
+                           ("node1/notes.md", TRACE)):
+            path = os.path.join(self.root, name)
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            with open(path, "w") as handle:
+                handle.write(text)
+
+    def report(self, path, **kwargs):
+        out = io.StringIO()
+        result = decode_report(path, out, processes=False, **kwargs)
+        return result, out.getvalue()
+
+    def test_items_once_per_line(self):
+        path = os.path.join(self.root, "node2", "sdl002.txt")
+        rows = [(line_no, timestamp, decoder.group or decoder.name, fields.get("cause"))
+                for line_no, timestamp, decoder, fields in iter_decoded(path)]
+        self.assertEqual(rows, [
+            (1, "14:00:00.001", "q850", 16),
+            (2, "14:00:00.002", "hex_ip", None),
+            (3, "14:00:00.003", "h323", None),
+            (4, "14:00:00.004", "hex_block", 16),
+            (8, "14:00:00.006", "q850", 41),
+        ])
+
+    def test_csv_rows_in_file_order(self):
+        (files, rows, errors), text = self.report(self.root)
+        self.assertEqual((files, rows, errors), (2, 15, []))
+        table = list(csv.reader(io.StringIO(text)))
+        self.assertEqual(table[0], ["file", "line", "timestamp", "decoder", "cause", "fields"])
+        labels = [row[0].replace(os.sep, "/") for row in table[1:]]
+        self.assertEqual(labels, ["node1/sdl001.txt"] * 10 + ["node2/sdl002.txt"] * 5)
+        self.assertEqual(table[-1][1:5], ["8", "14:00:00.006", "q850", "41"])
+        self.assertEqual(table[11][1], "1")
+        self.assertEqual(table[6][1], "9")
+
+    def test_json_failures_only(self):
+        (_, rows, _), text = self.report(os.path.join(self.root, "node2/sdl002.txt"), as_json=True,
+                                         failures_only=True)
+        items = json.loads(text)
+        self.assertEqual(rows, 1)
+        self.assertEqual(items[0]["file"], "sdl002.txt")
+        self.assertEqual(items[0]["cause"], 41)
+        self.assertEqual(items[0]["fields"]["cause_text"], "Temporary Failure")
+
+    @unittest.skipUnless(hasattr(os, "symlink"), "no symlinks")
+    def test_unreadable_file_is_reported(self):
+        os.mkdir(os.path.join(self.root, "node3"))
+        os.symlink(os.path.join(self.root, "missing"), os.path.join(self.root, "node3", "gone.txt"))
+        (files, rows, errors), _ = self.report(self.root)
+        self.assertEqual((files, rows), (3, 15))
+        self.assertEqual([rel_path.replace(os.sep, "/") for rel_path, _ in errors], ["node3/gone.txt"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,254 @@
+import os
+import random
+import re
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from highlight_engine import (  # noqa: E402
+    MatchCache, OffsetIndex, file_identity, scan_styles, token_signature)
+
+
+def find_all(text, style_patterns):
+    # What restore did before the combined pass: a find_all per token.
+    hits = {}
+    for style, patterns in style_patterns.items():
+        found = set()
+        for pattern in patterns:
+            found.update((m.start(), m.end()) for m in re.finditer(pattern, text) if m.end() > m.start())
+        hits[style] = sorted(found)
+    return hits
+
+
+def scan(text, style_patterns, chunk_size=1 << 20):
+    # Hits come in order of begin; spans starting together in token order.
+    hits, rejected = scan_styles(lambda a, b: text[a:b], style_patterns, 0, len(text), chunk_size)
+    return dict((style, sorted(spans)) for style, spans in hits.items()), rejected
+
+
+def spans(index):
+    return list(zip(index.begins, index.ends))
+
+
+def moved(span_list, begin, old_end, new_end):
+    # What Sublime does to each region for the same edit, span by span.
+    delta = new_end - old_end
+    result = []
+    for a, b in span_list:
+        if b <= begin:
+            result.append((a, b))
+        elif a >= old_end:
+            result.append((a + delta, b + delta))
+        elif a <= begin and old_end <= b and b + delta > a:
+            result.append((a, b + delta))
+    return sorted(set(result))
+
+
+class ScanStylesTest(unittest.TestCase):
+
+    def test_overlapping_tokens_keep_their_hits(self):
+        text = "foobar foo barfoo foo_bar aaaa\nCcSetupReq(1,100) foobarbaz\n"
+        style_patterns = {
+            0: [r"\bfoo\b", "foobar", "aa"],
+            1: ["oba", r"fo+b\w*", "foo"],
+            3: [r"CcSetupReq\(\d+,\d+\)", r"\bbar", "foo"],
+        }
+        hits, rejected = scan(text, style_patterns)
+        self.assertEqual(hits, find_all(text, style_patterns))
+        self.assertEqual(rejected, [])
+        self.assertTrue(set([(26, 28), (28, 30)]) <= set(hits[0]))
+
+    def test_matches_find_all_per_token(self):
+        rng = random.Random(3)
+        words = ["ab", "ba", "a", "b_", "aab", "bab"]
+        regexes = [r"a+b", r"\bab", r"b\w", r"(?:ab|ba)+", r"a(?=b)", r"\d*a"]
+        for _ in range(200):
+            text = "".join(rng.choice("ab _\n1") for _ in range(rng.randint(0, 120)))
+            style_patterns = {}
+            for style in range(rng.randint(1, 4)):
+                pool = [re.escape(w) for w in words] + [r"\b%s\b" % re.escape(w) for w in words] + regexes
+                style_patterns[style] = rng.sample(pool, rng.randint(1, 5))
+            self.assertEqual(scan(text, style_patterns)[0], find_all(text, style_patterns))
+
+    def test_all_literal_tokens(self):
+        text = "SdlSig-I CcSetupReq SdlSig-O CcSetupReqX Cdcc(1,100,224,1)\n" * 3
+        style_patterns = {0: [r"\bCcSetupReq\b", r"SdlSig\-I"], 2: [r"Cdcc\(1,100,224,1\)", "Req"]}
+        self.assertEqual(scan(text, style_patterns)[0], find_all(text, style_patterns))
+
+    def test_chunks_end_on_lines(self):
+        text = "".join("%05d foo bar foobar\n" % n for n in range(500))
+        style_patterns = {0: ["foo"], 1: [r"\bbar\b", r"\d+ f"]}
+        self.assertEqual(scan(text, style_patterns, chunk_size=64)[0], find_all(text, style_patterns))
+
+    def test_patterns_re_cannot_compile_are_rejected(self):
+        text = "foo bar\n"
+        hits, rejected = scan(text, {0: ["foo", r"\h+"], 1: ["bar"]})
+        self.assertEqual(hits, {0: [(0, 3)], 1: [(4, 7)]})
+        self.assertEqual(rejected, [(0, r"\h+")])
+
+    def test_token_signature_ignores_order_and_repeats(self):
+        self.assertEqual(token_signature({0: ["a", "b"], 1: ["c"]}),
+                         token_signature({1: ["c", "c"], 0: ["b", "a"]}))
+        self.assertNotEqual(token_signature({0: ["a"]}), token_signature({1: ["a"]}))
+
+
+class MatchCacheTest(unittest.TestCase):
+
+    def identity(self, path, size=10):
+        return (path, size, 1.0, "digest")
+
+    def test_hit_only_for_the_same_identity_and_tokens(self):
+        cache = MatchCache(max_files=4, max_regions=100)
+        cache.put(self.identity("a"), "sig", {0: [(1, 3), (5, 8)], 2: []})
+        self.assertEqual(cache.get(self.identity("a"), "sig"), {0: [(1, 3), (5, 8)], 2: []})
+        self.assertIsNone(cache.get(self.identity("a", size=11), "sig"))
+        self.assertIsNone(cache.get(self.identity("a"), "other"))
+        self.assertIsNone(cache.get(None, "sig"))
+        self.assertEqual((cache.hits, cache.misses), (1, 3))
+
+    def test_new_identity_replaces_the_entry(self):
+        cache = MatchCache(max_files=4, max_regions=100)
+        cache.put(self.identity("a"), "sig", {0: [(1, 3)]})
+        cache.put(self.identity("a", size=11), "sig", {0: [(1, 3), (4, 6)]})
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache._regions, 2)
+
+    def test_least_recently_used_go_first(self):
+        cache = MatchCache(max_files=2, max_regions=100)
+        cache.put(self.identity("a"), "sig", {0: [(0, 1)]})
+        cache.put(self.identity("b"), "sig", {0: [(0, 1)]})
+        cache.get(self.identity("a"), "sig")
+        cache.put(self.identity("c"), "sig", {0: [(0, 1)]})
+        self.assertIsNotNone(cache.get(self.identity("a"), "sig"))
+        self.assertIsNone(cache.get(self.identity("b"), "sig"))
+
+    def test_region_budget(self):
+        cache = MatchCache(max_files=10, max_regions=5)
+        cache.put(self.identity("a"), "sig", {0: [(0, 1)] * 3})
+        cache.put(self.identity("b"), "sig", {0: [(0, 1)] * 3})
+        self.assertEqual(len(cache), 1)
+        cache.put(self.identity("c"), "sig", {0: [(0, 1)] * 6})
+        self.assertIsNone(cache.get(self.identity("c"), "sig"))
+        self.assertIsNotNone(cache.get(self.identity("b"), "sig"))
+        cache.discard("b")
+        self.assertEqual((len(cache), cache._regions), (0, 0))
+
+    def test_file_identity_follows_the_content(self):
+        folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, folder)
+        path = os.path.join(folder, "trace.txt")
+        with open(path, "w") as handle:
+            handle.write("one\n")
+        before = file_identity(path)
+        with open(path, "w") as handle:
+            handle.write("two\n")
+        os.utime(path, (before[2], before[2]))
+        self.assertNotEqual(file_identity(path), before)
+        self.assertIsNone(file_identity(os.path.join(folder, "missing.txt")))
+
+
+class OffsetIndexNavigationTest(unittest.TestCase):
+
+    def setUp(self):
+        self.index = OffsetIndex([(30, 33), (10, 13), (20, 25), (10, 13), (20, 22)])
+
+    def test_sorted_and_deduplicated(self):
+        self.assertEqual(spans(self.index), [(10, 13), (20, 22), (20, 25), (30, 33)])
+        self.assertEqual(len(self.index), 4)
+        self.assertEqual(self.index.span(2), (20, 25))
+
+    def test_next_and_previous(self):
+        self.assertEqual(self.index.next_after(0), 0)
+        self.assertEqual(self.index.next_after(10), 1)
+        self.assertEqual(self.index.next_after(21), 3)
+        self.assertIsNone(self.index.next_after(30))
+        self.assertIsNone(self.index.prev_before(10))
+        self.assertEqual(self.index.prev_before(20), 0)
+        self.assertEqual(self.index.prev_before(31), 3)
+
+    def test_between_and_counts(self):
+        self.assertEqual(self.index.between(11, 30), (1, 4))
+        self.assertEqual(self.index.between(0, 9), (0, 0))
+        self.assertEqual(self.index.counts(20), (1, 1))
+        self.assertEqual(self.index.counts(100), (4, 0))
+
+    def test_matches_a_linear_scan(self):
+        rng = random.Random(5)
+        span_list = [(a, a + rng.randint(1, 9)) for a in (rng.randint(0, 500) for _ in range(200))]
+        index = OffsetIndex(span_list)
+        begins = [a for a, _ in sorted(set(span_list))]
+        for pos in range(-1, 510, 3):
+            after = [i for i, a in enumerate(begins) if a > pos]
+            before = [i for i, a in enumerate(begins) if a < pos]
+            self.assertEqual(index.next_after(pos), after[0] if after else None)
+            self.assertEqual(index.prev_before(pos), before[-1] if before else None)
+            self.assertEqual(index.counts(pos), (len(before), len(after)))
+
+
+class OffsetIndexEditTest(unittest.TestCase):
+
+    def test_shifts_spans_after_the_edit(self):
+        index = OffsetIndex([(0, 3), (10, 13), (20, 23)])
+        index.edit(5, 5, 8)
+        self.assertEqual(spans(index), [(0, 3), (13, 16), (23, 26)])
+
+    def test_span_holding_the_edit_grows_and_shrinks(self):
+        index = OffsetIndex([(0, 3), (10, 20)])
+        index.edit(12, 12, 17)
+        self.assertEqual(spans(index), [(0, 3), (10, 25)])
+        index.edit(11, 16, 11)
+        self.assertEqual(spans(index), [(0, 3), (10, 20)])
+
+    def test_spans_the_edit_cuts_into_are_dropped(self):
+        index = OffsetIndex([(0, 3), (10, 13), (20, 23)])
+        index.edit(2, 11, 2)
+        self.assertEqual(spans(index), [(11, 14)])
+
+    def test_deleting_a_whole_span_drops_it(self):
+        index = OffsetIndex([(10, 13), (20, 23)])
+        index.edit(10, 13, 10)
+        self.assertEqual(spans(index), [(17, 20)])
+
+    def test_grown_span_is_still_found_by_later_edits(self):
+        index = OffsetIndex([(10, 12), (30, 32)])
+        index.edit(11, 11, 111)
+        index.edit(100, 101, 100)
+        self.assertEqual(spans(index), [(10, 111), (129, 131)])
+
+    def test_matches_region_by_region_edit(self):
+        rng = random.Random(7)
+        for _ in range(500):
+            span_list = []
+            for _ in range(rng.randint(0, 30)):
+                a = rng.randint(0, 200)
+                span_list.append((a, a + rng.randint(1, 15)))
+            index = OffsetIndex(span_list)
+            expected = sorted(set(span_list))
+            for _ in range(3):
+                begin = rng.randint(0, 220)
+                old_end = begin + rng.randint(0, 12)
+                new_end = begin + rng.randint(0, 12)
+                index.edit(begin, old_end, new_end)
+                expected = moved(expected, begin, old_end, new_end)
+                self.assertEqual(spans(index), expected)
+
+
+class OffsetIndexExtendTest(unittest.TestCase):
+
+    def test_block_after_the_held_spans(self):
+        index = OffsetIndex([(0, 2), (5, 7)])
+        index.extend([(20, 22), (10, 12)])
+        self.assertEqual(spans(index), [(0, 2), (5, 7), (10, 12), (20, 22)])
+
+    def test_interleaved_spans_are_merged_without_duplicates(self):
+        index = OffsetIndex([(0, 2), (10, 12)])
+        index.extend([(5, 7), (10, 12), (15, 40)])
+        self.assertEqual(spans(index), [(0, 2), (5, 7), (10, 12), (15, 40)])
+        self.assertEqual(index.longest, 25)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from highlight_profiler import Profiler, format_summary, write_summary  # noqa: E402
+
+
+class ProfilerTest(unittest.TestCase):
+
+    def test_calls_are_timed_overall_and_per_view(self):
+        profiler = Profiler()
+        for view in ("v1", "v1", None):
+            profiler.end(profiler.begin("restore", view))
+        summary = profiler.summary()
+        self.assertEqual(summary["ops"]["restore"]["calls"], 3)
+        self.assertEqual(sorted(summary["views"]), ["v1"])
+        self.assertEqual(summary["views"]["v1"]["ops"]["restore"]["calls"], 2)
+        self.assertGreaterEqual(summary["ops"]["restore"]["total_ms"], summary["ops"]["restore"]["max_ms"])
+
+    def test_counts_are_charged_to_the_calls_in_progress(self):
+        profiler = Profiler()
+        outer = profiler.begin("save", "v1")
+        inner = profiler.begin("flush")
+        profiler.count("rows", 3)
+        profiler.end(inner)
+        profiler.count("bytes", 10)
+        profiler.end(outer)
+        profiler.count("evicted", view="v2")
+        summary = profiler.summary()
+        self.assertEqual(summary["counters"], {"rows": 3, "bytes": 10, "evicted": 1})
+        self.assertEqual(summary["views"]["v1"]["counters"], {"rows": 3, "bytes": 10})
+        self.assertEqual(summary["views"]["v2"]["counters"], {"evicted": 1})
+        self.assertEqual([(call["op"], call["counts"]) for call in summary["recent"]],
+                         [("flush", {"rows": 3}), ("save", {"rows": 3, "bytes": 10})])
+
+    def test_other_threads_keep_their_own_calls(self):
+        profiler = Profiler()
+        call = profiler.begin("restore", "v1")
+        thread = threading.Thread(target=profiler.count, args=("background",))
+        thread.start()
+        thread.join()
+        profiler.end(call)
+        self.assertEqual(profiler.summary()["recent"][0]["counts"], {})
+        self.assertEqual(profiler.summary()["counters"], {"background": 1})
+
+    def test_calls_ended_out_of_order(self):
+        profiler = Profiler(recent=1)
+        first = profiler.begin("a")
+        second = profiler.begin("b")
+        profiler.end(first)
+        profiler.count("n")
+        profiler.end(second)
+        summary = profiler.summary()
+        self.assertEqual([(call["op"], call["counts"]) for call in summary["recent"]], [("b", {"n": 1})])
+
+    def test_format_and_write(self):
+        profiler = Profiler()
+        profiler.end(profiler.begin("restore", "v1"))
+        profiler.count("regions", 4, view="v1")
+        summary = profiler.summary()
+        text = format_summary(summary)
+        self.assertIn("Operations:\n  restore ", text)
+        self.assertIn("Views (slowest 1):\n  v1\n    restore ", text)
+        self.assertIn("Latest calls:\n  restore ", text)
+        self.assertIn("Counters:\n  (none)", format_summary(Profiler().summary()))
+        folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, folder)
+        path = os.path.join(folder, "profile.json")
+        write_summary(summary, path)
+        with open(path) as handle:
+            self.assertEqual(json.load(handle)["counters"], {"regions": 4})
+
+
+if __name__ == "__main__":
+    unittest.main()
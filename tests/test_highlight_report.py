@@ -0,0 +1,68 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from highlight_report import (  # noqa: E402
+    format_csv, format_table, profile_report, profile_style_patterns, report_rows)
+
+
+class HighlightReportTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+
+    def write(self, rel_path, text):
+        path = os.path.join(self.root, rel_path)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, "w") as handle:
+            handle.write(text)
+        return path
+
+    def report(self, style_patterns):
+        return report_rows(self.root, profile_report(self.root, style_patterns, workers=1, processes=False))
+
+    def test_profile_style_patterns(self):
+        self.assertEqual(profile_style_patterns({"s0": ["a", "b"], "cisco_s0": ["c"], "s3": ["d"],
+                                                 "s4": [], "notes": ["e"]}),
+                         {0: ["a", "b", "c"], 3: ["d"]})
+
+    def test_rows_per_file_and_style_with_hits(self):
+        self.write("node2/ccm.txt", "10:00:05.000 |CcRelReq cause=41\n")
+        self.write("node1/ccm.txt", "10:00:01.000 |CcSetupReq\n10:00:02.000 |CcRelReq cause=16\n"
+                                    "10:00:03.000 |CcRelReq cause=16\n")
+        self.write("node1/notes.md", "CcRelReq\n")
+        rows, (errors, rejected, scanned) = self.report(
+            {0: ["CcRelReq"], 1: [r"cause=4\d"], 2: ["(?<!a+)b"]})
+        self.assertEqual(rows, [
+            (os.path.join("node1", "ccm.txt"), 1, 2, "10:00:02.000", "10:00:03.000"),
+            (os.path.join("node2", "ccm.txt"), 1, 1, "10:00:05.000", "10:00:05.000"),
+            (os.path.join("node2", "ccm.txt"), 2, 1, "10:00:05.000", "10:00:05.000")])
+        self.assertEqual((errors, rejected, scanned), ([], [(2, "(?<!a+)b")], 2))
+
+    def test_unreadable_file_is_an_error(self):
+        self.write("node1/ccm.txt", "CcRelReq\n")
+        os.symlink(os.path.join(self.root, "missing"), os.path.join(self.root, "node1", "gone.txt"))
+        rows, (errors, _, scanned) = self.report({0: ["CcRelReq"]})
+        self.assertEqual(rows, [(os.path.join("node1", "ccm.txt"), 1, 1, "", "")])
+        self.assertEqual([rel_path for rel_path, _ in errors], [os.path.join("node1", "gone.txt")])
+        self.assertEqual(scanned, 1)
+
+    def test_table_and_csv(self):
+        rows = [("a.txt", 1, 12, "10:00:01.000", ""), ("long/b.txt", 2, 3, "", "")]
+        self.assertEqual(format_table(rows).splitlines(), [
+            "file        style  hits  first         last",
+            "----------  -----  ----  ------------  ----",
+            "a.txt       1      12    10:00:01.000",
+            "long/b.txt  2      3"])
+        self.assertEqual(format_csv(rows).splitlines(),
+                         ["file,style,hits,first,last", "a.txt,1,12,10:00:01.000,", "long/b.txt,2,3,,"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,207 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from highlight_store import BufferedHighlightStore, HighlightStore, available  # noqa: E402
+
+
+def tokens(*patterns):
+    return [{"p": pattern, "ts": 1} for pattern in patterns]
+
+
+@unittest.skipUnless(available(), "sqlite3 not available")
+class StoreTestCase(unittest.TestCase):
+
+    def setUp(self):
+        folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, folder)
+        self.store = HighlightStore(os.path.join(folder, "highlights.sqlite3"))
+        self.addCleanup(self.store.close)
+
+
+class StoreTest(StoreTestCase):
+
+    def test_tokens_load_oldest_first(self):
+        self.store.add_tokens("folder::/logs", "s0", ["b"], 2, 10)
+        self.store.add_tokens("folder::/logs", "s0", ["a"], 1, 10)
+        self.store.add_tokens("folder::/logs", "s3", ["c"], 3, 10)
+        self.assertEqual(self.store.load(["folder::/logs", "missing"]), {
+            "folder::/logs": {"s0": [{"p": "a", "ts": 1}, {"p": "b", "ts": 2}], "s3": [{"p": "c", "ts": 3}]}})
+
+    def test_limit_keeps_the_newest_tokens(self):
+        for ts, pattern in enumerate(["a", "b", "c", "d"]):
+            self.store.add_tokens("scope", "s0", [pattern], ts, 2)
+        self.assertEqual([t["p"] for t in self.store.load(["scope"])["scope"]["s0"]], ["c", "d"])
+
+    def test_adding_again_updates_the_time(self):
+        self.store.add_tokens("scope", "s0", ["a", "b"], 1, 10)
+        self.store.add_tokens("scope", "s0", ["a"], 5, 10)
+        self.assertEqual(self.store.load(["scope"])["scope"]["s0"],
+                         [{"p": "b", "ts": 1}, {"p": "a", "ts": 5}])
+        self.assertEqual(self.store.token_count(), 2)
+
+    def test_other_keys_of_the_scope_are_adopted(self):
+        self.store.add_tokens("/logs", "s0", ["legacy"], 1, 10)
+        self.store.add_tokens("/logs", "s1", ["kept out"], 1, 10)
+        self.store.add_tokens("folder::/logs", "s1", ["first"], 1, 10)
+        self.store.add_tokens("folder::/logs", "s2", ["new"], 2, 10, other_keys=["/logs"])
+        loaded = self.store.load(["folder::/logs", "/logs"])
+        self.assertEqual(sorted(loaded), ["folder::/logs"])
+        self.assertEqual(dict((k, [t["p"] for t in v]) for k, v in loaded["folder::/logs"].items()),
+                         {"s0": ["legacy"], "s1": ["first"], "s2": ["new"]})
+
+    def test_replace_and_delete(self):
+        self.store.add_tokens("scope", "s0", ["a"], 1, 10)
+        self.store.add_tokens("old", "s0", ["b"], 1, 10)
+        self.store.replace_scope("scope", {"s1": tokens("c")}, drop_keys=["old"])
+        self.assertEqual(self.store.scope_keys(), ["scope"])
+        self.store.delete_style("scope", "s1")
+        self.assertEqual(self.store.load(["scope"]), {})
+
+    def test_migration_runs_once(self):
+        self.assertFalse(self.store.is_migrated())
+        self.store.add_tokens("scope", "s0", ["newer"], 5, 10)
+        self.store.migrate([("scope", {"s0": tokens("newer", "older")}),
+                            ("/legacy/file.txt", {"s2": tokens("x")})])
+        self.assertTrue(self.store.is_migrated())
+        self.assertEqual(sorted(self.store.scope_keys()), ["/legacy/file.txt", "scope"])
+        self.assertEqual(self.store.load(["scope"])["scope"]["s0"],
+                         [{"p": "older", "ts": 1}, {"p": "newer", "ts": 5}])
+
+    def test_tokens_survive_reopening(self):
+        self.store.add_tokens("scope", "s0", ["a"], 1, 10)
+        self.store.close()
+        self.store = HighlightStore(self.store.path)
+        self.addCleanup(self.store.close)
+        self.assertEqual(self.store.load(["scope"]), {"scope": {"s0": tokens("a")}})
+        self.assertEqual(self.store.usage(), (1, len("s0") + len("a")))
+
+
+class ProfileTest(StoreTestCase):
+
+    def test_save_load_and_delete(self):
+        self.store.save_profile("calls", {"s1": ["b", "a", "a"], "s0": ["c"]})
+        self.store.save_profile("other", {"s0": ["x"]})
+        self.assertEqual(self.store.profile_names(), ["calls", "other"])
+        self.assertEqual(self.store.load_profile("calls"), {"s0": ["c"], "s1": ["a", "b"]})
+        self.store.save_profile("calls", {"s2": ["d"]})
+        self.assertEqual(self.store.load_profile("calls"), {"s2": ["d"]})
+        self.store.delete_profile("calls")
+        self.assertEqual((self.store.profile_names(), self.store.load_profile("calls")), (["other"], {}))
+
+
+class EvictionTest(StoreTestCase):
+
+    def fill(self, scopes, per_scope=10):
+        for n, scope_key in enumerate(scopes):
+            patterns = ["%s%d" % (scope_key, i) for i in range(per_scope)]
+            self.store.replace_scope(scope_key, {"s0": tokens(*patterns)})
+            self.store.touch([scope_key], n)
+
+    def test_usage_follows_writes(self):
+        self.fill(["a", "b"])
+        self.assertEqual(self.store.usage()[0], 20)
+        self.store.replace_scope("a", {})
+        self.assertEqual(self.store.usage()[0], 10)
+
+    def test_evicts_least_recently_used_first(self):
+        self.fill(["a", "b", "c"])
+        self.store.touch(["a"], 10)
+        self.assertEqual(self.store.evict_lru(20, 10 ** 6), ["b"])
+        self.assertEqual(sorted(self.store.scope_keys()), ["a", "c"])
+
+    def test_protected_scope_is_kept(self):
+        self.fill(["a", "b"])
+        self.assertEqual(self.store.evict_lru(5, 10 ** 6, protect=["a"]), ["b"])
+        self.assertEqual(self.store.scope_keys(), ["a"])
+
+    def test_within_budget_evicts_nothing(self):
+        self.fill(["a", "b"])
+        self.assertEqual(self.store.evict_lru(20, 10 ** 6), [])
+
+
+class BufferedTest(StoreTestCase):
+
+    def setUp(self):
+        super(BufferedTest, self).setUp()
+        self.scheduled = []
+        self.buffered = BufferedHighlightStore(
+            self.store, 1000, lambda fn, delay_ms: self.scheduled.append((fn, delay_ms)))
+
+    def test_writes_wait_for_one_flush(self):
+        self.buffered.add_tokens("a", "s0", ["x"], 1, 10)
+        self.buffered.add_tokens("a", "s0", ["y"], 2, 10)
+        self.buffered.add_tokens("b", "s1", ["z"], 3, 10)
+        self.assertEqual(self.store.scope_keys(), [])
+        self.assertEqual(len(self.scheduled), 1)
+        self.assertEqual(self.scheduled[0][1], 1000)
+        self.scheduled[0][0]()
+        self.assertEqual(sorted(self.store.scope_keys()), ["a", "b"])
+        self.buffered.add_tokens("a", "s0", ["w"], 4, 10)
+        self.assertEqual(len(self.scheduled), 2)
+
+    def test_reads_see_pending_changes(self):
+        self.store.add_tokens("a", "s0", ["stored"], 1, 10)
+        self.store.add_tokens("gone", "s0", ["x"], 1, 10)
+        self.buffered.add_tokens("a", "s0", ["pending"], 2, 10)
+        self.buffered.replace_scope("gone", {})
+        self.assertEqual(self.buffered.scope_keys(), ["a"])
+        self.assertEqual(self.buffered.load(["a", "gone"]),
+                         {"a": {"s0": [{"p": "stored", "ts": 1}, {"p": "pending", "ts": 2}]}})
+
+    def test_limit_and_delete_before_the_flush(self):
+        for ts, pattern in enumerate(["a", "b", "c"]):
+            self.buffered.add_tokens("scope", "s0", [pattern], ts, 2)
+        self.buffered.add_tokens("scope", "s1", ["d"], 5, 2)
+        self.buffered.delete_style("scope", "s1")
+        self.buffered.flush()
+        self.assertEqual(self.store.load(["scope"]),
+                         {"scope": {"s0": [{"p": "b", "ts": 1}, {"p": "c", "ts": 2}]}})
+
+    def test_other_keys_are_adopted(self):
+        self.store.add_tokens("/logs", "s0", ["legacy"], 1, 10)
+        self.buffered.add_tokens("folder::/logs", "s1", ["new"], 2, 10, other_keys=["/logs"])
+        self.buffered.flush()
+        self.assertEqual(self.store.scope_keys(), ["folder::/logs"])
+        self.assertEqual(sorted(self.store.load(["folder::/logs"])["folder::/logs"]), ["s0", "s1"])
+
+    def test_close_flushes(self):
+        self.buffered.add_tokens("a", "s0", ["x"], 1, 10)
+        self.buffered.close()
+        store = HighlightStore(self.store.path)
+        self.addCleanup(store.close)
+        self.assertEqual(store.scope_keys(), ["a"])
+
+
+class BufferedEvictionTest(StoreTestCase):
+
+    def setUp(self):
+        super(BufferedEvictionTest, self).setUp()
+        self.scheduled = []
+        self.evicted = []
+        self.buffered = BufferedHighlightStore(
+            self.store, 1000, lambda fn, delay_ms: self.scheduled.append(fn), self.evicted.extend)
+
+    def test_eviction_is_reported_when_the_write_lands(self):
+        for n, scope_key in enumerate(["a", "b", "c"]):
+            self.buffered.add_tokens(scope_key, "s0", ["%s%d" % (scope_key, i) for i in range(10)], n, 100)
+        self.assertEqual(self.buffered.evict_lru(20, 10 ** 6, ["c"]), [])
+        self.assertEqual(self.evicted, [])
+        self.assertEqual(len(self.scheduled), 1)
+        self.scheduled[0]()
+        self.assertEqual(self.evicted, ["a"])
+        self.assertEqual(sorted(self.store.scope_keys()), ["b", "c"])
+
+    def test_nothing_reported_within_budget(self):
+        self.buffered.add_tokens("a", "s0", ["x"], 1, 100)
+        self.buffered.evict_lru(20, 10 ** 6)
+        self.buffered.flush()
+        self.assertEqual(self.evicted, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
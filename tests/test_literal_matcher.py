@@ -0,0 +1,76 @@
+import os
+import random
+import re
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from literal_matcher import FIND_LITERALS_MAX, LiteralMatcher, all_literal, literal_of  # noqa: E402
+
+
+def find_all(text, style_patterns):
+    hits = set()
+    for style, patterns in style_patterns.items():
+        for pattern in patterns:
+            hits.update((style, m.start(), m.end()) for m in re.finditer(pattern, text))
+    return sorted(hits)
+
+
+def scan(text, style_patterns):
+    return sorted(LiteralMatcher(style_patterns).scan(text))
+
+
+class LiteralOfTest(unittest.TestCase):
+
+    def test_escaped_literals(self):
+        self.assertEqual(literal_of(re.escape("CcSetupReq")), ("CcSetupReq", False))
+        self.assertEqual(literal_of(r"\b%s\b" % re.escape("Cdcc(1,100,224,1)")), ("Cdcc(1,100,224,1)", True))
+        self.assertEqual(literal_of(re.escape("a.b c")), ("a.b c", False))
+
+    def test_regexes_are_not_literals(self):
+        for pattern in (r"a.b", r"\d+", r"a|b", r"\bfoo", "(x)", r"\b\b"):
+            self.assertIsNone(literal_of(pattern), pattern)
+
+    def test_all_literal(self):
+        self.assertTrue(all_literal({0: [r"\bfoo\b", ""], 1: ["bar"]}))
+        self.assertFalse(all_literal({0: [r"\bfoo\b"], 1: [r"ba+r"]}))
+        self.assertFalse(all_literal({0: [""]}))
+
+    def test_rejects_regexes(self):
+        self.assertRaises(ValueError, LiteralMatcher, {0: [r"fo+"]})
+
+
+class ScanTest(unittest.TestCase):
+
+    def test_prefix_inside_and_overlapping_tokens(self):
+        text = "foobar foo_bar foo foofoo barfoo aaaa"
+        style_patterns = {0: ["foo", r"\bfoo\b", "aa"], 1: ["foobar", "oba", "obar"], 2: ["bar", "foo"]}
+        self.assertEqual(scan(text, style_patterns), find_all(text, style_patterns))
+
+    def test_span_of_several_tokens_reported_once(self):
+        text = "foo"
+        self.assertEqual(scan(text, {0: ["foo", r"\bfoo\b"]}), [(0, 0, 3)])
+
+    def test_offset(self):
+        self.assertEqual(list(LiteralMatcher({0: ["b"]}).scan("abab", 100)), [(0, 101, 102), (0, 103, 104)])
+
+    def test_both_strategies_match_find_all(self):
+        rng = random.Random(11)
+        words = ["".join(rng.choice("abc_1") for _ in range(rng.randint(1, 4))) for _ in range(400)]
+        words += ["-x", "a-b", ".", "c."]
+        for count in (20, FIND_LITERALS_MAX + 50):
+            for _ in range(30):
+                text = "".join(rng.choice(["a", "b", "c", "_", "1", " ", "-", ".", "x", "\n"])
+                               for _ in range(rng.randint(0, 200)))
+                style_patterns = {}
+                for pattern in rng.sample(words, count):
+                    escaped = re.escape(pattern)
+                    if rng.random() < 0.5:
+                        escaped = r"\b%s\b" % escaped
+                    style_patterns.setdefault(rng.randint(0, 3), []).append(escaped)
+                self.assertEqual(scan(text, style_patterns), find_all(text, style_patterns))
+
+
+if __name__ == "__main__":
+    unittest.main()
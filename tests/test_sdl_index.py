@@ -0,0 +1,90 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sdl_index import NO_ID, SdlIndex, build, load, save  # noqa: E402
+
+# As CUCM 10 and later write them: no direction, a state column.
+CURRENT = (
+    "00012345.002 |10:22:31.451 |SdlSig    |CcSetupReq                  |restart0          "
+    "|Cdcc(1,100,224,1)               |SIPD(1,100,105,1)               |1,100,14,1.33^*^*  "
+    "|[R:N-H:0,N:1,L:0,V:0,Z:0,D:0] CI=10008376 CgpnNum=1001\n"
+    "00012346.000 |10:22:31.452 |SdlSig    |SIPNotifyInd                |NA                "
+    "|SIPHandler(1,100,72,1)          |SIPD(1,100,105,1)               |1,100,14,1.34^*^*  "
+    "|[T:N-H:0,N:0,L:0,V:0,Z:0,D:0] ConnId=10008377\n"
+    "00012347.001 |10:22:31.460 |AppInfo   |SIPD(1,100,105,1) not a signal line\n"
+)
+# Older traces: a direction, no state column.
+OLDER = (
+    "00000123 |14:00:00.024 |SdlSig-O |CcSetupReq |Cdcc(1,100,224,1) |SIPD(1,100,105,1) "
+    "|1,100,14,1.1^*^* |CI=42\n"
+    "00000124 |14:00:00.030 |SdlSig-I |CcAlertReq |SIPD(1,100,105,1) |Cdcc(1,100,224,1) "
+    "|1,100,14,1.2^*^* |CI=42\n"
+)
+
+
+def index_of(text):
+    index = SdlIndex()
+    index.add_text(text)
+    return index
+
+
+class AddTextTest(unittest.TestCase):
+
+    def test_state_column(self):
+        index = index_of(CURRENT)
+        self.assertEqual(len(index), 2)
+        self.assertEqual([index.signals[n] for n in index.signal], ["CcSetupReq", "SIPNotifyInd"])
+        self.assertEqual([index.processes[n] for n in index.destination],
+                         ["Cdcc(1,100,224,1)", "SIPHandler(1,100,72,1)"])
+        self.assertEqual([index.processes[n] for n in index.source], ["SIPD(1,100,105,1)"] * 2)
+        self.assertEqual(list(index.direction), [NO_ID, NO_ID])
+        self.assertEqual(list(index.ci), [10008376, NO_ID])
+        self.assertEqual(index.rows_for_ci(10008377), [1])
+        self.assertEqual(list(index.line), [1, 2])
+
+    def test_without_state_column(self):
+        index = index_of(OLDER)
+        self.assertEqual([index.processes[n] for n in index.destination],
+                         ["Cdcc(1,100,224,1)", "SIPD(1,100,105,1)"])
+        self.assertEqual(list(index.direction), [1, 0])
+        self.assertEqual(index.row_text(0),
+                         "14:00:00.024 O CcSetupReq  SIPD(1,100,105,1) -> Cdcc(1,100,224,1)  CI=42")
+
+    def test_row_text_without_direction(self):
+        index = index_of(CURRENT)
+        self.assertEqual(index.row_text(0),
+                         "10:22:31.451 - CcSetupReq  SIPD(1,100,105,1) -> Cdcc(1,100,224,1)  CI=10008376")
+
+    def test_histogram_counts_instances_together(self):
+        index = index_of(OLDER + CURRENT)
+        counts = dict(index.histogram()["process"])
+        self.assertEqual(counts, {"Cdcc": 2, "SIPD": 1, "SIPHandler": 1})
+
+    def test_build_across_chunks(self):
+        text = (OLDER + CURRENT) * 50
+        index = build(lambda a, b: text[a:b], len(text), chunk_size=1000)
+        self.assertEqual(len(index), 200)
+        self.assertEqual(index.line[-1], 249)
+
+
+class CacheTest(unittest.TestCase):
+
+    def test_round_trip_and_identity_check(self):
+        folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, folder)
+        index = index_of(CURRENT)
+        identity = ("trace.txt", 1, 2)
+        save(index, identity, folder)
+        loaded = load("trace.txt", folder, identity)
+        self.assertEqual(list(loaded.direction), list(index.direction))
+        self.assertEqual(loaded.processes, index.processes)
+        self.assertIsNone(load("trace.txt", folder, ("trace.txt", 1, 3)))
+
+
+if __name__ == "__main__":
+    unittest.main()
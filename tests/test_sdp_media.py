@@ -0,0 +1,186 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sdp_media import (  # noqa: E402
+    MAX_SDP_CHARS, MEDIA, NO_CALL, ORIGIN, _scan, build_media_table, format_call, format_report,
+    parse_sdp, scan_file)
+from sip_index import CALL_ID, DIRECTION, LINE, PEER, START_LINE  # noqa: E402
+
+
+def message(time, direction, start_line, cseq, sdp, call_id="call-1"):
+    """A CUCM SDI SIP message from or to 10.10.1.20, with ``sdp`` as its body."""
+    return (
+        "00012345.001 |{} |AppInfo  |SIPTcp - {} SIP TCP message {} 10.10.1.20 on port 5060 index 12\n"
+        "{}\n"
+        "Via: SIP/2.0/TCP 10.10.1.20:5060;branch=z9hG4bK1\n"
+        "Call-ID: {}\n"
+        "CSeq: {}\n"
+        "Content-Type: application/sdp\n"
+        "\n"
+        "{}").format(time, "Incoming" if direction == "in" else "Outgoing",
+                     "from" if direction == "in" else "to", start_line, call_id, cseq, sdp)
+
+
+def sdp(origin, address, port, formats, *attributes):
+    return "v=0\no=CiscoSystemsCCM-SIP {} IN IP4 {}\ns=SIP Call\nc=IN IP4 {}\nt=0 0\n" \
+           "m=audio {} RTP/AVP {}\n{}".format(origin, address, address, port, formats,
+                                             "".join("a={}\n".format(a) for a in attributes))
+
+
+OFFER = sdp("2000 1 1", "10.10.1.20", 16384, "0 8 101", "rtpmap:101 telephone-event/8000", "ptime:20")
+INVITE = message("10:00:01.000", "in", "INVITE sip:2000@10.10.1.10 SIP/2.0", "101 INVITE", OFFER)
+TRACE = (
+    INVITE
+    + INVITE.replace("10:00:01.000", "10:00:01.500")
+    + message("10:00:02.000", "out", "SIP/2.0 200 OK", "101 INVITE",
+              sdp("3000 1 1", "10.10.1.10", 24000, "8", "rtpmap:8 PCMA/8000"))
+    + message("10:00:03.000", "in", "ACK sip:2000@10.10.1.10 SIP/2.0", "101 ACK", "")
+    + message("10:00:10.000", "in", "INVITE sip:2000@10.10.1.10 SIP/2.0", "102 INVITE",
+              sdp("2000 2 2", "0.0.0.0", 16384, "0 8", "sendonly"))
+    + message("10:00:11.000", "out", "SIP/2.0 200 OK", "102 INVITE",
+              sdp("3000 2 2", "10.10.1.10", 0, "18"))
+    + "00012399.001 |10:00:01.200 |SdlSig    |StationOutputOpenReceiveChannel |wait "
+      "|StationD(1,100,63,1) |Cdcc(1,100,219,2) |1,100,14,1.1^*^* |[R:N] CI=1234 IpAddr=0a01a8c0 Port=16384\n"
+    + "00012400.001 |10:00:01.300 |AppInfo  |MediaManager ip '0A01A8C0'h RtpPort=20000\n"
+    + "00012401.001 |10:00:01.400 |AppInfo  |IpAddr=0a01a8c0 and no port\n"
+)
+
+
+class ParseSdpTest(unittest.TestCase):
+
+    def test_codecs_ptime_mode_and_address(self):
+        origin, media, end = parse_sdp(OFFER, 0, len(OFFER))
+        self.assertEqual(origin, "CiscoSystemsCCM-SIP 2000 1 1 IN IP4 10.10.1.20")
+        self.assertEqual(media, (("audio", 16384, "RTP/AVP", ("PCMU", "PCMA", "telephone-event"), "20",
+                                  "sendrecv", "10.10.1.20"),))
+        self.assertEqual(end, len(OFFER))
+
+    def test_media_level_overrides_session_level(self):
+        text = ("v=0\nc=IN IP4 10.0.0.1\na=sendonly\nm=audio 4000/2 RTP/AVP 18\n"
+                "m=video 5000 RTP/AVP 97\nc=IN IP4 10.0.0.2\na=inactive\na=rtpmap:97 H264/90000\n"
+                "next line of the trace\n")
+        origin, media, end = parse_sdp(text, 0, len(text))
+        self.assertEqual(origin, "")
+        self.assertEqual(media, (("audio", 4000, "RTP/AVP", ("G729",), "", "sendonly", "10.0.0.1"),
+                                 ("video", 5000, "RTP/AVP", ("H264",), "", "inactive", "10.0.0.2")))
+        self.assertEqual(text[end:], "next line of the trace\n")
+
+
+class MediaTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+
+    def write(self, rel_path, text):
+        path = os.path.join(self.root, rel_path)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, "w") as handle:
+            handle.write(text)
+        return path
+
+
+class ScanTest(MediaTestCase):
+
+    def test_sdps_belong_to_the_message_above(self):
+        path = self.write("node1/ccm00000001.txt", TRACE)
+        _, sdps, _ = scan_file(path)
+        self.assertEqual([(r[START_LINE], r[CALL_ID], r[DIRECTION], r[PEER]) for r in sdps[:3]], [
+            ("INVITE sip:2000@10.10.1.10 SIP/2.0", "call-1", "in", "10.10.1.20:5060"),
+            ("INVITE sip:2000@10.10.1.10 SIP/2.0", "call-1", "in", "10.10.1.20:5060"),
+            ("SIP/2.0 200 OK", "call-1", "out", "10.10.1.20:5060")])
+        self.assertEqual(len(sdps), 5)
+        self.assertEqual(TRACE.splitlines()[sdps[0][LINE] - 1], "v=0")
+        self.assertEqual(sdps[0][ORIGIN], "CiscoSystemsCCM-SIP 2000 1 1 IN IP4 10.10.1.20")
+
+    def test_hex_ips_with_a_port(self):
+        path = self.write("node1/ccm00000001.txt", TRACE)
+        _, _, hexes = scan_file(path)
+        self.assertEqual([r[2:7] for r in hexes], [
+            ("10:00:01.200", "CI=1234", "StationOutputOpenReceiveChannel", "192.168.1.10", 16384),
+            ("10:00:01.300", NO_CALL, "", "10.1.168.192", 20000)])
+        self.assertTrue(TRACE.splitlines()[hexes[0][1] - 1].endswith("Port=16384"))
+
+    def test_sdp_near_the_chunk_end_is_left_for_the_next(self):
+        sdps, _, consumed = _scan(TRACE, False)
+        self.assertEqual((sdps, consumed), ([], TRACE.index("v=0")))
+        padded = TRACE + "x\n" * MAX_SDP_CHARS
+        sdps, _, consumed = _scan(padded, False)
+        self.assertEqual((len(sdps), consumed), (5, len(padded)))
+
+    def test_sdp_without_a_message_is_skipped(self):
+        path = self.write("node1/ccm00000001.txt", "00012345.001 |10:00:01.000 |AppInfo  |body\n" + OFFER)
+        self.assertEqual(scan_file(path)[1], [])
+
+
+class MediaTableTest(MediaTestCase):
+
+    def build(self):
+        return build_media_table(self.root, workers=1, processes=False)
+
+    def test_offers_answers_and_retransmissions(self):
+        self.write("node1/ccm00000001.txt", TRACE)
+        offers = self.build().offers("call-1")
+        self.assertEqual([(r[START_LINE].split()[0], role, note) for _, r, role, note in offers], [
+            ("INVITE", "offer 1", ""),
+            ("SIP/2.0", "answer 1", ""),
+            ("INVITE", "offer 2", ""),
+            ("SIP/2.0", "answer 2", "no common codec")])
+
+    def test_new_transaction_is_a_new_offer(self):
+        self.write("node1/ccm00000001.txt", INVITE + message(
+            "10:00:02.000", "in", "UPDATE sip:2000@10.10.1.10 SIP/2.0", "102 UPDATE", OFFER))
+        offers = self.build().offers("call-1")
+        self.assertEqual([role for _, _, role, _ in offers], ["offer 1", "offer 2"])
+
+    def test_table_rows_notes(self):
+        self.write("node1/ccm00000001.txt", TRACE)
+        rows = self.build().table_rows("call-1")
+        self.assertEqual([(row[2], row[6], row[7], row[9], row[10]) for row in rows], [
+            ("INVITE", "10.10.1.20:16384", "PCMU PCMA telephone-event", "sendrecv", ""),
+            ("200 OK (INVITE)", "10.10.1.10:24000", "PCMA", "sendrecv", ""),
+            ("INVITE", "0.0.0.0:16384", "PCMU PCMA", "sendonly", "hold"),
+            ("200 OK (INVITE)", "10.10.1.10:0", "G729", "sendrecv", "no common codec, rejected")])
+        self.assertEqual(rows[0][1], "node1")
+        self.assertTrue(rows[0][11].startswith("@ {}:".format(os.path.join("node1", "ccm00000001.txt"))))
+
+    def test_hex_rows_by_ci(self):
+        self.write("node1/ccm00000001.txt", TRACE)
+        rows = self.build().table_rows("CI=1234")
+        self.assertEqual([row[:8] for row in rows], [
+            ("10:00:01.200", "node1", "StationOutputOpenReceiveChannel", "sdl", "", "hex IP",
+             "192.168.1.10:16384", "")])
+
+    def test_call_rows_earliest_first_no_ci_last(self):
+        self.write("node1/ccm00000001.txt", TRACE)
+        self.write("node2/ccm00000001.txt", message(
+            "09:00:00.000", "out", "INVITE sip:3000@10.10.1.30 SIP/2.0", "1 INVITE", OFFER, "call-0"))
+        rows = self.build().call_rows()
+        self.assertEqual([row[:6] for row in rows], [
+            ("call-0", 1, 0, 1, "09:00:00.000", "09:00:00.000"),
+            ("call-1", 5, 0, 1, "10:00:01.000", "10:00:11.000"),
+            ("CI=1234", 0, 1, 1, "10:00:01.200", "10:00:01.200"),
+            (NO_CALL, 0, 1, 1, "10:00:01.300", "10:00:01.300")])
+        self.assertEqual(rows[1][6], "0.0.0.0:16384 10.10.1.10:0 10.10.1.10:24000 10.10.1.20:16384")
+
+    def test_format_call_and_report(self):
+        self.write("node1/ccm00000001.txt", TRACE)
+        table = self.build()
+        self.assertTrue(format_call(table, "call-1").startswith("Call-ID: call-1\n\n"))
+        self.assertTrue(format_call(table, "CI=1234").startswith("SDL CI=1234\n\n"))
+        self.assertTrue(format_call(table, NO_CALL).startswith("SDL (no CI)\n\n"))
+        self.assertEqual(format_call(table, "missing"), "No SDP or hex IPs for missing\n")
+        report = format_report(table)
+        self.assertLess(report.index("Call-ID: call-1"), report.index("SDL (no CI)"))
+        self.assertEqual(table.total, 5)
+        self.assertEqual([r[MEDIA][0][1] for _, r in table.sdps["call-1"]][-1], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
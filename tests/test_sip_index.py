@@ -0,0 +1,221 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sip_index import (  # noqa: E402
+    CALL_ID, CSEQ, DIRECTION, FROM_TAG, LINE, OFFSET, PEER, START_LINE, TIMESTAMP, TO_TAG, SipIndex,
+    SipIndexCache, _scan, build_sip_index, format_ladder, index_file, message_label)
+
+# A CUCM SDI trace: an INVITE in, with compact Call-ID, and the 100 out
+# with only compact headers.
+SDI = (
+    "00012345.001 |10:00:01.100 |AppInfo  |SIPTcp - wait_SdlReadRsp: Incoming SIP TCP message "
+    "from 10.10.1.20 on port 5060 index 12 with 400 bytes:\n"
+    "INVITE sip:2000@10.10.1.10:5060 SIP/2.0\n"
+    "Via: SIP/2.0/TCP 10.10.1.20:5060;branch=z9hG4bK1\n"
+    "From: <sip:1000@10.10.1.20>;tag=aaa\n"
+    "To: <sip:2000@10.10.1.10>\n"
+    "i: call-1@10.10.1.20\n"
+    "CSeq: 101 INVITE\n"
+    "Content-Length: 0\n"
+    "\n"
+    "00012346.001 |10:00:01.300 |AppInfo  |SIPTcp - wait_SdlSPISignal: Outgoing SIP TCP message "
+    "to 10.10.1.20 on port 5060 index 12\n"
+    "SIP/2.0 100 Trying\n"
+    "v: SIP/2.0/TCP 10.10.1.20:5060;branch=z9hG4bK1\n"
+    "f: <sip:1000@10.10.1.20>;tag=aaa\n"
+    "t: <sip:2000@10.10.1.10>;tag=bbb\n"
+    "Call-ID: call-1@10.10.1.20\n"
+    "CSeq: 101 INVITE\n"
+    "\n"
+    "00012347.001 |10:00:05.000 |AppInfo  |SIPTcp - wait_SdlReadRsp: Incoming SIP TCP message "
+    "from 10.10.1.30 on port 5060 index 13\n"
+    "OPTIONS sip:10.10.1.10 SIP/2.0\n"
+    "Call-ID: ping-1\n"
+    "CSeq: 1 OPTIONS\n"
+    "00012348.001 |10:00:05.001 |AppInfo  |next line of the trace\n"
+)
+
+# A CUBE debug: "Sent:"/"Received:" with no peer, syslog timestamps.
+CUBE = (
+    "Mar 14 10:00:01.000: //-1/xxx/SIP/Msg/ccsipDisplayMsg:\n"
+    "Sent:\n"
+    "INVITE sip:2000@10.10.1.10:5060 SIP/2.0\n"
+    "Via: SIP/2.0/TCP 10.10.1.20:5060;branch=z9hG4bK1\n"
+    "From: <sip:1000@10.10.1.20>;tag=aaa\n"
+    "To: <sip:2000@10.10.1.10>\n"
+    "Call-ID: call-1@10.10.1.20\n"
+    "CSeq: 101 INVITE\n"
+    "\n"
+    "Mar 14 10:00:01.200: //-1/xxx/SIP/Msg/ccsipDisplayMsg:\n"
+    "Received:\n"
+    "SIP/2.0 100 Trying\n"
+    "Via: SIP/2.0/TCP 10.10.1.20:5060;branch=z9hG4bK1\n"
+    "From: <sip:1000@10.10.1.20>;tag=aaa\n"
+    "To: <sip:2000@10.10.1.10>;tag=bbb\n"
+    "Call-ID: call-1@10.10.1.20\n"
+    "CSeq: 101 INVITE\n"
+    "\n"
+    "Mar 14 10:00:02.000: //-1/xxx/SIP/Msg/ccsipDisplayMsg:\n"
+    "Received:\n"
+    "INVITE sip:3000@10.10.1.20:5060 SIP/2.0\n"
+    "Via: SIP/2.0/UDP 10.10.1.40:5060;branch=z9hG4bK9\n"
+    "Call-ID: call-2\n"
+    "CSeq: 1 INVITE\n"
+)
+
+
+class SipIndexTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+
+    def write(self, rel_path, text):
+        path = os.path.join(self.root, rel_path)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, "w") as handle:
+            handle.write(text)
+        return path
+
+    def build(self, **kwargs):
+        return build_sip_index(self.root, workers=1, processes=False, **kwargs)
+
+
+class IndexFileTest(SipIndexTestCase):
+
+    def test_cucm_messages_with_compact_headers(self):
+        path = self.write("node1/ccm00000001.txt", SDI)
+        self.assertEqual(index_file(path)[0], path)
+        invite, trying, options = index_file(path)[2]
+        self.assertEqual((invite[LINE], invite[TIMESTAMP], invite[START_LINE]),
+                         (2, "10:00:01.100", "INVITE sip:2000@10.10.1.10:5060 SIP/2.0"))
+        self.assertEqual(SDI[invite[OFFSET]:].split("\n", 1)[0], invite[START_LINE])
+        self.assertEqual((invite[CALL_ID], invite[CSEQ], invite[FROM_TAG], invite[TO_TAG]),
+                         ("call-1@10.10.1.20", "101 INVITE", "aaa", None))
+        self.assertEqual((trying[CALL_ID], trying[FROM_TAG], trying[TO_TAG]),
+                         ("call-1@10.10.1.20", "aaa", "bbb"))
+        self.assertEqual((options[CALL_ID], options[CSEQ]), ("ping-1", "1 OPTIONS"))
+
+    def test_direction_and_peer_from_the_line_before(self):
+        path = self.write("node1/ccm00000001.txt", SDI)
+        found = [(m[DIRECTION], m[PEER]) for m in index_file(path)[2]]
+        self.assertEqual(found, [("in", "10.10.1.20:5060"), ("out", "10.10.1.20:5060"),
+                                 ("in", "10.10.1.30:5060")])
+
+    def test_peer_from_the_top_via(self):
+        path = self.write("cube/debug.log", CUBE)
+        found = [(m[DIRECTION], m[PEER]) for m in index_file(path)[2]]
+        # Only a request received names its sender in the Via.
+        self.assertEqual(found, [("out", None), ("in", None), ("in", "10.10.1.40:5060")])
+
+    def test_message_without_call_id_is_skipped(self):
+        path = self.write("node1/ccm00000001.txt", "INVITE sip:1@a SIP/2.0\nCSeq: 1 INVITE\n\n")
+        self.assertEqual(index_file(path)[2], [])
+
+    def test_message_cut_by_the_chunk_end_is_left_for_the_next(self):
+        text = SDI.split("00012347.001")[0] + "SIP/2.0 180 Ringing\nCall-ID: call-1@10.10.1.20\n"
+        found, consumed = _scan(text, False)
+        self.assertEqual(len(found), 2)
+        self.assertEqual(text[consumed:].split("\n", 1)[0], "SIP/2.0 180 Ringing")
+        found, consumed = _scan(text, True)
+        self.assertEqual((found[-1][START_LINE], consumed), ("SIP/2.0 180 Ringing", len(text)))
+
+
+class SipIndexTest(SipIndexTestCase):
+
+    def test_calls_across_nodes_in_time_order(self):
+        self.write("node1/cm/trace/ccm00000001.txt", SDI)
+        self.write("cube/debug.log", CUBE)
+        index = self.build()
+        self.assertEqual(index.total, 6)
+        self.assertEqual(sorted(index.calls), ["call-1@10.10.1.20", "call-2", "ping-1"])
+        found = [(rel_path.split(os.sep)[0], message[TIMESTAMP])
+                 for rel_path, message in index.messages("call-1@10.10.1.20")]
+        self.assertEqual(found, [("cube", "Mar 14 10:00:01.000"), ("node1", "10:00:01.100"),
+                                 ("cube", "Mar 14 10:00:01.200"), ("node1", "10:00:01.300")])
+        self.assertEqual(index.messages("missing"), [])
+
+    def test_call_rows_earliest_first(self):
+        self.write("node1/ccm00000001.txt", SDI)
+        self.write("cube/debug.log", CUBE)
+        rows = self.build().call_rows()
+        self.assertEqual([row[:3] for row in rows],
+                         [("call-1@10.10.1.20", 4, 2), ("call-2", 1, 1), ("ping-1", 1, 1)])
+        self.assertEqual(rows[0][3:], ("Mar 14 10:00:01.000", "10:00:01.300",
+                                       "INVITE sip:2000@10.10.1.10:5060 SIP/2.0"))
+
+    def test_single_file_root(self):
+        path = self.write("ccm00000001.txt", SDI)
+        index = build_sip_index(path, workers=1, processes=False)
+        self.assertEqual(sorted(index.files), ["ccm00000001.txt"])
+
+    def test_cache_skips_unchanged_files(self):
+        self.write("node1/ccm00000001.txt", SDI)
+        cache = SipIndexCache()
+        progress = []
+        self.build(cache=cache, progress=lambda path, error: progress.append(error))
+        self.assertEqual((len(cache), progress), (1, [None]))
+        index = self.build(cache=cache, progress=lambda path, error: progress.append(error))
+        self.assertEqual((index.total, progress), (3, [None]))
+
+
+class SipIndexCacheTest(unittest.TestCase):
+
+    def test_changed_identity_misses(self):
+        cache = SipIndexCache()
+        cache.put(("/a", 10, 1), ["m"])
+        self.assertEqual(cache.get(("/a", 10, 1)), ["m"])
+        self.assertIsNone(cache.get(("/a", 12, 2)))
+        self.assertIsNone(cache.get(None))
+        cache.put(None, ["ignored"])
+        self.assertEqual(len(cache), 1)
+
+    def test_least_recently_used_out_first(self):
+        cache = SipIndexCache(max_files=2)
+        cache.put(("/a", 1, 1), ["a"])
+        cache.put(("/b", 1, 1), ["b"])
+        cache.get(("/a", 1, 1))
+        cache.put(("/c", 1, 1), ["c"])
+        self.assertIsNone(cache.get(("/b", 1, 1)))
+        self.assertEqual(cache.get(("/a", 1, 1)), ["a"])
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+
+
+class LadderTest(SipIndexTestCase):
+
+    def test_message_label(self):
+        message = (0, 1, None, None, None, "SIP/2.0 200 OK", "c", "2 BYE", None, None, None)
+        self.assertEqual(message_label(message), "200 OK (BYE)")
+        self.assertEqual(message_label(message[:5] + ("BYE sip:a SIP/2.0",) + message[6:]), "BYE")
+        self.assertEqual(message_label(message[:7] + (None,) + message[8:]), "200 OK")
+
+    def test_ladder_of_one_call(self):
+        self.write("node1/ccm00000001.txt", SDI)
+        self.write("cube/debug.log", CUBE)
+        lines = format_ladder(self.build(), "call-1@10.10.1.20").splitlines()
+        self.assertEqual(lines[0], "Call-ID: call-1@10.10.1.20")
+        self.assertEqual(lines[1],
+                         "4 messages in 2 files, Mar 14 10:00:01.000 - 10:00:01.300; tags: aaa, bbb")
+        self.assertEqual(lines[3].split(), ["cube", "?", "10.10.1.20:5060", "node1"])
+        rows = lines[5:]
+        self.assertEqual(len(rows), 4)
+        self.assertTrue(rows[0].startswith("Mar 14 10:00:01.000  |---------- INVITE -------->|   "))
+        self.assertTrue(rows[0].endswith("@ {}:3".format(os.path.join("cube", "debug.log"))))
+        self.assertTrue(rows[1].startswith("10:00:01.100         |   "))
+        self.assertIn("|---------- INVITE -------->|   @", rows[1])
+        self.assertIn("|<-- 100 Trying (INVITE) ---|   @", rows[3])
+        self.assertTrue(rows[3].endswith("@ {}:11".format(os.path.join("node1", "ccm00000001.txt"))))
+
+    def test_unknown_call(self):
+        self.assertEqual(format_ladder(SipIndex(self.root), "x"), "No SIP messages with Call-ID x\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
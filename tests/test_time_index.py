@@ -0,0 +1,74 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from time_index import build, parse_time, seek  # noqa: E402
+
+
+def sdl_lines(times, date=""):
+    return "".join("%08d |%s%s |AppInfo |line %d\n  continuation\n" % (n, date, t, n)
+                   for n, t in enumerate(times))
+
+
+def clock(seconds):
+    return "%02d:%02d:%02d.000" % (seconds // 3600 % 24, seconds // 60 % 60, seconds % 60)
+
+
+class SeekTest(unittest.TestCase):
+
+    def go(self, text, typed, step=200, window=80):
+        index = build(lambda a, b: text[a:b], len(text), step, window)
+        date, micros = parse_time(typed)
+        offset = seek(index, lambda a, b: text[a:b], date, micros, step + window)
+        return None if offset is None else text[offset:text.index("\n", offset)]
+
+    def test_first_line_at_or_after_every_time(self):
+        text = sdl_lines([clock(36000 + 7 * n) for n in range(300)])
+        for n in range(0, 299, 13):
+            self.assertIn("line %d" % n, self.go(text, clock(36000 + 7 * n)))
+            self.assertIn("line %d" % (n + 1), self.go(text, clock(36000 + 7 * n + 3)))
+
+    def test_before_the_first_and_after_the_last_line(self):
+        text = sdl_lines([clock(36000 + n) for n in range(100)])
+        self.assertIn("line 0", self.go(text, "08:00:00"))
+        self.assertIsNone(self.go(text, "23:00:00"))
+
+    def test_bare_times_past_midnight(self):
+        text = sdl_lines([clock(86400 - 600 + 10 * n) for n in range(120)])
+        # 00:05 is on the second day; 23:55 on the first.
+        self.assertIn("line 90", self.go(text, "00:05:00"))
+        self.assertIn("line 30", self.go(text, "23:55:00"))
+        self.assertIn("line 60", self.go(text, "00:00:00"))
+        self.assertIsNone(self.go(text, "10:00:00"))
+
+    def test_matches_a_linear_scan_across_days(self):
+        seconds = [86400 - 3000 + 25 * n for n in range(240)]
+        text = sdl_lines([clock(s) for s in seconds])
+        for n in range(0, 240, 7):
+            for extra in (0, 10):
+                wanted = seconds[n] + extra
+                expected = next(i for i, s in enumerate(seconds) if s >= wanted)
+                self.assertIn("line %d\n" % expected, self.go(text, clock(wanted)) + "\n")
+
+    def test_dated_times(self):
+        text = (sdl_lines([clock(82800 + 30 * n) for n in range(100)], "2024/03/14 ") +
+                sdl_lines([clock(30 * n) for n in range(100)], "2024/03/15 "))
+        self.assertIn("|2024/03/15 00:00:00.000", self.go(text, "2024/03/15 00:00:00"))
+        self.assertIn("|2024/03/14 23:30:00.000", self.go(text, "2024/03/14 23:30:00"))
+        self.assertIn("|2024/03/15 00:00:00.000", self.go(text, "Mar 15 00:00:00"))
+
+
+class ParseTimeTest(unittest.TestCase):
+
+    def test_formats(self):
+        self.assertEqual(parse_time("14:03:22")[1], (14 * 3600 + 3 * 60 + 22) * 1000000)
+        self.assertEqual(parse_time(" 2024/03/14 14:03:22.500 ")[1],
+                         (14 * 3600 + 3 * 60 + 22) * 1000000 + 500000)
+        self.assertIsNotNone(parse_time("Mar 14 14:03:22")[0])
+        self.assertIsNone(parse_time("not a time"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+import io
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from trace_merge import merge_traces, set_name, trace_sets  # noqa: E402
+
+
+class TraceMergeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+
+    def write(self, rel_path, text):
+        path = os.path.join(self.root, rel_path)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, "w") as handle:
+            handle.write(text)
+
+    def merged(self, sets=None):
+        out = io.StringIO()
+        merge_traces(self.root, out, sets)
+        return [line.split("| ", 1)[1] for line in out.getvalue().splitlines()]
+
+    def test_set_name_drops_rotation_number(self):
+        self.assertEqual(set_name("sdl001_100_000123.txt"), "sdl001_100")
+        self.assertEqual(set_name("ccm00000042.txt"), "ccm")
+        self.assertEqual(set_name("messages"), "messages")
+
+    def test_sets_by_node(self):
+        self.write("node1/sdl001_100_000002.txt", "")
+        self.write("node1/sdl001_100_000001.txt", "")
+        self.write("node2/sdl001_100_000001.txt", "")
+        sets = trace_sets(self.root)
+        self.assertEqual(list(sets), ["sdl001_100"])
+        self.assertEqual([os.path.basename(p) for p in sets["sdl001_100"]["node1"]],
+                         ["sdl001_100_000001.txt", "sdl001_100_000002.txt"])
+
+    def test_interleaves_nodes_and_keeps_continuation_lines(self):
+        self.write("node1/sdl001_100_000001.txt",
+                   "1 |2024/03/14 10:00:01.000 |a\nmore of a\n1 |2024/03/14 10:00:04.000 |d\n")
+        self.write("node2/sdl001_100_000001.txt",
+                   "2 |2024/03/14 10:00:02.000 |b\nDate: Thu, 14 Mar 2024 10:00:09 GMT\n"
+                   "2 |2024/03/14 10:00:03.000 |c\n")
+        self.assertEqual(self.merged(), [
+            "1 |2024/03/14 10:00:01.000 |a", "more of a",
+            "2 |2024/03/14 10:00:02.000 |b", "Date: Thu, 14 Mar 2024 10:00:09 GMT",
+            "2 |2024/03/14 10:00:03.000 |c",
+            "1 |2024/03/14 10:00:04.000 |d"])
+
+    def test_yearless_syslog_merges_with_dated_lines(self):
+        self.write("node1/sdl001_100_000001.txt",
+                   "1 |2024/03/14 10:00:05.000 |a\n1 |2024/03/14 10:00:20.000 |d\n")
+        self.write("node2/sdl001_100_000001.txt",
+                   "*Mar 14 10:00:10.000: b\n*Mar 14 10:00:15.000: c\n")
+        self.assertEqual([line[-1] for line in self.merged()], ["a", "b", "c", "d"])
+
+    def test_bare_times_merge_with_dated_lines(self):
+        self.write("node1/sdl001_100_000001.txt",
+                   "1 |2024/03/14 10:00:05.000 |a\n1 |2024/03/14 10:00:20.000 |d\n")
+        self.write("node2/sdl001_100_000001.txt", "10:00:10.000 |b\n10:00:15.000 |c\n")
+        self.assertEqual([line[-1] for line in self.merged()], ["a", "b", "c", "d"])
+
+    def test_bare_times_wrap_to_next_day(self):
+        self.write("node1/sdl001_100_000001.txt", "23:59:58.000 |a\n00:00:03.000 |d\n")
+        self.write("node2/sdl001_100_000001.txt", "00:00:01.000 |c\n")
+        self.write("node2/sdl001_100_000000.txt", "23:59:59.000 |b\n")
+        self.assertEqual([line[-1] for line in self.merged()], ["a", "b", "c", "d"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,114 @@
+import io
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from trace_scan import (  # noqa: E402
+    NO_NODE, TIMESTAMP, iter_file_chunks, iter_trace_files, line_timestamp, node_of, run_pool, scan_file,
+    sort_keys, summarize_file, timestamp_key)
+
+TRACE = (
+    "00001.000 |10:00:01.000 |AppInfo  |CcSetupReq\n"
+    "continued\n"
+    "00002.000 |10:00:02.500 |AppInfo  |CcRelReq cause=16\n"
+    "00003.000 |10:00:03.250 |AppInfo  |CcSetupReq\n"
+)
+
+
+def key(text):
+    return timestamp_key(TIMESTAMP.search(text))
+
+
+def fail_on_two(n):
+    if n == 2:
+        raise ValueError("two")
+    return n * 10
+
+
+class TraceScanTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+
+    def write(self, rel_path, text):
+        path = os.path.join(self.root, rel_path)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, "w") as handle:
+            handle.write(text)
+        return path
+
+
+class FilesTest(TraceScanTestCase):
+
+    def test_chunks_end_on_lines(self):
+        chunks = list(iter_file_chunks(io.StringIO(TRACE), 20))
+        self.assertEqual("".join(text for _, text in chunks), TRACE)
+        self.assertTrue(all(text.endswith("\n") for _, text in chunks))
+        self.assertEqual([offset for offset, _ in chunks],
+                         [sum(len(text) for _, text in chunks[:i]) for i in range(len(chunks))])
+        self.assertEqual(list(iter_file_chunks(io.StringIO("no newline"), 4)), [(0, "no newline")])
+
+    def test_trace_files_in_path_order(self):
+        for rel_path in ("b/ccm2.txt", "a/ccm1.TXT", "a/notes.md", ".hidden/x.txt", "c/messages.log.1",
+                         "__pycache__/y.log"):
+            self.write(rel_path, "")
+        found = [os.path.relpath(path, self.root) for path in iter_trace_files(self.root)]
+        self.assertEqual(found, [os.path.join("a", "ccm1.TXT"), os.path.join("b", "ccm2.txt"),
+                                 os.path.join("c", "messages.log.1")])
+
+    def test_node_of(self):
+        self.assertEqual(node_of("cucm-pub/cm/trace/ccm/sdl/sdl001.txt"), "cucm-pub")
+        self.assertEqual(node_of("cucm-sub_extracted\\cm\\sdl001.txt"), "cucm-sub")
+        self.assertEqual(node_of("sdl001.txt"), NO_NODE)
+
+    def test_scan_and_summarize(self):
+        path = self.write("node1/ccm.txt", TRACE)
+        styles = {0: ["CcSetupReq"], 1: [r"cause=\d+"], 2: ["(?<!a+)b"]}
+        _, identity, hits, rejected = scan_file(path, styles, chunk_size=30)
+        self.assertIsNotNone(identity)
+        self.assertEqual([TRACE[a:b] for a, b in hits[0]], ["CcSetupReq", "CcSetupReq"])
+        self.assertEqual([TRACE[a:b] for a, b in hits[1]], ["cause=16"])
+        self.assertEqual((hits[2], rejected), ([], [(2, "(?<!a+)b")]))
+        _, summary, _ = summarize_file(path, styles, chunk_size=30)
+        self.assertEqual(summary[0], [2, "10:00:01.000", "10:00:03.250"])
+        self.assertEqual(summary[1], [1, "10:00:02.500", "10:00:02.500"])
+        self.assertEqual(summary[2], [0, None, None])
+
+    def test_pool_reports_errors_per_job(self):
+        found = sorted((job[0], result, str(error) if error else None)
+                       for job, result, error in run_pool(fail_on_two, [(1,), (2,), (3,)], 2, False))
+        self.assertEqual(found, [(1, 10, None), (2, None, "two"), (3, 30, None)])
+        self.assertEqual(list(run_pool(fail_on_two, [], 2, False)), [])
+
+
+class TimestampTest(unittest.TestCase):
+
+    def test_line_timestamp_looks_above(self):
+        self.assertEqual(line_timestamp(TRACE, TRACE.index("continued")), "10:00:01.000")
+        self.assertEqual(line_timestamp(TRACE, TRACE.index("continued"), lookback=0), None)
+        self.assertEqual(line_timestamp("no time\nhere", 9), None)
+
+    def test_timestamp_key_formats(self):
+        self.assertEqual(key("2024/03/14 10:22:31.451"), ((2024, 3, 14), 37351451000))
+        self.assertEqual(key("03/14/2024 10:22:31.451"), ((2024, 3, 14), 37351451000))
+        self.assertEqual(key("*Mar 14 10:22:31.451"), ((0, 3, 14), 37351451000))
+        self.assertEqual(key("Mar  4 2024 10:22:31"), ((2024, 3, 4), 37351000000))
+        self.assertEqual(key("10:22:31,5"), (None, 37351500000))
+
+    def test_sort_keys_drop_what_some_traces_lack(self):
+        dated = key("2024/03/15 01:00:00")
+        yearless = key("Mar 14 23:00:00")
+        bare = key("00:30:00")
+        self.assertEqual(sort_keys([dated, None]), [(2024, 3, 15, 3600000000), ()])
+        self.assertEqual(sort_keys([dated, yearless]), [(3, 15, 3600000000), (3, 14, 82800000000)])
+        self.assertEqual(sort_keys([dated, yearless, bare]), [(3600000000,), (82800000000,), (1800000000,)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,181 @@
+"""
+Sparse timestamp index of a trace, for jumping to a time of day without
+reading the whole file.
+
+One sample is taken every SAMPLE_STEP_CHARS: the first timestamped line
+at or after that offset. A lookup binary-searches the samples for the
+last one before the time asked for, and seek() then reads forward from
+there, a sample step or so, to the first line at or after it. Building
+reads only a few KB at each step, so a 500 MB trace is indexed from
+about 30 MB of reads.
+
+Timestamps are those of trace_scan.TIMESTAMP: CUCM SDL/SDI times with or
+without a date, and IOS/CUBE syslog. Traces with bare times of day can
+run past midnight; samples are grouped into days, a new one starting
+when the date changes or the time goes back by more than DAY_WRAP_MICROS,
+and a time with no date is looked for in the first day that reaches it:
+the trace's first day from its first line, later days from midnight.
+Nothing in here imports ``sublime``; callers pass a ``read`` callable
+returning text for a ``(begin, end)`` character range.
+"""
+import bisect
+from array import array
+
+try:
+    from .trace_scan import TIMESTAMP, TIMESTAMP_SEARCH_CHARS, timestamp_key
+except ImportError:
+    from trace_scan import TIMESTAMP, TIMESTAMP_SEARCH_CHARS, timestamp_key
+
+SAMPLE_STEP_CHARS = 64 * 1024
+# Read at each step to find a timestamped line.
+SAMPLE_WINDOW_CHARS = 4 * 1024
+# A bare time going back by more than this starts a new day.
+DAY_WRAP_MICROS = 3600 * 1000000
+
+
+def line_key(text, start):
+    """timestamp_key of the line starting at ``start``, or None."""
+    match = TIMESTAMP.search(text, start, start + TIMESTAMP_SEARCH_CHARS)
+    if match is None or "\n" in text[start:match.start()]:
+        return None
+    return timestamp_key(match)
+
+
+def parse_time(text):
+    """timestamp_key of the first timestamp in ``text`` (as typed), or None."""
+    match = TIMESTAMP.search(text.strip())
+    return timestamp_key(match) if match else None
+
+
+def _new_day(date, micros, last_date, last_micros):
+    if date is not None or last_date is not None:
+        return date != last_date
+    return micros < last_micros - DAY_WRAP_MICROS
+
+
+class TimeIndex(object):
+    """
+    ``(offset, day, micros)`` samples in offset order, as from build();
+    ``dates`` holds the date of each day (None for bare times of day).
+    """
+
+    def __init__(self, size=0):
+        self.size = size
+        self.offsets = array('q')
+        self.keys = []  # (day, micros) per sample
+        self.dates = []
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def add(self, offset, date, micros):
+        if not self.keys:
+            day = 0
+            self.dates.append(date)
+        else:
+            day, last_micros = self.keys[-1]
+            if _new_day(date, micros, self.dates[day], last_micros):
+                day += 1
+                self.dates.append(date)
+        self.offsets.append(offset)
+        self.keys.append((day, micros))
+
+    def _target(self, date, micros):
+        """The ``(day, micros)`` key of a time, or None when it is past the last day."""
+        if date is not None and any(self.dates):
+            for day, known in enumerate(self.dates):
+                if known is not None:
+                    order = _date_order(known, date)
+                    if order == 0:
+                        return day, micros
+                    if order > 0:
+                        return day, 0
+            return None
+        if not self.keys:
+            return None
+        # Every day but the first starts at midnight and every day but the
+        # last runs on to it, whatever times were sampled: a time before the
+        # first line is looked for on the next day, and one no day reaches
+        # is past the end.
+        last = len(self.dates) - 1
+        first = self.keys[0][1]
+        latest = max(sample for day, sample in self.keys if day == last)
+        for day in range(last + 1):
+            if (day or first <= micros) and (day < last or latest >= micros):
+                return day, micros
+        return (0, micros) if not last and latest >= micros else None
+
+    def start_for(self, date, micros):
+        """Offset of the sample before ``(date, micros)``: where to read forward from."""
+        return self._start(date, micros)[0]
+
+    def _start(self, date, micros):
+        """``(offset, day, target day)`` for seek(); the target day is None past the last day."""
+        target = self._target(date, micros)
+        if target is None:
+            return (self.offsets[-1], self.keys[-1][0], None) if self.offsets else (0, 0, None)
+        i = bisect.bisect_left(self.keys, target)
+        return (self.offsets[i - 1], self.keys[i - 1][0], target[0]) if i else (0, 0, target[0])
+
+
+def _date_order(known, wanted):
+    """-1, 0 or 1 comparing two dates, years left out when either has none."""
+    if not known[0] or not wanted[0]:
+        known, wanted = known[1:], wanted[1:]
+    return (known > wanted) - (known < wanted)
+
+
+def build(read, size, step=SAMPLE_STEP_CHARS, window=SAMPLE_WINDOW_CHARS, cancelled=None):
+    """
+    TimeIndex of a text of ``size`` characters read through ``read``.
+    ``cancelled()`` is checked at each step; when true, None is returned.
+    """
+    index = TimeIndex(size)
+    for pos in range(0, size, step):
+        if cancelled is not None and cancelled():
+            return None
+        text = read(pos, min(size, pos + window))
+        start = 0 if pos == 0 else text.find("\n") + 1
+        while start or pos == 0:
+            key = line_key(text, start)
+            if key is not None:
+                index.add(pos + start, key[0], key[1])
+                break
+            start = text.find("\n", start) + 1
+            if not start:
+                break
+    return index
+
+
+def seek(index, read, date, micros, limit=SAMPLE_STEP_CHARS + SAMPLE_WINDOW_CHARS):
+    """
+    Offset of the first line at or after ``(date, micros)``, reading at
+    most ``limit`` characters from the sample before it, or None when no
+    line there is.
+    """
+    offset, day, target = index._start(date, micros)
+    text = read(offset, min(index.size, offset + limit))
+    last_micros = None
+    start = 0
+    while True:
+        key = line_key(text, start)
+        if key is not None:
+            line_date, line_micros = key
+            wrapped = last_micros is not None and _new_day(None, line_micros, None, last_micros)
+            if date is not None and line_date is not None:
+                order = _date_order(line_date, date)
+                if order > 0 or (order == 0 and line_micros >= micros):
+                    return offset + start
+            elif target is None:
+                if line_micros >= micros or wrapped:
+                    return offset + start
+            else:
+                # Read on through the rest of an earlier day.
+                if wrapped:
+                    day += 1
+                if day > target or (day == target and line_micros >= micros):
+                    return offset + start
+            last_micros = line_micros
+        start = text.find("\n", start) + 1
+        if not start:
+            return None
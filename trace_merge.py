@@ -0,0 +1,220 @@
+"""
+Merge the traces of a bundle into one file in time order, each line
+prefixed with its node and file.
+
+Files are grouped into sets by name with the rotation number left out
+(``sdl001_100_000123.txt`` is set ``sdl001_100``, ``ccm00000042.txt`` is
+``ccm``). Within a set, each node's rotations are read one after the
+other, in name order, as one stream, and the streams of all nodes go
+through a heap-based k-way merge on the line timestamps. Memory and open
+files are bounded by the number of streams, not by the size of the
+traces.
+
+A line with no timestamp (the rest of a multi-line message) stays with
+the line above it, as does a message header with a date of its own.
+Bare times of day that go back by more than an hour are taken to be the
+next day, as in time_index.
+
+Streams whose timestamps are written differently are compared as
+trace_scan.sort_keys compares them: by the first timestamp of each
+stream, dates lose their year when any stream has none (IOS and CUBE
+syslog "Mar 14") and are left out when any stream has bare times of day,
+ordering on the time and its day count alone. A line of a stream with
+less date than that takes the date of the line before it.
+
+Used by the "Merge Traces by Time" command and runnable on its own:
+
+    python trace_merge.py BUNDLE --list
+    python trace_merge.py BUNDLE --set sdl001_100 -o merged.txt
+
+The node of a file is as for trace_scan.node_of. Nothing in here imports
+``sublime``.
+"""
+import argparse
+import heapq
+import os
+import re
+import sys
+from collections import OrderedDict
+
+try:
+    from .time_index import DAY_WRAP_MICROS
+    from .trace_scan import (
+        TIMESTAMP, TIMESTAMP_SEARCH_CHARS, TRACE_FILE_PATTERNS, iter_trace_files, node_of, open_trace,
+        timestamp_key)
+except ImportError:
+    from time_index import DAY_WRAP_MICROS
+    from trace_scan import (
+        TIMESTAMP, TIMESTAMP_SEARCH_CHARS, TRACE_FILE_PATTERNS, iter_trace_files, node_of, open_trace,
+        timestamp_key)
+
+# Name, rotation number, extensions: "sdl001_100_" "000123" ".txt".
+ROTATED_NAME = re.compile(r'^(.*?)(\d+)((?:\.[A-Za-z]\w*)*)$')
+# Lines of a logged message whose text carries a time of its own
+# ("Date: Thu, 14 Mar 2024 10:22:31 GMT") are not the start of a record.
+MESSAGE_HEADER = re.compile(r'[A-Za-z][\w-]*:[^\S\n]')
+PROGRESS_LINES = 100000
+# How much of the date records are merged on; see date_level.
+NO_DATE, NO_YEAR, DATED = range(3)
+
+
+def set_name(file_name):
+    """The rotation set of a trace file: its name without the rotation number."""
+    match = ROTATED_NAME.match(file_name)
+    if match is None:
+        return os.path.splitext(file_name)[0]
+    return match.group(1).rstrip("_.-") or file_name
+
+
+def trace_sets(root, file_patterns=TRACE_FILE_PATTERNS):
+    """``{set: {node: [path, ...]}}`` for the traces under ``root``, paths in name order."""
+    sets = OrderedDict()
+    for path in iter_trace_files(root, file_patterns):
+        nodes = sets.setdefault(set_name(os.path.basename(path)), OrderedDict())
+        nodes.setdefault(node_of(os.path.relpath(path, root)), []).append(path)
+    for nodes in sets.values():
+        for paths in nodes.values():
+            paths.sort(key=os.path.basename)
+    return sets
+
+
+def _timestamps(path):
+    with open_trace(path) as handle:
+        for line in handle:
+            match = TIMESTAMP.search(line, 0, TIMESTAMP_SEARCH_CHARS)
+            if match is not None and not MESSAGE_HEADER.match(line):
+                yield timestamp_key(match)
+
+
+def date_level(streams):
+    """
+    How much of the date the streams can be merged on, from the first
+    timestamp of each: DATED, NO_YEAR or NO_DATE.
+    """
+    level = DATED
+    for paths in streams:
+        for path in paths:
+            first = next(_timestamps(path), None)
+            if first is None:
+                continue
+            date = first[0]
+            level = min(level, NO_DATE if date is None else NO_YEAR if not date[0] else DATED)
+            break
+    return level
+
+
+def _records(paths, stream, prefix_of, level=DATED):
+    """
+    Yield ``(key, stream, seq, text)`` for each record of the files in
+    ``paths``, read in turn: a timestamped line and the lines after it
+    with none, every line prefixed by ``prefix_of(path)``. Keys hold as
+    much of the date as ``level`` says; see date_level.
+    """
+    seq = 0
+    day = 0
+    date = (0, 0, 0)
+    key = _key(level, date, day, 0)
+    last_micros = None
+    for path in paths:
+        prefix = prefix_of(path)
+        lines = []
+        with open_trace(path) as handle:
+            for line in handle:
+                match = TIMESTAMP.search(line, 0, TIMESTAMP_SEARCH_CHARS)
+                if match is not None and not MESSAGE_HEADER.match(line):
+                    if lines:
+                        yield key, stream, seq, "".join(lines)
+                        seq += 1
+                        lines = []
+                    found, micros = timestamp_key(match)
+                    if last_micros is not None and micros < last_micros - DAY_WRAP_MICROS:
+                        day += 1
+                    last_micros = micros
+                    if found is not None and (found[0] or not date[0]):
+                        date = found
+                    elif found is not None:
+                        date = (date[0],) + found[1:]
+                    key = _key(level, date, day, micros)
+                if not line.endswith("\n"):
+                    line += "\n"
+                lines.append(prefix + line)
+        if lines:
+            yield key, stream, seq, "".join(lines)
+            seq += 1
+
+
+def _key(level, date, day, micros):
+    if level == NO_DATE:
+        return (day,), micros
+    if level == NO_YEAR:
+        return date[1:], micros
+    return date, micros
+
+
+def merge_streams(streams, prefix_of):
+    """Records of ``streams`` (lists of paths) merged in time order; see _records."""
+    level = date_level(streams)
+    return heapq.merge(*[_records(paths, i, prefix_of, level) for i, paths in enumerate(streams)])
+
+
+def merge_traces(root, out, sets=None, file_patterns=TRACE_FILE_PATTERNS, progress=None):
+    """
+    Write the merge of the traces under ``root`` to ``out``: the sets
+    named in ``sets``, or all of them. ``progress(lines)`` is called every
+    PROGRESS_LINES lines. Returns ``(files, lines)``.
+    """
+    streams = []
+    labels = {}
+    for name, nodes in trace_sets(root, file_patterns).items():
+        if sets is not None and name not in sets:
+            continue
+        for node, paths in nodes.items():
+            streams.append(paths)
+            for path in paths:
+                labels[path] = (node, os.path.basename(path))
+    if not streams:
+        return 0, 0
+    node_width = max(len(node) for node, _ in labels.values())
+    file_width = max(len(name) for _, name in labels.values())
+    prefixes = dict((path, "{} {} | ".format(node.ljust(node_width), name.ljust(file_width)))
+                    for path, (node, name) in labels.items())
+    lines = 0
+    for _, _, _, text in merge_streams(streams, prefixes.get):
+        out.write(text)
+        count = text.count("\n")
+        if progress is not None and (lines + count) // PROGRESS_LINES != lines // PROGRESS_LINES:
+            progress(lines + count)
+        lines += count
+    return len(labels), lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("root", help="folder to merge (an extracted bundle)")
+    parser.add_argument("-o", "--output", help="output file (default: stdout)")
+    parser.add_argument("--set", action="append", dest="sets",
+                        help="rotation set to merge; may be repeated (default: all)")
+    parser.add_argument("--list", action="store_true", help="list the sets and exit")
+    parser.add_argument("--files", nargs="+", default=list(TRACE_FILE_PATTERNS),
+                        help="file name patterns (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.root):
+        parser.error("no such folder: %s" % args.root)
+    if args.list:
+        for name, nodes in trace_sets(args.root, args.files).items():
+            sys.stdout.write("%s  %d nodes, %d files\n" % (
+                name, len(nodes), sum(len(paths) for paths in nodes.values())))
+        return 0
+    out = open(args.output, "w", encoding="utf-8", newline="") if args.output else sys.stdout
+    try:
+        files, lines = merge_traces(args.root, out, args.sets, args.files)
+    finally:
+        if args.output:
+            out.close()
+    sys.stderr.write("%d lines from %d files\n" % (lines, files))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,226 @@
+"""
+Sublime-independent helpers for scanning trace files on disk.
+
+Files are decoded as UTF-8 with undecodable bytes replaced and with
+universal newlines, so character offsets line up with the ones Sublime
+uses for the same file opened as UTF-8 (CRLF counts as one character, a
+BOM is not part of the text).
+
+Work is spread over a worker pool: processes when run headless, threads
+inside Sublime's plugin host, where multiprocessing cannot start workers.
+"""
+import fnmatch
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+try:
+    from .highlight_engine import CHUNK_SIZE, build_matcher, file_identity
+except ImportError:
+    from highlight_engine import CHUNK_SIZE, build_matcher, file_identity
+
+TRACE_FILE_PATTERNS = ("*.txt", "*.log", "*.log.*", "*.out")
+MAX_WORKERS = 8
+
+# Time of day near the start of a line, optionally preceded by a date:
+# CUCM SDL/SDI ("2024/03/14 10:22:31.451", "10:22:31.451") and IOS/CUBE
+# syslog ("*Mar 14 10:22:31.451", "Mar 14 2024 10:22:31").
+TIMESTAMP = re.compile(
+    r'(?:(\d{4})[/-](\d{2})[/-](\d{2})[ T]|(\d{2})/(\d{2})/(\d{4}) '
+    r'|([A-Z][a-z]{2}) {1,2}(\d{1,2}) (?:(\d{4}) )?)?'
+    r'(\d{2}):(\d{2}):(\d{2})(?:[.,](\d{1,6}))?'
+)
+MONTHS = dict((name, i + 1) for i, name in enumerate(
+    ("Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec")))
+TIMESTAMP_SEARCH_CHARS = 64
+TIMESTAMP_LOOKBACK_LINES = 50
+NO_NODE = "-"
+# Added by ExtractNested to the folder a nested archive is extracted to.
+EXTRACTED_SUFFIX = re.compile(r'_(?:nested|extracted)$')
+
+
+def default_workers():
+    try:
+        import multiprocessing
+        count = multiprocessing.cpu_count()
+    except (ImportError, NotImplementedError):
+        count = 2
+    return max(1, min(MAX_WORKERS, count))
+
+
+def open_trace(path):
+    # utf-8-sig is UTF-8 that also drops a leading BOM, as Sublime does.
+    return open(path, "r", encoding="utf-8-sig", errors="replace", newline=None)
+
+
+def iter_file_chunks(handle, chunk_size=CHUNK_SIZE):
+    """
+    Yield ``(offset, text)`` from an open text file, each piece ending on a
+    line boundary (bar the last), offsets counted in characters.
+    """
+    offset = 0
+    carry = ""
+    while True:
+        block = handle.read(chunk_size)
+        if not block:
+            if carry:
+                yield offset, carry
+            return
+        text = carry + block
+        cut = text.rfind("\n")
+        if cut < 0:
+            carry = text
+            continue
+        yield offset, text[:cut + 1]
+        offset += cut + 1
+        carry = text[cut + 1:]
+
+
+def iter_trace_files(root, patterns=TRACE_FILE_PATTERNS):
+    """Files under ``root`` matching ``patterns``, hidden folders skipped, in path order."""
+    patterns = [p.lower() for p in patterns]
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith(".") and d != "__pycache__")
+        for name in sorted(filenames):
+            lowered = name.lower()
+            if any(fnmatch.fnmatch(lowered, p) for p in patterns):
+                yield os.path.join(dirpath, name)
+
+
+def node_of(rel_path):
+    """
+    The node a trace belongs to: the first folder of its path under the
+    bundle root, as in an RTMT collection (``<node>/cm/trace/...``), less
+    the suffix Extract Files gives the folder of a nested archive.
+    """
+    parts = rel_path.replace("\\", "/").split("/")
+    if len(parts) < 2:
+        return NO_NODE
+    return EXTRACTED_SUFFIX.sub("", parts[0]) or parts[0]
+
+
+def scan_file(path, style_patterns, chunk_size=CHUNK_SIZE):
+    """
+    Match ``{style: [pattern, ...]}`` against one file in a single pass.
+
+    Returns ``(path, identity, hits, rejected)`` with ``hits`` as in
+    highlight_engine.scan_styles. ``identity`` is the file_identity taken
+    before reading, or None if the file changed while it was read.
+    """
+    identity = file_identity(path)
+    matcher = build_matcher(style_patterns)
+    hits = dict((style, []) for style in style_patterns)
+    if matcher:
+        with open_trace(path) as handle:
+            for offset, text in iter_file_chunks(handle, chunk_size):
+                for style, a, b in matcher.scan(text, offset):
+                    hits[style].append((a, b))
+    if identity is not None and file_identity(path) != identity:
+        identity = None
+    return path, identity, hits, matcher.rejected
+
+
+def line_timestamp_match(text, pos, lookback=TIMESTAMP_LOOKBACK_LINES):
+    """
+    TIMESTAMP match at the head of the line holding ``pos``, else of the
+    nearest line above it that has one (multi-line messages carry it on
+    their first line), looking back at most ``lookback`` lines.
+    """
+    end = text.find("\n", pos)
+    if end < 0:
+        end = len(text)
+    for _ in range(lookback + 1):
+        start = text.rfind("\n", 0, end) + 1
+        match = TIMESTAMP.search(text, start, min(end, start + TIMESTAMP_SEARCH_CHARS))
+        if match:
+            return match
+        if start == 0:
+            return None
+        end = start - 1
+    return None
+
+
+def line_timestamp(text, pos, lookback=TIMESTAMP_LOOKBACK_LINES):
+    """Text of line_timestamp_match, or None."""
+    match = line_timestamp_match(text, pos, lookback)
+    return match.group() if match else None
+
+
+def timestamp_key(match):
+    """
+    ``(date, micros)`` for a TIMESTAMP match: the date as ``(year, month,
+    day)``, year 0 when the trace leaves it out, or None for a bare time
+    of day; and the time of day in microseconds.
+    """
+    (year, month, day, us_month, us_day, us_year, month_name, name_day, name_year,
+     hours, minutes, seconds, fraction) = match.groups()
+    if year:
+        date = (int(year), int(month), int(day))
+    elif us_year:
+        date = (int(us_year), int(us_month), int(us_day))
+    elif month_name in MONTHS:
+        date = (int(name_year or 0), MONTHS[month_name], int(name_day))
+    else:
+        date = None
+    micros = ((int(hours) * 60 + int(minutes)) * 60 + int(seconds)) * 1000000
+    if fraction:
+        micros += int(fraction.ljust(6, "0"))
+    return date, micros
+
+
+def sort_keys(keys):
+    """
+    Sort keys for timestamp_key values (or None) taken from different
+    traces, in the same order: dates are compared without their year when
+    any of them has none, and left out when any time has no date at all.
+    None, no timestamp, sorts first.
+    """
+    dates = [key[0] for key in keys if key is not None]
+    if any(date is None for date in dates):
+        return [() if key is None else (key[1],) for key in keys]
+    if any(not date[0] for date in dates):
+        return [() if key is None else key[0][1:] + (key[1],) for key in keys]
+    return [() if key is None else key[0] + (key[1],) for key in keys]
+
+
+def summarize_file(path, style_patterns, chunk_size=CHUNK_SIZE):
+    """
+    Like scan_file, but keeps only ``{style: [hits, first_ts, last_ts]}``
+    so memory does not grow with the number of hits.
+    Returns ``(path, summary, rejected)``.
+    """
+    matcher = build_matcher(style_patterns)
+    summary = dict((style, [0, None, None]) for style in style_patterns)
+    if matcher:
+        with open_trace(path) as handle:
+            for _, text in iter_file_chunks(handle, chunk_size):
+                last = {}
+                for style, a, b in matcher.scan(text):
+                    entry = summary[style]
+                    if not entry[0]:
+                        entry[1] = line_timestamp(text, a)
+                    entry[0] += 1
+                    last[style] = a
+                for style, a in last.items():
+                    summary[style][2] = line_timestamp(text, a)
+    return path, summary, matcher.rejected
+
+
+def run_pool(fn, jobs, workers=None, processes=True):
+    """
+    Call ``fn(*job)`` for every job and yield ``(job, result, error)`` as
+    each finishes, in completion order. ``fn`` must be a module-level
+    function when ``processes`` is true.
+    """
+    jobs = list(jobs)
+    if not jobs:
+        return
+    workers = workers or default_workers()
+    executor_class = ProcessPoolExecutor if processes else ThreadPoolExecutor
+    with executor_class(max_workers=min(workers, len(jobs))) as executor:
+        futures = dict((executor.submit(fn, *job), job) for job in jobs)
+        for future in as_completed(futures):
+            try:
+                yield futures[future], future.result(), None
+            except Exception as error:
+                yield futures[future], None, error